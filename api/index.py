@@ -4,6 +4,9 @@ Wraps the FastAPI app for Vercel's serverless Python runtime.
 
 Vercel deploys each request as an independent serverless function.
 All /api/* routes are rewritten to this file via vercel.json.
+The VERCEL environment variable switches the app to its serverless mode
+(settings.is_serverless): NullPool, no boot-time migrations, and scheduled
+tasks run by Vercel Cron through /api/v1/cron/<task> (see "crons").
 """
 
 import sys
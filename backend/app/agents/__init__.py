@@ -1,22 +1,28 @@
 """
 KadaiGPT - AI Agents Package
+
+The operational agents (print, inventory, offline) are plain Python and load
+with the package. The AI agents in .core load on first access, so billing
+routes don't pay for the Gemini SDK at startup.
 """
 
-from .core import (
-    BaseAgent,
-    AgentTool,
-    AgentGoal,
-    AgentOrchestrator,
-    StoreManagerAgent,
-    InventoryAgent,
-    CustomerEngagementAgent
-)
+from app.utils.lazy import lazy_exports
 
 # Import agent instances
 from .print_agent import print_agent
 from .inventory_agent import inventory_agent
 from .offline_agent import offline_agent
 
+__getattr__ = lazy_exports(__name__, {
+    "BaseAgent": ".core.base_agent:BaseAgent",
+    "AgentTool": ".core.base_agent:AgentTool",
+    "AgentGoal": ".core.base_agent:AgentGoal",
+    "AgentOrchestrator": ".core.base_agent:AgentOrchestrator",
+    "StoreManagerAgent": ".core.store_manager_agent:StoreManagerAgent",
+    "InventoryAgent": ".core.inventory_agent:InventoryAgent",
+    "CustomerEngagementAgent": ".core.customer_agent:CustomerEngagementAgent",
+})
+
 __all__ = [
     "BaseAgent",
     "AgentTool", 
@@ -1,26 +1,33 @@
 """
 KadaiGPT - AI Agents Core Package
 Autonomous AI agents for store management
+
+Agents load on first access; importing the package imports none of them.
 """
 
-from .base_agent import (
-    BaseAgent,
-    AgentTool,
-    AgentGoal,
-    AgentAction,
-    AgentMemory,
-    AgentStatus,
-    ActionType,
-    AgentOrchestrator
-)
+from app.utils.lazy import lazy_exports
 
-from .store_manager_agent import StoreManagerAgent
-from .inventory_agent import InventoryAgent
-from .customer_agent import CustomerEngagementAgent, CustomerMessage
-from .analytics_agent import AnalyticsAgent
-from .voice_agent import VoiceAIAgent
-from .learning_agent import LearningAgent
-from .workflow_engine import WorkflowEngine, Workflow, WorkflowTrigger, WorkflowAction
+__getattr__ = lazy_exports(__name__, {
+    "BaseAgent": ".base_agent:BaseAgent",
+    "AgentTool": ".base_agent:AgentTool",
+    "AgentGoal": ".base_agent:AgentGoal",
+    "AgentAction": ".base_agent:AgentAction",
+    "AgentMemory": ".base_agent:AgentMemory",
+    "AgentStatus": ".base_agent:AgentStatus",
+    "ActionType": ".base_agent:ActionType",
+    "AgentOrchestrator": ".base_agent:AgentOrchestrator",
+    "StoreManagerAgent": ".store_manager_agent:StoreManagerAgent",
+    "InventoryAgent": ".inventory_agent:InventoryAgent",
+    "CustomerEngagementAgent": ".customer_agent:CustomerEngagementAgent",
+    "CustomerMessage": ".customer_agent:CustomerMessage",
+    "AnalyticsAgent": ".analytics_agent:AnalyticsAgent",
+    "VoiceAIAgent": ".voice_agent:VoiceAIAgent",
+    "LearningAgent": ".learning_agent:LearningAgent",
+    "WorkflowEngine": ".workflow_engine:WorkflowEngine",
+    "Workflow": ".workflow_engine:Workflow",
+    "WorkflowTrigger": ".workflow_engine:WorkflowTrigger",
+    "WorkflowAction": ".workflow_engine:WorkflowAction",
+})
 
 __all__ = [
     # Base classes
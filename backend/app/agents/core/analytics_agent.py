@@ -68,13 +68,20 @@ class AnalyticsAgent(BaseAgent):
             store_id=store_id
         )
         
-        # Historical data simulation (in production, would be from DB)
-        self._init_historical_data()
+        # Historical data simulation (in production, would be from DB),
+        # generated on the first forecast rather than per agent instance
+        self._historical_sales: Optional[List[Dict]] = None
+        self.historical_customers = []
+    
+    @property
+    def historical_sales(self) -> List[Dict]:
+        if self._historical_sales is None:
+            self._init_historical_data()
+        return self._historical_sales
     
     def _init_historical_data(self):
         """Initialize simulated historical data for demos"""
-        self.historical_sales = []
-        self.historical_customers = []
+        self._historical_sales = []
         
         # Generate 90 days of historical data
         base_date = datetime.now() - timedelta(days=90)
@@ -90,7 +97,7 @@ class AnalyticsAgent(BaseAgent):
             
             sales = base + (base * weekly_factor) + seasonal + random_factor
             
-            self.historical_sales.append({
+            self._historical_sales.append({
                 "date": date,
                 "sales": max(5000, sales),
                 "bills": int(sales / 500) + random.randint(-5, 5),
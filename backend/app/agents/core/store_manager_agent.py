@@ -8,8 +8,8 @@ import json
 import asyncio
 from typing import Dict, List, Any, Optional
 from datetime import datetime
-import google.generativeai as genai
 
+from app.utils.lazy import optional_import
 from .base_agent import (
     BaseAgent, AgentTool, AgentGoal, AgentStatus,
     ActionType, AgentOrchestrator, logger
@@ -35,7 +35,8 @@ class StoreManagerAgent(BaseAgent):
         
         # Initialize Gemini
         api_key = os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
-        if api_key:
+        genai = optional_import("google.generativeai") if api_key else None
+        if genai:
             genai.configure(api_key=api_key)
             self.model = genai.GenerativeModel('gemini-pro')
         else:
@@ -11,12 +11,10 @@ import os
 
 from .base_agent import BaseAgent, AgentTool, ActionType, logger
 
-# Try to import Google Generative AI
-try:
-    import google.generativeai as genai
-    GEMINI_AVAILABLE = True
-except ImportError:
-    GEMINI_AVAILABLE = False
+from app.utils.lazy import is_installed, optional_import
+
+# Google Generative AI is imported when an agent first needs it
+GEMINI_AVAILABLE = is_installed("google.generativeai")
 
 
 @dataclass
@@ -56,6 +54,7 @@ class VoiceAIAgent(BaseAgent):
         if GEMINI_AVAILABLE:
             api_key = os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
             if api_key:
+                genai = optional_import("google.generativeai")
                 genai.configure(api_key=api_key)
                 self.model = genai.GenerativeModel('gemini-pro')
             else:
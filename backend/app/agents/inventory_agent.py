@@ -180,7 +180,7 @@ class InventoryAgent:
             expiry_date = product.get("expiry_date")
             
             # Calculate sales velocity
-            velocity = self._calculate_velocity(product_id)
+            velocity = self._product_velocity(product)
             days_of_stock = self._predict_stockout(current_stock, velocity)
             
             # Determine alert type
@@ -225,6 +225,13 @@ class InventoryAgent:
         
         return insights
     
+    def _product_velocity(self, product: Dict[str, Any]) -> float:
+        """The product's sales_velocity column when given, else this process's sales history"""
+        velocity = product.get("sales_velocity")
+        if velocity is not None:
+            return velocity
+        return self._calculate_velocity(product.get("id"))
+    
     def _calculate_velocity(self, product_id: int) -> float:
         """Calculate average daily sales velocity"""
         if product_id not in self.sales_history:
@@ -354,20 +361,18 @@ class InventoryAgent:
         📋 SMART REORDER LIST: Generate intelligent reorder suggestions
         """
         insights = await self.analyze_inventory(products)
+        products_by_id = {p.get("id"): p for p in products}
         suggestions = []
         
         for insight in insights:
             if insight.alert_type in [StockAlert.CRITICAL, StockAlert.LOW]:
-                product = next(
-                    (p for p in products if p.get("id") == insight.product_id),
-                    None
-                )
+                product = products_by_id.get(insight.product_id)
                 
                 if not product:
                     continue
                 
                 # Calculate suggested quantity
-                velocity = self._calculate_velocity(insight.product_id)
+                velocity = self._product_velocity(product)
                 if velocity > 0:
                     # Order for 3 weeks + buffer
                     suggested_qty = int(velocity * 21) + insight.min_stock
@@ -7,19 +7,21 @@ import base64
 import json
 import re
 from datetime import datetime
-from typing import Optional, List, Dict, Any, Tuple
+from typing import Optional, List, Dict, Any, Tuple, TYPE_CHECKING
 from dataclasses import dataclass
 from enum import Enum
 import asyncio
+import io
 
-try:
-    import google.generativeai as genai
-    GEMINI_AVAILABLE = True
-except ImportError:
-    GEMINI_AVAILABLE = False
+from app.utils.lazy import is_installed, optional_import
 
-from PIL import Image
-import io
+# Gemini SDK and PIL are imported on first use, not at startup
+GEMINI_AVAILABLE = is_installed("google.generativeai")
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+from app.services.pricing_engine import pricing_engine, to_paise, to_rupees
 
 
 class ConfidenceLevel(Enum):
@@ -78,6 +80,7 @@ class OCRAgent:
     def _initialize_gemini(self):
         """Initialize Google Gemini for vision processing"""
         try:
+            genai = optional_import("google.generativeai")
             genai.configure(api_key=self.api_key)
             self.model = genai.GenerativeModel('gemini-1.5-flash')
             print("✅ Gemini Vision initialized successfully")
@@ -166,8 +169,10 @@ class OCRAgent:
                 errors=[str(e)]
             )
     
-    async def _preprocess_image(self, image_data: bytes) -> Image.Image:
+    async def _preprocess_image(self, image_data: bytes) -> "Image.Image":
         """Preprocess image for better OCR results"""
+        from PIL import Image
+        
         image = Image.open(io.BytesIO(image_data))
         
         # Convert to RGB if necessary
@@ -185,7 +190,7 @@ class OCRAgent:
     
     async def _gemini_extract(
         self, 
-        image: Image.Image,
+        image: "Image.Image",
         language_hint: str
     ) -> Tuple[str, List[ExtractedItem], Optional[float], Optional[str]]:
         """Use Gemini Vision API for extraction"""
@@ -260,7 +265,7 @@ Important:
     
     async def _demo_extract(
         self, 
-        image: Image.Image
+        image: "Image.Image"
     ) -> Tuple[str, List[ExtractedItem], Optional[float], Optional[str]]:
         """Demo extraction when Gemini is not available"""
         
@@ -399,22 +404,22 @@ Total:        600"""
             result["issues"].append("No items extracted")
             return result
         
-        # Calculate sum of item totals
-        calculated_total = sum(item.total for item in items)
+        # Calculate sum of item totals (in paise, as billing will)
+        calculated_paise = sum(to_paise(item.total) for item in items)
         
         # Check individual item calculations
         for i, item in enumerate(items):
-            expected_total = item.quantity * item.unit_price
-            if abs(expected_total - item.total) > 0.01:
+            expected_paise = pricing_engine.price_line(item.unit_price, item.quantity)[3]
+            if abs(expected_paise - to_paise(item.total)) > 1:
                 result["issues"].append(
-                    f"Item '{item.name}': {item.quantity} × ₹{item.unit_price} = ₹{expected_total}, not ₹{item.total}"
+                    f"Item '{item.name}': {item.quantity} × ₹{item.unit_price} = ₹{to_rupees(expected_paise)}, not ₹{item.total}"
                 )
         
-        # Check grand total
+        # Check grand total (₹1 tolerance for rounded-off handwritten totals)
         if extracted_total is not None:
-            if abs(calculated_total - extracted_total) > 1.0:
+            if abs(calculated_paise - to_paise(extracted_total)) > 100:
                 result["issues"].append(
-                    f"Total mismatch: Items sum to ₹{calculated_total:.2f}, but bill shows ₹{extracted_total:.2f}"
+                    f"Total mismatch: Items sum to ₹{to_rupees(calculated_paise):.2f}, but bill shows ₹{extracted_total:.2f}"
                 )
                 result["valid"] = False
         
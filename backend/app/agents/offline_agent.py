@@ -11,6 +11,7 @@ from typing import Optional, List, Dict, Any
 from dataclasses import dataclass, asdict
 from enum import Enum
 import aiofiles
+import httpx
 import os
 
 
@@ -74,6 +75,7 @@ class OfflineAgent:
         self.sync_in_progress = False
         self.last_sync_time: Optional[datetime] = None
         self.network_check_interval = 5  # seconds
+        self.bill_batch_size = 200  # bills per POST /bills/batch call
         self._monitor_task = None
         
         # Ensure storage directory exists
@@ -192,12 +194,17 @@ class OfflineAgent:
         
         return local_id
     
-    async def sync_pending_transactions(self, api_endpoint: Optional[str] = None) -> SyncResult:
+    async def sync_pending_transactions(
+        self,
+        api_endpoint: Optional[str] = None,
+        auth_token: Optional[str] = None
+    ) -> SyncResult:
         """
         🔄 SYNC: Push all pending transactions to server
         
         Features:
-        - Batch processing for efficiency
+        - Batch processing for efficiency (consecutive bills go in one
+          POST /bills/batch call, up to bill_batch_size at a time)
         - Conflict detection
         - Retry logic for failures
         - Transaction ordering preservation
@@ -226,6 +233,35 @@ class OfflineAgent:
         conflicts = []
         errors = []
         
+        def apply_result(transaction: OfflineTransaction, result: Dict[str, Any]):
+            if result["status"] == "success":
+                synced.append(transaction.local_id)
+                transaction.sync_status = SyncStatus.SYNCED
+            elif result["status"] == "conflict":
+                conflicts.append({
+                    "local_id": transaction.local_id,
+                    "type": transaction.transaction_type,
+                    "conflict_info": result.get("conflict_info")
+                })
+                transaction.sync_status = SyncStatus.CONFLICT
+            else:
+                failed.append(transaction.local_id)
+                transaction.sync_attempts += 1
+                transaction.last_sync_error = result.get("error")
+                transaction.sync_status = SyncStatus.FAILED
+        
+        async def flush_bills(chunk: List[OfflineTransaction]):
+            try:
+                results = await self._sync_bill_batch(chunk, api_endpoint, auth_token)
+            except Exception as e:
+                results = {}
+                errors.append(f"bill batch of {len(chunk)}: {str(e)}")
+            for transaction in chunk:
+                apply_result(transaction, results.get(
+                    transaction.local_id,
+                    {"status": "failed", "error": "No result returned for bill"}
+                ))
+        
         try:
             # Sort by creation time
             sorted_transactions = sorted(
@@ -233,26 +269,24 @@ class OfflineAgent:
                 key=lambda t: t.created_at
             )
             
+            bill_chunk: List[OfflineTransaction] = []
             for transaction in sorted_transactions:
+                if transaction.transaction_type == "bill":
+                    bill_chunk.append(transaction)
+                    if len(bill_chunk) >= self.bill_batch_size:
+                        await flush_bills(bill_chunk)
+                        bill_chunk = []
+                    continue
+                
+                # Keep ordering: bills queued before this transaction go first
+                if bill_chunk:
+                    await flush_bills(bill_chunk)
+                    bill_chunk = []
+                
                 try:
                     # Attempt to sync
                     result = await self._sync_single_transaction(transaction, api_endpoint)
-                    
-                    if result["status"] == "success":
-                        synced.append(transaction.local_id)
-                        transaction.sync_status = SyncStatus.SYNCED
-                    elif result["status"] == "conflict":
-                        conflicts.append({
-                            "local_id": transaction.local_id,
-                            "type": transaction.transaction_type,
-                            "conflict_info": result.get("conflict_info")
-                        })
-                        transaction.sync_status = SyncStatus.CONFLICT
-                    else:
-                        failed.append(transaction.local_id)
-                        transaction.sync_attempts += 1
-                        transaction.last_sync_error = result.get("error")
-                        transaction.sync_status = SyncStatus.FAILED
+                    apply_result(transaction, result)
                         
                 except Exception as e:
                     failed.append(transaction.local_id)
@@ -260,6 +294,9 @@ class OfflineAgent:
                     transaction.last_sync_error = str(e)
                     errors.append(f"{transaction.local_id}: {str(e)}")
             
+            if bill_chunk:
+                await flush_bills(bill_chunk)
+            
             # Remove synced transactions
             self.pending_transactions = [
                 t for t in self.pending_transactions 
@@ -302,6 +339,59 @@ class OfflineAgent:
             "synced_at": datetime.now().isoformat()
         }
     
+    async def _sync_bill_batch(
+        self,
+        transactions: List[OfflineTransaction],
+        api_endpoint: Optional[str],
+        auth_token: Optional[str] = None
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Sync many bills with one POST /bills/batch call.
+        
+        The server is idempotent on local_id, so a batch that failed half-way
+        can simply be sent again. Returns a result per local_id.
+        """
+        synced_at = datetime.now().isoformat()
+        
+        if not api_endpoint:
+            # Demo mode: one simulated round trip for the whole batch
+            await asyncio.sleep(0.1)
+            return {
+                t.local_id: {
+                    "status": "success",
+                    "server_id": f"SRV-{uuid.uuid4().hex[:8]}",
+                    "synced_at": synced_at
+                }
+                for t in transactions
+            }
+        
+        payload = {"bills": [{**t.data, "local_id": t.local_id} for t in transactions]}
+        headers = {"Authorization": f"Bearer {auth_token}"} if auth_token else {}
+        async with httpx.AsyncClient(timeout=60.0) as client:
+            response = await client.post(
+                f"{api_endpoint.rstrip('/')}/bills/batch",
+                json=payload,
+                headers=headers
+            )
+            response.raise_for_status()
+        
+        results = {}
+        for item in response.json().get("results", []):
+            if item["status"] in ("created", "duplicate"):
+                results[item["local_id"]] = {
+                    "status": "success",
+                    "server_id": item.get("bill_number"),
+                    "synced_at": synced_at
+                }
+            elif (item.get("error") or {}).get("error") == "insufficient_stock":
+                results[item["local_id"]] = {"status": "conflict", "conflict_info": item["error"]}
+            else:
+                results[item["local_id"]] = {
+                    "status": "failed",
+                    "error": (item.get("error") or {}).get("message", "Rejected by server")
+                }
+        return results
+    
     async def _persist_pending_transactions(self):
         """Save pending transactions to disk"""
         filepath = os.path.join(self.storage_path, "pending_transactions.json")
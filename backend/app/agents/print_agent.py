@@ -241,13 +241,16 @@ class PrintAgent:
         self, 
         content: str,
         printer_name: str,
-        content_type: str = "receipt"
+        content_type: str = "receipt",
+        max_retries: Optional[int] = None
     ) -> Dict[str, Any]:
         """
         🖨️ SILENT PRINT: Execute print without any dialog boxes
         
         This is the key feature - NO user interaction required!
+        Pass max_retries=1 when the caller (e.g. the print spooler) owns retries.
         """
+        max_retries = max_retries or self.max_retries
         result = {
             "success": False,
             "printer": printer_name,
@@ -255,7 +258,7 @@ class PrintAgent:
             "error": None
         }
         
-        for attempt in range(1, self.max_retries + 1):
+        for attempt in range(1, max_retries + 1):
             result["attempts"] = attempt
             
             try:
@@ -273,10 +276,10 @@ class PrintAgent:
                 result["error"] = str(e)
             
             # Wait before retry with exponential backoff
-            if attempt < self.max_retries:
+            if attempt < max_retries:
                 await asyncio.sleep(self.retry_delay_seconds * attempt)
         
-        result["message"] = f"Print failed after {self.max_retries} attempts"
+        result["message"] = f"Print failed after {max_retries} attempts"
         return result
     
     async def _windows_silent_print(
@@ -350,13 +353,15 @@ class PrintAgent:
         bill_number = bill_data.get("bill_number", "N/A")
         items = bill_data.get("items", [])
         total = bill_data.get("total_amount", 0)
+        # Reprints show the sale time, so the same bill always renders the same
+        printed_at = bill_data.get("bill_date") or datetime.now()
         
         receipt = []
         receipt.append("=" * 32)
         receipt.append(f"{store_name:^32}")
         receipt.append("=" * 32)
         receipt.append(f"Bill No: {bill_number}")
-        receipt.append(f"Date: {datetime.now().strftime('%d/%m/%Y %H:%M')}")
+        receipt.append(f"Date: {printed_at.strftime('%d/%m/%Y %H:%M')}")
         receipt.append("-" * 32)
         receipt.append(f"{'Item':<16} {'Qty':>4} {'Amount':>10}")
         receipt.append("-" * 32)
@@ -24,6 +24,36 @@ class Settings(BaseSettings):
     
     # Database
     database_url: str = "sqlite+aiosqlite:///./kadaigpt.db"
+    # Optional read replica for reporting/analytics reads
+    read_database_url: Optional[str] = None
+    # After a store writes, its replica reads go to the primary for this long
+    read_your_writes_seconds: float = 10.0
+    # "edge": tuned embedded SQLite file for single-shop boxes (WAL, one
+    # writer connection, concurrent query-only readers)
+    database_profile: str = "default"
+    sqlite_cache_size_mb: int = 64
+    sqlite_mmap_size_mb: int = 256
+    sqlite_busy_timeout_ms: int = 5000
+    sqlite_reader_connections: int = 4
+    # Monthly range partitions of bills/bill_items (PostgreSQL only)
+    bill_partitioning: bool = False
+    bill_partition_months_ahead: int = 3
+    bill_partition_retention_months: int = 0  # detach older months; 0 = keep all
+    # Query instrumentation (GET /api/health/db)
+    slow_query_ms: float = 200.0
+    slow_query_log_size: int = 200
+    query_explain_sample_rate: float = 0.05
+    excessive_queries_per_request: int = 50
+    # Serverless profile: NullPool, no boot-time DDL, no background loops;
+    # scheduled tasks run through the /api/v1/cron trigger instead.
+    # None = detect (Vercel, AWS Lambda)
+    serverless: Optional[bool] = None
+    # Connections go through PgBouncer in transaction mode (no prepared
+    # statement cache). None = detect Neon's "-pooler" hosts
+    database_pgbouncer: Optional[bool] = None
+    # Bearer token the cron trigger requires; CRON_SECRET is also what
+    # Vercel Cron sends in its Authorization header
+    cron_secret: Optional[str] = None
     
     # JWT Settings
     jwt_secret_key: str = "kadaigpt-dev-jwt-key-CHANGE-IN-PRODUCTION"
@@ -31,14 +61,27 @@ class Settings(BaseSettings):
     access_token_expire_minutes: int = 1440  # 24 hours
     refresh_token_expire_days: int = 30
     
+    # Password hashing: bcrypt cost for new hashes (older costs are rehashed
+    # on login) and the thread pool it runs on
+    bcrypt_rounds: int = 12
+    password_hash_workers: int = 4
+    password_hash_max_queue: int = 64
+    
     # Google AI (Gemini) for OCR & Predictions
     google_api_key: Optional[str] = None
     
     # Redis (optional - gracefully degrades without it)
     redis_url: str = "redis://localhost:6379/0"
     
+    # Shop time zone: "today" and the hourly sales buckets follow its wall
+    # clock (bill times are stored in UTC)
+    store_timezone: str = "Asia/Kolkata"
+    
     # Printer Settings
     default_printer_name: str = "auto"
+    # A "printing" job whose claim is older than this is assumed abandoned
+    # by a dead worker and is printed again
+    print_job_lease_seconds: float = 300.0
     silent_print_enabled: bool = True
     printer_width: int = 32
     printer_type: str = "thermal"
@@ -53,7 +96,39 @@ class Settings(BaseSettings):
     # Rate Limiting
     rate_limit_per_minute: int = 100
     auth_rate_limit_per_minute: int = 5
-    
+    # Limiter store: "memory" (per process), "shared" (mmap'd table for all
+    # workers on this host) or "redis" (redis_url, across hosts)
+    rate_limit_backend: str = "memory"
+    rate_limit_max_keys: int = 100000
+    rate_limit_shared_path: Optional[str] = None  # default /dev/shm/kadaigpt-ratelimit
+    rate_limit_shared_slots: int = 65536
+    
+    # Idempotency-Key response cache ("memory" or "redis" via redis_url)
+    idempotency_backend: str = "memory"
+    idempotency_ttl_seconds: int = 86400
+    idempotency_max_entries: int = 10000
+    
+    # Serialized bill detail / rendered receipt cache (per process)
+    bill_cache_max_entries: int = 2000
+    
+    # Authenticated user + store settings cache (per process)
+    principal_cache_ttl_seconds: float = 30.0
+    principal_cache_max_entries: int = 10000
+
+    # Product typeahead: "memory" (per-store trigram index in each process)
+    # or "pg_trgm" (PostgreSQL similarity() over a GIN index)
+    product_search_backend: str = "memory"
+    product_search_ttl_seconds: float = 300.0
+    product_search_max_stores: int = 200
+
+    # Barcode/SKU scan lookups (per process, all stores share the cap)
+    barcode_cache_max_entries: int = 50000
+    barcode_cache_ttl_seconds: float = 600.0
+
+    # Inventory insights: how often a store's products.sales_velocity is
+    # recomputed (lazily, on the first inventory read after this long)
+    inventory_velocity_refresh_seconds: float = 900.0
+
     # Feature Flags
     enable_voice_commands: bool = True
     enable_multilingual: bool = True
@@ -103,6 +178,27 @@ class Settings(BaseSettings):
             if vercel_url:
                 url = vercel_url
         
+        return self._to_async_url(url)
+    
+    def get_async_read_database_url(self) -> Optional[str]:
+        """Async-compatible read replica URL, or None when reads share the primary"""
+        return self._to_async_url(self.read_database_url) if self.read_database_url else None
+    
+    def is_serverless(self) -> bool:
+        """Whether each instance lives for a burst of requests only"""
+        if self.serverless is not None:
+            return self.serverless
+        return bool(os.environ.get("VERCEL") or os.environ.get("AWS_LAMBDA_FUNCTION_NAME"))
+    
+    def uses_pgbouncer(self, url: str) -> bool:
+        """Whether connections to url go through a transaction-mode pooler"""
+        if self.database_pgbouncer is not None:
+            return self.database_pgbouncer
+        return "-pooler." in url
+    
+    @staticmethod
+    def _to_async_url(url: str) -> str:
+        """Rewrite a database URL for the async drivers"""
         # Convert postgres:// to postgresql+asyncpg://
         if url.startswith("postgres://"):
             url = url.replace("postgres://", "postgresql+asyncpg://", 1)
@@ -2,16 +2,25 @@
 KadaiGPT - Database Configuration
 Async SQLAlchemy setup with PostgreSQL (Production) or SQLite (local dev)
 
-Production-grade connection pooling, health checks, and index management.
+Production-grade connection pooling and health checks, with optional
+read-replica routing for reporting reads, a tuned "edge" profile for
+embedded SQLite on in-store boxes and a serverless profile (NullPool,
+PgBouncer-safe statements) for Vercel.
+Schema changes live in app/migrations.
 """
 
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase
-from sqlalchemy import text, Index, event
+from sqlalchemy import text, event
+from sqlalchemy.pool import NullPool
 from app.config import settings
+from app.middleware.query_metrics import db_metrics, TimedAsyncQueuePool
+from contextvars import ContextVar
+from typing import Dict, Optional
 import logging
 import os
 import time
+import uuid
 
 logger = logging.getLogger(__name__)
 
@@ -26,34 +35,114 @@ else:
     log_url = "SQLite (local)"
 logger.info(f"[Database] Connecting to: {log_url}")
 
-# Engine configuration differs between SQLite and PostgreSQL
-engine_kwargs = {
-    "echo": settings.debug,
-    "future": True,
-}
-
-if not is_sqlite:
-    # PostgreSQL production settings — optimized pool
-    engine_kwargs.update({
-        "pool_pre_ping": True,
-        "pool_size": 20,           # Production pool size
-        "max_overflow": 10,        # Extra connections under load
-        "pool_recycle": 1800,      # Recycle connections every 30 min
-        "pool_timeout": 30,
-        "connect_args": {
-            "server_settings": {
-                "application_name": "kadaigpt",
-                "statement_timeout": "30000",  # 30s query timeout
-            }
+def build_engine_kwargs(url: str) -> dict:
+    """Engine configuration differs between SQLite and PostgreSQL"""
+    engine_kwargs = {
+        "echo": settings.debug,
+        "future": True,
+    }
+    
+    if url.startswith("sqlite"):
+        if settings.is_serverless() and ":memory:" not in url:
+            engine_kwargs["poolclass"] = NullPool
+        return engine_kwargs
+    
+    connect_args = {
+        "server_settings": {
+            "application_name": "kadaigpt",
+            "statement_timeout": "30000",  # 30s query timeout
         }
-    })
+    }
+    
+    if settings.is_serverless():
+        # A function instance serves one burst of requests and may be frozen
+        # between them; a pool per instance would pin connections the other
+        # instances need, so connect per session and let the pooler pool
+        engine_kwargs["poolclass"] = NullPool
+    else:
+        # PostgreSQL production settings — optimized pool
+        engine_kwargs.update({
+            "poolclass": TimedAsyncQueuePool,  # records checkout waits
+            "pool_pre_ping": True,
+            "pool_size": 20,           # Production pool size
+            "max_overflow": 10,        # Extra connections under load
+            "pool_recycle": 1800,      # Recycle connections every 30 min
+            "pool_timeout": 30,
+        })
     
     # Neon requires SSL
-    if "neon.tech" in db_url:
-        engine_kwargs["connect_args"]["ssl"] = "require"
+    if "neon.tech" in url:
+        connect_args["ssl"] = "require"
+    
+    # Transaction-mode PgBouncer hands each transaction to any server
+    # connection, so named prepared statements can't be reused
+    if settings.uses_pgbouncer(url):
+        connect_args.update({
+            "statement_cache_size": 0,             # asyncpg's own cache
+            "prepared_statement_cache_size": 0,    # SQLAlchemy's adapter cache
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid.uuid4()}__",
+        })
+    
+    engine_kwargs["connect_args"] = connect_args
+    return engine_kwargs
+
+
+def apply_sqlite_pragmas(sync_engine, query_only: bool = False):
+    """Set the edge-profile PRAGMAs on every new SQLite connection"""
+    pragmas = [
+        "PRAGMA journal_mode=WAL",         # readers never block the writer
+        "PRAGMA synchronous=NORMAL",       # fsync at checkpoints, not every commit
+        f"PRAGMA mmap_size={settings.sqlite_mmap_size_mb * 1024 * 1024}",
+        f"PRAGMA cache_size=-{settings.sqlite_cache_size_mb * 1024}",  # negative = KiB
+        f"PRAGMA busy_timeout={settings.sqlite_busy_timeout_ms}",
+        "PRAGMA temp_store=MEMORY",
+    ]
+    if query_only:
+        pragmas.append("PRAGMA query_only=ON")
+    
+    @event.listens_for(sync_engine, "connect")
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+
+def create_edge_engines(url: str):
+    """
+    (writer, reader) engines for the edge profile on one SQLite file.
+    
+    SQLite allows one writer at a time; funnelling every primary session
+    through a single pooled connection makes writers queue in asyncio
+    instead of spinning on SQLITE_BUSY, while WAL lets the reader pool
+    run reports concurrently against the last committed state.
+    """
+    writer = create_async_engine(
+        url, echo=settings.debug, poolclass=TimedAsyncQueuePool,
+        pool_size=1, max_overflow=0, pool_timeout=30
+    )
+    reader = create_async_engine(
+        url, echo=settings.debug, poolclass=TimedAsyncQueuePool,
+        pool_size=settings.sqlite_reader_connections, max_overflow=0, pool_timeout=30
+    )
+    apply_sqlite_pragmas(writer.sync_engine)
+    apply_sqlite_pragmas(reader.sync_engine, query_only=True)
+    return writer, reader
+
+
+engine_kwargs = build_engine_kwargs(db_url)
+
+# Edge profile: tuned embedded SQLite for single-shop boxes
+is_edge = settings.database_profile == "edge" and is_sqlite and ":memory:" not in db_url
+if settings.database_profile == "edge" and not is_edge:
+    logger.warning("[Database] Edge profile needs a SQLite file URL; using defaults")
 
 # Create async engine
-engine = create_async_engine(db_url, **engine_kwargs)
+if is_edge:
+    logger.info("[Database] Edge profile: WAL, single writer, concurrent readers")
+    engine, edge_reader_engine = create_edge_engines(db_url)
+else:
+    engine = create_async_engine(db_url, **engine_kwargs)
 
 # Create async session factory
 async_session_maker = async_sessionmaker(
@@ -62,6 +151,28 @@ async_session_maker = async_sessionmaker(
     expire_on_commit=False
 )
 
+# Optional read replica: reporting reads get their own pool. Without one,
+# reads share the primary engine.
+read_db_url = settings.get_async_read_database_url()
+if read_db_url:
+    logger.info(f"[Database] Read replica: {read_db_url.split('@')[-1] if '@' in read_db_url else 'SQLite (local)'}")
+    read_engine = create_async_engine(read_db_url, **build_engine_kwargs(read_db_url))
+elif is_edge:
+    read_engine = edge_reader_engine
+else:
+    read_engine = engine
+
+read_session_maker = async_sessionmaker(
+    read_engine,
+    class_=AsyncSession,
+    expire_on_commit=False
+)
+
+# Statement timings, pool waits and the slow-query log (GET /api/health/db)
+db_metrics.install(engine, "primary")
+if read_engine is not engine:
+    db_metrics.install(read_engine, "replica" if read_db_url else "reader")
+
 
 class Base(DeclarativeBase):
     """Base class for all database models"""
@@ -69,82 +180,20 @@ class Base(DeclarativeBase):
 
 
 async def init_db():
-    """Initialize database - create all tables and indexes"""
-    logger.info("[Database] Initializing database tables...")
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-    logger.info("[Database] Tables created successfully!")
-    await run_migrations()
-    await create_indexes()
-
-
-async def run_migrations():
-    """Run lightweight migrations to add missing columns to existing tables"""
-    migration_statements = [
-        # Add deleted_at to customers if missing (soft delete support)
-        """DO $$ BEGIN
-            ALTER TABLE customers ADD COLUMN deleted_at TIMESTAMPTZ;
-        EXCEPTION WHEN duplicate_column THEN NULL;
-        END $$;""",
-        # Add loyalty_points to customers if missing
-        """DO $$ BEGIN
-            ALTER TABLE customers ADD COLUMN loyalty_points INTEGER DEFAULT 0;
-        EXCEPTION WHEN duplicate_column THEN NULL;
-        END $$;""",
-        # Add last_purchase to customers if missing
-        """DO $$ BEGIN
-            ALTER TABLE customers ADD COLUMN last_purchase TIMESTAMP;
-        EXCEPTION WHEN duplicate_column THEN NULL;
-        END $$;""",
-    ]
-    try:
-        async with engine.begin() as conn:
-            for stmt in migration_statements:
-                try:
-                    await conn.execute(text(stmt))
-                except Exception as e:
-                    logger.debug(f"Migration skipped: {e}")
-        logger.info(f"[Database] {len(migration_statements)} migrations checked")
-    except Exception as e:
-        logger.warning(f"[Database] Migrations skipped: {e}")
-
-
-async def create_indexes():
-    """Create performance indexes for common query patterns"""
-    index_statements = [
-        # Products: frequently searched by store + name
-        "CREATE INDEX IF NOT EXISTS idx_products_store_name ON products(store_id, name)",
-        "CREATE INDEX IF NOT EXISTS idx_products_store_active ON products(store_id, is_active)",
-        "CREATE INDEX IF NOT EXISTS idx_products_store_category ON products(store_id, category_id)",
-        "CREATE INDEX IF NOT EXISTS idx_products_store_stock ON products(store_id, current_stock)",
-        # Bills: frequently queried by store + date range
-        "CREATE INDEX IF NOT EXISTS idx_bills_store_date ON bills(store_id, created_at DESC)",
-        "CREATE INDEX IF NOT EXISTS idx_bills_store_status ON bills(store_id, status)",
-        "CREATE INDEX IF NOT EXISTS idx_bills_customer_phone ON bills(customer_phone)",
-        "CREATE INDEX IF NOT EXISTS idx_bills_bill_number ON bills(bill_number)",
-        # Bill Items: join performance
-        "CREATE INDEX IF NOT EXISTS idx_bill_items_bill ON bill_items(bill_id)",
-        "CREATE INDEX IF NOT EXISTS idx_bill_items_product ON bill_items(product_id)",
-        # Customers: phone lookup
-        "CREATE INDEX IF NOT EXISTS idx_customers_store_phone ON customers(store_id, phone)",
-        "CREATE INDEX IF NOT EXISTS idx_customers_store_name ON customers(store_id, name)",
-        # Users: auth lookups
-        "CREATE INDEX IF NOT EXISTS idx_users_store ON users(store_id)",
-        # Daily Summaries: date range queries
-        "CREATE INDEX IF NOT EXISTS idx_daily_summaries_store_date ON daily_summaries(store_id, summary_date DESC)",
-        # Agent Logs: recent logs
-        "CREATE INDEX IF NOT EXISTS idx_agent_logs_store_date ON agent_logs(store_id, created_at DESC)",
-    ]
-    try:
-        async with engine.begin() as conn:
-            for stmt in index_statements:
-                try:
-                    await conn.execute(text(stmt))
-                except Exception as e:
-                    logger.debug(f"Index already exists or skipped: {e}")
-        logger.info(f"[Database] {len(index_statements)} performance indexes ensured")
-    except Exception as e:
-        logger.warning(f"[Database] Index creation skipped: {e}")
+    """
+    Bring the schema up to date through the versioned migrations.
+    
+    A database already at the latest version costs one SELECT and no DDL.
+    """
+    from app.migrations import migrate
+    from app.services.bill_partitions import bill_partitions
+    
+    applied = await migrate(engine)
+    if applied:
+        logger.info(f"[Database] Applied migrations {applied}")
+    # BILL_PARTITIONING turned on after migration 0007 ran
+    if await bill_partitions.ensure_converted(engine):
+        logger.info("[Database] Converted bills to monthly partitions")
 
 
 async def check_db_health() -> dict:
@@ -155,11 +204,15 @@ async def check_db_health() -> dict:
             result = await conn.execute(text("SELECT 1"))
             latency_ms = round((time.time() - start) * 1000, 2)
             pool = engine.pool
+            pool_stats = db_metrics.pool_summary("primary")
             return {
                 "status": "healthy",
                 "latency_ms": latency_ms,
                 "pool_size": pool.size() if hasattr(pool, 'size') else "N/A",
                 "checked_out": pool.checkedout() if hasattr(pool, 'checkedout') else "N/A",
+                "overflow": pool.overflow() if hasattr(pool, 'overflow') else "N/A",
+                "pool_timeouts": pool_stats.get("timeouts", 0),
+                "pool_wait_p95_ms": pool_stats.get("wait_ms", {}).get("p95", 0.0),
             }
     except Exception as e:
         return {"status": "unhealthy", "error": str(e)[:100]}
@@ -175,3 +228,100 @@ async def get_db() -> AsyncSession:
             raise
         finally:
             await session.close()
+
+
+# ==================== READ REPLICA ROUTING ====================
+
+# Store of the authenticated principal handling the current request
+request_store_id: ContextVar[Optional[int]] = ContextVar("request_store_id", default=None)
+
+
+class ReplicaRouter:
+    """
+    Read-your-writes routing between the primary and the read replica.
+    
+    Committed ORM writes mark their store (from the written rows' store_id
+    and from the request's principal). For read_your_writes_seconds after
+    that, the store's replica reads fall back to the primary so a report
+    right after a sale includes it despite replica lag.
+    
+    The marks are per process; with several workers a write on one worker
+    only redirects that worker's reads.
+    """
+    
+    MAX_TRACKED_STORES = 10000
+    
+    def __init__(self, read_session_maker: Optional[async_sessionmaker], window_seconds: float):
+        self.read_session_maker = read_session_maker
+        self.window_seconds = window_seconds
+        self._last_write: Dict[int, float] = {}
+        self._replica_reads = 0
+        self._primary_reads = 0
+    
+    @property
+    def enabled(self) -> bool:
+        return self.read_session_maker is not None
+    
+    def mark_write(self, store_id: int):
+        now = time.monotonic()
+        self._last_write.pop(store_id, None)
+        self._last_write[store_id] = now  # insertion order = write order
+        if len(self._last_write) > self.MAX_TRACKED_STORES:
+            cutoff = now - self.window_seconds
+            for stale in [s for s, t in self._last_write.items() if t < cutoff]:
+                del self._last_write[stale]
+    
+    def use_replica(self, store_id: Optional[int]) -> bool:
+        """Whether this store's reads may go to the replica right now"""
+        if not self.enabled:
+            return False
+        written_at = self._last_write.get(store_id)
+        if written_at is not None and time.monotonic() - written_at < self.window_seconds:
+            self._primary_reads += 1
+            return False
+        self._replica_reads += 1
+        return True
+    
+    def get_stats(self) -> dict:
+        return {
+            "replica_configured": self.enabled,
+            "replica_reads": self._replica_reads,
+            "primary_fallback_reads": self._primary_reads,
+            "recent_writers": len(self._last_write),
+            "window_seconds": self.window_seconds
+        }
+
+
+# Edge readers share the writer's file, so committed writes are visible at once
+replica_router = ReplicaRouter(
+    read_session_maker if read_engine is not engine else None,
+    0 if is_edge and not read_db_url else settings.read_your_writes_seconds
+)
+
+
+# Imported here, after Base: the services package imports the models
+from app.services.write_tracker import TransactionWrites, write_tracker
+
+
+@write_tracker.on_commit
+def _mark_committed_writes(writes: TransactionWrites):
+    if not replica_router.enabled or not writes.written:
+        return
+    for store_id in writes.store_ids | {request_store_id.get()}:
+        if store_id is not None:
+            replica_router.mark_write(store_id)
+
+
+async def get_read_session(store_id: Optional[int], primary: AsyncSession):
+    """
+    Session for a reporting read: the replica, or the request's primary
+    session while the store is inside its read-your-writes window.
+    """
+    if not replica_router.use_replica(store_id):
+        yield primary
+        return
+    async with replica_router.read_session_maker() as session:
+        try:
+            yield session
+        finally:
+            await session.close()
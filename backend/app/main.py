@@ -12,7 +12,7 @@ import os
 import time
 from pathlib import Path
 from datetime import datetime
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, Request, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse, JSONResponse
@@ -25,29 +25,25 @@ from app.routers import (
     auth_router,
     products_router,
     bills_router,
-    ocr_router,
-    print_router,
     customers_router,
-    suppliers_router,
-    whatsapp_router,
     dashboard_router,
     analytics_router,
     notifications_router
 )
-from app.routers.bulk import router as bulk_router
-from app.routers.telegram import router as telegram_router
-from app.services.scheduler import router as scheduler_router
-from app.routers.subscription import router as subscription_router
-from app.routers.gst import router as gst_router
-from app.routers.credit import router as credit_router
-from app.routers.audit import router as audit_router
-from app.routers.inapp_notifications import router as inapp_notifications_router
-from app.routers.backup import router as backup_router
-from app.routers.privacy import router as privacy_router
+from app.services.scheduler import router as scheduler_router, cron_router
 from app.services.keepalive import keepalive
+from app.services.print_spooler import print_spooler
+from app.services.password_hasher import password_hasher
+from app.services.product_search import product_search
+from app.services.barcode_cache import barcode_cache
+from app.services.change_feed import change_feed
+from app.services.stock_take import stock_takes
 from app.services.scheduler import scheduler, register_default_tasks
-from app.middleware.security import rate_limiter, get_rate_limit_type, RATE_LIMITS, audit_logger
-import uuid
+from app.middleware.security import SecurityMiddleware, rate_limiter, route_timings, audit_logger
+from app.middleware.query_metrics import QueryMetricsMiddleware, db_metrics
+from app.models import User, UserRole
+from app.rbac import require_min_role
+from app.utils.lazy import include_lazy_router, load_lazy_routers
 
 settings = get_settings()
 
@@ -66,16 +62,26 @@ async def lifespan(app: FastAPI):
     print("   கடை சிறியது, கனவுகள் பெரியது")
     print("   'The shop may be small, but dreams are big'")
     
-    # Create database tables + run migrations + create indexes
-    await init_db()
-    
-    # Start keep-alive service (prevents Render free tier from sleeping)
-    await keepalive.start()
-    
-    # Start task scheduler
-    register_default_tasks()
-    await scheduler.start()
-    print("✅ Scheduler started with", len(scheduler.tasks), "tasks")
+    if settings.is_serverless():
+        # Each function instance runs this; schema changes ship with the
+        # deploy (python -m app.migrations) and scheduled tasks arrive
+        # through the /api/v1/cron trigger, so nothing runs in the background
+        register_default_tasks()
+        print("☁️ Serverless mode: skipped migrations and background loops")
+    else:
+        # Create database tables + run migrations + create indexes
+        await init_db()
+        
+        # Start keep-alive service (prevents Render free tier from sleeping)
+        await keepalive.start()
+        
+        # Start print spooler (resumes any unfinished print jobs)
+        await print_spooler.start()
+        
+        # Start task scheduler
+        register_default_tasks()
+        await scheduler.start()
+        print("✅ Scheduler started with", len(scheduler.tasks), "tasks")
     
     # Check if frontend build exists
     if FRONTEND_BUILD_DIR.exists():
@@ -91,6 +97,7 @@ async def lifespan(app: FastAPI):
     # Shutdown
     print("👋 KadaiGPT shutting down... நன்றி!")
     await keepalive.stop()
+    await print_spooler.stop()
     await scheduler.stop()
     await engine.dispose()
 
@@ -143,73 +150,19 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS", "PATCH"],
     allow_headers=["*"],
-    expose_headers=["X-Request-ID", "X-Response-Time"],
+    expose_headers=["X-Request-ID", "X-Response-Time", "X-Next-Cursor"],
 )
 
+# Per-request statement counts and timings for /api/health/db
+app.add_middleware(QueryMetricsMiddleware)
+
 
 # ═══════════════════════════════════════════════════════════════════
 # Security Middleware — Rate Limiting + Headers + Request Timing
 # ═══════════════════════════════════════════════════════════════════
-@app.middleware("http")
-async def security_middleware(request: Request, call_next):
-    """Adds rate limiting, security headers, request IDs, and timing."""
-    start_time = time.time()
-    request_id = str(uuid.uuid4())[:8]
-    
-    # Rate limiting (skip for health/ping/docs endpoints)
-    client_ip = request.client.host if request.client else "unknown"
-    path = request.url.path
-    
-    if not path.startswith(("/api/ping", "/api/health", "/api/docs", "/api/redoc", "/api/openapi")):
-        limit_type = get_rate_limit_type(path)
-        limits = RATE_LIMITS.get(limit_type, RATE_LIMITS['api'])
-        allowed, remaining = rate_limiter.check_rate_limit(
-            f"{client_ip}:{limit_type}",
-            max_requests=limits['max'],
-            window_seconds=limits['window']
-        )
-        if not allowed:
-            return JSONResponse(
-                status_code=429,
-                content={
-                    "error": True,
-                    "message": "Too many requests. Please slow down.",
-                    "retry_after": limits['window']
-                },
-                headers={"Retry-After": str(limits['window'])}
-            )
-    
-    # Process request
-    response = await call_next(request)
-    
-    # Add security headers
-    response.headers["X-Request-ID"] = request_id
-    response.headers["X-Response-Time"] = f"{(time.time() - start_time)*1000:.1f}ms"
-    response.headers["X-Content-Type-Options"] = "nosniff"
-    response.headers["X-Frame-Options"] = "DENY"
-    response.headers["X-XSS-Protection"] = "1; mode=block"
-    response.headers["Referrer-Policy"] = "strict-origin-when-cross-origin"
-    response.headers["Permissions-Policy"] = "camera=(), microphone=(self), geolocation=()"
-    
-    # Content-Security-Policy — last missing security header
-    csp_directives = [
-        "default-src 'self'",
-        "script-src 'self' 'unsafe-inline' 'unsafe-eval'",  # React needs inline/eval
-        "style-src 'self' 'unsafe-inline' https://fonts.googleapis.com",
-        "font-src 'self' https://fonts.gstatic.com",
-        "img-src 'self' data: blob: https:",
-        "connect-src 'self' https://api.whatsapp.com https://wa.me https://*.googleapis.com wss: ws:",
-        "media-src 'self' blob:",
-        "worker-src 'self' blob:",
-        "frame-ancestors 'none'",
-    ]
-    response.headers["Content-Security-Policy"] = "; ".join(csp_directives)
-    
-    # HSTS in production
-    if settings.app_env == "production":
-        response.headers["Strict-Transport-Security"] = "max-age=31536000; includeSubDomains"
-    
-    return response
+# Pure ASGI and added last, so it is outermost: refused requests never
+# reach CORS, the router or body parsing
+app.add_middleware(SecurityMiddleware, hsts=settings.app_env == "production")
 
 
 # API Health check endpoint — production-grade
@@ -234,6 +187,13 @@ async def health_check():
         "server_started": datetime.fromtimestamp(SERVER_START_TIME).isoformat(),
         "database": db_health,
         "keepalive": keepalive.get_status(),
+        "print_spooler": print_spooler.get_status(),
+        "password_hashing": password_hasher.get_status(),
+        "rate_limiting": rate_limiter.get_stats(),
+        "product_search": product_search.get_stats(),
+        "barcode_lookup": barcode_cache.get_stats(),
+        "change_feed": change_feed.get_stats(),
+        "stock_takes": stock_takes.get_stats(),
         "scheduler": {
             "running": scheduler.running,
             "tasks": len(scheduler.tasks)
@@ -252,6 +212,29 @@ async def health_check():
     }
 
 
+# Database query metrics — pool waits, per-route statement histograms, slow queries
+@app.get("/api/health/db")
+async def db_health_metrics(
+    top: int = 20,
+    current_user: User = Depends(require_min_role(UserRole.OWNER))
+):
+    """Connection pool and query instrumentation (owners only)."""
+    return {
+        "database": await check_db_health(),
+        **db_metrics.snapshot(top)
+    }
+
+
+# Request latency per route template, recorded by SecurityMiddleware
+@app.get("/api/health/routes")
+async def route_health_metrics(
+    top: int = 20,
+    current_user: User = Depends(require_min_role(UserRole.OWNER))
+):
+    """Per-route request counts, 5xx counts and latency histograms (owners only)."""
+    return route_timings.snapshot(top)
+
+
 # Ultra-lightweight ping endpoint for external monitors (UptimeRobot, etc.)
 @app.get("/api/ping")
 async def ping():
@@ -284,28 +267,43 @@ async def app_info():
 
 
 # Include API routers with /api/v1 prefix
+# The billing counter's routers are built at import time; the rest are
+# imported on the first request under their prefix to keep cold starts short
 app.include_router(auth_router, prefix="/api/v1")
 app.include_router(products_router, prefix="/api/v1")
 app.include_router(bills_router, prefix="/api/v1")
-app.include_router(ocr_router, prefix="/api/v1")
-app.include_router(print_router, prefix="/api/v1")
+include_lazy_router(app, "app.routers.ocr:router", "/api/v1/ocr", prefix="/api/v1")
+include_lazy_router(app, "app.routers.print:router", "/api/v1/print", prefix="/api/v1")
 app.include_router(customers_router, prefix="/api/v1")
-app.include_router(suppliers_router, prefix="/api/v1")
-app.include_router(whatsapp_router, prefix="/api/v1")
+include_lazy_router(app, "app.routers.suppliers:router", "/api/v1/suppliers", prefix="/api/v1")
+include_lazy_router(app, "app.routers.whatsapp:router", "/api/v1/whatsapp", prefix="/api/v1")
 app.include_router(dashboard_router, prefix="/api/v1")
 app.include_router(analytics_router, prefix="/api/v1")
 app.include_router(notifications_router, prefix="/api/v1")
-app.include_router(bulk_router, prefix="/api/v1")
+include_lazy_router(app, "app.routers.bulk:router", "/api/v1/bulk", prefix="/api/v1")
 app.include_router(scheduler_router, prefix="/api/v1")
-app.include_router(telegram_router, prefix="/api/v1")
-app.include_router(subscription_router, prefix="/api/v1")
-app.include_router(gst_router, prefix="/api/v1")
-app.include_router(credit_router, prefix="/api/v1")
-app.include_router(audit_router)  # Already has /api/audit prefix
-app.include_router(inapp_notifications_router)  # Already has /api/notifications prefix
-app.include_router(backup_router, prefix="/api/v1")  # /api/v1/backup
-app.include_router(privacy_router, prefix="/api/v1")  # /api/v1/privacy
+app.include_router(cron_router, prefix="/api/v1")  # Vercel Cron in serverless mode
+include_lazy_router(app, "app.routers.telegram:router", "/api/v1/telegram", prefix="/api/v1")
+include_lazy_router(app, "app.routers.subscription:router", "/api/v1/subscription", prefix="/api/v1")
+include_lazy_router(app, "app.routers.gst:router", "/api/v1/gst", prefix="/api/v1")
+include_lazy_router(app, "app.routers.credit:router", "/api/v1/credit", prefix="/api/v1")
+include_lazy_router(app, "app.routers.audit:router", "/api/audit")  # Already has /api/audit prefix
+include_lazy_router(app, "app.routers.inapp_notifications:router", "/api/notifications")  # Already has /api/notifications prefix
+include_lazy_router(app, "app.routers.backup:router", "/api/v1/backup", prefix="/api/v1")
+include_lazy_router(app, "app.routers.privacy:router", "/api/v1/privacy", prefix="/api/v1")
+include_lazy_router(app, "app.routers.sync:router", "/api/v1/sync", prefix="/api/v1")
+include_lazy_router(app, "app.routers.stock_takes:router", "/api/v1/stock-takes", prefix="/api/v1")
+
+# 📚 The docs list every endpoint, so building them loads the lazy routers
+_build_openapi = app.openapi
+
+
+def openapi_with_lazy_routers():
+    load_lazy_routers(app)
+    return _build_openapi()
+
 
+app.openapi = openapi_with_lazy_routers
 
 # Serve static files from frontend build (assets like JS, CSS, images)
 if FRONTEND_BUILD_DIR.exists():
@@ -2,11 +2,15 @@
 KadaiGPT - Middleware Package
 """
 
-from .security import SecurityMiddleware, rate_limiter, audit_logger, InputSanitizer
+from .security import SecurityMiddleware, rate_limiter, route_timings, audit_logger, InputSanitizer
+from .query_metrics import QueryMetricsMiddleware, db_metrics
 
 __all__ = [
     "SecurityMiddleware",
     "rate_limiter",
+    "route_timings",
     "audit_logger",
-    "InputSanitizer"
+    "InputSanitizer",
+    "QueryMetricsMiddleware",
+    "db_metrics"
 ]
@@ -0,0 +1,439 @@
+"""
+KadaiGPT - Database Query Metrics Middleware
+Per-route statement counts, latency histograms, pool waits and a slow-query log.
+
+Strategy:
+- before/after_cursor_execute events time every statement on the instrumented
+  engines; the request being served is carried in a ContextVar set by
+  QueryMetricsMiddleware, and its route template ("/api/v1/bills/{bill_id}")
+  is read from the ASGI scope, so parametrised URLs share one entry
+- Histograms use fixed buckets, so memory stays constant however much
+  traffic a route sees
+- Statements slower than slow_query_ms are grouped by a normalized SQL
+  fingerprint (literals, placeholders and IN/VALUES lists collapsed) and the
+  route that issued them, in a bounded LRU
+- The first slow execution of a fingerprint, and a random sample after that,
+  capture the plan with EXPLAIN on the same connection (EXPLAIN QUERY PLAN
+  on SQLite); plain EXPLAIN only plans, it never runs the statement
+- TimedAsyncQueuePool times how long each checkout waited for a connection;
+  pool checkout/checkin events time how long connections are held
+"""
+
+import hashlib
+import logging
+import random
+import re
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event, exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from app.config import settings
+
+logger = logging.getLogger("KadaiGPT.DBMetrics")
+
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+STATEMENT_COUNT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 200)
+BACKGROUND_ROUTE = "(background)"
+UNMATCHED_ROUTE = "(unmatched)"
+EXPLAINABLE = ("SELECT", "WITH", "UPDATE", "DELETE", "INSERT")
+
+
+# ─── SQL fingerprints ─────────────────────────────────────────
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_PLACEHOLDER = re.compile(r"\$\d+|%\(\w+\)s|%s|(?<!:):(?!:)\w+|\?")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+_VALUES_LIST = re.compile(r"\bVALUES\s*(\([^()]*\))(?:\s*,\s*\([^()]*\))+", re.IGNORECASE)
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_sql(statement: str) -> str:
+    """SQL with every literal and bound value replaced by '?'"""
+    sql = _STRING_LITERAL.sub("?", statement)
+    sql = _PLACEHOLDER.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    sql = _IN_LIST.sub("IN (?)", sql)
+    sql = _VALUES_LIST.sub(r"VALUES \1", sql)
+    return _WHITESPACE.sub(" ", sql).strip()
+
+
+def fingerprint(statement: str) -> Tuple[str, str]:
+    """(fingerprint id, normalized SQL) of a statement"""
+    sql = normalize_sql(statement)
+    return hashlib.sha1(sql.encode()).hexdigest()[:16], sql
+
+
+# ─── Histograms ───────────────────────────────────────────────
+
+class Histogram:
+    """Fixed-bucket histogram; percentiles are bucket upper bounds"""
+
+    __slots__ = ("bounds", "counts", "count", "total", "max")
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                return min(self.bounds[i], self.max) if i < len(self.bounds) else self.max
+        return self.max
+
+    def to_dict(self) -> Dict[str, Any]:
+        labels = [f"le_{b}" for b in self.bounds] + ["inf"]
+        return {
+            "count": self.count,
+            "sum": round(self.total, 2),
+            "avg": round(self.total / self.count, 2) if self.count else 0.0,
+            "max": round(self.max, 2),
+            "p50": round(self.percentile(0.50), 2),
+            "p95": round(self.percentile(0.95), 2),
+            "p99": round(self.percentile(0.99), 2),
+            "buckets": {label: n for label, n in zip(labels, self.counts) if n},
+        }
+
+
+# ─── Records ──────────────────────────────────────────────────
+
+def route_name(scope: Dict[str, Any]) -> str:
+    """"METHOD /route/{template}" of the route that handled an ASGI scope"""
+    path = getattr(scope.get("route"), "path", None)
+    if path is None:
+        return UNMATCHED_ROUTE
+    return f"{scope.get('method', '')} {path}".strip()
+
+
+@dataclass
+class RequestQueryStats:
+    """Statements issued while serving one request"""
+    scope: Optional[Dict[str, Any]] = None
+    statements: int = 0
+    db_ms: float = 0.0
+    pool_wait_ms: float = 0.0
+
+    @property
+    def route(self) -> str:
+        if self.scope is None:
+            return BACKGROUND_ROUTE
+        return route_name(self.scope)
+
+
+@dataclass
+class RouteStats:
+    requests: int = 0
+    excessive_requests: int = 0
+    statements_per_request: Histogram = field(default_factory=lambda: Histogram(STATEMENT_COUNT_BUCKETS))
+    db_ms_per_request: Histogram = field(default_factory=lambda: Histogram(LATENCY_BUCKETS_MS))
+    statement_ms: Histogram = field(default_factory=lambda: Histogram(LATENCY_BUCKETS_MS))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "excessive_requests": self.excessive_requests,
+            "statements_per_request": self.statements_per_request.to_dict(),
+            "db_ms_per_request": self.db_ms_per_request.to_dict(),
+            "statement_ms": self.statement_ms.to_dict(),
+        }
+
+
+@dataclass
+class SlowQuery:
+    fingerprint: str
+    sql: str
+    route: str
+    count: int = 0
+    total_ms: float = 0.0
+    max_ms: float = 0.0
+    last_seen: float = 0.0
+    plan: Optional[List[str]] = None
+    plan_captured_at: Optional[float] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "fingerprint": self.fingerprint,
+            "sql": self.sql,
+            "route": self.route,
+            "count": self.count,
+            "total_ms": round(self.total_ms, 2),
+            "avg_ms": round(self.total_ms / self.count, 2) if self.count else 0.0,
+            "max_ms": round(self.max_ms, 2),
+            "last_seen": self.last_seen,
+            "plan": self.plan,
+            "plan_captured_at": self.plan_captured_at,
+        }
+
+
+@dataclass
+class PoolStats:
+    checkouts: int = 0
+    timeouts: int = 0
+    wait_ms: Histogram = field(default_factory=lambda: Histogram(LATENCY_BUCKETS_MS))
+    hold_ms: Histogram = field(default_factory=lambda: Histogram(LATENCY_BUCKETS_MS))
+
+
+current_request: ContextVar[Optional[RequestQueryStats]] = ContextVar("db_metrics_request", default=None)
+
+
+class DBMetrics:
+    """Process-wide collector fed by engine and pool events"""
+
+    def __init__(
+        self,
+        slow_query_ms: float,
+        explain_sample_rate: float,
+        max_slow_queries: int,
+        excessive_statements: int,
+    ):
+        self.slow_query_ms = slow_query_ms
+        self.explain_sample_rate = explain_sample_rate
+        self.max_slow_queries = max_slow_queries
+        self.excessive_statements = excessive_statements
+        self._engines: Dict[str, Any] = {}
+        self._pool_listeners: Dict[str, Tuple[Any, Any]] = {}
+        self.reset()
+
+    def reset(self):
+        self.started_at = time.time()
+        self.statement_ms = Histogram(LATENCY_BUCKETS_MS)
+        self._routes: Dict[str, RouteStats] = {}
+        self._slow: "OrderedDict[Tuple[str, str], SlowQuery]" = OrderedDict()
+        self._pools: Dict[str, PoolStats] = {name: PoolStats() for name in self._engines}
+
+    # ─── Wiring ──────────────────────────────────────────────────
+
+    def install(self, engine, name: str):
+        """Start collecting on an (async) engine under the given name"""
+        if name in self._engines:
+            self.uninstall(name)
+        sync_engine = getattr(engine, "sync_engine", engine)
+        event.listen(sync_engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(sync_engine, "after_cursor_execute", self._after_cursor_execute)
+        self._engines[name] = sync_engine
+        self._pools[name] = PoolStats()
+
+        def on_checkout(dbapi_connection, connection_record, connection_proxy):
+            connection_record.info["db_metrics_checkout"] = time.perf_counter()
+
+        def on_checkin(dbapi_connection, connection_record):
+            started = connection_record.info.pop("db_metrics_checkout", None)
+            stats = self._pools.get(name)
+            if started is not None and stats is not None:
+                stats.checkouts += 1
+                stats.hold_ms.observe((time.perf_counter() - started) * 1000)
+
+        event.listen(sync_engine.pool, "checkout", on_checkout)
+        event.listen(sync_engine.pool, "checkin", on_checkin)
+        self._pool_listeners[name] = (on_checkout, on_checkin)
+
+    def uninstall(self, name: str):
+        sync_engine = self._engines.pop(name, None)
+        if sync_engine is None:
+            return
+        event.remove(sync_engine, "before_cursor_execute", self._before_cursor_execute)
+        event.remove(sync_engine, "after_cursor_execute", self._after_cursor_execute)
+        on_checkout, on_checkin = self._pool_listeners.pop(name)
+        event.remove(sync_engine.pool, "checkout", on_checkout)
+        event.remove(sync_engine.pool, "checkin", on_checkin)
+        self._pools.pop(name, None)
+
+    def _pool_stats(self, pool) -> Optional[PoolStats]:
+        for name, sync_engine in self._engines.items():
+            if sync_engine.pool is pool:
+                return self._pools[name]
+        return None
+
+    # ─── Statement events ────────────────────────────────────────
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("db_metrics_start", []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get("db_metrics_start")
+        if not starts:
+            return
+        elapsed_ms = (time.perf_counter() - starts.pop()) * 1000
+
+        request = current_request.get()
+        route = request.route if request is not None else BACKGROUND_ROUTE
+        if request is not None:
+            request.statements += 1
+            request.db_ms += elapsed_ms
+
+        self.statement_ms.observe(elapsed_ms)
+        self._route(route).statement_ms.observe(elapsed_ms)
+
+        if elapsed_ms >= self.slow_query_ms:
+            self._record_slow(conn, statement, parameters, executemany, route, elapsed_ms)
+
+    def _route(self, route: str) -> RouteStats:
+        stats = self._routes.get(route)
+        if stats is None:
+            stats = self._routes[route] = RouteStats()
+        return stats
+
+    def _record_slow(self, conn, statement, parameters, executemany, route, elapsed_ms):
+        fp, sql = fingerprint(statement)
+        key = (fp, route)
+        entry = self._slow.get(key)
+        if entry is None:
+            entry = self._slow[key] = SlowQuery(fingerprint=fp, sql=sql[:2000], route=route)
+            while len(self._slow) > self.max_slow_queries:
+                self._slow.popitem(last=False)
+        else:
+            self._slow.move_to_end(key)
+        entry.count += 1
+        entry.total_ms += elapsed_ms
+        entry.max_ms = max(entry.max_ms, elapsed_ms)
+        entry.last_seen = time.time()
+        logger.warning(f"[DBMetrics] Slow query {fp} on {route}: {elapsed_ms:.1f}ms")
+
+        if executemany or not sql.upper().startswith(EXPLAINABLE):
+            return
+        if entry.plan is None or random.random() < self.explain_sample_rate:
+            plan = self._explain(conn, statement, parameters)
+            if plan is not None:
+                entry.plan = plan
+                entry.plan_captured_at = time.time()
+
+    @staticmethod
+    def _explain(conn, statement, parameters) -> Optional[List[str]]:
+        """Plan of a statement, on its own DBAPI cursor so the result being read is untouched"""
+        prefix = "EXPLAIN QUERY PLAN " if conn.dialect.name == "sqlite" else "EXPLAIN "
+        cursor = None
+        try:
+            cursor = conn.connection.cursor()
+            cursor.execute(prefix + statement, parameters)
+            return [str(row[-1]) for row in cursor.fetchall()]
+        except Exception as e:
+            logger.debug(f"[DBMetrics] EXPLAIN failed: {e}")
+            return None
+        finally:
+            if cursor is not None:
+                cursor.close()
+
+    # ─── Pool waits ──────────────────────────────────────────────
+
+    def record_pool_wait(self, pool, wait_ms: float, timed_out: bool = False):
+        stats = self._pool_stats(pool)
+        if stats is not None:
+            stats.wait_ms.observe(wait_ms)
+            if timed_out:
+                stats.timeouts += 1
+        request = current_request.get()
+        if request is not None:
+            request.pool_wait_ms += wait_ms
+
+    # ─── Requests ────────────────────────────────────────────────
+
+    def finish_request(self, request: RequestQueryStats):
+        """Fold a finished request into its route's histograms"""
+        if not request.statements:
+            return
+        route = request.route
+        stats = self._route(route)
+        stats.requests += 1
+        stats.statements_per_request.observe(request.statements)
+        stats.db_ms_per_request.observe(request.db_ms)
+        if request.statements > self.excessive_statements:
+            stats.excessive_requests += 1
+            logger.warning(f"[DBMetrics] {route} issued {request.statements} statements in one request")
+
+    # ─── Reporting ───────────────────────────────────────────────
+
+    def pool_summary(self, name: str) -> Dict[str, Any]:
+        """Pool counters for one engine (used by check_db_health)"""
+        sync_engine = self._engines.get(name)
+        stats = self._pools.get(name)
+        if sync_engine is None or stats is None:
+            return {}
+        pool = sync_engine.pool
+        return {
+            "pool_class": type(pool).__name__,
+            "pool_size": pool.size() if hasattr(pool, "size") else None,
+            "checked_out": pool.checkedout() if hasattr(pool, "checkedout") else None,
+            "overflow": pool.overflow() if hasattr(pool, "overflow") else None,
+            "checkouts": stats.checkouts,
+            "timeouts": stats.timeouts,
+            "wait_ms": stats.wait_ms.to_dict(),
+            "hold_ms": stats.hold_ms.to_dict(),
+        }
+
+    def snapshot(self, top: int = 20) -> Dict[str, Any]:
+        routes = sorted(self._routes.items(), key=lambda item: item[1].statement_ms.total, reverse=True)
+        slow = sorted(self._slow.values(), key=lambda s: s.total_ms, reverse=True)
+        return {
+            "since": self.started_at,
+            "slow_query_ms": self.slow_query_ms,
+            "explain_sample_rate": self.explain_sample_rate,
+            "statement_ms": self.statement_ms.to_dict(),
+            "pools": {name: self.pool_summary(name) for name in self._engines},
+            "routes": {route: stats.to_dict() for route, stats in routes[:top]},
+            "slow_queries": [s.to_dict() for s in slow[:top]],
+        }
+
+
+class QueryMetricsMiddleware:
+    """Pure ASGI middleware that scopes statement metrics to the request being served"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        # The router fills scope["route"] in place, so the template is known
+        # by the time the endpoint's first statement runs
+        request = RequestQueryStats(scope=scope)
+        token = current_request.set(request)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_request.reset(token)
+            db_metrics.finish_request(request)
+
+
+class TimedAsyncQueuePool(AsyncAdaptedQueuePool):
+    """AsyncAdaptedQueuePool that reports how long each checkout waited"""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            db_metrics.record_pool_wait(self, (time.perf_counter() - start) * 1000, timed_out=True)
+            raise
+        db_metrics.record_pool_wait(self, (time.perf_counter() - start) * 1000)
+        return connection
+
+
+# Global singleton
+db_metrics = DBMetrics(
+    slow_query_ms=settings.slow_query_ms,
+    explain_sample_rate=settings.query_explain_sample_rate,
+    max_slow_queries=settings.slow_query_log_size,
+    excessive_statements=settings.excessive_queries_per_request,
+)
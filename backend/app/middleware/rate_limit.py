@@ -0,0 +1,354 @@
+"""
+KadaiGPT - Rate Limiting
+Fixed-memory GCRA (generic cell rate algorithm) limiter with pluggable stores.
+
+Strategy:
+- Each key keeps one theoretical arrival time (TAT) instead of a list of
+  request timestamps: a request is allowed while TAT - now stays within the
+  window, and each allowed request pushes TAT on by window / max_requests.
+  That is a smooth sliding window allowing max_requests per window_seconds
+- Requests refused while already limited are counted; a key refused
+  max_requests times in a row is blocked for BLOCK_SECONDS
+- A key whose TAT and block have both passed carries no information and is
+  evicted (memory: LRU scan from the oldest; shared: its slot is reused)
+- Stores (settings.rate_limit_backend):
+  - "memory": per-process OrderedDict capped at rate_limit_max_keys
+  - "shared": fixed-size hash table in an mmap'd file under an fcntl lock,
+    shared by every worker on the host (rate_limit_shared_slots x 32 bytes)
+  - "redis": the same algorithm as a Lua script at settings.redis_url, for
+    several hosts; falls back to memory when the package is missing, and
+    fails open if Redis is unreachable
+"""
+
+import logging
+import math
+import mmap
+import os
+import struct
+import tempfile
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from hashlib import blake2b
+from typing import Dict, NamedTuple, Tuple
+
+from app.config import settings
+
+logger = logging.getLogger("KadaiGPT.RateLimit")
+
+BLOCK_SECONDS = 300  # 5 minutes for repeat offenders
+
+
+class LimiterState(NamedTuple):
+    tat: float            # theoretical arrival time of the next request
+    denied: int           # refusals since the last allowed request
+    blocked_until: float
+
+
+EMPTY_STATE = LimiterState(0.0, 0, 0.0)
+
+
+@dataclass
+class RateLimitDecision:
+    allowed: bool
+    remaining: int
+    retry_after: float  # seconds until the next request would be allowed
+
+
+def gcra(
+    state: LimiterState, now: float, max_requests: int, window_seconds: float
+) -> Tuple[LimiterState, RateLimitDecision]:
+    """One request against a key's state: (new state, decision)"""
+    if state.blocked_until > now:
+        return state, RateLimitDecision(False, 0, state.blocked_until - now)
+
+    interval = window_seconds / max_requests
+    tat = max(state.tat, now)
+    new_tat = tat + interval
+    allow_at = new_tat - window_seconds
+    if allow_at > now:
+        denied = state.denied + 1
+        if denied >= max_requests:
+            return LimiterState(state.tat, 0, now + BLOCK_SECONDS), RateLimitDecision(False, 0, BLOCK_SECONDS)
+        return LimiterState(state.tat, denied, 0.0), RateLimitDecision(False, 0, allow_at - now)
+
+    remaining = int((window_seconds - (new_tat - now)) / interval + 1e-9)
+    return LimiterState(new_tat, 0, 0.0), RateLimitDecision(True, remaining, 0.0)
+
+
+def is_idle(state: LimiterState, now: float) -> bool:
+    return state.tat <= now and state.blocked_until <= now
+
+
+# ─── Stores ──────────────────────────────────────────────────────
+
+class MemoryRateLimitStore:
+    """Per-process store; keys are kept in least-recently-used order"""
+
+    is_async = False
+
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self._states: "OrderedDict[str, LimiterState]" = OrderedDict()
+        self._evicted = 0
+
+    def _evict(self, now: float):
+        # The oldest keys are the likeliest to be idle; stop at the first live one
+        while self._states:
+            key, state = next(iter(self._states.items()))
+            if not is_idle(state, now) and len(self._states) <= self.max_keys:
+                break
+            del self._states[key]
+            self._evicted += 1
+
+    def hit(self, key: str, now: float, max_requests: int, window_seconds: float) -> RateLimitDecision:
+        state, decision = gcra(self._states.get(key, EMPTY_STATE), now, max_requests, window_seconds)
+        self._states[key] = state
+        self._states.move_to_end(key)
+        self._evict(now)
+        return decision
+
+    def get(self, key: str, now: float) -> LimiterState:
+        return self._states.get(key, EMPTY_STATE)
+
+    def put(self, key: str, state: LimiterState, now: float):
+        self._states[key] = state
+        self._states.move_to_end(key)
+
+    def reset(self):
+        self._states.clear()
+
+    def get_stats(self) -> Dict:
+        return {"backend": "memory", "keys": len(self._states), "max_keys": self.max_keys, "evicted": self._evicted}
+
+
+class SharedRateLimitStore:
+    """
+    Fixed-size table shared by all worker processes on one host.
+
+    Slots are (key hash, TAT, blocked_until, denied), found by open addressing
+    over PROBE slots. When all of them are live, the one with the earliest
+    TAT is overwritten, so memory never grows and a collision can only make
+    the limiter more lenient for that key.
+    """
+
+    is_async = False
+    SLOT = struct.Struct("<QddI4x")
+    PROBE = 8
+
+    def __init__(self, path: str, slots: int):
+        import fcntl  # POSIX only; imported here so "memory" works everywhere
+
+        self._fcntl = fcntl
+        self.path = path
+        self.slots = slots
+        size = slots * self.SLOT.size
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        if os.fstat(self._fd).st_size != size:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                if os.fstat(self._fd).st_size != size:
+                    os.ftruncate(self._fd, size)
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._map = mmap.mmap(self._fd, size)
+
+    @staticmethod
+    def _hash(key: str) -> int:
+        return int.from_bytes(blake2b(key.encode(), digest_size=8).digest(), "little") or 1
+
+    def _find(self, key_hash: int, now: float) -> Tuple[int, LimiterState]:
+        """Slot offset for key_hash and its state (EMPTY_STATE for a new key)"""
+        start = key_hash % self.slots
+        reusable, oldest, oldest_tat = None, None, math.inf
+        for probe in range(self.PROBE):
+            offset = ((start + probe) % self.slots) * self.SLOT.size
+            slot_hash, tat, blocked_until, denied = self.SLOT.unpack_from(self._map, offset)
+            if slot_hash == key_hash:
+                return offset, LimiterState(tat, denied, blocked_until)
+            if reusable is None and (slot_hash == 0 or is_idle(LimiterState(tat, denied, blocked_until), now)):
+                reusable = offset
+            if tat < oldest_tat:
+                oldest, oldest_tat = offset, tat
+        return (reusable if reusable is not None else oldest), EMPTY_STATE
+
+    @contextmanager
+    def _locked(self):
+        self._fcntl.flock(self._fd, self._fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            self._fcntl.flock(self._fd, self._fcntl.LOCK_UN)
+
+    def hit(self, key: str, now: float, max_requests: int, window_seconds: float) -> RateLimitDecision:
+        key_hash = self._hash(key)
+        with self._locked():
+            offset, state = self._find(key_hash, now)
+            state, decision = gcra(state, now, max_requests, window_seconds)
+            self.SLOT.pack_into(self._map, offset, key_hash, state.tat, state.blocked_until, state.denied)
+        return decision
+
+    def get(self, key: str, now: float) -> LimiterState:
+        key_hash = self._hash(key)
+        with self._locked():
+            return self._find(key_hash, now)[1]
+
+    def put(self, key: str, state: LimiterState, now: float):
+        key_hash = self._hash(key)
+        with self._locked():
+            offset, _ = self._find(key_hash, now)
+            self.SLOT.pack_into(self._map, offset, key_hash, state.tat, state.blocked_until, state.denied)
+
+    def reset(self):
+        with self._locked():
+            self._map[:] = bytes(len(self._map))
+
+    def get_stats(self) -> Dict:
+        now = time.time()
+        with self._locked():
+            live = sum(
+                1 for slot_hash, tat, blocked_until, _ in self.SLOT.iter_unpack(self._map)
+                if slot_hash and (tat > now or blocked_until > now)
+            )
+        return {"backend": "shared", "path": self.path, "slots": self.slots, "live_keys": live}
+
+
+# KEYS[1] = state hash; ARGV = now, max_requests, window_seconds, block_seconds
+# Returns {allowed, remaining, retry_after (string: Lua numbers truncate to int)}
+GCRA_LUA = """
+local now = tonumber(ARGV[1])
+local max_requests = tonumber(ARGV[2])
+local window = tonumber(ARGV[3])
+local block_seconds = tonumber(ARGV[4])
+local state = redis.call('HMGET', KEYS[1], 'tat', 'denied', 'blocked_until')
+local tat = tonumber(state[1]) or 0
+local denied = tonumber(state[2]) or 0
+local blocked_until = tonumber(state[3]) or 0
+
+if blocked_until > now then
+    return {0, 0, tostring(blocked_until - now)}
+end
+
+local interval = window / max_requests
+local new_tat = math.max(tat, now) + interval
+local allow_at = new_tat - window
+if allow_at > now then
+    denied = denied + 1
+    if denied >= max_requests then
+        redis.call('HSET', KEYS[1], 'denied', 0, 'blocked_until', now + block_seconds)
+        redis.call('PEXPIRE', KEYS[1], math.ceil(math.max(tat - now, block_seconds) * 1000))
+        return {0, 0, tostring(block_seconds)}
+    end
+    redis.call('HSET', KEYS[1], 'denied', denied)
+    return {0, 0, tostring(allow_at - now)}
+end
+
+redis.call('HSET', KEYS[1], 'tat', new_tat, 'denied', 0, 'blocked_until', 0)
+redis.call('PEXPIRE', KEYS[1], math.ceil((new_tat - now) * 1000))
+return {1, math.floor((window - (new_tat - now)) / interval + 1e-9), '0'}
+"""
+
+
+class RedisRateLimitStore:
+    """Limiter state in Redis, shared by every host; idle keys expire by TTL"""
+
+    is_async = True
+
+    def __init__(self, redis_client, prefix: str = "rl:"):
+        self._redis = redis_client
+        self._script = redis_client.register_script(GCRA_LUA)
+        self.prefix = prefix
+
+    async def hit(self, key: str, now: float, max_requests: int, window_seconds: float) -> RateLimitDecision:
+        allowed, remaining, retry_after = await self._script(
+            keys=[self.prefix + key], args=[now, max_requests, window_seconds, BLOCK_SECONDS]
+        )
+        return RateLimitDecision(bool(int(allowed)), int(remaining), float(retry_after))
+
+    def get_stats(self) -> Dict:
+        return {"backend": "redis", "prefix": self.prefix}
+
+
+# ─── Limiter ─────────────────────────────────────────────────────
+
+class RateLimiter:
+    """Rate limiter over a MemoryRateLimitStore, SharedRateLimitStore or RedisRateLimitStore"""
+
+    def __init__(self, store=None, clock=time.time):
+        self.store = store if store is not None else MemoryRateLimitStore(settings.rate_limit_max_keys)
+        self.clock = clock
+
+    async def check(self, key: str, max_requests: int = 100, window_seconds: int = 60) -> RateLimitDecision:
+        """Count one request for key; works with every store"""
+        if not self.store.is_async:
+            return self.store.hit(key, self.clock(), max_requests, window_seconds)
+        try:
+            return await self.store.hit(key, self.clock(), max_requests, window_seconds)
+        except Exception as e:
+            # Limiter store down: serve the request rather than block checkout
+            logger.warning(f"[RateLimit] Store unavailable, allowing request: {e}")
+            return RateLimitDecision(True, max_requests, 0.0)
+
+    def check_rate_limit(
+        self,
+        key: str,
+        max_requests: int = 100,
+        window_seconds: int = 60
+    ) -> Tuple[bool, int]:
+        """
+        Synchronous check for the in-process stores.
+        Returns (allowed, remaining_requests)
+        """
+        decision = self.store.hit(key, self.clock(), max_requests, window_seconds)
+        return decision.allowed, decision.remaining
+
+    # is_blocked/block/reset need an in-process store; with Redis the
+    # blocking happens inside the script and keys expire on their own
+
+    def is_blocked(self, key: str) -> bool:
+        """Check if IP/user is blocked"""
+        now = self.clock()
+        return self.store.get(key, now).blocked_until > now
+
+    def block(self, key: str, duration_seconds: int = 60):
+        """Block a key for specified duration"""
+        now = self.clock()
+        self.store.put(key, self.store.get(key, now)._replace(blocked_until=now + duration_seconds), now)
+        logger.warning(f"[Security] Blocked {key} for {duration_seconds}s")
+
+    def reset(self):
+        """Forget every key (tests share one client IP)"""
+        self.store.reset()
+
+    def get_stats(self) -> Dict:
+        return self.store.get_stats()
+
+
+def default_shared_path() -> str:
+    directory = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(directory, "kadaigpt-ratelimit")
+
+
+def create_rate_limiter() -> RateLimiter:
+    """Build the limiter for settings.rate_limit_backend, falling back to memory"""
+    backend = settings.rate_limit_backend
+    if backend == "redis":
+        try:
+            import redis.asyncio as redis_asyncio
+            logger.info("[RateLimit] Using Redis store")
+            return RateLimiter(RedisRateLimitStore(redis_asyncio.from_url(settings.redis_url)))
+        except ImportError:
+            logger.warning("[RateLimit] redis package not installed, using in-memory store")
+    elif backend == "shared":
+        try:
+            path = settings.rate_limit_shared_path or default_shared_path()
+            logger.info(f"[RateLimit] Using shared store at {path}")
+            return RateLimiter(SharedRateLimitStore(path, settings.rate_limit_shared_slots))
+        except (ImportError, OSError) as e:
+            logger.warning(f"[RateLimit] Shared store unavailable ({e}), using in-memory store")
+    return RateLimiter()
+
+
+# Global rate limiter instance
+rate_limiter = create_rate_limiter()
@@ -1,22 +1,26 @@
 """
 KadaiGPT - Security Middleware & Audit Logging
-Rate limiting, input sanitization, and security headers
+Rate limiting, input sanitization, security headers and per-route timing
 """
 
+import math
 import os
 import re
 import logging
 import hashlib
 import secrets
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Callable
+import time
+from datetime import datetime
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
 from functools import wraps
-from collections import defaultdict
 import json
 
-from fastapi import Request, Response, HTTPException, status
+from fastapi import HTTPException, status
 from fastapi.responses import JSONResponse
-from starlette.middleware.base import BaseHTTPMiddleware
+
+from app.middleware.query_metrics import LATENCY_BUCKETS_MS, Histogram, route_name
+from app.middleware.rate_limit import RateLimiter, rate_limiter
 
 logger = logging.getLogger(__name__)
 
@@ -25,60 +29,9 @@ logger = logging.getLogger(__name__)
 # Rate Limiting
 # ═══════════════════════════════════════════════════════════════════
 
-class RateLimiter:
-    """In-memory rate limiter with sliding window"""
-    
-    def __init__(self):
-        self.requests: Dict[str, List[datetime]] = defaultdict(list)
-        self.blocked: Dict[str, datetime] = {}
-    
-    def _cleanup_old_requests(self, key: str, window: int):
-        """Remove requests outside the time window"""
-        cutoff = datetime.utcnow() - timedelta(seconds=window)
-        self.requests[key] = [t for t in self.requests[key] if t > cutoff]
-    
-    def is_blocked(self, key: str) -> bool:
-        """Check if IP/user is blocked"""
-        if key in self.blocked:
-            if datetime.utcnow() < self.blocked[key]:
-                return True
-            del self.blocked[key]
-        return False
-    
-    def block(self, key: str, duration_seconds: int = 60):
-        """Block a key for specified duration"""
-        self.blocked[key] = datetime.utcnow() + timedelta(seconds=duration_seconds)
-        logger.warning(f"[Security] Blocked {key} for {duration_seconds}s")
-    
-    def check_rate_limit(
-        self,
-        key: str,
-        max_requests: int = 100,
-        window_seconds: int = 60
-    ) -> tuple[bool, int]:
-        """
-        Check if request is within rate limits.
-        Returns (allowed, remaining_requests)
-        """
-        if self.is_blocked(key):
-            return False, 0
-        
-        self._cleanup_old_requests(key, window_seconds)
-        current_count = len(self.requests[key])
-        
-        if current_count >= max_requests:
-            # Block for escalating duration
-            if current_count >= max_requests * 2:
-                self.block(key, 300)  # 5 minutes for repeat offenders
-            return False, 0
-        
-        self.requests[key].append(datetime.utcnow())
-        return True, max_requests - current_count - 1
-
-
-# Global rate limiter instance
-rate_limiter = RateLimiter()
-
+# Fixed-memory GCRA limiter (app/middleware/rate_limit.py); the store is
+# chosen by settings.rate_limit_backend. RateLimiter and rate_limiter are
+# re-exported here for existing imports.
 
 # Rate limit configurations per endpoint type
 RATE_LIMITS = {
@@ -279,70 +232,165 @@ audit_logger = AuditLogger()
 # Security Middleware
 # ═══════════════════════════════════════════════════════════════════
 
-class SecurityMiddleware(BaseHTTPMiddleware):
-    """Comprehensive security middleware"""
-    
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:
-        # Get client IP
-        client_ip = request.client.host if request.client else "unknown"
-        forwarded_for = request.headers.get("X-Forwarded-For")
-        if forwarded_for:
-            client_ip = forwarded_for.split(",")[0].strip()
-        
-        path = request.url.path
-        method = request.method
-        
-        # Skip rate limiting for health checks
-        if path in ['/health', '/']:
-            return await call_next(request)
-        
-        # Rate limiting check
-        rate_type = get_rate_limit_type(path)
-        limits = RATE_LIMITS.get(rate_type, RATE_LIMITS['api'])
-        allowed, remaining = rate_limiter.check_rate_limit(
-            f"{client_ip}:{rate_type}",
-            limits['max'],
-            limits['window']
-        )
-        
-        if not allowed:
-            audit_logger.log_event(
-                'RATE_LIMITED',
-                None,
-                client_ip,
-                path,
-                method,
-                429,
-                {'rate_type': rate_type}
-            )
-            return JSONResponse(
-                status_code=429,
-                content={"detail": "Too many requests. Please slow down."},
-                headers={"Retry-After": str(limits['window'])}
-            )
-        
-        # Process request
+# Sent on every response; each middleware encodes the block once
+SECURITY_HEADERS = {
+    "X-Content-Type-Options": "nosniff",
+    "X-Frame-Options": "DENY",
+    "X-XSS-Protection": "1; mode=block",
+    "Referrer-Policy": "strict-origin-when-cross-origin",
+    "Permissions-Policy": "camera=(), microphone=(self), geolocation=()",
+}
+
+CONTENT_SECURITY_POLICY = "; ".join([
+    "default-src 'self'",
+    "script-src 'self' 'unsafe-inline' 'unsafe-eval'",  # React needs inline/eval
+    "style-src 'self' 'unsafe-inline' https://fonts.googleapis.com",
+    "font-src 'self' https://fonts.gstatic.com",
+    "img-src 'self' data: blob: https:",
+    "connect-src 'self' https://api.whatsapp.com https://wa.me https://*.googleapis.com wss: ws:",
+    "media-src 'self' blob:",
+    "worker-src 'self' blob:",
+    "frame-ancestors 'none'",
+])
+
+HSTS = "max-age=31536000; includeSubDomains"
+
+# Health checks and API docs are never rate limited
+RATE_LIMIT_EXEMPT = ("/health", "/api/ping", "/api/health", "/api/docs", "/api/redoc", "/api/openapi")
+
+
+@dataclass
+class RouteTiming:
+    requests: int = 0
+    server_errors: int = 0
+    ms: Histogram = field(default_factory=lambda: Histogram(LATENCY_BUCKETS_MS))
+
+    def to_dict(self) -> Dict:
+        return {"requests": self.requests, "server_errors": self.server_errors, "ms": self.ms.to_dict()}
+
+
+class RouteTimings:
+    """Request latency per route template ("GET /api/v1/bills/{bill_id}")"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.started_at = time.time()
+        self._routes: Dict[str, RouteTiming] = {}
+
+    def observe(self, route: str, status_code: int, elapsed_ms: float):
+        stats = self._routes.get(route)
+        if stats is None:
+            stats = self._routes[route] = RouteTiming()
+        stats.requests += 1
+        if status_code >= 500:
+            stats.server_errors += 1
+        stats.ms.observe(elapsed_ms)
+
+    def snapshot(self, top: int = 20) -> Dict:
+        routes = sorted(self._routes.items(), key=lambda item: item[1].ms.total, reverse=True)
+        return {
+            "since": self.started_at,
+            "routes": {route: stats.to_dict() for route, stats in routes[:top]},
+        }
+
+
+# Global route timings instance
+route_timings = RouteTimings()
+
+
+class SecurityMiddleware:
+    """
+    Pure ASGI security middleware: rate limiting, security headers, request
+    IDs and per-route timing.
+
+    The rate limit is checked before the app is called, so a refused request
+    never has its body read. Headers are appended to the response start
+    message as it passes through and body chunks are forwarded as they come,
+    so streaming responses are never buffered. X-Response-Time is the time
+    to the response headers; route_timings records the full request.
+    """
+
+    def __init__(
+        self,
+        app,
+        exempt_prefixes: Tuple[str, ...] = RATE_LIMIT_EXEMPT,
+        hsts: bool = False,
+        trust_forwarded_for: bool = False
+    ):
+        self.app = app
+        self.exempt_prefixes = tuple(exempt_prefixes)
+        self.trust_forwarded_for = trust_forwarded_for
+        headers = {**SECURITY_HEADERS, "Content-Security-Policy": CONTENT_SECURITY_POLICY}
+        if hsts:
+            headers["Strict-Transport-Security"] = HSTS
+        self.static_headers = [(name.lower().encode("latin-1"), value.encode("latin-1"))
+                               for name, value in headers.items()]
+
+    def client_ip(self, scope) -> str:
+        if self.trust_forwarded_for:
+            for name, value in scope["headers"]:
+                if name == b"x-forwarded-for":
+                    return value.decode("latin-1").split(",")[0].strip()
+        client = scope.get("client")
+        return client[0] if client else "unknown"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        path = scope["path"]
+        method = scope["method"]
+        client_ip = self.client_ip(scope)
+        headers = [*self.static_headers, (b"x-request-id", secrets.token_hex(4).encode())]
+        status_code = 500
+
+        async def send_with_headers(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                elapsed_ms = (time.perf_counter() - start) * 1000
+                message["headers"] = [
+                    *message.get("headers", ()), *headers,
+                    (b"x-response-time", f"{elapsed_ms:.1f}ms".encode())
+                ]
+                if status_code == 401:
+                    audit_logger.log_event('UNAUTHORIZED', None, client_ip, path, method, 401)
+                elif status_code == 403:
+                    audit_logger.log_event('FORBIDDEN', None, client_ip, path, method, 403)
+            await send(message)
+
+        if not path.startswith(self.exempt_prefixes):
+            rate_type = get_rate_limit_type(path)
+            limits = RATE_LIMITS[rate_type]
+            decision = await rate_limiter.check(f"{client_ip}:{rate_type}", limits['max'], limits['window'])
+            if not decision.allowed:
+                audit_logger.log_event('RATE_LIMITED', None, client_ip, path, method, 429, {'rate_type': rate_type})
+                retry_after = math.ceil(decision.retry_after)
+                response = JSONResponse(
+                    status_code=429,
+                    content={
+                        "error": True,
+                        "detail": "Too many requests. Please slow down.",
+                        "message": "Too many requests. Please slow down.",
+                        "retry_after": retry_after
+                    },
+                    headers={"Retry-After": str(retry_after)}
+                )
+                await response(scope, receive, send_with_headers)
+                return
+            headers.append((b"x-ratelimit-remaining", str(decision.remaining).encode()))
+
         try:
-            response = await call_next(request)
+            await self.app(scope, receive, send_with_headers)
         except Exception as e:
             logger.error(f"[Security] Request error: {e}")
             raise
-        
-        # Add security headers
-        response.headers["X-Content-Type-Options"] = "nosniff"
-        response.headers["X-Frame-Options"] = "DENY"
-        response.headers["X-XSS-Protection"] = "1; mode=block"
-        response.headers["Referrer-Policy"] = "strict-origin-when-cross-origin"
-        response.headers["Permissions-Policy"] = "geolocation=(), microphone=(), camera=()"
-        response.headers["X-RateLimit-Remaining"] = str(remaining)
-        
-        # Log important events
-        if response.status_code == 401:
-            audit_logger.log_event('UNAUTHORIZED', None, client_ip, path, method, 401)
-        elif response.status_code == 403:
-            audit_logger.log_event('FORBIDDEN', None, client_ip, path, method, 403)
-        
-        return response
+        finally:
+            route_timings.observe(route_name(scope), status_code, (time.perf_counter() - start) * 1000)
 
 
 # ═══════════════════════════════════════════════════════════════════
@@ -0,0 +1,229 @@
+"""
+KadaiGPT - Versioned Schema Migrations
+Applies each schema change once instead of re-running DDL on every boot.
+
+Strategy:
+- Migrations are modules in app/migrations/versions named mNNNN_<name>.py,
+  applied in NNNN order; each exposes a `steps` list
+- Applied versions are recorded in the schema_version table
+- Fast path: one SELECT MAX(version); a current schema runs no DDL at all
+- Every step is idempotent (IF NOT EXISTS / column check), so a migration
+  interrupted half-way is simply re-run on the next boot
+- A failing migration stops the run and re-raises: startup and
+  `python -m app.migrations` fail instead of serving a partial schema
+- On PostgreSQL, indexes are built CONCURRENTLY (outside a transaction, no
+  write lock on the table) and concurrent boots serialize on an advisory lock
+"""
+
+import importlib
+import logging
+import pkgutil
+import re
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import List, Optional, Sequence
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, func, inspect, select, text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+logger = logging.getLogger("KadaiGPT.Migrations")
+
+MIGRATION_MODULE = re.compile(r"^m(\d{4})_(\w+)$")
+ADVISORY_LOCK_KEY = 0x4B414441  # "KADA"
+
+schema_metadata = MetaData()
+schema_version = Table(
+    "schema_version",
+    schema_metadata,
+    Column("version", Integer, primary_key=True),
+    Column("name", String(100), nullable=False),
+    Column("applied_at", DateTime(timezone=True), server_default=func.now()),
+)
+
+
+# ─── Steps ───────────────────────────────────────────────────────
+
+class Step:
+    """One idempotent schema change"""
+
+    async def apply(self, engine: AsyncEngine):
+        raise NotImplementedError
+
+
+@dataclass
+class CreateTables(Step):
+    """create_all for the given model tables (all tables when empty)"""
+    tables: Sequence[str] = ()
+
+    async def apply(self, engine: AsyncEngine):
+        import app.models  # noqa: F401 - registers every model on Base.metadata
+        from app.database import Base
+
+        tables = [Base.metadata.tables[name] for name in self.tables] or None
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all, tables=tables)
+
+
+@dataclass
+class AddColumn(Step):
+    """ALTER TABLE ... ADD COLUMN unless the column is already there"""
+    table: str
+    column: str
+    ddl: str
+
+    async def apply(self, engine: AsyncEngine):
+        async with engine.begin() as conn:
+            columns = await conn.run_sync(
+                lambda sync_conn: {c["name"] for c in inspect(sync_conn).get_columns(self.table)}
+            )
+            if self.column not in columns:
+                await conn.execute(text(f"ALTER TABLE {self.table} ADD COLUMN {self.column} {self.ddl}"))
+
+
+@dataclass
+class CreateIndex(Step):
+    """CREATE INDEX IF NOT EXISTS; CONCURRENTLY on PostgreSQL; partial with `where`"""
+    name: str
+    table: str
+    columns: str
+    unique: bool = False
+    where: Optional[str] = None
+
+    async def apply(self, engine: AsyncEngine):
+        unique = "UNIQUE " if self.unique else ""
+        where = f" WHERE {self.where}" if self.where else ""
+        if engine.dialect.name != "postgresql":
+            async with engine.begin() as conn:
+                await conn.execute(text(
+                    f"CREATE {unique}INDEX IF NOT EXISTS {self.name} ON {self.table}({self.columns}){where}"
+                ))
+            return
+
+        async with engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            # Partitioned parents can't build CONCURRENTLY; the plain build
+            # cascades to every partition
+            partitioned = (await conn.execute(
+                text("SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+                     "WHERE c.relname = :table"),
+                {"table": self.table}
+            )).scalar()
+            if partitioned:
+                await conn.execute(text(
+                    f"CREATE {unique}INDEX IF NOT EXISTS {self.name} ON {self.table}({self.columns}){where}"
+                ))
+                return
+            # A failed concurrent build leaves an INVALID index behind that
+            # IF NOT EXISTS would happily keep; drop it and build again
+            valid = (await conn.execute(
+                text("SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+                     "WHERE c.relname = :name"),
+                {"name": self.name}
+            )).scalar_one_or_none()
+            if valid is False:
+                await conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {self.name}"))
+            await conn.execute(text(
+                f"CREATE {unique}INDEX CONCURRENTLY IF NOT EXISTS {self.name} ON {self.table}({self.columns}){where}"
+            ))
+
+
+@dataclass
+class Execute(Step):
+    """Raw idempotent SQL, optionally for one dialect only"""
+    sql: str
+    dialect: Optional[str] = None
+
+    async def apply(self, engine: AsyncEngine):
+        if self.dialect and engine.dialect.name != self.dialect:
+            return
+        async with engine.begin() as conn:
+            await conn.execute(text(self.sql))
+
+
+# ─── Discovery ───────────────────────────────────────────────────
+
+@dataclass
+class Migration:
+    version: int
+    name: str
+    steps: List[Step]
+
+
+def load_migrations() -> List[Migration]:
+    """All migration modules in version order"""
+    from app.migrations import versions
+
+    migrations = []
+    for module_info in pkgutil.iter_modules(versions.__path__):
+        match = MIGRATION_MODULE.match(module_info.name)
+        if not match:
+            continue
+        module = importlib.import_module(f"{versions.__name__}.{module_info.name}")
+        migrations.append(Migration(int(match.group(1)), match.group(2), list(module.steps)))
+    migrations.sort(key=lambda m: m.version)
+    return migrations
+
+
+# ─── Runner ──────────────────────────────────────────────────────
+
+async def current_version(engine: AsyncEngine) -> int:
+    """Highest applied version; 0 for a database that predates schema_version"""
+    try:
+        async with engine.connect() as conn:
+            return (await conn.execute(select(func.max(schema_version.c.version)))).scalar() or 0
+    except Exception:
+        return 0
+
+
+@asynccontextmanager
+async def migration_lock(engine: AsyncEngine):
+    """Serialize migrating processes (PostgreSQL advisory lock)"""
+    if engine.dialect.name != "postgresql":
+        yield
+        return
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": ADVISORY_LOCK_KEY})
+        try:
+            yield
+        finally:
+            await conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": ADVISORY_LOCK_KEY})
+
+
+async def migrate(engine: AsyncEngine, migrations: Optional[List[Migration]] = None) -> List[int]:
+    """
+    Bring the schema up to date. Returns the versions applied.
+
+    A failing migration is logged, left unrecorded and re-raised; the
+    migrations before it stay applied, so the next run resumes there.
+    """
+    migrations = load_migrations() if migrations is None else migrations
+    latest = migrations[-1].version if migrations else 0
+
+    if await current_version(engine) >= latest:
+        logger.info(f"[Migrations] Schema current at version {latest}")
+        return []
+
+    applied = []
+    async with migration_lock(engine):
+        async with engine.begin() as conn:
+            await conn.run_sync(schema_metadata.create_all)
+        current = await current_version(engine)  # another process may have migrated
+
+        for migration in migrations:
+            if migration.version <= current:
+                continue
+            try:
+                for step in migration.steps:
+                    await step.apply(engine)
+                async with engine.begin() as conn:
+                    await conn.execute(schema_version.insert().values(
+                        version=migration.version, name=migration.name
+                    ))
+            except Exception as e:
+                logger.error(f"[Migrations] {migration.version:04d}_{migration.name} failed: {e}")
+                raise
+            applied.append(migration.version)
+            logger.info(f"[Migrations] Applied {migration.version:04d}_{migration.name}")
+
+    return applied
@@ -0,0 +1,25 @@
+"""
+KadaiGPT - Apply schema migrations from the command line
+Run with: python -m app.migrations
+
+Serverless instances skip migrations at boot, so run this once per deploy
+(against the direct database URL, not the PgBouncer pooler: the migration
+lock is a session-level advisory lock).
+"""
+
+import asyncio
+import logging
+
+from app.database import engine, init_db
+
+
+async def main():
+    try:
+        await init_db()
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
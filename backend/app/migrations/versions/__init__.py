@@ -0,0 +1,4 @@
+"""
+KadaiGPT - Migration files, applied in mNNNN order
+Never edit or renumber an applied migration; add a new one.
+"""
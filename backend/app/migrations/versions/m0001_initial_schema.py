@@ -0,0 +1,12 @@
+"""
+Tables for every model.
+
+On a fresh database this creates the current schema outright, which makes
+the column additions below no-ops there.
+"""
+
+from app.migrations import CreateTables
+
+steps = [
+    CreateTables(),
+]
@@ -0,0 +1,9 @@
+"""Soft delete and loyalty columns on customers"""
+
+from app.migrations import AddColumn
+
+steps = [
+    AddColumn("customers", "deleted_at", "TIMESTAMP WITH TIME ZONE"),
+    AddColumn("customers", "loyalty_points", "INTEGER DEFAULT 0"),
+    AddColumn("customers", "last_purchase", "TIMESTAMP"),
+]
@@ -0,0 +1,29 @@
+"""Indexes for the common query patterns"""
+
+from app.migrations import CreateIndex
+
+steps = [
+    # Products: frequently searched by store + name
+    CreateIndex("idx_products_store_name", "products", "store_id, name"),
+    CreateIndex("idx_products_store_active", "products", "store_id, is_active"),
+    CreateIndex("idx_products_store_category", "products", "store_id, category_id"),
+    CreateIndex("idx_products_store_stock", "products", "store_id, current_stock"),
+    # Bills: frequently queried by store + date range
+    CreateIndex("idx_bills_store_date", "bills", "store_id, created_at DESC"),
+    CreateIndex("idx_bills_store_bill_date_id", "bills", "store_id, bill_date DESC, id DESC"),
+    CreateIndex("idx_bills_store_status", "bills", "store_id, status"),
+    CreateIndex("idx_bills_customer_phone", "bills", "customer_phone"),
+    CreateIndex("idx_bills_bill_number", "bills", "bill_number"),
+    # Bill Items: join performance
+    CreateIndex("idx_bill_items_bill", "bill_items", "bill_id"),
+    CreateIndex("idx_bill_items_product", "bill_items", "product_id"),
+    # Customers: phone lookup
+    CreateIndex("idx_customers_store_phone", "customers", "store_id, phone"),
+    CreateIndex("idx_customers_store_name", "customers", "store_id, name"),
+    # Users: auth lookups
+    CreateIndex("idx_users_store", "users", "store_id"),
+    # Daily Summaries: date range queries
+    CreateIndex("idx_daily_summaries_store_date", "daily_summaries", "store_id, summary_date DESC"),
+    # Agent Logs: recent logs
+    CreateIndex("idx_agent_logs_store_date", "agent_logs", "store_id, created_at DESC"),
+]
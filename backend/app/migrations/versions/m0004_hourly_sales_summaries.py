@@ -0,0 +1,9 @@
+"""Hourly rows in daily_summaries for the live sales counters (hour -1 = whole day)"""
+
+from app.migrations import AddColumn, CreateIndex
+
+steps = [
+    AddColumn("daily_summaries", "hour", "INTEGER NOT NULL DEFAULT -1"),
+    CreateIndex("uq_daily_summaries_store_date_hour", "daily_summaries",
+                "store_id, summary_date, hour", unique=True),
+]
@@ -0,0 +1,8 @@
+"""Partial refunds on bills and bill items"""
+
+from app.migrations import AddColumn
+
+steps = [
+    AddColumn("bills", "refunded_amount", "FLOAT DEFAULT 0"),
+    AddColumn("bill_items", "refunded_quantity", "FLOAT DEFAULT 0"),
+]
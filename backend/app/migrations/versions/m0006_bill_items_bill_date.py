@@ -0,0 +1,12 @@
+"""bill_date copied onto bill_items, so both tables can be partitioned by it"""
+
+from app.migrations import AddColumn, Execute
+
+steps = [
+    AddColumn("bill_items", "bill_date", "TIMESTAMP WITH TIME ZONE"),
+    Execute(
+        "UPDATE bill_items SET bill_date = "
+        "(SELECT bills.bill_date FROM bills WHERE bills.id = bill_items.bill_id) "
+        "WHERE bill_date IS NULL"
+    ),
+]
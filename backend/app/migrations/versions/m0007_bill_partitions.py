@@ -0,0 +1,21 @@
+"""Monthly partitions for bills and bill_items when BILL_PARTITIONING is on (PostgreSQL)"""
+
+from app.migrations import Step
+
+
+class PartitionBills(Step):
+    """
+    Convert bills/bill_items to monthly partitions; no-op unless enabled on
+    PostgreSQL. Enabling it later converts at the next startup or daily
+    maintenance (bill_partitions.ensure_converted).
+    """
+
+    async def apply(self, engine):
+        from app.services.bill_partitions import bill_partitions
+
+        await bill_partitions.ensure_converted(engine)
+
+
+steps = [
+    PartitionBills(),
+]
@@ -0,0 +1,34 @@
+"""pg_trgm GIN index on product names for product_search_backend = "pg_trgm" (PostgreSQL)"""
+
+import logging
+
+from sqlalchemy import text
+
+from app.migrations import Step
+
+logger = logging.getLogger("KadaiGPT.Migrations")
+
+
+class ProductNameTrigramIndex(Step):
+    """CREATE EXTENSION pg_trgm and a GIN index on lower(name); skipped where not permitted"""
+
+    async def apply(self, engine):
+        if engine.dialect.name != "postgresql":
+            return
+        async with engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            try:
+                await conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+            except Exception as e:
+                # Managed databases may not allow it; search stays in memory
+                logger.warning(f"[Migrations] pg_trgm unavailable, skipping trigram index: {e}")
+                return
+            await conn.execute(text(
+                "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_products_name_trgm "
+                "ON products USING gin (lower(name) gin_trgm_ops)"
+            ))
+
+
+steps = [
+    ProductNameTrigramIndex(),
+]
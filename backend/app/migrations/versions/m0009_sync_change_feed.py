@@ -0,0 +1,7 @@
+"""Per-store change feed for delta sync (sync_versions, sync_changes)"""
+
+from app.migrations import CreateTables
+
+steps = [
+    CreateTables(["sync_versions", "sync_changes"]),
+]
@@ -0,0 +1,11 @@
+"""Rolling sales velocity on products, a partial index of low-stock products and perishable products"""
+
+from app.migrations import AddColumn, CreateIndex
+
+steps = [
+    AddColumn("products", "sales_velocity", "FLOAT DEFAULT 0"),
+    CreateIndex("idx_products_low_stock", "products", "store_id, current_stock",
+                where="current_stock <= min_stock_alert"),
+    CreateIndex("idx_products_expiry", "products", "store_id, expiry_date",
+                where="expiry_date IS NOT NULL"),
+]
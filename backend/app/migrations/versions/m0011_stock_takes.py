@@ -0,0 +1,7 @@
+"""Physical stock-take sessions (stock_takes, stock_take_lines)"""
+
+from app.migrations import CreateTables
+
+steps = [
+    CreateTables(["stock_takes", "stock_take_lines"]),
+]
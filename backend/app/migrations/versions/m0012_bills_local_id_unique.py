@@ -0,0 +1,27 @@
+"""Unique (store_id, local_id) on bills, after renaming the local_id of replayed duplicates"""
+
+import logging
+
+from app.migrations import CreateIndex, Step
+from app.services.bill_partitions import release_duplicate_local_ids
+
+logger = logging.getLogger("KadaiGPT.Migrations")
+
+
+class ReleaseDuplicateLocalIds(Step):
+    """Keep local_id on the first (lowest id) copy of each offline bill; tag and audit the others"""
+
+    async def apply(self, engine):
+        async with engine.begin() as conn:
+            renamed = await release_duplicate_local_ids(conn)
+        if renamed:
+            logger.warning(f"[Migrations] Marked {renamed} duplicate offline bill(s) as <local_id>#dup-<id>; "
+                           f"see audit_trails action 'mark_duplicate'")
+
+
+steps = [
+    ReleaseDuplicateLocalIds(),
+    # Offline replays are idempotent on (store, local_id). Partitioned bills
+    # already carry it, with bill_date, from the conversion
+    CreateIndex("idx_bills_store_local_id", "bills", "store_id, local_id", unique=True),
+]
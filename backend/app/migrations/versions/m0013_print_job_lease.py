@@ -0,0 +1,7 @@
+"""Claim time on print jobs, so restarts only re-queue jobs whose lease expired"""
+
+from app.migrations import AddColumn
+
+steps = [
+    AddColumn("print_jobs", "claimed_at", "TIMESTAMP"),
+]
@@ -0,0 +1,13 @@
+"""At most one open stock take per store, enforced by a partial unique index"""
+
+from app.migrations import CreateIndex, Execute
+
+steps = [
+    # Sessions opened concurrently before the index: keep the newest open
+    Execute(
+        "UPDATE stock_takes SET status = 'CANCELLED' WHERE status = 'OPEN' AND id NOT IN ("
+        "SELECT max(id) FROM stock_takes WHERE status = 'OPEN' GROUP BY store_id)"
+    ),
+    CreateIndex("uq_stock_takes_open", "stock_takes", "store_id", unique=True,
+                where="status = 'OPEN'"),
+]
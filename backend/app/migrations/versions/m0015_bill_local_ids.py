@@ -0,0 +1,13 @@
+"""Offline bill guard table (bill_local_ids), backfilled from the synced bills"""
+
+from app.migrations import CreateTables, Execute
+
+steps = [
+    CreateTables(["bill_local_ids"]),
+    Execute(
+        "INSERT INTO bill_local_ids (store_id, local_id, bill_id) "
+        "SELECT store_id, local_id, min(id) FROM bills b WHERE local_id IS NOT NULL AND NOT EXISTS ("
+        "SELECT 1 FROM bill_local_ids g WHERE g.store_id = b.store_id AND g.local_id = b.local_id) "
+        "GROUP BY store_id, local_id"
+    ),
+]
@@ -5,7 +5,7 @@ Complete data models for the retail operations platform
 
 from sqlalchemy import (
     Column, Integer, String, Float, Boolean, DateTime, Text, 
-    ForeignKey, Enum, JSON, LargeBinary
+    ForeignKey, Enum, JSON, LargeBinary, Index, text
 )
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -48,6 +48,12 @@ class OCRConfidence(str, enum.Enum):
     LOW = "low"
 
 
+class StockTakeStatus(str, enum.Enum):
+    OPEN = "open"
+    APPLIED = "applied"
+    CANCELLED = "cancelled"
+
+
 # ==================== MODELS ====================
 
 class Store(Base):
@@ -138,6 +144,15 @@ class Category(Base):
 class Product(Base):
     """Product/Item model with inventory tracking"""
     __tablename__ = "products"
+    __table_args__ = (
+        # Partial: only the (few) products at or below their reorder level
+        Index("idx_products_low_stock", "store_id", "current_stock",
+              sqlite_where=text("current_stock <= min_stock_alert"),
+              postgresql_where=text("current_stock <= min_stock_alert")),
+        Index("idx_products_expiry", "store_id", "expiry_date",
+              sqlite_where=text("expiry_date IS NOT NULL"),
+              postgresql_where=text("expiry_date IS NOT NULL")),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     store_id = Column(Integer, ForeignKey("stores.id"), nullable=False)
@@ -163,6 +178,7 @@ class Product(Base):
     current_stock = Column(Integer, default=0)
     min_stock_alert = Column(Integer, default=10)
     unit = Column(String(20), default="pieces")  # pieces, kg, liters, etc.
+    sales_velocity = Column(Float, default=0.0)  # units/day over the last 30 days (inventory_insights)
     
     # For medical stores
     expiry_date = Column(DateTime)
@@ -185,6 +201,10 @@ class Product(Base):
 class Bill(Base):
     """Bill/Invoice model"""
     __tablename__ = "bills"
+    __table_args__ = (
+        # Offline replays are idempotent on (store, local_id)
+        Index("idx_bills_store_local_id", "store_id", "local_id", unique=True),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     store_id = Column(Integer, ForeignKey("stores.id"), nullable=False)
@@ -203,6 +223,7 @@ class Bill(Base):
     discount_amount = Column(Float, default=0.0)
     tax_amount = Column(Float, default=0.0)
     total_amount = Column(Float, nullable=False)
+    refunded_amount = Column(Float, default=0.0)  # Sum of partial refunds
     
     # Payment
     payment_method = Column(Enum(PaymentMethod), default=PaymentMethod.CASH)
@@ -237,6 +258,7 @@ class BillItem(Base):
     id = Column(Integer, primary_key=True, index=True)
     bill_id = Column(Integer, ForeignKey("bills.id"), nullable=False)
     product_id = Column(Integer, ForeignKey("products.id"))
+    bill_date = Column(DateTime(timezone=True))  # Copy of bills.bill_date (partition key)
     
     # Item Details (copied from product at time of sale)
     product_name = Column(String(200), nullable=False)
@@ -253,12 +275,26 @@ class BillItem(Base):
     discount_amount = Column(Float, default=0.0)
     tax_amount = Column(Float, default=0.0)
     total = Column(Float, nullable=False)
+    refunded_quantity = Column(Float, default=0.0)
     
     # Relationships
     bill = relationship("Bill", back_populates="items")
     product = relationship("Product", back_populates="bill_items")
 
 
+class BillLocalId(Base):
+    """
+    One row per synced offline bill, written with the bill. Not partitioned,
+    so (store_id, local_id) stays unique when bills are partitioned by month
+    """
+    __tablename__ = "bill_local_ids"
+    
+    store_id = Column(Integer, primary_key=True)
+    local_id = Column(String(50), primary_key=True)
+    bill_id = Column(Integer, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
 class HandwrittenBill(Base):
     """OCR-processed handwritten bills"""
     __tablename__ = "handwritten_bills"
@@ -311,6 +347,7 @@ class PrintJob(Base):
     status = Column(String(50), default="pending")  # pending, printing, completed, failed
     attempts = Column(Integer, default=0)
     max_attempts = Column(Integer, default=3)
+    claimed_at = Column(DateTime)  # when a worker last took the job (lease start)
     
     # Error tracking
     last_error = Column(Text)
@@ -345,14 +382,18 @@ class AgentLog(Base):
 
 
 class DailySummary(Base):
-    """Daily sales summary for analytics"""
+    """Daily sales summary for analytics (hourly rows + one whole-day row)"""
     __tablename__ = "daily_summaries"
+    __table_args__ = (
+        Index("uq_daily_summaries_store_date_hour", "store_id", "summary_date", "hour", unique=True),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     store_id = Column(Integer, ForeignKey("stores.id"), nullable=False)
     
     # Date
     summary_date = Column(DateTime, nullable=False)
+    hour = Column(Integer, nullable=False, default=-1, server_default="-1")  # 0-23, or -1 for the whole day
     
     # Sales Metrics
     total_bills = Column(Integer, default=0)
@@ -453,3 +494,73 @@ class Notification(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     read_at = Column(DateTime(timezone=True), nullable=True)
 
+
+
+class SyncVersion(Base):
+    """Per-store change feed counter, bumped once per committing transaction"""
+    __tablename__ = "sync_versions"
+    
+    store_id = Column(Integer, ForeignKey("stores.id"), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+
+class SyncChange(Base):
+    """Latest change of each synced entity (GET /sync/changes)"""
+    __tablename__ = "sync_changes"
+    __table_args__ = (
+        Index("uq_sync_changes_entity", "store_id", "entity_type", "entity_id", unique=True),
+        Index("idx_sync_changes_store_version", "store_id", "version"),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    store_id = Column(Integer, ForeignKey("stores.id"), nullable=False)
+    
+    entity_type = Column(String(20), nullable=False)  # product, category, customer, bill
+    entity_id = Column(Integer, nullable=False)
+    version = Column(Integer, nullable=False)
+    deleted = Column(Boolean, nullable=False, default=False)
+    
+    changed_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class StockTake(Base):
+    """Physical stock count session: counts are collected, then applied at once"""
+    __tablename__ = "stock_takes"
+    __table_args__ = (
+        # Partial: one open session per store (the enum is stored by member name)
+        Index("uq_stock_takes_open", "store_id", unique=True,
+              sqlite_where=text("status = 'OPEN'"),
+              postgresql_where=text("status = 'OPEN'")),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    store_id = Column(Integer, ForeignKey("stores.id"), nullable=False, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    
+    note = Column(String(200))
+    status = Column(Enum(StockTakeStatus), default=StockTakeStatus.OPEN, nullable=False)
+    
+    # Filled in when the counts are applied
+    adjusted_count = Column(Integer, default=0)
+    
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    applied_at = Column(DateTime(timezone=True), nullable=True)
+    
+    lines = relationship("StockTakeLine", back_populates="stock_take", cascade="all, delete-orphan")
+
+
+class StockTakeLine(Base):
+    """Counted quantity of one product in a stock take (scans are summed)"""
+    __tablename__ = "stock_take_lines"
+    __table_args__ = (
+        Index("uq_stock_take_lines_product", "stock_take_id", "product_id", unique=True),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    stock_take_id = Column(Integer, ForeignKey("stock_takes.id"), nullable=False)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
+    
+    counted_quantity = Column(Integer, nullable=False, default=0)
+    expected_quantity = Column(Integer, nullable=True)  # current_stock when applied
+    
+    stock_take = relationship("StockTake", back_populates="lines")
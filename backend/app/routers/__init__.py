@@ -2,17 +2,23 @@
 KadaiGPT - Routers Package
 """
 
-from app.routers.auth import router as auth_router
-from app.routers.products import router as products_router
-from app.routers.bills import router as bills_router
-from app.routers.ocr import router as ocr_router
-from app.routers.print import router as print_router
-from app.routers.customers import router as customers_router
-from app.routers.suppliers import router as suppliers_router
-from app.routers.whatsapp import router as whatsapp_router
-from app.routers.dashboard import router as dashboard_router
-from app.routers.analytics import router as analytics_router
-from app.routers.notifications import router as notifications_router
+from app.utils.lazy import lazy_exports
+
+# Each router is imported only when it is asked for, so importing one
+# router module (e.g. app.routers.auth) doesn't build all of them
+__getattr__ = lazy_exports(__name__, {
+    "auth_router": "app.routers.auth:router",
+    "products_router": "app.routers.products:router",
+    "bills_router": "app.routers.bills:router",
+    "ocr_router": "app.routers.ocr:router",
+    "print_router": "app.routers.print:router",
+    "customers_router": "app.routers.customers:router",
+    "suppliers_router": "app.routers.suppliers:router",
+    "whatsapp_router": "app.routers.whatsapp:router",
+    "dashboard_router": "app.routers.dashboard:router",
+    "analytics_router": "app.routers.analytics:router",
+    "notifications_router": "app.routers.notifications:router",
+})
 
 __all__ = [
     "auth_router",
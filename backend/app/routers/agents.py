@@ -11,13 +11,6 @@ import asyncio
 import json
 
 from ..agents.core.base_agent import AgentOrchestrator, AgentGoal
-from ..agents.core.store_manager_agent import StoreManagerAgent
-from ..agents.core.inventory_agent import InventoryAgent
-from ..agents.core.customer_agent import CustomerEngagementAgent, CustomerMessage
-from ..agents.core.analytics_agent import AnalyticsAgent
-from ..agents.core.voice_agent import VoiceAIAgent
-from ..agents.core.learning_agent import LearningAgent
-from ..agents.core.workflow_engine import WorkflowEngine
 
 router = APIRouter(prefix="/agents", tags=["AI Agents"])
 
@@ -94,6 +87,15 @@ class WhatsAppIncomingMessage(BaseModel):
 def get_store_agents(store_id: int) -> Dict:
     """Get or create all agents for a store"""
     if store_id not in agent_instances:
+        # Specialized agents load with the first store that needs them
+        from ..agents.core.store_manager_agent import StoreManagerAgent
+        from ..agents.core.inventory_agent import InventoryAgent
+        from ..agents.core.customer_agent import CustomerEngagementAgent
+        from ..agents.core.analytics_agent import AnalyticsAgent
+        from ..agents.core.voice_agent import VoiceAIAgent
+        from ..agents.core.learning_agent import LearningAgent
+        from ..agents.core.workflow_engine import WorkflowEngine
+        
         store_name = "KadaiGPT Store"
         
         # Create all agents
@@ -373,6 +375,8 @@ async def get_price_optimization(store_id: int = 1):
 @router.post("/customer/whatsapp/incoming")
 async def handle_whatsapp_message(message: WhatsAppIncomingMessage, store_id: int = 1):
     """Handle incoming WhatsApp message"""
+    from ..agents.core.customer_agent import CustomerMessage
+    
     agents = get_store_agents(store_id)
     customer = agents["customer"]
     
@@ -11,8 +11,7 @@ from typing import List, Optional, Dict, Any
 import logging
 import random
 
-from app.database import get_db
-from app.routers.auth import get_current_user
+from app.routers.auth import get_current_user, get_read_db
 from app.models import User, UserRole
 from app.rbac import require_min_role
 
@@ -28,7 +27,7 @@ logger = logging.getLogger(__name__)
 async def get_sales_overview(
     period: str = Query("month", enum=["day", "week", "month", "quarter", "year"]),
     current_user: User = Depends(require_min_role(UserRole.MANAGER)),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Get sales overview with comparisons"""
     try:
@@ -9,9 +9,8 @@ from sqlalchemy import select, func, desc
 from typing import Optional
 from datetime import datetime, timedelta
 
-from app.database import get_db
 from app.models import AuditTrail, User
-from app.routers.auth import get_current_user
+from app.routers.auth import get_current_user, get_read_db
 
 router = APIRouter(prefix="/api/audit", tags=["Audit Trail"])
 
@@ -28,7 +27,7 @@ async def get_audit_logs(
     limit: int = Query(50, ge=1, le=200),
     offset: int = Query(0, ge=0),
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Get audit trail logs for the current user's store."""
     cutoff = datetime.utcnow() - timedelta(days=days)
@@ -83,7 +82,7 @@ async def get_audit_logs(
 async def get_audit_summary(
     days: int = Query(7, ge=1, le=90),
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Get a summary of audit activity for the store."""
     cutoff = datetime.utcnow() - timedelta(days=days)
@@ -9,13 +9,14 @@ from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from datetime import datetime, timedelta
 from typing import Optional
 
-from app.database import get_db
+from app.database import get_db, get_read_session, request_store_id
 from app.config import settings
 from app.models import User, Store, UserRole
+from app.services.tenant_cache import tenant_cache, TenantContext
+from app.services.password_hasher import password_hasher, PasswordHasherBusy
 from app.schemas import (
     Token, TokenData, LoginRequest, RegisterRequest, 
     UserResponse, StoreResponse
@@ -24,22 +25,27 @@ from app.schemas import (
 
 router = APIRouter(prefix="/auth", tags=["Authentication"])
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 # OAuth2 scheme
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/login")
 logger = logging.getLogger("KadaiGPT.Auth")
 
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify a password against its hash"""
-    return pwd_context.verify(plain_password, hashed_password)
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password against its hash (off the event loop)"""
+    return await password_hasher.verify(plain_password, hashed_password)
+
 
+async def get_password_hash(password: str) -> str:
+    """Hash a password (off the event loop)"""
+    return await password_hasher.hash(password)
 
-def get_password_hash(password: str) -> str:
-    """Hash a password"""
-    return pwd_context.hash(password)
+
+def hasher_busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many sign-ins at once. Please retry in a moment.",
+        headers={"Retry-After": "1"},
+    )
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
@@ -61,11 +67,15 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     return encoded_jwt
 
 
-async def get_current_user(
+async def get_tenant(
     token: str = Depends(oauth2_scheme),
     db: AsyncSession = Depends(get_db)
-) -> User:
-    """Get current authenticated user from JWT token"""
+) -> TenantContext:
+    """
+    Authenticated user and their store, from the JWT token.
+    
+    Served from the tenant cache, so a warm request runs no query here.
+    """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -88,17 +98,23 @@ async def get_current_user(
         logger.warning(f"JWT validation failed: {type(e).__name__}")
         raise credentials_exception
     
-    result = await db.execute(select(User).where(User.id == token_data.user_id))
-    user = result.scalar_one_or_none()
+    tenant = await tenant_cache.get(db, token_data.user_id)
     
-    if user is None:
+    if tenant is None:
         logger.warning(f"Token valid but user not found (id: {token_data.user_id})")
         raise credentials_exception
     
-    if not user.is_active:
+    if not tenant.user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
     
-    return user
+    # Writes committed during this request count as this store's (read-your-writes)
+    request_store_id.set(tenant.user.store_id)
+    return tenant
+
+
+async def get_current_user(tenant: TenantContext = Depends(get_tenant)) -> User:
+    """Get current authenticated user from JWT token"""
+    return tenant.user
 
 
 async def get_current_active_user(current_user: User = Depends(get_current_user)) -> User:
@@ -108,6 +124,18 @@ async def get_current_active_user(current_user: User = Depends(get_current_user)
     return current_user
 
 
+async def get_read_db(
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Session for read-heavy reporting endpoints: the read replica when one is
+    configured, the primary while this store has just written.
+    """
+    async for session in get_read_session(current_user.store_id, db):
+        yield session
+
+
 @router.post("/register", response_model=dict)
 async def register(
     request: RegisterRequest,
@@ -133,6 +161,11 @@ async def register(
                 detail="Phone number already registered"
             )
     
+    try:
+        password_hash = await get_password_hash(request.password)
+    except PasswordHasherBusy:
+        raise hasher_busy()
+    
     # Create store first
     store = Store(
         name=request.store_name,
@@ -146,7 +179,7 @@ async def register(
         store_id=store.id,
         email=request.email,
         phone=request.phone,
-        password_hash=get_password_hash(request.password),
+        password_hash=password_hash,
         full_name=request.full_name,
         role=UserRole.OWNER
     )
@@ -187,7 +220,14 @@ async def login(
     result = await db.execute(select(User).where(User.email == form_data.username))
     user = result.scalar_one_or_none()
     
-    if not user or not verify_password(form_data.password, user.password_hash):
+    valid, new_hash = False, None
+    if user:
+        try:
+            valid, new_hash = await password_hasher.verify_and_update(form_data.password, user.password_hash)
+        except PasswordHasherBusy:
+            raise hasher_busy()
+    
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -200,8 +240,10 @@ async def login(
             detail="Account is inactive"
         )
     
-    # Update last login
+    # Update last login; re-hash if bcrypt_rounds changed since this hash was made
     user.last_login = datetime.utcnow()
+    if new_hash:
+        user.password_hash = new_hash
     await db.commit()
     
     # Generate token - sub must be a string
@@ -219,20 +261,14 @@ async def get_me(current_user: User = Depends(get_current_active_user)):
 
 
 @router.get("/me/store", response_model=StoreResponse)
-async def get_my_store(
-    current_user: User = Depends(get_current_active_user),
-    db: AsyncSession = Depends(get_db)
-):
+async def get_my_store(tenant: TenantContext = Depends(get_tenant)):
     """
     Get current user's store details
     """
-    result = await db.execute(select(Store).where(Store.id == current_user.store_id))
-    store = result.scalar_one_or_none()
-    
-    if not store:
+    if not tenant.store:
         raise HTTPException(status_code=404, detail="Store not found")
     
-    return store
+    return tenant.store
 
 
 @router.post("/logout")
@@ -240,4 +276,5 @@ async def logout(current_user: User = Depends(get_current_active_user)):
     """
     Logout (client should discard token)
     """
+    tenant_cache.invalidate_user(current_user.id)
     return {"message": "Logged out successfully"}
@@ -11,12 +11,12 @@ from typing import Optional
 from datetime import datetime, timedelta
 import json
 
-from app.database import get_db
 from app.models import (
     User, Store, Product, Bill, BillItem, Customer, 
     Category, DailySummary
 )
-from app.routers.auth import get_current_active_user
+from app.routers.auth import get_current_active_user, get_read_db
+from app.services.sales_counters import DAILY_ROW_HOUR
 
 router = APIRouter(prefix="/backup", tags=["Data Backup"])
 
@@ -28,7 +28,7 @@ async def export_store_data(
     include_customers: bool = Query(True, description="Include customers"),
     days: int = Query(90, ge=1, le=365, description="Export bills from last N days"),
     current_user: User = Depends(get_current_active_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     Export all store data as JSON for backup.
@@ -161,12 +161,16 @@ async def export_store_data(
                 "created_at": bill.created_at.isoformat() if bill.created_at else None,
             })
     
-    # Daily Summaries
+    # Daily Summaries (whole-day rows; the hourly rows are rebuilt from bills)
     summary_cutoff = datetime.utcnow() - timedelta(days=days)
     try:
         summary_result = await db.execute(
             select(DailySummary)
-            .where(DailySummary.store_id == store_id, DailySummary.summary_date >= summary_cutoff.date())
+            .where(
+                DailySummary.store_id == store_id,
+                DailySummary.hour == DAILY_ROW_HOUR,
+                DailySummary.summary_date >= summary_cutoff.date()
+            )
             .order_by(DailySummary.summary_date.desc())
         )
         for s in summary_result.scalars().all():
@@ -199,7 +203,7 @@ async def export_store_data(
 @router.get("/stats")
 async def get_backup_stats(
     current_user: User = Depends(get_current_active_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Get database statistics for the store (useful for monitoring)."""
     store_id = current_user.store_id
@@ -3,26 +3,70 @@ KadaiGPT - Bills Router
 Core billing functionality with AI agent integration
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response, Header
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, func
-from typing import List, Optional
+from sqlalchemy import select, insert, and_, func, tuple_, literal, DateTime
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects import sqlite
+from typing import Dict, List, Optional, Tuple
 from datetime import datetime, timedelta
+import base64
 import uuid
 
 from app.database import get_db
-from app.models import Bill, BillItem, Product, User, Store, BillStatus, PaymentMethod, UserRole
-from app.schemas import BillCreate, BillResponse, BillSummary, PrintRequest, PrintStatus
+from app.models import Bill, BillItem, BillLocalId, User, BillStatus, PaymentMethod, UserRole
+from app.schemas import (
+    BillCreate, BillItemCreate, BillResponse, BillSummary, PrintRequest, PrintStatus,
+    BillBatchCreate, BillBatchResult, BillBatchResponse, BillRefundCreate
+)
 from app.routers.auth import get_current_active_user
 from app.rbac import require_min_role
-from app.agents import print_agent, inventory_agent, offline_agent
+from app.agents import inventory_agent, offline_agent
 from app.routers.audit import log_audit_event
 from app.routers.inapp_notifications import create_system_notification
+from app.services.stock_engine import stock_engine, InsufficientStockError
+from app.services.change_feed import change_feed
+from app.services.print_spooler import print_spooler
+from app.services.bill_cache import bill_cache, etag_matches
+from app.services.idempotency import idempotent
+from app.services.pricing_engine import pricing_engine, to_paise, to_rupees
+from app.services.sales_counters import sales_counters, SaleRecord, local_bill_time, store_today
 
 
 router = APIRouter(prefix="/bills", tags=["Bills"])
 
 
+async def find_offline_bills(db: AsyncSession, store_id: int, local_ids: List[str]) -> Dict[str, Bill]:
+    """Bills already synced for these local_ids; the first (lowest id) copy when a replay stored two"""
+    result = await db.execute(
+        select(Bill)
+        .where(and_(Bill.store_id == store_id, Bill.local_id.in_(local_ids)))
+        .order_by(Bill.id)
+    )
+    found: Dict[str, Bill] = {}
+    for bill in result.scalars().all():
+        found.setdefault(bill.local_id, bill)
+    return found
+
+
+async def claim_local_ids(db: AsyncSession, store_id: int, bill_ids: Dict[str, int]):
+    """
+    Record synced offline bills in bill_local_ids, in the bill's transaction.
+    Raises IntegrityError when another request synced one of them first; the
+    guard holds even when bills are partitioned and their unique index
+    includes bill_date.
+    """
+    await db.execute(insert(BillLocalId), [
+        {"store_id": store_id, "local_id": local_id, "bill_id": bill_id}
+        for local_id, bill_id in bill_ids.items()
+    ])
+
+
+async def offline_bill_response(db: AsyncSession, bill: Bill) -> BillResponse:
+    await db.refresh(bill, ["items"])
+    return BillResponse.model_validate(bill)
+
+
 def generate_bill_number(store_prefix: str = "INV") -> str:
     """Generate unique bill number"""
     date_part = datetime.now().strftime("%Y%m%d")
@@ -30,46 +74,90 @@ def generate_bill_number(store_prefix: str = "INV") -> str:
     return f"{store_prefix}-{date_part}-{unique_part}"
 
 
-async def calculate_bill_totals(items: List[dict]) -> dict:
-    """Calculate bill totals from items"""
-    subtotal = 0.0
-    total_discount = 0.0
-    total_tax = 0.0
-    
-    for item in items:
-        item_subtotal = item["unit_price"] * item["quantity"]
-        item_discount = item_subtotal * (item.get("discount_percent", 0) / 100)
-        item_taxable = item_subtotal - item_discount
-        item_tax = item_taxable * (item.get("tax_rate", 0) / 100)
-        
-        subtotal += item_subtotal
-        total_discount += item_discount
-        total_tax += item_tax
-    
-    total = subtotal - total_discount + total_tax
+# SQLite stores server_default now() without microseconds; bind cursors the
+# same way so (bill_date, id) comparisons line up with the stored text
+KEYSET_DATETIME = DateTime().with_variant(sqlite.DATETIME(truncate_microseconds=True), "sqlite")
+
+
+def encode_bill_cursor(bill_date: datetime, bill_id: int) -> str:
+    """Encode a (bill_date, id) keyset position as an opaque cursor"""
+    raw = f"{bill_date.isoformat()}|{bill_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_bill_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Decode a cursor produced by encode_bill_cursor"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        date_part, id_part = base64.urlsafe_b64decode(padded).decode().rsplit("|", 1)
+        return datetime.fromisoformat(date_part), int(id_part)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def price_bills(carts: List[List[BillItemCreate]]) -> List[Tuple[List[dict], dict]]:
+    """Calculate line amounts and bill totals for many bills in one pricing pass"""
+    priced = pricing_engine.price_carts([
+        [(item.unit_price, item.quantity, item.discount_percent, item.tax_rate) for item in items]
+        for items in carts
+    ])
     
-    return {
-        "subtotal": round(subtotal, 2),
-        "discount_amount": round(total_discount, 2),
-        "tax_amount": round(total_tax, 2),
-        "total_amount": round(total, 2)
-    }
+    results = []
+    for items, (line_amounts, totals) in zip(carts, priced):
+        processed_items = [
+            {
+                "product_id": item.product_id,
+                "product_name": item.product_name,
+                "product_sku": item.product_sku,
+                "unit_price": item.unit_price,
+                "quantity": item.quantity,
+                "discount_percent": item.discount_percent or 0,
+                "tax_rate": item.tax_rate or 0,
+                "subtotal": to_rupees(subtotal),
+                "discount_amount": to_rupees(discount),
+                "tax_amount": to_rupees(tax),
+                "total": to_rupees(total)
+            }
+            for item, (subtotal, discount, tax, total) in zip(items, line_amounts)
+        ]
+        results.append((processed_items, pricing_engine.totals_in_rupees(totals)))
+    return results
+
+
+def process_bill_items(items: List[BillItemCreate]) -> Tuple[List[dict], dict]:
+    """Calculate line amounts and bill totals for a list of bill items"""
+    return price_bills([items])[0]
 
 
 @router.get("", response_model=List[BillSummary])
 async def list_bills(
+    response: Response,
     date_from: Optional[datetime] = None,
     date_to: Optional[datetime] = None,
     status: Optional[BillStatus] = None,
     payment_method: Optional[PaymentMethod] = None,
     search: Optional[str] = None,
     skip: int = 0,
+    cursor: Optional[str] = Query(default=None, description="Keyset cursor from X-Next-Cursor"),
     limit: int = Query(default=50, le=200),
     current_user: User = Depends(get_current_active_user),
     db: AsyncSession = Depends(get_db)
 ):
-    """Get all bills with filtering"""
-    query = select(Bill).where(Bill.store_id == current_user.store_id)
+    """
+    Get all bills with filtering
+    
+    Pages with `cursor` (keyset on bill_date, id) when given, which costs the
+    same at any depth. The cursor for the next page is returned in the
+    X-Next-Cursor header. `skip` is kept for older clients.
+    """
+    # Items count per bill, evaluated only for rows on the page
+    items_count = (
+        select(func.count(BillItem.id))
+        .where(BillItem.bill_id == Bill.id)
+        .correlate(Bill)
+        .scalar_subquery()
+    )
+    query = select(Bill, items_count).where(Bill.store_id == current_user.store_id)
     
     if date_from:
         query = query.where(Bill.bill_date >= date_from)
@@ -91,20 +179,24 @@ async def list_bills(
             Bill.customer_phone.ilike(search_term)
         )
     
-    query = query.order_by(Bill.bill_date.desc()).offset(skip).limit(limit)
+    if cursor:
+        cursor_date, cursor_id = decode_bill_cursor(cursor)
+        cursor_value = literal(cursor_date, type_=KEYSET_DATETIME)
+        query = query.where(tuple_(Bill.bill_date, Bill.id) < tuple_(cursor_value, cursor_id))
+    else:
+        query = query.offset(skip)
+    
+    query = query.order_by(Bill.bill_date.desc(), Bill.id.desc()).limit(limit)
     result = await db.execute(query)
-    bills = result.scalars().all()
+    rows = result.all()
+    
+    if len(rows) == limit:
+        last_bill = rows[-1][0]
+        response.headers["X-Next-Cursor"] = encode_bill_cursor(last_bill.bill_date, last_bill.id)
     
     # Transform to summary
-    summaries = []
-    for bill in bills:
-        # Get items count
-        items_result = await db.execute(
-            select(func.count(BillItem.id)).where(BillItem.bill_id == bill.id)
-        )
-        items_count = items_result.scalar() or 0
-        
-        summaries.append(BillSummary(
+    return [
+        BillSummary(
             id=bill.id,
             bill_number=bill.bill_number,
             total_amount=bill.total_amount,
@@ -112,43 +204,38 @@ async def list_bills(
             payment_method=bill.payment_method,
             customer_name=bill.customer_name,
             customer_phone=bill.customer_phone,
-            items_count=items_count,
+            items_count=count or 0,
             created_at=bill.created_at
-        ))
-    
-    return summaries
+        )
+        for bill, count in rows
+    ]
 
 
 @router.get("/{bill_id}", response_model=BillResponse)
 async def get_bill(
     bill_id: int,
+    if_none_match: Optional[str] = Header(None, alias="If-None-Match"),
     current_user: User = Depends(get_current_active_user),
     db: AsyncSession = Depends(get_db)
 ):
-    """Get a specific bill with items"""
-    result = await db.execute(
-        select(Bill).where(
-            and_(
-                Bill.id == bill_id,
-                Bill.store_id == current_user.store_id
-            )
-        )
-    )
-    bill = result.scalar_one_or_none()
+    """
+    Get a specific bill with items
     
-    if not bill:
+    Served from the bill cache with an ETag; send it back as If-None-Match
+    to get 304 Not Modified while the bill is unchanged.
+    """
+    entry = await bill_cache.get_detail(db, bill_id, current_user.store_id)
+    if entry is None:
         raise HTTPException(status_code=404, detail="Bill not found")
     
-    # Get items
-    items_result = await db.execute(
-        select(BillItem).where(BillItem.bill_id == bill.id)
-    )
-    bill.items = items_result.scalars().all()
-    
-    return bill
+    headers = {"ETag": entry.etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(if_none_match, entry.etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
 
 
 @router.post("", response_model=BillResponse, status_code=status.HTTP_201_CREATED)
+@idempotent(status_code=status.HTTP_201_CREATED)
 async def create_bill(
     bill_data: BillCreate,
     auto_print: bool = Query(default=True, description="Automatically print bill"),
@@ -162,40 +249,31 @@ async def create_bill(
     1. Validate items and calculate totals
     2. Create bill and bill items
     3. Update inventory (Inventory Agent)
-    4. Auto-print if enabled (Print Agent)
+    4. Queue receipt for the print spooler if enabled (Print Agent)
     5. Queue for sync if offline (Offline Agent)
     """
     
     if not bill_data.items:
         raise HTTPException(status_code=400, detail="Bill must have at least one item")
     
-    # Get store for prefix
-    store_result = await db.execute(
-        select(Store).where(Store.id == current_user.store_id)
-    )
-    store = store_result.scalar_one_or_none()
+    # 📶 Offline replays are idempotent on local_id
+    if bill_data.local_id:
+        existing = await find_offline_bills(db, current_user.store_id, [bill_data.local_id])
+        if bill_data.local_id in existing:
+            return await offline_bill_response(db, existing[bill_data.local_id])
     
     # ═══════════════════════════════════════════════════
     # 🛡️ STOCK VALIDATION: Prevent negative stock (BUG-001 fix)
-    # Validate ALL items have sufficient stock BEFORE creating the bill
+    # Lock ALL referenced products in one query (ordered by id to avoid
+    # deadlocks) and validate the aggregated quantities BEFORE creating the bill
     # ═══════════════════════════════════════════════════
-    insufficient_items = []
-    for item in bill_data.items:
-        if item.product_id:
-            prod_check = await db.execute(
-                select(Product).where(Product.id == item.product_id)
-            )
-            product = prod_check.scalar_one_or_none()
-            if product:
-                if product.current_stock < item.quantity:
-                    insufficient_items.append({
-                        "product_name": item.product_name or product.name,
-                        "product_id": item.product_id,
-                        "available": product.current_stock,
-                        "requested": item.quantity,
-                        "shortfall": round(item.quantity - product.current_stock, 2)
-                    })
+    quantities = stock_engine.aggregate_quantities(
+        (item.product_id, item.quantity) for item in bill_data.items
+    )
+    products = await stock_engine.lock_products(db, current_user.store_id, quantities)
+    quantities = {pid: qty for pid, qty in quantities.items() if pid in products}
     
+    insufficient_items = stock_engine.find_shortfalls(products, quantities)
     if insufficient_items:
         raise HTTPException(
             status_code=400,
@@ -207,69 +285,24 @@ async def create_bill(
         )
     # ═══════════════════════════════════════════════════
     
-    # Process items
-    processed_items = []
-    inventory_updates = []
-    
-    for item in bill_data.items:
-        # Calculate item totals
-        item_subtotal = item.unit_price * item.quantity
-        item_discount = item_subtotal * (item.discount_percent / 100)
-        item_taxable = item_subtotal - item_discount
-        item_tax = item_taxable * (item.tax_rate / 100)
-        item_total = item_taxable + item_tax
-        
-        processed_item = {
-            "product_id": item.product_id,
-            "product_name": item.product_name,
-            "product_sku": item.product_sku,
-            "unit_price": item.unit_price,
-            "quantity": item.quantity,
-            "discount_percent": item.discount_percent,
-            "tax_rate": item.tax_rate,
-            "subtotal": round(item_subtotal, 2),
-            "discount_amount": round(item_discount, 2),
-            "tax_amount": round(item_tax, 2),
-            "total": round(item_total, 2)
-        }
-        processed_items.append(processed_item)
-        
-        # Track for inventory update
-        if item.product_id:
-            # Get current stock (use FOR UPDATE to prevent race conditions)
-            prod_result = await db.execute(
-                select(Product).where(Product.id == item.product_id)
-            )
-            product = prod_result.scalar_one_or_none()
-            if product:
-                # Double-check stock (race condition protection)
-                if product.current_stock < item.quantity:
-                    raise HTTPException(
-                        status_code=409,
-                        detail=f"Stock for '{item.product_name}' changed during transaction. Please retry."
-                    )
-                inventory_updates.append({
-                    "product_id": item.product_id,
-                    "product_name": item.product_name,
-                    "quantity": item.quantity,
-                    "current_stock": product.current_stock,
-                    "min_stock": product.min_stock_alert
-                })
-    
-    # Calculate totals
-    totals = await calculate_bill_totals([
+    # Process items and calculate totals
+    processed_items, totals = process_bill_items(bill_data.items)
+    
+    # Track for inventory agent (one entry per product, from the locked snapshot)
+    inventory_updates = [
         {
-            "unit_price": item.unit_price,
-            "quantity": item.quantity,
-            "discount_percent": item.discount_percent,
-            "tax_rate": item.tax_rate
+            "product_id": product_id,
+            "product_name": products[product_id].name,
+            "quantity": quantity,
+            "current_stock": products[product_id].current_stock,
+            "min_stock": products[product_id].min_stock_alert
         }
-        for item in bill_data.items
-    ])
+        for product_id, quantity in quantities.items()
+    ]
     
     # Determine amount paid and change
     amount_paid = bill_data.amount_paid if bill_data.amount_paid else totals["total_amount"]
-    change_amount = max(0, amount_paid - totals["total_amount"])
+    change_amount = pricing_engine.change_due(amount_paid, totals["total_amount"])
     
     # Generate bill number
     bill_number = generate_bill_number("INV")
@@ -294,74 +327,59 @@ async def create_bill(
         local_id=bill_data.local_id
     )
     
+    # 📦 INVENTORY AGENT: Update stock in one conditional statement
+    if inventory_updates:
+        try:
+            await stock_engine.decrement_stock(db, current_user.store_id, quantities)
+        except InsufficientStockError:
+            await db.rollback()
+            raise HTTPException(
+                status_code=409,
+                detail="Stock changed during transaction. Please retry."
+            )
+        stock_result = await inventory_agent.deduct_stock_from_sale(inventory_updates, db)
+    
     db.add(bill)
-    await db.flush()  # Get bill ID
+    try:
+        await db.flush()  # Get bill ID
+        if bill_data.local_id:
+            await claim_local_ids(db, current_user.store_id, {bill_data.local_id: bill.id})
+    except IntegrityError:
+        if not bill_data.local_id:
+            raise
+        # A concurrent replay of this offline bill claimed its local_id first
+        await db.rollback()
+        existing = await find_offline_bills(db, current_user.store_id, [bill_data.local_id])
+        if bill_data.local_id not in existing:
+            raise
+        return await offline_bill_response(db, existing[bill_data.local_id])
+    
+    # Create bill items (flushed as one multi-row insert)
+    db.add_all([
+        BillItem(bill_id=bill.id, bill_date=bill.bill_date, **item_data)
+        for item_data in processed_items
+    ])
     
-    # Create bill items
-    for item_data in processed_items:
-        bill_item = BillItem(
-            bill_id=bill.id,
-            **item_data
-        )
-        db.add(bill_item)
+    # 🖨️ Queue the receipt in the same transaction as the bill
+    print_job = None
+    if auto_print:
+        print_job = await print_spooler.enqueue(db, bill.id)
     
-    # 📦 INVENTORY AGENT: Update stock
-    if inventory_updates:
-        stock_result = await inventory_agent.deduct_stock_from_sale(inventory_updates, db)
-        
-        # Update products in database
-        for update in inventory_updates:
-            await db.execute(
-                Product.__table__.update()
-                .where(Product.id == update["product_id"])
-                .values(current_stock=Product.current_stock - update["quantity"])
-            )
+    # 📊 Live sales counters: upsert today's summary rows with this bill
+    sales = await sales_counters.record(db, current_user.store_id, [
+        SaleRecord.from_bill(bill, sum(item.quantity for item in bill_data.items))
+    ])
     
     await db.commit()
+    sales_counters.apply(current_user.store_id, sales)
     await db.refresh(bill)
     
     # Get items for response
-    items_result = await db.execute(
-        select(BillItem).where(BillItem.bill_id == bill.id)
-    )
-    bill.items = items_result.scalars().all()
+    await db.refresh(bill, ["items"])
     
-    # 🖨️ PRINT AGENT: Auto-print if enabled
-    print_result = None
-    if auto_print:
-        bill_for_print = {
-            "id": bill.id,
-            "bill_number": bill.bill_number,
-            "store_name": store.name if store else "KadaiGPT Store",
-            "items": [
-                {
-                    "product_name": item.product_name,
-                    "quantity": item.quantity,
-                    "total": item.total
-                }
-                for item in bill.items
-            ],
-            "total_amount": bill.total_amount
-        }
-        
-        # Get print decision
-        print_decision = await print_agent.decide_print_strategy(bill_for_print)
-        
-        if print_decision.should_print:
-            # Generate receipt content
-            receipt_content = print_agent.generate_receipt_content(bill_for_print)
-            
-            # Execute silent print
-            print_result = await print_agent.execute_silent_print(
-                receipt_content,
-                print_decision.printer_name
-            )
-            
-            # Update bill print status
-            if print_result.get("success"):
-                bill.is_printed = True
-                bill.print_count = 1
-                await db.commit()
+    # 🖨️ PRINT AGENT: Hand the queued job to the spooler (prints in the background)
+    if print_job:
+        print_spooler.wake(print_job.printer_name)
     
     # Build response
     response = BillResponse.model_validate(bill)
@@ -387,6 +405,235 @@ async def create_bill(
     return response
 
 
+async def generate_offline_bill_numbers(db: AsyncSession, count: int) -> List[str]:
+    """Generate `count` offline bill numbers unique within the batch and the table"""
+    numbers = set()
+    while len(numbers) < count:
+        numbers.add(offline_agent.generate_offline_bill_number("OFL"))
+    
+    taken_result = await db.execute(select(Bill.bill_number).where(Bill.bill_number.in_(numbers)))
+    taken = set(taken_result.scalars().all())
+    numbers -= taken
+    while len(numbers) < count:
+        candidate = offline_agent.generate_offline_bill_number("OFL")
+        if candidate not in taken:
+            numbers.add(candidate)
+    return list(numbers)
+
+
+@router.post("/batch", response_model=BillBatchResponse)
+async def create_bills_batch(
+    batch: BillBatchCreate,
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    📶 OFFLINE AGENT: Ingest bills replayed by an offline terminal in one request
+    
+    - Idempotent on local_id: bills already on the server come back as "duplicate"
+    - Bills and bill items are written with multi-row inserts
+    - Stock is decremented once per product across the whole batch
+    - A bill that would drive stock negative is rejected on its own; the rest
+      of the batch still goes through
+    
+    Bills are not auto-printed; the terminal printed them while offline.
+    """
+    store_id = current_user.store_id
+    results: Dict[int, BillBatchResult] = {}
+    candidates = []
+    first_index_by_local_id: Dict[str, int] = {}
+    repeated = []
+    
+    for index, bill_data in enumerate(batch.bills):
+        if not bill_data.local_id:
+            results[index] = BillBatchResult(
+                local_id=None, status="rejected",
+                error={"error": "local_id_required", "message": "Offline bills must carry a local_id"}
+            )
+        elif not bill_data.items:
+            results[index] = BillBatchResult(
+                local_id=bill_data.local_id, status="rejected",
+                error={"error": "empty_bill", "message": "Bill must have at least one item"}
+            )
+        elif bill_data.local_id in first_index_by_local_id:
+            repeated.append(index)
+        else:
+            first_index_by_local_id[bill_data.local_id] = index
+            candidates.append((index, bill_data))
+    
+    # Bills synced by an earlier (possibly interrupted) attempt
+    if candidates:
+        existing = await find_offline_bills(db, store_id, [bill_data.local_id for _, bill_data in candidates])
+        for index, bill_data in candidates:
+            row = existing.get(bill_data.local_id)
+            if row:
+                results[index] = BillBatchResult(
+                    local_id=row.local_id, status="duplicate",
+                    bill_id=row.id, bill_number=row.bill_number
+                )
+        candidates = [(index, bill_data) for index, bill_data in candidates if index not in results]
+    
+    # 🛡️ Lock every product referenced anywhere in the batch, once
+    products = await stock_engine.lock_products(
+        db, store_id,
+        {item.product_id for _, bill_data in candidates for item in bill_data.items if item.product_id}
+    )
+    remaining = {product_id: product.current_stock or 0 for product_id, product in products.items()}
+    
+    # Walk bills in order, rejecting any that the remaining stock cannot cover
+    accepted = []
+    batch_quantities: Dict[int, float] = {}
+    for index, bill_data in candidates:
+        quantities = stock_engine.aggregate_quantities(
+            (item.product_id, item.quantity) for item in bill_data.items
+        )
+        quantities = {pid: qty for pid, qty in quantities.items() if pid in products}
+        shortfalls = [
+            {
+                "product_name": products[pid].name,
+                "product_id": pid,
+                "available": remaining[pid],
+                "requested": qty,
+                "shortfall": round(qty - remaining[pid], 2)
+            }
+            for pid, qty in quantities.items() if remaining[pid] < qty
+        ]
+        if shortfalls:
+            results[index] = BillBatchResult(
+                local_id=bill_data.local_id, status="rejected",
+                error={
+                    "error": "insufficient_stock",
+                    "message": f"{len(shortfalls)} item(s) have insufficient stock",
+                    "items": shortfalls
+                }
+            )
+            continue
+        for pid, qty in quantities.items():
+            remaining[pid] -= qty
+            batch_quantities[pid] = batch_quantities.get(pid, 0) + qty
+        accepted.append((index, bill_data))
+    
+    if accepted:
+        bill_numbers = await generate_offline_bill_numbers(db, len(accepted))
+        bill_rows = []
+        lines_by_local_id = {}
+        priced = price_bills([bill_data.items for _, bill_data in accepted])
+        for (index, bill_data), bill_number, (processed_items, totals) in zip(accepted, bill_numbers, priced):
+            amount_paid = bill_data.amount_paid if bill_data.amount_paid else totals["total_amount"]
+            bill_rows.append({
+                "store_id": store_id,
+                "cashier_id": current_user.id,
+                "bill_number": bill_number,
+                "customer_name": bill_data.customer_name,
+                "customer_phone": bill_data.customer_phone,
+                "subtotal": totals["subtotal"],
+                "discount_amount": totals["discount_amount"],
+                "tax_amount": totals["tax_amount"],
+                "total_amount": totals["total_amount"],
+                "payment_method": bill_data.payment_method,
+                "amount_paid": amount_paid,
+                "change_amount": pricing_engine.change_due(amount_paid, totals["total_amount"]),
+                "status": BillStatus.COMPLETED,
+                "local_id": bill_data.local_id
+            })
+            lines_by_local_id[bill_data.local_id] = processed_items
+        
+        try:
+            # Multi-row inserts: one statement for bills, one for their items
+            inserted = await db.execute(
+                insert(Bill).returning(
+                    Bill.id, Bill.local_id, Bill.bill_number, Bill.bill_date, sort_by_parameter_order=True
+                ),
+                bill_rows
+            )
+            created = {row.local_id: row for row in inserted.all()}
+            await claim_local_ids(db, store_id, {local_id: row.id for local_id, row in created.items()})
+            change_feed.record(db, store_id, "bill", [row.id for row in created.values()])
+            await db.execute(insert(BillItem), [
+                {"bill_id": created[local_id].id, "bill_date": created[local_id].bill_date, **line}
+                for local_id, lines in lines_by_local_id.items()
+                for line in lines
+            ])
+            
+            # 📦 One aggregated decrement per product for the whole batch
+            await stock_engine.decrement_stock(db, store_id, batch_quantities)
+            
+            for row in bill_rows:
+                await log_audit_event(
+                    db=db,
+                    store_id=store_id,
+                    user_id=current_user.id,
+                    action="create",
+                    entity_type="bill",
+                    entity_id=created[row["local_id"]].id,
+                    new_values={
+                        "bill_number": row["bill_number"],
+                        "total_amount": row["total_amount"],
+                        "payment_method": row["payment_method"].value,
+                        "items_count": len(lines_by_local_id[row["local_id"]]),
+                        "customer_name": row["customer_name"],
+                        "source": "offline_batch",
+                    }
+                )
+            
+            # 📊 Live sales counters: one upsert for all bills of the batch
+            sales = await sales_counters.record(db, store_id, [
+                SaleRecord(
+                    bill_time=local_bill_time(created[row["local_id"]].bill_date),
+                    total_amount=row["total_amount"],
+                    tax_amount=row["tax_amount"],
+                    discount_amount=row["discount_amount"],
+                    payment_method=row["payment_method"].value,
+                    items_sold=sum(line["quantity"] for line in lines_by_local_id[row["local_id"]])
+                )
+                for row in bill_rows
+            ])
+            await db.commit()
+        except (InsufficientStockError, IntegrityError):
+            await db.rollback()
+            raise HTTPException(
+                status_code=409,
+                detail="Stock or bills changed during sync. Please retry the batch."
+            )
+        
+        sales_counters.apply(store_id, sales)
+        
+        await inventory_agent.deduct_stock_from_sale([
+            {
+                "product_id": pid,
+                "product_name": products[pid].name,
+                "quantity": qty,
+                "current_stock": products[pid].current_stock,
+                "min_stock": products[pid].min_stock_alert
+            }
+            for pid, qty in batch_quantities.items()
+        ], db)
+        
+        for index, bill_data in accepted:
+            row = created[bill_data.local_id]
+            results[index] = BillBatchResult(
+                local_id=row.local_id, status="created",
+                bill_id=row.id, bill_number=row.bill_number
+            )
+    
+    # Repeats inside the batch resolve to whatever their first occurrence became
+    for index in repeated:
+        first = results[first_index_by_local_id[batch.bills[index].local_id]]
+        results[index] = BillBatchResult(
+            local_id=first.local_id,
+            status="duplicate" if first.status != "rejected" else "rejected",
+            bill_id=first.bill_id, bill_number=first.bill_number, error=first.error
+        )
+    
+    ordered = [results[index] for index in range(len(batch.bills))]
+    return BillBatchResponse(
+        created_count=sum(1 for r in ordered if r.status == "created"),
+        duplicate_count=sum(1 for r in ordered if r.status == "duplicate"),
+        rejected_count=sum(1 for r in ordered if r.status == "rejected"),
+        results=ordered
+    )
+
+
 @router.post("/{bill_id}/print", response_model=PrintStatus)
 async def print_bill(
     bill_id: int,
@@ -396,126 +643,241 @@ async def print_bill(
 ):
     """
     🖨️ PRINT AGENT: Print or reprint a bill
+    
+    Queues a print job and returns immediately. Poll /print/status?job_id=
+    for the outcome.
     """
+    if await bill_cache.get_version(db, bill_id, current_user.store_id) is None:
+        raise HTTPException(status_code=404, detail="Bill not found")
+    
+    # Queue the job; the spooler's printer worker handles retries
+    print_job = await print_spooler.enqueue(db, bill_id, print_request.printer_name)
+    await db.commit()
+    print_spooler.wake(print_job.printer_name)
+    
+    return PrintStatus(
+        job_id=print_job.id,
+        status=print_job.status,
+        message=f"Queued for printing on {print_job.printer_name}",
+        attempts=print_job.attempts
+    )
+
+
+async def lock_bill_for_update(db: AsyncSession, bill_id: int, store_id: int) -> Bill:
+    """Load and row-lock a store's bill so cancel/refund of the same bill serialize"""
     result = await db.execute(
-        select(Bill).where(
-            and_(
-                Bill.id == bill_id,
-                Bill.store_id == current_user.store_id
-            )
-        )
+        select(Bill)
+        .where(and_(Bill.id == bill_id, Bill.store_id == store_id))
+        .with_for_update()
     )
     bill = result.scalar_one_or_none()
-    
     if not bill:
         raise HTTPException(status_code=404, detail="Bill not found")
+    return bill
+
+
+def bill_status_value(bill: Bill) -> str:
+    return bill.status.value if hasattr(bill.status, "value") else str(bill.status)
+
+
+@router.post("/{bill_id}/cancel")
+async def cancel_bill(
+    bill_id: int,
+    current_user: User = Depends(require_min_role(UserRole.MANAGER)),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Cancel a bill and restore inventory (Manager/Owner only)
     
-    # Get items
-    items_result = await db.execute(
-        select(BillItem).where(BillItem.bill_id == bill.id)
-    )
-    items = items_result.scalars().all()
-    
-    # Get store name
-    store_result = await db.execute(
-        select(Store).where(Store.id == current_user.store_id)
-    )
-    store = store_result.scalar_one_or_none()
+    Stock comes back in one UPDATE aggregated by product (net of any partial
+    refunds), in the same transaction as the status change and audit event.
+    Product rows are only locked for that final statement.
+    """
+    bill = await lock_bill_for_update(db, bill_id, current_user.store_id)
     
-    # Prepare bill data for printing
-    bill_for_print = {
-        "id": bill.id,
-        "bill_number": bill.bill_number,
-        "store_name": store.name if store else "KadaiGPT Store",
-        "items": [
-            {
-                "product_name": item.product_name,
-                "quantity": item.quantity,
-                "total": item.total
-            }
-            for item in items
-        ],
-        "total_amount": bill.total_amount
-    }
+    if bill.status == BillStatus.CANCELLED:
+        raise HTTPException(status_code=400, detail="Bill already cancelled")
+    old_status = bill_status_value(bill)
     
-    # Get print decision
-    print_decision = await print_agent.decide_print_strategy(
-        bill_for_print,
-        print_request.printer_name
+    # Quantities still out with the customer, per product
+    remaining = func.sum(BillItem.quantity - func.coalesce(BillItem.refunded_quantity, 0))
+    result = await db.execute(
+        select(BillItem.product_id, remaining)
+        .where(BillItem.bill_id == bill.id)
+        .group_by(BillItem.product_id)
     )
+    per_product = {product_id: quantity or 0 for product_id, quantity in result.all()}
+    items_returned = sum(per_product.values())
+    restock = {pid: qty for pid, qty in per_product.items() if pid and qty > 0}
+    
+    # 📊 Take what is left of the bill out of its day's sales counters
+    sales = []
+    if bill.status in (BillStatus.COMPLETED, BillStatus.REFUNDED):
+        sale = SaleRecord.from_bill(bill, items_returned)
+        if bill.status == BillStatus.REFUNDED:
+            sale = await remaining_sale(db, bill, sale)
+        sales = await sales_counters.record(db, bill.store_id, [sale], sign=-1)
     
-    if not print_decision.should_print:
-        return PrintStatus(
-            job_id=0,
-            status="failed",
-            message=print_decision.reason,
-            attempts=0
-        )
+    bill.status = BillStatus.CANCELLED
     
-    # Generate and print
-    receipt_content = print_agent.generate_receipt_content(bill_for_print)
-    print_result = await print_agent.execute_silent_print(
-        receipt_content,
-        print_decision.printer_name
+    # 📝 AUDIT: written in the same transaction
+    await log_audit_event(
+        db=db,
+        store_id=current_user.store_id,
+        user_id=current_user.id,
+        action="cancel",
+        entity_type="bill",
+        entity_id=bill.id,
+        old_values={"status": old_status},
+        new_values={
+            "status": BillStatus.CANCELLED.value,
+            "bill_number": bill.bill_number,
+            "restored": {str(pid): qty for pid, qty in restock.items()},
+        }
     )
     
-    # Update bill
-    if print_result.get("success"):
-        bill.is_printed = True
-        bill.print_count += 1
-        await db.commit()
+    # 📦 One aggregated stock restore, last so product locks are held briefly
+    await stock_engine.restore_stock(db, current_user.store_id, restock)
+    await db.commit()
+    sales_counters.apply(bill.store_id, sales)
+    bill_cache.invalidate(bill_id)
     
-    return PrintStatus(
-        job_id=bill.id,
-        status="completed" if print_result.get("success") else "failed",
-        message=print_result.get("message", ""),
-        attempts=print_result.get("attempts", 1)
+    return {"message": "Bill cancelled and inventory restored"}
+
+
+async def remaining_sale(db: AsyncSession, bill: Bill, sale: SaleRecord) -> SaleRecord:
+    """Reduce a partially refunded bill's sale record to its unrefunded part"""
+    result = await db.execute(
+        select(
+            BillItem.quantity, BillItem.refunded_quantity,
+            BillItem.total, BillItem.tax_amount, BillItem.discount_amount
+        ).where(BillItem.bill_id == bill.id)
     )
+    tax = discount = 0
+    for quantity, refunded, total, tax_amount, discount_amount in result.all():
+        tax += pricing_engine.prorate(tax_amount, refunded, quantity)
+        discount += pricing_engine.prorate(discount_amount, refunded, quantity)
+    sale.total_amount = to_rupees(to_paise(bill.total_amount) - to_paise(bill.refunded_amount))
+    sale.tax_amount = to_rupees(to_paise(bill.tax_amount) - tax)
+    sale.discount_amount = to_rupees(to_paise(bill.discount_amount) - discount)
+    return sale
 
 
-@router.post("/{bill_id}/cancel")
-async def cancel_bill(
+@router.post("/{bill_id}/refund")
+async def refund_bill(
     bill_id: int,
+    refund: BillRefundCreate,
     current_user: User = Depends(require_min_role(UserRole.MANAGER)),
     db: AsyncSession = Depends(get_db)
 ):
-    """Cancel a bill and restore inventory (Manager/Owner only)"""
+    """
+    Partially refund a bill and restore the returned stock (Manager/Owner only)
+    
+    Marks the bill REFUNDED, records refunded quantities per line and the
+    refunded amount (line totals prorated in paise), restores stock in one
+    aggregated UPDATE and writes an audit event, all in one transaction.
+    """
+    bill = await lock_bill_for_update(db, bill_id, current_user.store_id)
+    
+    if bill.status not in (BillStatus.COMPLETED, BillStatus.REFUNDED):
+        raise HTTPException(status_code=400, detail=f"Cannot refund a {bill_status_value(bill)} bill")
+    old_status = bill_status_value(bill)
+    
+    requested: Dict[int, float] = {}
+    for line in refund.items:
+        requested[line.bill_item_id] = requested.get(line.bill_item_id, 0) + line.quantity
+    
     result = await db.execute(
-        select(Bill).where(
-            and_(
-                Bill.id == bill_id,
-                Bill.store_id == current_user.store_id
-            )
-        )
+        select(BillItem).where(and_(BillItem.bill_id == bill.id, BillItem.id.in_(requested)))
     )
-    bill = result.scalar_one_or_none()
+    items = {item.id: item for item in result.scalars().all()}
+    missing = [item_id for item_id in requested if item_id not in items]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Bill items not found: {missing}")
     
-    if not bill:
-        raise HTTPException(status_code=404, detail="Bill not found")
+    over = [
+        {
+            "bill_item_id": item.id,
+            "product_name": item.product_name,
+            "refundable": round(item.quantity - (item.refunded_quantity or 0), 3),
+            "requested": requested[item.id]
+        }
+        for item in items.values()
+        if requested[item.id] > item.quantity - (item.refunded_quantity or 0) + 1e-9
+    ]
+    if over:
+        raise HTTPException(
+            status_code=400,
+            detail={"error": "refund_exceeds_sold", "message": "Refund exceeds quantity sold", "items": over}
+        )
     
-    if bill.status == BillStatus.CANCELLED:
-        raise HTTPException(status_code=400, detail="Bill already cancelled")
+    # Amounts: cumulative proration so repeated partial refunds add up exactly
+    refund_total = refund_tax = refund_discount = 0
+    restock: Dict[int, float] = {}
+    for item in items.values():
+        before = item.refunded_quantity or 0
+        after = before + requested[item.id]
+        refund_total += pricing_engine.prorate(item.total, after, item.quantity) - pricing_engine.prorate(item.total, before, item.quantity)
+        refund_tax += pricing_engine.prorate(item.tax_amount, after, item.quantity) - pricing_engine.prorate(item.tax_amount, before, item.quantity)
+        refund_discount += pricing_engine.prorate(item.discount_amount, after, item.quantity) - pricing_engine.prorate(item.discount_amount, before, item.quantity)
+        item.refunded_quantity = after
+        if item.product_id:
+            restock[item.product_id] = restock.get(item.product_id, 0) + requested[item.id]
+    
+    bill.refunded_amount = to_rupees(to_paise(bill.refunded_amount) + refund_total)
+    bill.status = BillStatus.REFUNDED
+    
+    # 📊 Refunds reduce the sale's day without removing the bill
+    sales = await sales_counters.record(db, bill.store_id, [SaleRecord(
+        bill_time=local_bill_time(bill.bill_date),
+        total_amount=to_rupees(refund_total),
+        tax_amount=to_rupees(refund_tax),
+        discount_amount=to_rupees(refund_discount),
+        payment_method=bill.payment_method.value if hasattr(bill.payment_method, "value") else str(bill.payment_method),
+        items_sold=sum(requested.values()),
+        bills=0
+    )], sign=-1)
     
-    # Get items to restore inventory
-    items_result = await db.execute(
-        select(BillItem).where(BillItem.bill_id == bill.id)
+    await log_audit_event(
+        db=db,
+        store_id=current_user.store_id,
+        user_id=current_user.id,
+        action="refund",
+        entity_type="bill",
+        entity_id=bill.id,
+        old_values={"status": old_status},
+        new_values={
+            "status": BillStatus.REFUNDED.value,
+            "bill_number": bill.bill_number,
+            "refund_amount": to_rupees(refund_total),
+            "items": {str(item_id): qty for item_id, qty in requested.items()},
+            "reason": refund.reason,
+        }
     )
-    items = items_result.scalars().all()
     
-    # Restore inventory
-    for item in items:
-        if item.product_id:
-            await db.execute(
-                Product.__table__.update()
-                .where(Product.id == item.product_id)
-                .values(current_stock=Product.current_stock + item.quantity)
-            )
+    # 📦 One aggregated stock restore, last so product locks are held briefly
+    await stock_engine.restore_stock(db, current_user.store_id, restock)
     
-    # Update bill status
-    bill.status = BillStatus.CANCELLED
+    response = {
+        "message": "Refund recorded and inventory restored",
+        "bill_id": bill.id,
+        "status": BillStatus.REFUNDED.value,
+        "refund_amount": to_rupees(refund_total),
+        "refunded_amount": bill.refunded_amount,
+        "items": [
+            {
+                "bill_item_id": item.id,
+                "refunded_quantity": item.refunded_quantity,
+                "remaining_quantity": round(item.quantity - item.refunded_quantity, 3)
+            }
+            for item in items.values()
+        ]
+    }
     await db.commit()
+    sales_counters.apply(bill.store_id, sales)
+    bill_cache.invalidate(bill_id)
     
-    return {"message": "Bill cancelled and inventory restored"}
+    return response
 
 
 # ==================== ANALYTICS ====================
@@ -526,46 +888,14 @@ async def get_today_analytics(
     db: AsyncSession = Depends(get_db)
 ):
     """Get today's sales analytics (Manager/Owner only)"""
-    today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-    today_end = today_start + timedelta(days=1)
+    # 📊 Live counters: O(1) in the number of bills made today
+    counters = (await sales_counters.get_today(db, current_user.store_id)).to_dict()
+    total_revenue = counters["revenue"]
     
-    # Today's bills
-    result = await db.execute(
-        select(Bill).where(
-            and_(
-                Bill.store_id == current_user.store_id,
-                Bill.status == BillStatus.COMPLETED,
-                Bill.bill_date >= today_start,
-                Bill.bill_date < today_end
-            )
-        )
-    )
-    bills = result.scalars().all()
-    
-    # Calculate metrics
-    total_revenue = sum(b.total_amount for b in bills)
-    total_bills = len(bills)
-    avg_bill_value = total_revenue / total_bills if total_bills > 0 else 0
-    
-    # Payment breakdown
-    payment_breakdown = {}
-    for bill in bills:
-        method = bill.payment_method.value
-        payment_breakdown[method] = payment_breakdown.get(method, 0) + bill.total_amount
-    
-    # Compare with yesterday
-    yesterday_start = today_start - timedelta(days=1)
-    yesterday_result = await db.execute(
-        select(func.sum(Bill.total_amount)).where(
-            and_(
-                Bill.store_id == current_user.store_id,
-                Bill.status == BillStatus.COMPLETED,
-                Bill.bill_date >= yesterday_start,
-                Bill.bill_date < today_start
-            )
-        )
+    # Compare with yesterday (its whole-day summary row)
+    yesterday_revenue = await sales_counters.get_day_revenue(
+        db, current_user.store_id, store_today() - timedelta(days=1)
     )
-    yesterday_revenue = yesterday_result.scalar() or 0
     
     revenue_change = 0
     if yesterday_revenue > 0:
@@ -573,13 +903,13 @@ async def get_today_analytics(
     
     return {
         "today": {
-            "revenue": round(total_revenue, 2),
-            "bills": total_bills,
-            "avg_bill_value": round(avg_bill_value, 2)
+            "revenue": total_revenue,
+            "bills": counters["bills"],
+            "avg_bill_value": counters["avg_bill_value"]
         },
-        "yesterday_revenue": round(yesterday_revenue, 2),
+        "yesterday_revenue": yesterday_revenue,
         "revenue_change_percent": round(revenue_change, 1),
-        "payment_breakdown": payment_breakdown
+        "payment_breakdown": counters["payment_breakdown"]
     }
 
 
@@ -589,36 +919,5 @@ async def get_hourly_sales(
     db: AsyncSession = Depends(get_db)
 ):
     """Get hourly sales breakdown for today"""
-    today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-    
-    result = await db.execute(
-        select(Bill).where(
-            and_(
-                Bill.store_id == current_user.store_id,
-                Bill.status == BillStatus.COMPLETED,
-                Bill.bill_date >= today_start
-            )
-        )
-    )
-    bills = result.scalars().all()
-    
-    # Group by hour
-    hourly_data = {}
-    for bill in bills:
-        hour = bill.bill_date.hour
-        if hour not in hourly_data:
-            hourly_data[hour] = {"bills": 0, "revenue": 0}
-        hourly_data[hour]["bills"] += 1
-        hourly_data[hour]["revenue"] += bill.total_amount
-    
-    # Format for chart
-    chart_data = []
-    for hour in range(24):
-        data = hourly_data.get(hour, {"bills": 0, "revenue": 0})
-        chart_data.append({
-            "hour": f"{hour:02d}:00",
-            "bills": data["bills"],
-            "revenue": round(data["revenue"], 2)
-        })
-    
-    return chart_data
+    counters = await sales_counters.get_today(db, current_user.store_id)
+    return counters.to_dict()["hourly"]
@@ -15,6 +15,7 @@ import re
 from app.database import get_db
 from app.models import User, Customer
 from app.routers.auth import get_current_user
+from app.services.idempotency import idempotent
 
 router = APIRouter(prefix="/customers", tags=["Customers"])
 
@@ -362,6 +363,7 @@ async def delete_customer(
 
 
 @router.post("/{customer_id}/payment", response_model=dict)
+@idempotent()
 async def record_payment(
     customer_id: int,
     payment: CustomerPayment,
@@ -398,6 +400,7 @@ async def record_payment(
 
 
 @router.post("/{customer_id}/credit", response_model=dict)
+@idempotent()
 async def add_credit(
     customer_id: int,
     credit: CustomerCredit,
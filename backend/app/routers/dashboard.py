@@ -19,7 +19,9 @@ from typing import Optional
 
 from app.database import get_db
 from app.models import User, Bill, Product, BillStatus
-from app.routers.auth import get_current_active_user
+from app.routers.auth import get_current_active_user, get_read_db
+from app.services.sales_counters import sales_counters, store_today, utc_day_bounds
+from app.services.inventory_insights import inventory_insights, LOW_STOCK
 
 router = APIRouter(prefix="/dashboard", tags=["Dashboard"])
 
@@ -31,57 +33,29 @@ async def get_dashboard_stats(
 ):
     """
     Get dashboard statistics for the current user's store
+    
+    Uses the primary: the live counters may rebuild missing summary rows.
     """
-    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    today = store_today()
     
     try:
-        # Get today's completed bills for the store
-        bills_result = await db.execute(
-            select(Bill)
-            .where(
-                and_(
-                    Bill.store_id == current_user.store_id,
-                    Bill.status == BillStatus.COMPLETED,
-                    Bill.bill_date >= today
-                )
-            )
-        )
-        today_bills = bills_result.scalars().all()
+        # 📊 Today's sales from the live counters (O(1) in today's bill count)
+        counters = await sales_counters.get_today(db, current_user.store_id)
         
-        # Get all active products for the store
-        products_result = await db.execute(
-            select(Product)
-            .where(
-                and_(
-                    Product.store_id == current_user.store_id,
-                    Product.is_active == True
-                )
-            )
-        )
-        products = products_result.scalars().all()
+        # 📦 Product and low-stock counts in one aggregate, no rows loaded
+        stock_counts = await inventory_insights.stock_counts(db, current_user.store_id)
         
         # Calculate stats using correct column names
-        today_sales = sum(float(bill.total_amount or 0) for bill in today_bills)
-        today_bills_count = len(today_bills)
-        avg_bill_value = today_sales / today_bills_count if today_bills_count > 0 else 0
-        low_stock_count = sum(
-            1 for p in products 
-            if (p.current_stock or 0) <= (p.min_stock_alert or 10)
-        )
+        today_stats = counters.to_dict()
+        today_sales = today_stats["revenue"]
+        today_bills_count = today_stats["bills"]
+        avg_bill_value = today_stats["avg_bill_value"]
+        low_stock_count = stock_counts["low_stock"]
         
         # Yesterday's stats for comparison
-        yesterday = today - timedelta(days=1)
-        yesterday_result = await db.execute(
-            select(func.sum(Bill.total_amount)).where(
-                and_(
-                    Bill.store_id == current_user.store_id,
-                    Bill.status == BillStatus.COMPLETED,
-                    Bill.bill_date >= yesterday,
-                    Bill.bill_date < today
-                )
-            )
+        yesterday_sales = await sales_counters.get_day_revenue(
+            db, current_user.store_id, today - timedelta(days=1)
         )
-        yesterday_sales = float(yesterday_result.scalar() or 0)
         
         # Revenue change
         revenue_change = 0
@@ -93,7 +67,7 @@ async def get_dashboard_stats(
             "todayBills": today_bills_count,
             "avgBillValue": round(avg_bill_value, 2),
             "lowStockCount": low_stock_count,
-            "totalProducts": len(products),
+            "totalProducts": stock_counts["total_products"],
             "yesterdaySales": round(yesterday_sales, 2),
             "revenueChange": revenue_change,
             "lastUpdated": datetime.now().isoformat()
@@ -117,7 +91,7 @@ async def get_dashboard_stats(
 async def get_activity_feed(
     limit: int = 10,
     current_user: User = Depends(get_current_active_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     Get recent activity feed for the dashboard
@@ -152,7 +126,7 @@ async def get_activity_feed(
                 and_(
                     Product.store_id == current_user.store_id,
                     Product.is_active == True,
-                    Product.current_stock <= Product.min_stock_alert
+                    LOW_STOCK
                 )
             )
             .limit(5)
@@ -204,7 +178,7 @@ def get_time_ago(dt: datetime) -> str:
 @router.get("/insights")
 async def get_ai_insights(
     current_user: User = Depends(get_current_active_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     Get AI-generated insights for the business
@@ -257,7 +231,7 @@ async def get_ai_insights(
             })
         
         # Sales insight
-        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        today, _ = utc_day_bounds(store_today())
         bills_result = await db.execute(
             select(func.count(Bill.id), func.sum(Bill.total_amount))
             .where(
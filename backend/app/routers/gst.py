@@ -8,9 +8,8 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
 from datetime import datetime
 
-from app.database import get_db
 from app.models import User
-from app.routers.auth import get_current_active_user
+from app.routers.auth import get_current_active_user, get_read_db
 from app.services.gst_engine import gst_engine
 
 router = APIRouter(prefix="/gst", tags=["GST Compliance"])
@@ -21,7 +20,7 @@ async def generate_gstr1(
     year: int = Query(default=None, description="Financial year"),
     month: int = Query(default=None, description="Month (1-12)"),
     current_user: User = Depends(get_current_active_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Generate GSTR-1 (Outward Supplies) report for a period"""
     if not year:
@@ -44,7 +43,7 @@ async def generate_gstr3b(
     year: int = Query(default=None),
     month: int = Query(default=None),
     current_user: User = Depends(get_current_active_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Generate GSTR-3B (Summary Return) for a period"""
     if not year:
@@ -86,7 +85,7 @@ async def calculate_tax(
 @router.get("/compliance-status")
 async def get_compliance_status(
     current_user: User = Depends(get_current_active_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Get overall GST compliance status with alerts and recommendations"""
     try:
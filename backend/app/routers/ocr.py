@@ -16,8 +16,11 @@ from app.database import get_db
 from app.models import HandwrittenBill, Product, User, OCRConfidence
 from app.schemas import OCRResult, HandwrittenBillResponse
 from app.routers.auth import get_current_active_user
-from app.agents import ocr_agent
 from app.config import settings
+from app.utils.lazy import LazyObject
+
+# Gemini/PIL-backed agent, loaded on the first OCR request
+ocr_agent = LazyObject("app.agents.ocr_agent:ocr_agent")
 
 
 router = APIRouter(prefix="/ocr", tags=["OCR Processing"])
@@ -62,6 +65,8 @@ async def process_handwritten_bill(
         {"name": p.name, "sku": p.sku, "price": p.selling_price}
         for p in products
     ]
+    # End the read transaction so no connection is held during the OCR call
+    await db.commit()
     
     # Process with OCR Agent
     result = await ocr_agent.process_handwritten_bill(
@@ -181,6 +186,8 @@ async def process_handwritten_bill_base64(
         {"name": p.name, "sku": p.sku, "price": p.selling_price}
         for p in products
     ]
+    # End the read transaction so no connection is held during the OCR call
+    await db.commit()
     
     # Process with OCR Agent
     result = await ocr_agent.process_handwritten_bill(
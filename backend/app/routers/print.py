@@ -5,11 +5,17 @@ Handles receipt printing requests
 
 from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional, List, Dict, Any
 from datetime import datetime
 
+from ..database import get_db
+from ..models import Bill, PrintJob, User
+from .auth import get_current_active_user
 from ..agents.print_agent import print_agent, PrinterInfo
 from ..agents.thermal_printer import print_receipt, ReceiptBuilder
+from ..services.print_spooler import print_spooler
 
 router = APIRouter(prefix="/print", tags=["Printing"])
 
@@ -198,20 +204,56 @@ async def test_print(printer_name: Optional[str] = "auto"):
 
 
 @router.get("/status")
-async def get_print_status():
+async def get_print_status(
+    job_id: Optional[int] = None,
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_db)
+):
     """
     📊 PRINT AGENT STATUS
     
-    Returns the current status of the print agent.
+    Returns the current status of the print agent and the print spooler
+    queues of the user's store. Pass job_id to get the state of one of the
+    store's print jobs.
     """
     printers = await print_agent.get_available_printers()
     ready_count = sum(1 for p in printers if p.status.value == "ready")
+    spooler_status = print_spooler.get_status()
+    spooler_status.pop("last_error")  # may come from another store's job
     
-    return {
+    status = {
         "agent": "PrintAgent",
         "status": "active",
         "total_printers": len(printers),
         "ready_printers": ready_count,
         "last_scan": print_agent.last_scan_time.isoformat() if print_agent.last_scan_time else None,
-        "decisions_logged": len(print_agent.decision_log)
+        "decisions_logged": len(print_agent.decision_log),
+        "spooler": {
+            **spooler_status,
+            "queues": await print_spooler.get_queue_counts(db, current_user.store_id)
+        }
     }
+    
+    if job_id is not None:
+        # 🔒 Jobs are reachable only through their bill's store
+        result = await db.execute(
+            select(PrintJob)
+            .join(Bill, Bill.id == PrintJob.bill_id)
+            .where(PrintJob.id == job_id, Bill.store_id == current_user.store_id)
+        )
+        job = result.scalar_one_or_none()
+        if not job:
+            raise HTTPException(status_code=404, detail="Print job not found")
+        status["job"] = {
+            "id": job.id,
+            "bill_id": job.bill_id,
+            "printer_name": job.printer_name,
+            "status": job.status,
+            "attempts": job.attempts,
+            "max_attempts": job.max_attempts,
+            "last_error": job.last_error,
+            "created_at": job.created_at.isoformat() if job.created_at else None,
+            "completed_at": job.completed_at.isoformat() if job.completed_at else None
+        }
+    
+    return status
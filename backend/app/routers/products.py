@@ -5,17 +5,21 @@ Product and category management with inventory tracking
 
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, or_
+from sqlalchemy import select, and_
 from typing import List, Optional
 
 from app.database import get_db
 from app.models import Product, Category, User
 from app.schemas import (
     ProductCreate, ProductUpdate, ProductResponse,
+    ProductLookupBatch, ProductLookupResult,
     CategoryCreate, CategoryResponse
 )
-from app.routers.auth import get_current_active_user
+from app.routers.auth import get_current_active_user, get_read_db
 from app.agents import inventory_agent
+from app.services.product_search import product_search
+from app.services.barcode_cache import barcode_cache
+from app.services.inventory_insights import inventory_insights, product_dict, days_of_cover
 
 
 router = APIRouter(prefix="/products", tags=["Products"])
@@ -88,16 +92,30 @@ async def list_products(
     skip: int = 0,
     limit: int = Query(default=100, le=500),
     current_user: User = Depends(get_current_active_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     Get all products with filtering options
+    
+    Read-only: on an edge box this runs on the reader pool, not the single
+    writer connection billing needs.
     """
     try:
         # Check if user has a store
         if not current_user.store_id:
             return []
         
+        # 🔎 Typeahead: ranked by the per-store search index, not ILIKE scans
+        if search:
+            return await product_search.search(
+                db, current_user.store_id, search,
+                category_id=category_id,
+                active_only=active_only,
+                low_stock_only=low_stock_only,
+                skip=skip,
+                limit=limit
+            )
+        
         query = select(Product).where(Product.store_id == current_user.store_id)
         
         if active_only:
@@ -109,16 +127,6 @@ async def list_products(
         if low_stock_only:
             query = query.where(Product.current_stock <= Product.min_stock_alert)
         
-        if search:
-            search_term = f"%{search}%"
-            query = query.where(
-                or_(
-                    Product.name.ilike(search_term),
-                    Product.sku.ilike(search_term),
-                    Product.barcode.ilike(search_term)
-                )
-            )
-        
         query = query.offset(skip).limit(limit)
         result = await db.execute(query)
         
@@ -129,6 +137,40 @@ async def list_products(
         return []
 
 
+# 📷 Counter scans: served from the per-store barcode/SKU map (misses read
+# through get_read_db, so scans never queue behind a bill on the edge writer)
+@router.get("/lookup", response_model=ProductResponse)
+async def lookup_product(
+    code: str = Query(..., min_length=1, max_length=64),
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Resolve one scanned barcode or SKU"""
+    product = None
+    if current_user.store_id:
+        product = await barcode_cache.lookup(db, current_user.store_id, code)
+    if not product:
+        raise HTTPException(status_code=404, detail="No product with this barcode or SKU")
+    return product
+
+
+@router.post("/lookup/batch", response_model=ProductLookupResult)
+async def lookup_products(
+    batch: ProductLookupBatch,
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Resolve every code a handheld scanned with at most one query"""
+    found = {}
+    if current_user.store_id:
+        found = await barcode_cache.resolve(db, current_user.store_id, batch.codes)
+    return {
+        "products": found,
+        "missing": [code for code in dict.fromkeys(c.strip() for c in batch.codes)
+                    if code and code not in found]
+    }
+
+
 @router.get("/{product_id}", response_model=ProductResponse)
 async def get_product(
     product_id: int,
@@ -302,35 +344,16 @@ async def get_inventory_insights(
     """
     🧠 AI AGENT: Get intelligent inventory insights
     """
-    result = await db.execute(
-        select(Product).where(
-            and_(
-                Product.store_id == current_user.store_id,
-                Product.is_active == True
-            )
-        )
-    )
-    products = result.scalars().all()
-    
-    # Convert to dicts for agent
-    product_dicts = [
-        {
-            "id": p.id,
-            "name": p.name,
-            "current_stock": p.current_stock,
-            "min_stock_alert": p.min_stock_alert,
-            "cost_price": p.cost_price,
-            "selling_price": p.selling_price,
-            "expiry_date": p.expiry_date
-        }
-        for p in products
-    ]
+    # 📊 Counted and ranked in SQL; only the top 20 rows are loaded
+    await inventory_insights.ensure_fresh(db, current_user.store_id)
+    counts = await inventory_insights.stock_counts(db, current_user.store_id)
+    rows = await inventory_insights.top_priority(db, current_user.store_id, limit=20)
     
-    insights = await inventory_agent.analyze_inventory(product_dicts)
+    insights = await inventory_agent.analyze_inventory([product_dict(row) for row in rows])
     
     # Convert to serializable format
     return {
-        "total_products": len(products),
+        "total_products": counts["total_products"],
         "insights": [
             {
                 "product_id": i.product_id,
@@ -342,7 +365,7 @@ async def get_inventory_insights(
                 "recommendation": i.recommendation,
                 "priority": i.priority
             }
-            for i in insights[:20]  # Top 20 priority items
+            for i in insights  # Top 20 priority items
         ]
     }
 
@@ -355,28 +378,11 @@ async def get_reorder_list(
     """
     🧠 AI AGENT: Get smart reorder suggestions
     """
-    result = await db.execute(
-        select(Product).where(
-            and_(
-                Product.store_id == current_user.store_id,
-                Product.is_active == True
-            )
-        )
-    )
-    products = result.scalars().all()
-    
-    product_dicts = [
-        {
-            "id": p.id,
-            "name": p.name,
-            "current_stock": p.current_stock,
-            "min_stock_alert": p.min_stock_alert,
-            "cost_price": p.cost_price
-        }
-        for p in products
-    ]
+    # 📊 Only low-stock products (partial index), fewest days of cover first
+    await inventory_insights.ensure_fresh(db, current_user.store_id)
+    rows = await inventory_insights.low_stock(db, current_user.store_id, exclude_expiring=True)
     
-    suggestions = await inventory_agent.generate_reorder_list(product_dicts)
+    suggestions = await inventory_agent.generate_reorder_list([product_dict(row) for row in rows])
     
     return {
         "total_items": len(suggestions),
@@ -401,28 +407,22 @@ async def get_low_stock_products(
     current_user: User = Depends(get_current_active_user),
     db: AsyncSession = Depends(get_db)
 ):
-    """Get all products with low stock"""
-    result = await db.execute(
-        select(Product).where(
-            and_(
-                Product.store_id == current_user.store_id,
-                Product.is_active == True,
-                Product.current_stock <= Product.min_stock_alert
-            )
-        ).order_by(Product.current_stock)
-    )
-    products = result.scalars().all()
+    """Get all products with low stock, fewest days of cover first"""
+    await inventory_insights.ensure_fresh(db, current_user.store_id)
+    rows = await inventory_insights.low_stock(db, current_user.store_id)
     
     return {
-        "count": len(products),
+        "count": len(rows),
         "products": [
             {
-                "id": p.id,
-                "name": p.name,
-                "current_stock": p.current_stock,
-                "min_stock_alert": p.min_stock_alert,
-                "selling_price": p.selling_price
+                "id": row.id,
+                "name": row.name,
+                "current_stock": row.current_stock,
+                "min_stock_alert": row.min_stock_alert,
+                "selling_price": row.selling_price,
+                "sales_velocity": row.sales_velocity,
+                "days_of_cover": days_of_cover(row)
             }
-            for p in products
+            for row in rows
         ]
     }
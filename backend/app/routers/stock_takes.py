@@ -0,0 +1,156 @@
+"""
+KadaiGPT - Stock Take Router
+Physical stock counts: open, stream counts, review variance, apply
+"""
+
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import get_db
+from app.models import StockTake, User, UserRole
+from app.rbac import require_min_role
+from app.routers.auth import get_current_active_user
+from app.schemas import StockCountBatch, StockTakeCreate, StockTakeResponse
+from app.services.stock_take import StockTakeClosedError, stock_takes
+
+
+router = APIRouter(prefix="/stock-takes", tags=["Stock Take"])
+
+
+async def get_stock_take(db: AsyncSession, stock_take_id: int, store_id: int, lock: bool = False) -> StockTake:
+    take = await stock_takes.load(db, store_id, stock_take_id, lock=lock)
+    if not take:
+        raise HTTPException(status_code=404, detail="Stock take not found")
+    return take
+
+
+def closed(error: StockTakeClosedError) -> HTTPException:
+    return HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(error))
+
+
+def already_open(existing: Optional[StockTake]) -> HTTPException:
+    detail = f"Stock take {existing.id} is already open" if existing else "A stock take is already open"
+    return HTTPException(status_code=status.HTTP_409_CONFLICT, detail=detail)
+
+
+@router.post("", response_model=StockTakeResponse, status_code=status.HTTP_201_CREATED)
+async def open_stock_take(
+    body: StockTakeCreate,
+    current_user: User = Depends(require_min_role(UserRole.MANAGER)),
+    db: AsyncSession = Depends(get_db)
+):
+    """Open a stock take; a store counts one at a time (uq_stock_takes_open)"""
+    existing = await stock_takes.open_session(db, current_user.store_id)
+    if existing:
+        raise already_open(existing)
+    take = StockTake(store_id=current_user.store_id, user_id=current_user.id, note=body.note)
+    db.add(take)
+    try:
+        await db.commit()
+    except IntegrityError:
+        # Another manager opened one between the check and the insert
+        await db.rollback()
+        raise already_open(await stock_takes.open_session(db, current_user.store_id))
+    await db.refresh(take)
+    return take
+
+
+@router.get("/{stock_take_id}")
+async def get_stock_take_summary(
+    stock_take_id: int,
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Stock take with its variance totals"""
+    take = await get_stock_take(db, stock_take_id, current_user.store_id)
+    return {
+        **StockTakeResponse.model_validate(take).model_dump(),
+        "summary": await stock_takes.variance_summary(db, take)
+    }
+
+
+@router.post("/{stock_take_id}/counts")
+async def add_counts(
+    stock_take_id: int,
+    batch: StockCountBatch,
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    📦 Add a batch of scanned counts (any staff member can scan).
+    Counts of the same product add up unless `replace` is set.
+    """
+    # 🔒 Locked so an apply or cancel cannot close the take mid-batch
+    take = await get_stock_take(db, stock_take_id, current_user.store_id, lock=True)
+    try:
+        result = await stock_takes.add_counts(
+            db, take, [(line.product_id, line.code, line.quantity) for line in batch.lines], batch.replace
+        )
+    except StockTakeClosedError as e:
+        raise closed(e)
+    await db.commit()
+    return result
+
+
+@router.get("/{stock_take_id}/variance")
+async def get_variance(
+    stock_take_id: int,
+    limit: int = Query(default=100, ge=1, le=1000),
+    offset: int = Query(default=0, ge=0),
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Counted vs stock: totals and the differing products, largest value first"""
+    take = await get_stock_take(db, stock_take_id, current_user.store_id)
+    rows = await stock_takes.variance_lines(db, take, limit=limit, offset=offset)
+    return {
+        "summary": await stock_takes.variance_summary(db, take),
+        "lines": [
+            {
+                "product_id": row.id,
+                "name": row.name,
+                "sku": row.sku,
+                "barcode": row.barcode,
+                "expected": row.expected,
+                "counted": row.counted,
+                "variance": row.variance,
+                "variance_value": round(row.value, 2)
+            }
+            for row in rows
+        ]
+    }
+
+
+@router.post("/{stock_take_id}/apply")
+async def apply_stock_take(
+    stock_take_id: int,
+    current_user: User = Depends(require_min_role(UserRole.MANAGER)),
+    db: AsyncSession = Depends(get_db)
+):
+    """Set every counted product to its count in one transaction (Manager/Owner only)"""
+    take = await get_stock_take(db, stock_take_id, current_user.store_id, lock=True)
+    try:
+        result = await stock_takes.apply(db, take, current_user.id)
+    except StockTakeClosedError as e:
+        raise closed(e)
+    await db.commit()
+    return {"message": "Stock take applied", "stock_take_id": take.id, **result}
+
+
+@router.delete("/{stock_take_id}")
+async def cancel_stock_take(
+    stock_take_id: int,
+    current_user: User = Depends(require_min_role(UserRole.MANAGER)),
+    db: AsyncSession = Depends(get_db)
+):
+    """Cancel an open stock take and discard its counts"""
+    take = await get_stock_take(db, stock_take_id, current_user.store_id, lock=True)
+    try:
+        await stock_takes.cancel(db, take)
+    except StockTakeClosedError as e:
+        raise closed(e)
+    await db.commit()
+    return {"message": "Stock take cancelled", "stock_take_id": take.id}
@@ -14,6 +14,7 @@ import random
 from app.database import get_db
 from app.models import User, Store
 from app.routers.auth import get_current_user
+from app.services.idempotency import idempotent
 
 router = APIRouter(prefix="/suppliers", tags=["Suppliers"])
 
@@ -140,6 +141,7 @@ async def get_purchase_orders(
 
 
 @router.post("/orders", response_model=dict)
+@idempotent()
 async def create_purchase_order(
     order: PurchaseOrderCreate,
     current_user: User = Depends(get_current_user),
@@ -374,6 +376,7 @@ async def delete_supplier(
 
 
 @router.post("/{supplier_id}/payment", response_model=dict)
+@idempotent()
 async def record_supplier_payment(
     supplier_id: int,
     payment: SupplierPayment,
@@ -0,0 +1,42 @@
+"""
+KadaiGPT - Sync Router
+Delta sync for PWA terminals and the offline agent
+"""
+
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import get_db
+from app.models import User
+from app.routers.auth import get_current_active_user
+from app.services.change_feed import change_feed, encode
+
+
+router = APIRouter(prefix="/sync", tags=["Sync"])
+
+
+@router.get("/changes")
+async def get_changes(
+    since: int = Query(default=0, ge=0, description="Last cursor received; 0 for a full snapshot"),
+    limit: int = Query(default=5000, ge=1, le=50000),
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Stream products, categories, customers and bills changed after `since`
+    as NDJSON. The last line carries the cursor for the next call.
+    """
+    store_id = current_user.store_id
+    bind = db.bind
+
+    # 📶 The request's session is closed before the body streams; use our own
+    async def records():
+        if not store_id:
+            yield encode({"cursor": 0, "more": False})
+            return
+        async with AsyncSession(bind, expire_on_commit=False) as session:
+            async for line in change_feed.stream(session, store_id, since, limit):
+                yield line
+
+    return StreamingResponse(records(), media_type="application/x-ndjson")
@@ -12,10 +12,13 @@ import os
 import httpx
 
 from app.config import settings
-from app.services.telegram_bot import telegram_bot
+from app.utils.lazy import LazyObject
 
 logger = logging.getLogger(__name__)
 
+# Bot loads on the first webhook or send
+telegram_bot = LazyObject("app.services.telegram_bot:telegram_bot")
+
 router = APIRouter(prefix="/telegram", tags=["Telegram"])
 
 
@@ -15,12 +15,15 @@ import httpx
 
 from app.database import get_db
 from app.config import settings
-from app.services.whatsapp_bot import whatsapp_bot
+from app.utils.lazy import LazyObject
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/whatsapp", tags=["WhatsApp"])
 
+# Bot (and its NLP service) loads on the first webhook or send
+whatsapp_bot = LazyObject("app.services.whatsapp_bot:whatsapp_bot")
+
 
 # ==================== SCHEMAS ====================
 
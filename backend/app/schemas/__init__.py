@@ -4,7 +4,7 @@ Request/Response schemas for API endpoints
 """
 
 from pydantic import BaseModel, EmailStr, Field
-from typing import Optional, List
+from typing import Optional, List, Dict
 from datetime import datetime
 from enum import Enum
 
@@ -177,6 +177,16 @@ class ProductResponse(ProductBase):
         from_attributes = True
 
 
+class ProductLookupBatch(BaseModel):
+    """Barcodes/SKUs scanned by a handheld, resolved in one call"""
+    codes: List[str] = Field(..., min_length=1, max_length=200)
+
+
+class ProductLookupResult(BaseModel):
+    products: Dict[str, ProductResponse]  # keyed by the scanned code
+    missing: List[str]
+
+
 # ==================== BILL ITEM SCHEMAS ====================
 
 class BillItemCreate(BaseModel):
@@ -202,6 +212,7 @@ class BillItemResponse(BaseModel):
     discount_amount: float
     tax_amount: float
     total: float
+    refunded_quantity: Optional[float] = 0.0
 
     class Config:
         from_attributes = True
@@ -231,6 +242,7 @@ class BillResponse(BaseModel):
     discount_amount: float
     tax_amount: float
     total_amount: float
+    refunded_amount: Optional[float] = 0.0
     
     payment_method: PaymentMethodEnum
     amount_paid: float
@@ -264,6 +276,37 @@ class BillSummary(BaseModel):
         from_attributes = True
 
 
+class BillBatchCreate(BaseModel):
+    """Offline bills replayed by a terminal in one request"""
+    bills: List[BillCreate] = Field(..., min_length=1, max_length=1000)
+
+
+class BillBatchResult(BaseModel):
+    local_id: Optional[str]
+    status: str  # created, duplicate, rejected
+    bill_id: Optional[int] = None
+    bill_number: Optional[str] = None
+    error: Optional[dict] = None
+
+
+class BillBatchResponse(BaseModel):
+    created_count: int
+    duplicate_count: int
+    rejected_count: int
+    results: List[BillBatchResult]
+
+
+class BillRefundItem(BaseModel):
+    bill_item_id: int
+    quantity: float = Field(..., gt=0)
+
+
+class BillRefundCreate(BaseModel):
+    """Partial refund: quantities to return per bill line"""
+    items: List[BillRefundItem] = Field(..., min_length=1)
+    reason: Optional[str] = None
+
+
 # ==================== OCR SCHEMAS ====================
 
 class OCRResult(BaseModel):
@@ -351,3 +394,34 @@ class SyncResponse(BaseModel):
     failed_count: int
     errors: List[dict]
     server_time: datetime
+
+
+# ==================== STOCK-TAKE SCHEMAS ====================
+
+class StockTakeCreate(BaseModel):
+    note: Optional[str] = Field(None, max_length=200)
+
+
+class StockCountLine(BaseModel):
+    """One scanned count: a product id, or the barcode/SKU as scanned"""
+    product_id: Optional[int] = None
+    code: Optional[str] = Field(None, max_length=50)
+    quantity: int = Field(..., ge=0)
+
+
+class StockCountBatch(BaseModel):
+    lines: List[StockCountLine] = Field(..., min_length=1, max_length=2000)
+    replace: bool = False  # True: a recount overwrites earlier counts instead of adding to them
+
+
+class StockTakeResponse(BaseModel):
+    id: int
+    store_id: int
+    note: Optional[str]
+    status: str
+    adjusted_count: Optional[int] = 0
+    created_at: Optional[datetime]
+    applied_at: Optional[datetime]
+
+    class Config:
+        from_attributes = True
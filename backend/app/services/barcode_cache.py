@@ -0,0 +1,203 @@
+"""
+KadaiGPT - Barcode Lookup Cache
+Resolves scanned barcodes and SKUs to products without a query per scan.
+
+Strategy:
+- Per store, a lazily filled map of code -> product snapshot; a code
+  matches a product's barcode or SKU exactly, as scanners send it
+- Misses of a scan or a whole batch are resolved together with one
+  indexed query (barcode IN (...) OR sku IN (...)); codes that match
+  nothing are cached too, so repeated unknown scans stay off the database
+- Barcodes and SKUs aren't unique per store: a barcode match wins over a
+  SKU match, then active over inactive products, then the lowest id
+- Entries of all stores share one LRU capped at barcode_cache_max_entries
+  and expire after barcode_cache_ttl_seconds
+- Committed ORM writes to a product drop every code pointing at it plus
+  its new codes; bulk UPDATE/DELETE on products clears the cache
+- Stock moved by stock_engine's Core UPDATEs is patched into the cached
+  snapshots on commit, so a scan after a sale shows the new stock
+"""
+
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.models import Product
+from app.services.tenant_cache import column_values
+from app.services.write_tracker import TransactionWrites, write_tracker
+
+logger = logging.getLogger("KadaiGPT.BarcodeCache")
+
+Key = Tuple[int, str]
+
+
+@dataclass
+class CodeEntry:
+    product_id: Optional[int]  # None: no product has this code
+    values: Optional[Dict[str, Any]]
+    expires_at: float
+
+
+def match_rank(product: Product, code: str) -> tuple:
+    """Sort key picking one product among those sharing a code"""
+    return (product.barcode != code, not product.is_active, product.id)
+
+
+class BarcodeCache:
+    """Per-process LRU of (store_id, code) -> product snapshot"""
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Key, CodeEntry]" = OrderedDict()
+        self._keys_by_product: Dict[int, Set[Key]] = {}
+        self._generation = 0  # bumped by every invalidation
+        self._hits = 0
+        self._misses = 0
+        self._queries = 0
+
+    # ─── Lookup ──────────────────────────────────────────────────
+
+    async def lookup(self, db: AsyncSession, store_id: int, code: str) -> Optional[Dict[str, Any]]:
+        """Column values of the product a scanned code resolves to, or None"""
+        return (await self.resolve(db, store_id, [code])).get(code.strip())
+
+    async def resolve(
+        self, db: AsyncSession, store_id: int, codes: Iterable[str]
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Resolve many codes with at most one query.
+
+        Returns code -> product column values for every code that matched;
+        codes are stripped of surrounding whitespace and blank ones skipped.
+        """
+        now = time.monotonic()
+        found: Dict[str, Dict[str, Any]] = {}
+        misses: List[str] = []
+        for code in dict.fromkeys(c.strip() for c in codes):
+            if not code:
+                continue
+            entry = self._entries.get((store_id, code))
+            if entry is not None and entry.expires_at > now:
+                self._entries.move_to_end((store_id, code))
+                self._hits += 1
+                if entry.values is not None:
+                    found[code] = entry.values
+            else:
+                misses.append(code)
+
+        if misses:
+            self._misses += len(misses)
+            found.update(await self._load(db, store_id, misses))
+        return found
+
+    async def _load(self, db: AsyncSession, store_id: int, codes: List[str]) -> Dict[str, Dict[str, Any]]:
+        self._queries += 1
+        generation = self._generation
+        result = await db.execute(
+            select(Product).where(
+                Product.store_id == store_id,
+                or_(Product.barcode.in_(codes), Product.sku.in_(codes))
+            )
+        )
+        wanted = set(codes)
+        candidates: Dict[str, List[Product]] = {}
+        for product in result.scalars().all():
+            for code in {product.barcode, product.sku} & wanted:
+                candidates.setdefault(code, []).append(product)
+
+        found = {}
+        # An invalidation while we were loading means these rows may be stale
+        cacheable = self.ttl_seconds > 0 and generation == self._generation
+        expires_at = time.monotonic() + self.ttl_seconds
+        for code in codes:
+            matches = candidates.get(code)
+            if matches:
+                product = min(matches, key=lambda p: match_rank(p, code))
+                found[code] = column_values(product)
+                if cacheable:
+                    self._store((store_id, code), CodeEntry(product.id, found[code], expires_at))
+            elif cacheable:
+                self._store((store_id, code), CodeEntry(None, None, expires_at))
+        return found
+
+    def _store(self, key: Key, entry: CodeEntry):
+        self._discard(key)
+        self._entries[key] = entry
+        if entry.product_id is not None:
+            self._keys_by_product.setdefault(entry.product_id, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            self._discard(next(iter(self._entries)))
+
+    def _discard(self, key: Key):
+        entry = self._entries.pop(key, None)
+        if entry is not None and entry.product_id is not None:
+            keys = self._keys_by_product.get(entry.product_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_product[entry.product_id]
+
+    # ─── Invalidation ────────────────────────────────────────────
+
+    def invalidate_product(self, store_id: int, product_id: int, codes: Iterable[Optional[str]] = ()):
+        """Drop the codes pointing at a product and the codes it now carries"""
+        self._generation += 1
+        for key in list(self._keys_by_product.get(product_id, ())):
+            self._discard(key)
+        for code in codes:
+            if code:
+                self._discard((store_id, code.strip()))
+
+    def apply_stock(self, changes: Dict[int, float]):
+        """Patch committed stock levels into cached snapshots"""
+        for product_id, stock in changes.items():
+            for key in self._keys_by_product.get(product_id, ()):
+                entry = self._entries[key]
+                entry.values = {**entry.values, "current_stock": stock}
+
+    def clear(self):
+        self._generation += 1
+        self._entries.clear()
+        self._keys_by_product.clear()
+
+    def get_stats(self) -> dict:
+        total = self._hits + self._misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self._hits,
+            "misses": self._misses,
+            "queries": self._queries,
+            "hit_rate": round(self._hits / total, 3) if total else 0.0
+        }
+
+
+# Global singleton
+barcode_cache = BarcodeCache(
+    max_entries=settings.barcode_cache_max_entries,
+    ttl_seconds=settings.barcode_cache_ttl_seconds
+)
+
+
+# ─── Write tracking ──────────────────────────────────────────────
+
+write_tracker.watch(Product, columns=("barcode", "sku"))
+
+
+@write_tracker.on_commit
+def _apply_committed_barcode_writes(writes: TransactionWrites):
+    if writes.bulk_written(Product):
+        barcode_cache.clear()
+    for write in writes.of(Product):
+        barcode_cache.invalidate_product(
+            write.store_id, write.id, (write.values["barcode"], write.values["sku"])
+        )
+    barcode_cache.apply_stock(writes.stock_changes)
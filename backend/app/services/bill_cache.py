@@ -0,0 +1,195 @@
+"""
+KadaiGPT - Bill Detail Cache
+Serves bill detail and reprints without re-querying or re-rendering.
+
+Strategy:
+- One joined SELECT loads a bill together with its items and store
+- Entries are versioned by (bill.updated_at, store.updated_at); a one-row
+  probe of those two columns decides whether an entry is still current
+- Bill detail is kept as serialized JSON with a content ETag (304 on match)
+- Rendered receipts are kept next to it so reprints skip rendering
+- Writers in this process also invalidate explicitly, because updated_at
+  can have one-second resolution (SQLite CURRENT_TIMESTAMP)
+"""
+
+import hashlib
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+
+from app.config import settings
+from app.models import Bill, Store
+from app.schemas import BillResponse
+
+logger = logging.getLogger("KadaiGPT.BillCache")
+
+BillVersion = Tuple[Optional[datetime], Optional[datetime]]
+
+
+@dataclass
+class BillCacheEntry:
+    """Cached renderings of one bill at one version"""
+    version: BillVersion
+    body: Optional[bytes] = None
+    etag: Optional[str] = None
+    print_payload: Optional[Dict[str, Any]] = None
+    receipt: Optional[str] = None
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Evaluate an If-None-Match header (weak comparison, as RFC 9110 requires)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
+
+
+class BillCache:
+    """
+    Per-process LRU of bill renderings.
+
+    Every read costs one indexed probe query; a miss adds the joined load.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[int, BillCacheEntry]" = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+
+    # ─── Loading ─────────────────────────────────────────────────
+
+    async def get_version(
+        self, db: AsyncSession, bill_id: int, store_id: Optional[int] = None
+    ) -> Optional[BillVersion]:
+        """Current version of a bill, or None if it doesn't exist (in the store)"""
+        query = (
+            select(Bill.updated_at, Store.updated_at)
+            .join(Store, Store.id == Bill.store_id, isouter=True)
+            .where(Bill.id == bill_id)
+        )
+        if store_id is not None:
+            query = query.where(Bill.store_id == store_id)
+        row = (await db.execute(query)).first()
+        return tuple(row) if row is not None else None
+
+    async def load_bill(self, db: AsyncSession, bill_id: int) -> Optional[Bill]:
+        """Bill with items and store in a single query"""
+        result = await db.execute(
+            select(Bill)
+            .options(joinedload(Bill.items), joinedload(Bill.store))
+            .where(Bill.id == bill_id)
+        )
+        return result.unique().scalar_one_or_none()
+
+    def _lookup(self, bill_id: int, version: BillVersion) -> Optional[BillCacheEntry]:
+        entry = self._entries.get(bill_id)
+        if entry is None or entry.version != version:
+            return None
+        self._entries.move_to_end(bill_id)
+        return entry
+
+    def _store(self, bill_id: int, bill: Bill) -> BillCacheEntry:
+        """Entry for a freshly loaded bill, keeping still-valid renderings"""
+        version = (bill.updated_at, bill.store.updated_at if bill.store else None)
+        entry = self._entries.get(bill_id)
+        if entry is None or entry.version != version:
+            entry = BillCacheEntry(version=version)
+        self._entries[bill_id] = entry
+        self._entries.move_to_end(bill_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return entry
+
+    # ─── Bill Detail ─────────────────────────────────────────────
+
+    async def get_detail(self, db: AsyncSession, bill_id: int, store_id: int) -> Optional[BillCacheEntry]:
+        """Serialized BillResponse and its ETag, or None if the store has no such bill"""
+        version = await self.get_version(db, bill_id, store_id)
+        if version is None:
+            return None
+
+        entry = self._lookup(bill_id, version)
+        if entry is not None and entry.body is not None:
+            self._hits += 1
+            return entry
+
+        self._misses += 1
+        bill = await self.load_bill(db, bill_id)
+        if bill is None:
+            return None
+        entry = self._store(bill_id, bill)
+        entry.body = BillResponse.model_validate(bill).model_dump_json().encode()
+        entry.etag = f'"{hashlib.sha256(entry.body).hexdigest()[:32]}"'
+        return entry
+
+    # ─── Receipts ────────────────────────────────────────────────
+
+    async def get_receipt(
+        self,
+        db: AsyncSession,
+        bill_id: int,
+        render: Callable[[Bill], Tuple[Dict[str, Any], str]]
+    ) -> Optional[Tuple[Dict[str, Any], str]]:
+        """
+        (print payload, rendered receipt) for a bill, rendering on a miss.
+
+        render builds both from a bill loaded with items and store.
+        """
+        version = await self.get_version(db, bill_id)
+        if version is None:
+            return None
+
+        entry = self._lookup(bill_id, version)
+        if entry is not None and entry.receipt is not None:
+            self._hits += 1
+            return entry.print_payload, entry.receipt
+
+        self._misses += 1
+        bill = await self.load_bill(db, bill_id)
+        if bill is None:
+            return None
+        entry = self._store(bill_id, bill)
+        entry.print_payload, entry.receipt = render(bill)
+        return entry.print_payload, entry.receipt
+
+    def mark_printed(self, bill_id: int, bill_updated_at: Optional[datetime]):
+        """
+        A print only bumps is_printed/print_count: the receipt stays valid
+        under the new version, the detail JSON does not.
+        """
+        entry = self._entries.get(bill_id)
+        if entry is None:
+            return
+        entry.version = (bill_updated_at, entry.version[1])
+        entry.body = None
+        entry.etag = None
+
+    # ─── Maintenance ─────────────────────────────────────────────
+
+    def invalidate(self, bill_id: Optional[int] = None):
+        """Drop one bill (after a write to it) or everything"""
+        if bill_id is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(bill_id, None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self._hits,
+            "misses": self._misses
+        }
+
+
+# Global singleton
+bill_cache = BillCache(settings.bill_cache_max_entries)
@@ -0,0 +1,339 @@
+"""
+KadaiGPT - Monthly Bill Partitions
+Declarative range partitioning of bills and bill_items by bill_date (PostgreSQL).
+
+Strategy:
+- Opt-in (BILL_PARTITIONING=true) and PostgreSQL only; on SQLite, or while
+  the tables are still plain, every call here is a no-op
+- bill_items carries a copy of bill_date, so both tables share the partition
+  key and a one-month report (GSTR-1) prunes to one partition of each
+- Unique constraints on a partitioned table must contain the partition key:
+  primary keys become (id, bill_date), bill_number is unique per bill_date and
+  bill_items references bills by (bill_id, bill_date). Ids still come from the
+  original sequences, so they stay unique on their own. (store_id, local_id)
+  would only be unique per bill_date, so offline replays are guarded by the
+  plain bill_local_ids table instead
+- Conversion runs once, in one transaction: the plain tables are renamed,
+  partitioned copies are created with a partition per month since the first
+  bill, the rows are copied and the plain tables dropped
+- ensure_converted() runs it whenever the flag is on and the tables are
+  still plain: in migration 0007, at startup and in the daily maintenance,
+  so turning the flag on for an existing deployment converts it
+- Partitions are named <table>_YYYY_MM with UTC month bounds; a DEFAULT
+  partition catches anything outside them. The scheduler keeps the next few
+  months created ahead of time, so the default partition stays empty
+- Months older than the retention window are DETACHed, never dropped: they
+  stay on disk as plain tables for archiving
+"""
+
+import logging
+import re
+from datetime import date, datetime, timezone
+from typing import List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from app.config import settings
+
+logger = logging.getLogger("KadaiGPT.BillPartitions")
+
+PARTITIONED_TABLES = ("bills", "bill_items")
+PARTITION_SUFFIX = re.compile(r"_(\d{4})_(\d{2})$")
+
+# Secondary indexes of the partitioned tables; unique ones carry bill_date
+PARTITIONED_INDEXES = [
+    ("idx_bills_store_date", "bills", "store_id, created_at DESC", False),
+    ("idx_bills_store_bill_date_id", "bills", "store_id, bill_date DESC, id DESC", False),
+    ("idx_bills_store_status", "bills", "store_id, status", False),
+    ("idx_bills_customer_phone", "bills", "customer_phone", False),
+    ("idx_bills_bill_number", "bills", "bill_number, bill_date", True),
+    ("idx_bills_store_local_id", "bills", "store_id, local_id, bill_date", True),
+    ("idx_bill_items_bill", "bill_items", "bill_id, bill_date", False),
+    ("idx_bill_items_product", "bill_items", "product_id", False),
+]
+
+
+# Offline replays from before the (store_id, local_id) unique index could
+# store the same bill twice
+DUPLICATE_LOCAL_IDS = (
+    "SELECT b.id, b.store_id, b.local_id, k.first_id FROM bills b JOIN ("
+    "SELECT store_id, local_id, min(id) AS first_id FROM bills WHERE local_id IS NOT NULL "
+    "GROUP BY store_id, local_id HAVING count(*) > 1) k "
+    "ON b.store_id = k.store_id AND b.local_id = k.local_id WHERE b.id <> k.first_id ORDER BY b.id"
+)
+LOCAL_ID_LENGTH = 50  # bills.local_id is VARCHAR(50)
+
+
+def duplicate_local_id(local_id: str, bill_id: int) -> str:
+    """local_id of a replayed copy: the original (shortened to fit) tagged with the copy's id"""
+    suffix = f"#dup-{bill_id}"
+    return local_id[:LOCAL_ID_LENGTH - len(suffix)] + suffix
+
+
+async def release_duplicate_local_ids(conn: AsyncConnection) -> int:
+    """
+    Free the (store_id, local_id) slot held by replayed copies of an offline
+    bill. The first (lowest id) copy keeps the local_id; every other copy is
+    renamed with duplicate_local_id() and audited with the bill it repeats,
+    so they can still be reconciled. Returns the number of copies.
+    """
+    from app.models import AuditTrail
+
+    duplicates = (await conn.execute(text(DUPLICATE_LOCAL_IDS))).all()
+    if not duplicates:
+        return 0
+    await conn.execute(
+        text("UPDATE bills SET local_id = :local_id WHERE id = :id"),
+        [{"id": row.id, "local_id": duplicate_local_id(row.local_id, row.id)} for row in duplicates]
+    )
+    now = datetime.utcnow()
+    await conn.execute(AuditTrail.__table__.insert(), [
+        {
+            "store_id": row.store_id, "action": "mark_duplicate",
+            "entity_type": "bill", "entity_id": row.id,
+            "old_values": {"local_id": row.local_id},
+            "new_values": {"local_id": duplicate_local_id(row.local_id, row.id), "duplicate_of": row.first_id},
+            "created_at": now,
+        }
+        for row in duplicates
+    ])
+    return len(duplicates)
+
+
+def month_start(value) -> date:
+    return date(value.year, value.month, 1)
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table: str, month: date) -> str:
+    return f"{table}_{month:%Y_%m}"
+
+
+def partition_ddl(table: str, month: date) -> str:
+    """CREATE TABLE for one month of a partitioned table (UTC bounds)"""
+    return (
+        f"CREATE TABLE IF NOT EXISTS {partition_name(table, month)} PARTITION OF {table} "
+        f"FOR VALUES FROM ('{month.isoformat()} 00:00:00+00') "
+        f"TO ('{add_months(month, 1).isoformat()} 00:00:00+00')"
+    )
+
+
+def partition_month(name: str) -> Optional[date]:
+    match = PARTITION_SUFFIX.search(name)
+    return date(int(match.group(1)), int(match.group(2)), 1) if match else None
+
+
+class BillPartitionManager:
+    """Creates, converts to and detaches monthly partitions"""
+
+    def __init__(self, enabled: bool, months_ahead: int, retention_months: int):
+        self.enabled = enabled
+        self.months_ahead = months_ahead
+        self.retention_months = retention_months
+
+    @staticmethod
+    def supported(engine: AsyncEngine) -> bool:
+        return engine.dialect.name == "postgresql"
+
+    @staticmethod
+    async def is_partitioned(conn: AsyncConnection, table: str = "bills") -> bool:
+        return bool((await conn.execute(
+            text("SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+                 "WHERE c.relname = :table AND pg_table_is_visible(c.oid)"),
+            {"table": table}
+        )).scalar())
+
+    @staticmethod
+    async def list_partitions(conn: AsyncConnection, table: str) -> List[str]:
+        result = await conn.execute(text(
+            f"SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            f"WHERE i.inhparent = '{table}'::regclass ORDER BY c.relname"
+        ))
+        return [row[0] for row in result.all()]
+
+    # ─── Conversion ──────────────────────────────────────────────
+
+    async def ensure_converted(self, engine: AsyncEngine) -> bool:
+        """Convert to partitions if enabled and not done yet; True when this call converted"""
+        if not self.enabled or not self.supported(engine):
+            return False
+        return await self.convert(engine)
+
+    async def convert(self, engine: AsyncEngine) -> bool:
+        """Turn the plain bills/bill_items tables into monthly partitioned ones"""
+        if not self.supported(engine):
+            return False
+        async with engine.begin() as conn:
+            if await self.is_partitioned(conn):
+                return False
+            await conn.execute(text("LOCK TABLE bills, bill_items IN ACCESS EXCLUSIVE MODE"))
+
+            # Other tables' foreign keys to bills.id can't target a partitioned
+            # table (no unique index on id alone); those links stay app-level
+            dependents = await conn.execute(text(
+                "SELECT conrelid::regclass::text, conname FROM pg_constraint "
+                "WHERE contype = 'f' AND confrelid = 'bills'::regclass "
+                "AND conrelid <> 'bill_items'::regclass"
+            ))
+            for table, constraint in dependents.all():
+                await conn.execute(text(f'ALTER TABLE {table} DROP CONSTRAINT "{constraint}"'))
+
+            # Partition keys can't be NULL
+            await conn.execute(text(
+                "UPDATE bills SET bill_date = COALESCE(created_at, now()) WHERE bill_date IS NULL"
+            ))
+            await conn.execute(text(
+                "UPDATE bill_items i SET bill_date = b.bill_date FROM bills b "
+                "WHERE b.id = i.bill_id AND i.bill_date IS NULL"
+            ))
+            await conn.execute(text("UPDATE bill_items SET bill_date = now() WHERE bill_date IS NULL"))
+            await release_duplicate_local_ids(conn)
+
+            foreign_keys = {}
+            for table in PARTITIONED_TABLES:
+                result = await conn.execute(text(
+                    f"SELECT pg_get_constraintdef(oid) FROM pg_constraint "
+                    f"WHERE contype = 'f' AND conrelid = '{table}'::regclass "
+                    f"AND confrelid <> 'bills'::regclass"
+                ))
+                foreign_keys[table] = [row[0] for row in result.all()]
+            sequences = {}
+            for table in PARTITIONED_TABLES:
+                sequences[table] = (await conn.execute(
+                    text("SELECT pg_get_serial_sequence(:table, 'id')"), {"table": table}
+                )).scalar()
+
+            for table in PARTITIONED_TABLES:
+                await conn.execute(text(f"ALTER TABLE {table} RENAME TO {table}_unpartitioned"))
+                await conn.execute(text(
+                    f"CREATE TABLE {table} (LIKE {table}_unpartitioned INCLUDING DEFAULTS) "
+                    f"PARTITION BY RANGE (bill_date)"
+                ))
+                await conn.execute(text(f"ALTER TABLE {table} ADD PRIMARY KEY (id, bill_date)"))
+                for definition in foreign_keys[table]:
+                    await conn.execute(text(f"ALTER TABLE {table} ADD {definition}"))
+            # Safety net for inserts that don't copy the bill's date
+            await conn.execute(text("ALTER TABLE bill_items ALTER COLUMN bill_date SET DEFAULT now()"))
+
+            first = (await conn.execute(text("SELECT min(bill_date) FROM bills_unpartitioned"))).scalar()
+            now = datetime.now(timezone.utc)
+            await self._create_partitions(conn, month_start(first or now), add_months(month_start(now), self.months_ahead))
+            for table in PARTITIONED_TABLES:
+                await conn.execute(text(f"CREATE TABLE IF NOT EXISTS {table}_default PARTITION OF {table} DEFAULT"))
+                await conn.execute(text(f"INSERT INTO {table} SELECT * FROM {table}_unpartitioned"))
+                if sequences[table]:
+                    await conn.execute(text(f"ALTER SEQUENCE {sequences[table]} OWNED BY {table}.id"))
+
+            await conn.execute(text(
+                "ALTER TABLE bill_items ADD FOREIGN KEY (bill_id, bill_date) REFERENCES bills (id, bill_date)"
+            ))
+            await conn.execute(text("DROP TABLE bill_items_unpartitioned"))
+            await conn.execute(text("DROP TABLE bills_unpartitioned"))
+
+            for name, table, columns, unique in PARTITIONED_INDEXES:
+                unique_sql = "UNIQUE " if unique else ""
+                await conn.execute(text(f"CREATE {unique_sql}INDEX IF NOT EXISTS {name} ON {table} ({columns})"))
+
+        logger.info("[BillPartitions] bills and bill_items are now partitioned by month")
+        return True
+
+    # ─── Maintenance ─────────────────────────────────────────────
+
+    async def _create_partitions(self, conn: AsyncConnection, first: date, last: date) -> List[str]:
+        created = []
+        existing = set()
+        for table in PARTITIONED_TABLES:
+            existing.update(await self.list_partitions(conn, table))
+        month = first
+        while month <= last:
+            for table in PARTITIONED_TABLES:
+                name = partition_name(table, month)
+                if name in existing:
+                    continue
+                if f"{table}_default" in existing and await self._default_has_rows(conn, table, month):
+                    logger.warning(f"[BillPartitions] {table}_default holds rows for {month:%Y-%m}; not creating {name}")
+                    continue
+                await conn.execute(text(partition_ddl(table, month)))
+                created.append(name)
+            month = add_months(month, 1)
+        return created
+
+    @staticmethod
+    async def _default_has_rows(conn: AsyncConnection, table: str, month: date) -> bool:
+        return bool((await conn.execute(
+            text(f"SELECT 1 FROM {table}_default WHERE bill_date >= :start AND bill_date < :end LIMIT 1"),
+            {"start": datetime(month.year, month.month, 1, tzinfo=timezone.utc),
+             "end": datetime.combine(add_months(month, 1), datetime.min.time(), timezone.utc)}
+        )).scalar())
+
+    async def ensure_partitions(self, engine: AsyncEngine, today: Optional[date] = None) -> List[str]:
+        """Create this month's and the next months_ahead months' partitions"""
+        if not self.supported(engine):
+            return []
+        current = month_start(today or datetime.now(timezone.utc))
+        async with engine.begin() as conn:
+            if not await self.is_partitioned(conn):
+                return []
+            return await self._create_partitions(conn, current, add_months(current, self.months_ahead))
+
+    async def detach_partition(self, engine: AsyncEngine, month: date) -> List[str]:
+        """DETACH one month from both tables; the data stays in <table>_YYYY_MM"""
+        if not self.supported(engine):
+            return []
+        detached = []
+        async with engine.begin() as conn:
+            if not await self.is_partitioned(conn):
+                return []
+            items_name = partition_name("bill_items", month)
+            bills_name = partition_name("bills", month)
+            if items_name in await self.list_partitions(conn, "bill_items"):
+                await conn.execute(text(f"ALTER TABLE bill_items DETACH PARTITION {items_name}"))
+                # The detached month keeps a copy of the foreign key to bills,
+                # which would block detaching the bills month below
+                result = await conn.execute(text(
+                    f"SELECT conname FROM pg_constraint WHERE contype = 'f' "
+                    f"AND conrelid = '{items_name}'::regclass AND confrelid = 'bills'::regclass"
+                ))
+                for (constraint,) in result.all():
+                    await conn.execute(text(f'ALTER TABLE {items_name} DROP CONSTRAINT "{constraint}"'))
+                detached.append(items_name)
+            if bills_name in await self.list_partitions(conn, "bills"):
+                await conn.execute(text(f"ALTER TABLE bills DETACH PARTITION {bills_name}"))
+                detached.append(bills_name)
+        if detached:
+            logger.info(f"[BillPartitions] Detached {', '.join(detached)}")
+        return detached
+
+    async def detach_expired(self, engine: AsyncEngine, today: Optional[date] = None) -> List[str]:
+        """Detach months that fall outside retention_months (0 keeps everything)"""
+        if not self.retention_months or not self.supported(engine):
+            return []
+        cutoff = add_months(month_start(today or datetime.now(timezone.utc)), -self.retention_months)
+        async with engine.connect() as conn:
+            if not await self.is_partitioned(conn):
+                return []
+            months = {partition_month(name) for name in await self.list_partitions(conn, "bills")}
+        detached = []
+        for month in sorted(m for m in months if m and m < cutoff):
+            detached += await self.detach_partition(engine, month)
+        return detached
+
+    async def maintain(self, engine: AsyncEngine) -> dict:
+        """Scheduler entry point: convert if newly enabled, create upcoming months, detach expired ones"""
+        converted = await self.ensure_converted(engine)
+        created = await self.ensure_partitions(engine)
+        detached = await self.detach_expired(engine)
+        return {"converted": converted, "created": created, "detached": detached}
+
+
+# Global singleton
+bill_partitions = BillPartitionManager(
+    enabled=settings.bill_partitioning,
+    months_ahead=settings.bill_partition_months_ahead,
+    retention_months=settings.bill_partition_retention_months,
+)
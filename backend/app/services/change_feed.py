@@ -0,0 +1,256 @@
+"""
+KadaiGPT - Change Feed
+Per-store versioned log of product, category, customer and bill changes
+behind GET /sync/changes, so terminals download only what changed.
+
+Strategy:
+- Every committing transaction that changes synced rows bumps its store's
+  counter in sync_versions once (INSERT ... ON CONFLICT DO UPDATE ...
+  RETURNING) and upserts one sync_changes row per changed entity with
+  that version, inside the transaction being committed
+- The counter row stays locked until commit, so versions become visible in
+  commit order: a client that has seen version N never misses a later
+  commit with a lower number
+- sync_changes keeps only the latest change per entity (deletes stay as
+  tombstones), so the log grows with the catalogue, not with write volume
+- ORM writes are collected from flushes; Core statements (stock_engine, the
+  offline bill batch, the print spooler) call record() themselves
+- since=0 streams a snapshot of products, categories and customers from
+  their tables, so stores that predate the feed need no backfill; bills
+  appear once they change
+- Records are streamed as NDJSON, one entity per line with its full current
+  row (null columns omitted), read in chunks of CHUNK_SIZE
+"""
+
+import enum
+import json
+import logging
+from datetime import date, datetime
+from typing import Any, AsyncIterator, Dict, Iterable, List, Tuple
+
+from sqlalchemy import and_, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Bill, Category, Customer, Product, SyncChange, SyncVersion
+from app.services.tenant_cache import column_values
+from app.services.write_tracker import TransactionWrites, write_tracker
+
+logger = logging.getLogger("KadaiGPT.ChangeFeed")
+
+CHUNK_SIZE = 500
+SYNCED_MODELS = {"product": Product, "category": Category, "customer": Customer, "bill": Bill}
+ENTITY_TYPES = {model: entity_type for entity_type, model in SYNCED_MODELS.items()}
+SNAPSHOT_TYPES = ("category", "product", "customer")
+SERVER_COLUMNS = {"store_id", "sales_velocity"}  # not sent to terminals
+
+ChangeKey = Tuple[int, str, int]  # (store_id, entity_type, entity_id)
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, enum.Enum):
+        return value.value
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def encode(record: Dict[str, Any]) -> str:
+    return json.dumps(record, default=_json_default, separators=(",", ":")) + "\n"
+
+
+def entity_data(obj) -> Dict[str, Any]:
+    """Current row of a synced entity without nulls or server-side columns"""
+    return {k: v for k, v in column_values(obj).items() if v is not None and k not in SERVER_COLUMNS}
+
+
+def is_deleted(obj) -> bool:
+    return getattr(obj, "deleted_at", None) is not None  # soft-deleted customers
+
+
+class ChangeFeed:
+    """
+    Versioned per-store change log.
+
+    Write path (any session; written on commit):
+        change_feed.record(db, store_id, "product", product_ids)
+
+    Read path:
+        async for line in change_feed.stream(db, store_id, since, limit):
+            ...
+    """
+
+    def __init__(self):
+        self._commits = 0
+        self._changes = 0
+
+    # ─── Write side ──────────────────────────────────────────────
+
+    @staticmethod
+    def record(db, store_id: int, entity_type: str, ids: Iterable[int], deleted: bool = False):
+        """Add entities written outside the ORM unit of work to the next commit's changes"""
+        changes = db.info.setdefault("sync_changes", {})
+        for entity_id in ids:
+            changes[(store_id, entity_type, entity_id)] = deleted
+
+    def write(self, connection, changes: Dict[ChangeKey, bool]):
+        """Bump each store's version and upsert its changes (runs inside the commit)"""
+        if connection.dialect.name == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+
+        by_store: Dict[int, List[Tuple[str, int, bool]]] = {}
+        for (store_id, entity_type, entity_id), deleted in changes.items():
+            if store_id is not None and entity_id is not None:
+                by_store.setdefault(store_id, []).append((entity_type, entity_id, deleted))
+
+        versions = SyncVersion.__table__
+        table = SyncChange.__table__
+        # Stores in id order, so concurrent multi-store commits lock counters alike
+        for store_id in sorted(by_store):
+            bump = dialect_insert(versions).values(store_id=store_id, version=1)
+            version = connection.execute(
+                bump.on_conflict_do_update(
+                    index_elements=[versions.c.store_id],
+                    set_={"version": versions.c.version + 1}
+                ).returning(versions.c.version)
+            ).scalar_one()
+
+            entries = by_store[store_id]
+            for start in range(0, len(entries), CHUNK_SIZE):
+                stmt = dialect_insert(table).values([
+                    {"store_id": store_id, "entity_type": entity_type, "entity_id": entity_id,
+                     "version": version, "deleted": deleted}
+                    for entity_type, entity_id, deleted in entries[start:start + CHUNK_SIZE]
+                ])
+                connection.execute(stmt.on_conflict_do_update(
+                    index_elements=[table.c.store_id, table.c.entity_type, table.c.entity_id],
+                    set_={"version": stmt.excluded.version, "deleted": stmt.excluded.deleted,
+                          "changed_at": datetime.utcnow()}
+                ))
+            self._commits += 1
+            self._changes += len(entries)
+
+    # ─── Read side ───────────────────────────────────────────────
+
+    async def current_version(self, db: AsyncSession, store_id: int) -> int:
+        result = await db.execute(select(SyncVersion.version).where(SyncVersion.store_id == store_id))
+        return result.scalar_one_or_none() or 0
+
+    async def stream(
+        self, db: AsyncSession, store_id: int, since: int = 0, limit: int = 5000
+    ) -> AsyncIterator[str]:
+        """
+        NDJSON lines of the store's changes after version `since`.
+
+        Entity lines are {"v", "type", "id", "data"} or {"v", "type", "id",
+        "deleted": true}. The last line is {"cursor": version, "more": bool};
+        the client passes cursor as the next `since`. Pages stop at the first
+        version boundary after `limit` entities (never inside a version).
+        """
+        if since <= 0:
+            async for line in self._snapshot(db, store_id):
+                yield line
+        else:
+            async for line in self._changes_since(db, store_id, since, limit):
+                yield line
+
+    async def _snapshot(self, db: AsyncSession, store_id: int) -> AsyncIterator[str]:
+        # Read the version first: anything committed later is sent again next time
+        version = await self.current_version(db, store_id)
+        for entity_type in SNAPSHOT_TYPES:
+            model = SYNCED_MODELS[entity_type]
+            last_id = 0
+            while True:
+                query = select(model).where(model.store_id == store_id, model.id > last_id)
+                if model is Customer:
+                    query = query.where(Customer.deleted_at.is_(None))
+                result = await db.execute(query.order_by(model.id).limit(CHUNK_SIZE))
+                rows = result.scalars().all()
+                if not rows:
+                    break
+                for obj in rows:
+                    yield encode({"v": version, "type": entity_type, "id": obj.id, "data": entity_data(obj)})
+                last_id = rows[-1].id
+                db.expunge_all()
+        yield encode({"cursor": version, "more": False})
+
+    async def _changes_since(
+        self, db: AsyncSession, store_id: int, since: int, limit: int
+    ) -> AsyncIterator[str]:
+        cursor, last_id, sent, more = since, None, 0, False
+        while not more:
+            position = SyncChange.version > cursor
+            if last_id is not None:
+                position = or_(position, and_(SyncChange.version == cursor, SyncChange.id > last_id))
+            result = await db.execute(
+                select(SyncChange.id, SyncChange.version, SyncChange.entity_type,
+                       SyncChange.entity_id, SyncChange.deleted)
+                .where(SyncChange.store_id == store_id, position)
+                .order_by(SyncChange.version, SyncChange.id)
+                .limit(CHUNK_SIZE)
+            )
+            changes = result.all()
+            if not changes:
+                break
+
+            entities = await self._load(db, store_id, changes)
+            for change in changes:
+                if sent >= limit and change.version != cursor:
+                    more = True
+                    break
+                obj = None if change.deleted else entities.get((change.entity_type, change.entity_id))
+                record = {"v": change.version, "type": change.entity_type, "id": change.entity_id}
+                if obj is None or is_deleted(obj):
+                    record["deleted"] = True
+                else:
+                    record["data"] = entity_data(obj)
+                yield encode(record)
+                cursor, last_id, sent = change.version, change.id, sent + 1
+            db.expunge_all()
+        yield encode({"cursor": cursor, "more": more})
+
+    @staticmethod
+    async def _load(db: AsyncSession, store_id: int, changes) -> Dict[Tuple[str, int], Any]:
+        """Current rows of the changed entities, one query per entity type"""
+        ids_by_type: Dict[str, List[int]] = {}
+        for change in changes:
+            if not change.deleted:
+                ids_by_type.setdefault(change.entity_type, []).append(change.entity_id)
+
+        entities = {}
+        for entity_type, ids in ids_by_type.items():
+            model = SYNCED_MODELS.get(entity_type)
+            if model is None:
+                continue
+            result = await db.execute(select(model).where(model.store_id == store_id, model.id.in_(ids)))
+            for obj in result.scalars().all():
+                entities[(entity_type, obj.id)] = obj
+        return entities
+
+    def get_stats(self) -> dict:
+        return {"commits": self._commits, "changes": self._changes}
+
+
+# Global singleton
+change_feed = ChangeFeed()
+
+
+# ─── Write tracking ──────────────────────────────────────────────
+
+write_tracker.watch(Product, Category, Bill)
+write_tracker.watch(Customer, columns=("deleted_at",))  # soft deletes are tombstones
+write_tracker.forget_on_rollback("sync_changes")
+
+
+@write_tracker.before_commit
+def _write_change_feed(session, writes: TransactionWrites):
+    changes = session.info.pop("sync_changes", {})
+    for write in writes.rows.values():
+        entity_type = ENTITY_TYPES.get(write.model)
+        if entity_type is not None and write.modified:
+            changes[(write.store_id, entity_type, write.id)] = (
+                write.deleted or write.values.get("deleted_at") is not None
+            )
+    if changes:
+        change_feed.write(session.connection(), changes)
@@ -13,6 +13,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, and_, func, extract
 
 from app.models import Store, Bill, BillItem, Product, BillStatus
+from app.services.pricing_engine import pricing_engine, to_paise, to_rupees
 
 logger = logging.getLogger("KadaiGPT.GST")
 
@@ -63,6 +64,7 @@ GST_THRESHOLD_GOODS = 4000000   # ₹40 Lakhs
 GST_THRESHOLD_SERVICES = 2000000  # ₹20 Lakhs
 COMPOSITION_THRESHOLD = 15000000  # ₹1.5 Crore
 EINVOICE_THRESHOLD = 50000000    # ₹5 Crore
+B2C_LARGE_LIMIT_PAISE = 250000 * 100  # B2C large invoices: above ₹2.5 Lakh
 
 
 class GSTComplianceEngine:
@@ -107,62 +109,74 @@ class GSTComplianceEngine:
         b2c_small = []     # B2C <= ₹2.5 Lakh
         hsn_summary = {}
 
+        total_taxable_paise = 0
+        total_tax_paise = 0
+        b2c_small_paise = 0
+
         for bill in bills:
-            total = float(bill.total_amount or 0)
-            tax = float(bill.tax_amount or 0)
+            total_paise = to_paise(bill.total_amount)
+            tax_paise = to_paise(bill.tax_amount)
+            split = pricing_engine.split_gst(tax_paise)
+            total_taxable_paise += total_paise - tax_paise
+            total_tax_paise += tax_paise
 
             entry = {
                 "invoice_number": bill.bill_number,
                 "invoice_date": bill.bill_date.strftime("%d-%m-%Y") if bill.bill_date else "",
                 "customer_name": bill.customer_name or "Walk-in",
-                "taxable_value": round(total - tax, 2),
-                "cgst": round(tax / 2, 2),
-                "sgst": round(tax / 2, 2),
+                "taxable_value": to_rupees(total_paise - tax_paise),
+                "cgst": to_rupees(split["cgst"]),
+                "sgst": to_rupees(split["sgst"]),
                 "igst": 0,
-                "total": round(total, 2),
+                "total": to_rupees(total_paise),
                 "payment_method": bill.payment_method.value if bill.payment_method else "cash"
             }
 
-            if total > 250000:
+            if total_paise > B2C_LARGE_LIMIT_PAISE:
                 b2c_large.append(entry)
             else:
                 b2c_small.append(entry)
+                b2c_small_paise += total_paise
 
-        # HSN-wise summary
+        # HSN-wise summary (HSN code joined in, not fetched per item).
+        # The item-side date range lets monthly partitions prune bill_items too.
         items_result = await db.execute(
-            select(BillItem).join(Bill).where(and_(
+            select(BillItem.quantity, BillItem.subtotal, BillItem.tax_amount, Product.hsn_code)
+            .join(Bill, BillItem.bill_id == Bill.id)
+            .outerjoin(Product, BillItem.product_id == Product.id)
+            .where(and_(
                 Bill.store_id == store_id,
                 Bill.status == BillStatus.COMPLETED,
                 Bill.bill_date >= period_start,
-                Bill.bill_date < period_end
+                Bill.bill_date < period_end,
+                BillItem.bill_date >= period_start,
+                BillItem.bill_date < period_end
             ))
         )
-        items = items_result.scalars().all()
-
-        for item in items:
-            hsn = "9999"  # Default
-            if item.product:
-                prod_result = await db.execute(select(Product).where(Product.id == item.product_id))
-                product = prod_result.scalar_one_or_none()
-                if product and product.hsn_code:
-                    hsn = product.hsn_code
 
+        for quantity, subtotal, tax_amount, hsn_code in items_result.all():
+            hsn = hsn_code or "9999"  # Default
             if hsn not in hsn_summary:
-                hsn_summary[hsn] = {
-                    "hsn_code": hsn, "quantity": 0,
-                    "taxable_value": 0, "cgst": 0, "sgst": 0, "igst": 0, "total_tax": 0
-                }
-
-            taxable = float(item.subtotal or 0)
-            tax_amt = float(item.tax_amount or 0)
-            hsn_summary[hsn]["quantity"] += float(item.quantity or 0)
-            hsn_summary[hsn]["taxable_value"] += taxable
-            hsn_summary[hsn]["cgst"] += round(tax_amt / 2, 2)
-            hsn_summary[hsn]["sgst"] += round(tax_amt / 2, 2)
-            hsn_summary[hsn]["total_tax"] += tax_amt
-
-        total_taxable = sum(float(b.total_amount or 0) - float(b.tax_amount or 0) for b in bills)
-        total_tax = sum(float(b.tax_amount or 0) for b in bills)
+                hsn_summary[hsn] = {"hsn_code": hsn, "quantity": 0, "taxable_value": 0, "total_tax": 0}
+
+            hsn_summary[hsn]["quantity"] += float(quantity or 0)
+            hsn_summary[hsn]["taxable_value"] += to_paise(subtotal)
+            hsn_summary[hsn]["total_tax"] += to_paise(tax_amount)
+
+        hsn_rows = []
+        for summary in hsn_summary.values():
+            split = pricing_engine.split_gst(summary["total_tax"])
+            hsn_rows.append({
+                "hsn_code": summary["hsn_code"],
+                "quantity": round(summary["quantity"], 3),
+                "taxable_value": to_rupees(summary["taxable_value"]),
+                "cgst": to_rupees(split["cgst"]),
+                "sgst": to_rupees(split["sgst"]),
+                "igst": 0,
+                "total_tax": to_rupees(summary["total_tax"]),
+            })
+
+        total_split = pricing_engine.split_gst(total_tax_paise)
 
         return {
             "return_type": "GSTR-1",
@@ -171,17 +185,17 @@ class GSTComplianceEngine:
             "filing_deadline": self._get_filing_deadline("GSTR-1", year, month),
             "summary": {
                 "total_invoices": len(bills),
-                "total_taxable_value": round(total_taxable, 2),
-                "total_tax": round(total_tax, 2),
-                "total_cgst": round(total_tax / 2, 2),
-                "total_sgst": round(total_tax / 2, 2),
+                "total_taxable_value": to_rupees(total_taxable_paise),
+                "total_tax": to_rupees(total_tax_paise),
+                "total_cgst": to_rupees(total_split["cgst"]),
+                "total_sgst": to_rupees(total_split["sgst"]),
                 "total_igst": 0,
             },
             "b2b_supplies": b2b_supplies,
             "b2c_large": b2c_large,
             "b2c_small_count": len(b2c_small),
-            "b2c_small_total": round(sum(e["total"] for e in b2c_small), 2),
-            "hsn_summary": list(hsn_summary.values()),
+            "b2c_small_total": to_rupees(b2c_small_paise),
+            "hsn_summary": hsn_rows,
         }
 
     async def generate_gstr3b(
@@ -207,11 +221,14 @@ class GSTComplianceEngine:
         )
         row = result.one()
         count = row[0] or 0
-        total = float(row[1] or 0)
-        tax = float(row[2] or 0)
-        discount = float(row[3] or 0)
+        total_paise = to_paise(row[1])
+        tax_paise = to_paise(row[2])
+        discount = to_rupees(to_paise(row[3]))
+        split = pricing_engine.split_gst(tax_paise)
 
-        taxable = total - tax
+        total = to_rupees(total_paise)
+        tax = to_rupees(tax_paise)
+        taxable = to_rupees(total_paise - tax_paise)
 
         return {
             "return_type": "GSTR-3B",
@@ -219,10 +236,10 @@ class GSTComplianceEngine:
             "filing_deadline": self._get_filing_deadline("GSTR-3B", year, month),
             "3_1": {
                 "description": "Outward supplies and inward supplies (reverse charge)",
-                "taxable_value": round(taxable, 2),
+                "taxable_value": taxable,
                 "igst": 0,
-                "cgst": round(tax / 2, 2),
-                "sgst": round(tax / 2, 2),
+                "cgst": to_rupees(split["cgst"]),
+                "sgst": to_rupees(split["sgst"]),
                 "cess": 0,
             },
             "3_2": {
@@ -239,16 +256,16 @@ class GSTComplianceEngine:
             "5": {
                 "description": "Tax payable",
                 "igst": 0,
-                "cgst": round(tax / 2, 2),
-                "sgst": round(tax / 2, 2),
-                "total_payable": round(tax, 2),
+                "cgst": to_rupees(split["cgst"]),
+                "sgst": to_rupees(split["sgst"]),
+                "total_payable": tax,
             },
             "summary": {
                 "total_invoices": count,
-                "total_sales": round(total, 2),
-                "total_discount": round(discount, 2),
-                "total_taxable": round(taxable, 2),
-                "total_tax": round(tax, 2),
+                "total_sales": total,
+                "total_discount": discount,
+                "total_taxable": taxable,
+                "total_tax": tax,
             }
         }
 
@@ -305,32 +322,20 @@ class GSTComplianceEngine:
         seller_state: str, buyer_state: Optional[str] = None
     ) -> Dict[str, Any]:
         """Calculate CGST/SGST/IGST based on seller and buyer states"""
-        tax_amount = round(amount * (gst_rate / 100), 2)
-        is_interstate = buyer_state and buyer_state != seller_state
-
-        if is_interstate:
-            return {
-                "taxable_amount": amount,
-                "gst_rate": gst_rate,
-                "igst": tax_amount,
-                "cgst": 0,
-                "sgst": 0,
-                "total_tax": tax_amount,
-                "total_with_tax": round(amount + tax_amount, 2),
-                "supply_type": "inter_state"
-            }
-        else:
-            half_tax = round(tax_amount / 2, 2)
-            return {
-                "taxable_amount": amount,
-                "gst_rate": gst_rate,
-                "igst": 0,
-                "cgst": half_tax,
-                "sgst": half_tax,
-                "total_tax": tax_amount,
-                "total_with_tax": round(amount + tax_amount, 2),
-                "supply_type": "intra_state"
-            }
+        taxable_paise, _, tax_paise, total_paise = pricing_engine.price_line(amount, 1, 0, gst_rate)
+        is_interstate = bool(buyer_state and buyer_state != seller_state)
+        split = pricing_engine.split_gst(tax_paise, interstate=is_interstate)
+
+        return {
+            "taxable_amount": to_rupees(taxable_paise),
+            "gst_rate": gst_rate,
+            "igst": to_rupees(split["igst"]),
+            "cgst": to_rupees(split["cgst"]),
+            "sgst": to_rupees(split["sgst"]),
+            "total_tax": to_rupees(tax_paise),
+            "total_with_tax": to_rupees(total_paise),
+            "supply_type": "inter_state" if is_interstate else "intra_state"
+        }
 
     async def check_compliance_status(
         self, db: AsyncSession, store_id: int
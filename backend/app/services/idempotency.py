@@ -0,0 +1,288 @@
+"""
+KadaiGPT - Idempotency-Key Response Cache
+Makes retried POSTs from flaky (3G) cashier tablets safe.
+
+Strategy:
+- Clients send an `Idempotency-Key` header with a mutating request
+- The first response for (store, user, method, path, key) is stored for a TTL
+- Retries get the stored response back without touching the database
+- Concurrent duplicates wait for the in-flight request and share its result
+- Reusing a key with a different request body is rejected (422)
+
+Backends: bounded in-memory LRU (default) or Redis (settings.redis_url)
+when idempotency_backend = "redis" and the redis package is installed.
+"""
+
+import asyncio
+import functools
+import hashlib
+import inspect
+import json
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, Optional
+
+from fastapi import Header, HTTPException, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+
+from app.config import settings
+
+logger = logging.getLogger("KadaiGPT.Idempotency")
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+
+@dataclass
+class IdempotencyRecord:
+    """A stored response for one idempotency key"""
+    fingerprint: str
+    status_code: int
+    body: Any
+
+
+class IdempotencyConflict(Exception):
+    """Another request with the same key is still in flight"""
+    pass
+
+
+class MemoryIdempotencyStore:
+    """
+    Per-process store: LRU-bounded, TTL-expiring, with in-flight futures
+    so concurrent duplicates wait instead of executing twice.
+    """
+
+    def __init__(self, ttl_seconds: int, max_entries: int, wait_timeout: float = 30.0):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.wait_timeout = wait_timeout
+        self._records: "OrderedDict[str, tuple]" = OrderedDict()
+        self._in_flight: Dict[str, asyncio.Future] = {}
+
+    def _get(self, key: str) -> Optional[IdempotencyRecord]:
+        entry = self._records.get(key)
+        if entry is None:
+            return None
+        expires_at, record = entry
+        if expires_at < time.monotonic():
+            del self._records[key]
+            return None
+        self._records.move_to_end(key)
+        return record
+
+    async def begin(self, key: str) -> Optional[IdempotencyRecord]:
+        """
+        Return the stored record for key, or None if the caller now owns the
+        key and must execute the request (then call complete() or release()).
+        """
+        deadline = time.monotonic() + self.wait_timeout
+        while True:
+            record = self._get(key)
+            if record is not None:
+                return record
+
+            future = self._in_flight.get(key)
+            if future is None:
+                self._in_flight[key] = asyncio.get_running_loop().create_future()
+                return None
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise IdempotencyConflict(key)
+            try:
+                await asyncio.wait_for(asyncio.shield(future), timeout=remaining)
+            except asyncio.TimeoutError:
+                raise IdempotencyConflict(key)
+
+    async def complete(self, key: str, record: IdempotencyRecord):
+        """Store the response and wake any waiting duplicates"""
+        self._records[key] = (time.monotonic() + self.ttl_seconds, record)
+        self._records.move_to_end(key)
+        while len(self._records) > self.max_entries:
+            self._records.popitem(last=False)
+        self._finish(key)
+
+    async def release(self, key: str):
+        """Give up ownership without storing (the request failed)"""
+        self._finish(key)
+
+    def _finish(self, key: str):
+        future = self._in_flight.pop(key, None)
+        if future is not None and not future.done():
+            future.set_result(None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "memory",
+            "entries": len(self._records),
+            "in_flight": len(self._in_flight),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds
+        }
+
+
+class RedisIdempotencyStore:
+    """
+    Shared store for multi-worker deployments. Ownership is a SET NX lock,
+    duplicates in other workers poll for the stored response.
+    """
+
+    POLL_INTERVAL_SECONDS = 0.05
+
+    def __init__(self, redis_client, ttl_seconds: int, wait_timeout: float = 30.0):
+        self._redis = redis_client
+        self.ttl_seconds = ttl_seconds
+        self.wait_timeout = wait_timeout
+
+    async def begin(self, key: str) -> Optional[IdempotencyRecord]:
+        deadline = time.monotonic() + self.wait_timeout
+        while True:
+            raw = await self._redis.get(f"idem:{key}")
+            if raw is not None:
+                return IdempotencyRecord(**json.loads(raw))
+
+            lock_ms = int(self.wait_timeout * 1000)
+            if await self._redis.set(f"idem:{key}:lock", "1", nx=True, px=lock_ms):
+                return None
+
+            if time.monotonic() >= deadline:
+                raise IdempotencyConflict(key)
+            await asyncio.sleep(self.POLL_INTERVAL_SECONDS)
+
+    async def complete(self, key: str, record: IdempotencyRecord):
+        await self._redis.set(f"idem:{key}", json.dumps(asdict(record)), ex=self.ttl_seconds)
+        await self._redis.delete(f"idem:{key}:lock")
+
+    async def release(self, key: str):
+        await self._redis.delete(f"idem:{key}:lock")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"backend": "redis", "ttl_seconds": self.ttl_seconds}
+
+
+def create_idempotency_store():
+    """Build the configured store, falling back to memory if Redis is unavailable"""
+    if settings.idempotency_backend == "redis":
+        try:
+            import redis.asyncio as redis_asyncio
+            client = redis_asyncio.from_url(settings.redis_url)
+            logger.info("[Idempotency] Using Redis backend")
+            return RedisIdempotencyStore(client, settings.idempotency_ttl_seconds)
+        except ImportError:
+            logger.warning("[Idempotency] redis package not installed, using in-memory store")
+    return MemoryIdempotencyStore(settings.idempotency_ttl_seconds, settings.idempotency_max_entries)
+
+
+idempotency_store = create_idempotency_store()
+
+
+def _request_fingerprint(request: Request, kwargs: Dict[str, Any]) -> str:
+    """Hash of the query string and the parsed body models of a request"""
+    bodies = {
+        name: value.model_dump(mode="json")
+        for name, value in kwargs.items()
+        if hasattr(value, "model_dump")
+    }
+    payload = json.dumps({"query": str(request.url.query), "body": bodies}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _serialize(result: Any) -> tuple:
+    """(status_code, JSON body) for a handler's return value, or None if not cacheable"""
+    if isinstance(result, Response):
+        if not isinstance(result, JSONResponse):
+            return None
+        return result.status_code, json.loads(result.body)
+    return None, jsonable_encoder(result)
+
+
+def idempotent(status_code: int = 200):
+    """
+    Route decorator adding Idempotency-Key support to a mutating endpoint.
+
+    Usage:
+        @router.post("/{customer_id}/payment", response_model=dict)
+        @idempotent()
+        async def record_payment(..., current_user: User = Depends(...)):
+
+    The endpoint must take `current_user`; keys are scoped per store and user.
+    Requests without the header run exactly as before.
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+        parameters = list(signature.parameters.values()) + [
+            inspect.Parameter(
+                "idempotency_request", inspect.Parameter.KEYWORD_ONLY, annotation=Request
+            ),
+            inspect.Parameter(
+                "idempotency_key", inspect.Parameter.KEYWORD_ONLY,
+                annotation=Optional[str],
+                default=Header(default=None, alias=IDEMPOTENCY_HEADER)
+            ),
+        ]
+
+        @functools.wraps(func)
+        async def wrapper(
+            *args, idempotency_request: Optional[Request] = None,
+            idempotency_key: Optional[str] = None, **kwargs
+        ):
+            # Direct in-process calls (e.g. OCR convert-to-bill) pass neither
+            if idempotency_request is None or not idempotency_key:
+                return await func(*args, **kwargs)
+
+            user = kwargs.get("current_user")
+            scope = ":".join([
+                str(getattr(user, "store_id", "")),
+                str(getattr(user, "id", "")),
+                idempotency_request.method,
+                idempotency_request.url.path,
+                idempotency_key[:255],
+            ])
+            fingerprint = _request_fingerprint(idempotency_request, kwargs)
+
+            try:
+                record = await idempotency_store.begin(scope)
+            except IdempotencyConflict:
+                raise HTTPException(
+                    status_code=409,
+                    detail="A request with this Idempotency-Key is still being processed"
+                )
+            except Exception as e:
+                # Backend down: serve the request rather than block checkout
+                logger.warning(f"[Idempotency] Store unavailable, executing without key: {e}")
+                return await func(*args, **kwargs)
+
+            if record is not None:
+                if record.fingerprint != fingerprint:
+                    raise HTTPException(
+                        status_code=422,
+                        detail="Idempotency-Key was already used with a different request"
+                    )
+                return JSONResponse(
+                    content=record.body,
+                    status_code=record.status_code,
+                    headers={REPLAYED_HEADER: "true"}
+                )
+
+            try:
+                result = await func(*args, **kwargs)
+            except BaseException:
+                await idempotency_store.release(scope)
+                raise
+
+            serialized = _serialize(result)
+            if serialized is None:
+                await idempotency_store.release(scope)
+            else:
+                result_status, body = serialized
+                await idempotency_store.complete(
+                    scope, IdempotencyRecord(fingerprint, result_status or status_code, body)
+                )
+            return result
+
+        wrapper.__signature__ = signature.replace(parameters=parameters)
+        return wrapper
+    return decorator
@@ -0,0 +1,202 @@
+"""
+KadaiGPT - Inventory Insights
+SQL-side low-stock, reorder and insight queries for the inventory endpoints
+and the dashboard.
+
+Strategy:
+- "Low stock" is one predicate, current_stock <= min_stock_alert, shared
+  by every query and by the partial index idx_products_low_stock, so
+  low-stock reads touch only the products that are actually low
+- products.sales_velocity holds units sold per day over the last
+  VELOCITY_DAYS days; days of cover (current_stock / sales_velocity) is
+  computed and sorted on in SQL
+- The velocity column is refreshed per store at most every
+  inventory_velocity_refresh_seconds, lazily on the first inventory read:
+  one GROUP BY over the window's sales, then UPDATEs for just the products
+  whose velocity changed
+- Insights rank by a SQL priority expression that mirrors InventoryAgent's
+  rules and fetch only the top rows; the agent words the recommendations
+  for those rows
+- Low-stock and expiring products always outrank the rest (priority >= 7
+  vs <= 4), so the top rows are read from those two sets first, through
+  the partial indexes idx_products_low_stock and idx_products_expiry; the
+  rest of the catalogue is ranked only when they run short
+"""
+
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import and_, bindparam, case, func, not_, select, union
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.models import Product
+from app.services.product_search import product_search
+
+logger = logging.getLogger("KadaiGPT.InventoryInsights")
+
+EXPIRY_WARNING_DAYS = 7  # InventoryAgent flags expiry within 7 whole days
+OVERSTOCK_DAYS = 90
+
+STOCK = func.coalesce(Product.current_stock, 0)
+MIN_STOCK = func.coalesce(Product.min_stock_alert, 10)
+LOW_STOCK = Product.current_stock <= Product.min_stock_alert  # idx_products_low_stock predicate
+DAYS_OF_COVER = case((Product.sales_velocity > 0, STOCK / Product.sales_velocity), else_=None)
+
+PRODUCT_COLUMNS = (
+    Product.id, Product.name, STOCK.label("current_stock"), MIN_STOCK.label("min_stock_alert"),
+    Product.cost_price, Product.selling_price, Product.expiry_date,
+    func.coalesce(Product.sales_velocity, 0).label("sales_velocity"),
+    DAYS_OF_COVER.label("days_of_cover"),
+)
+
+
+def expiring(now: datetime):
+    return and_(Product.expiry_date.isnot(None),
+                Product.expiry_date < now + timedelta(days=EXPIRY_WARNING_DAYS + 1))
+
+
+def urgent(store_id: int, now: datetime):
+    """Ids the agent alerts on with priority >= 7: low stock or expiring, one index each"""
+    return union(
+        select(Product.id).where(Product.store_id == store_id, LOW_STOCK),
+        select(Product.id).where(Product.store_id == store_id, expiring(now)),
+    )
+
+
+def priority(now: datetime):
+    """InventoryAgent's alert priority (1-10) as a SQL expression"""
+    base = case(
+        (expiring(now), 9),
+        (STOCK <= MIN_STOCK * 0.5, 10),
+        (STOCK <= MIN_STOCK, 7),
+        (DAYS_OF_COVER >= OVERSTOCK_DAYS + 1, 4),
+        else_=1
+    )
+    # int(days_of_stock) <= 1 / <= 3
+    boost = case((DAYS_OF_COVER < 2, 2), (DAYS_OF_COVER < 4, 1), else_=0)
+    return case((base + boost > 10, 10), else_=base + boost)
+
+
+class InventoryInsights:
+    """Per-store inventory reads computed in the database"""
+
+    def __init__(self, refresh_seconds: float):
+        self.refresh_seconds = refresh_seconds
+        self._refreshed_at: Dict[int, float] = {}
+        self._refreshes = 0
+        self._updated_rows = 0
+
+    # ─── Sales velocity ──────────────────────────────────────────
+
+    async def ensure_fresh(self, db: AsyncSession, store_id: int):
+        """Refresh the store's sales_velocity column if it is older than refresh_seconds"""
+        refreshed_at = self._refreshed_at.get(store_id)
+        if refreshed_at is not None and time.monotonic() - refreshed_at < self.refresh_seconds:
+            return
+        await self.refresh_velocity(db, store_id)
+
+    async def refresh_velocity(self, db: AsyncSession, store_id: int) -> int:
+        """Recompute units/day per product and write the changed ones; returns rows updated"""
+        velocity = await product_search.load_velocity(db, store_id)
+        result = await db.execute(
+            select(Product.id, Product.sales_velocity)
+            .where(Product.store_id == store_id, Product.sales_velocity > 0)
+        )
+        current = dict(result.all())
+
+        fresh = {product_id: max(0.0, round(v, 4)) for product_id, v in velocity.items()}
+        changed = [
+            {"b_id": product_id, "b_velocity": v}
+            for product_id, v in fresh.items()
+            if abs((current.get(product_id) or 0) - v) > 1e-9
+        ]
+        changed.extend({"b_id": product_id, "b_velocity": 0.0}
+                       for product_id in current if product_id not in fresh)
+        if changed:
+            table = Product.__table__
+            await db.execute(
+                table.update()
+                .where(and_(table.c.id == bindparam("b_id"), table.c.store_id == store_id))
+                .values(sales_velocity=bindparam("b_velocity")),
+                changed
+            )
+            await db.commit()
+
+        self._refreshed_at[store_id] = time.monotonic()
+        self._refreshes += 1
+        self._updated_rows += len(changed)
+        return len(changed)
+
+    # ─── Queries ─────────────────────────────────────────────────
+
+    async def stock_counts(self, db: AsyncSession, store_id: int) -> Dict[str, int]:
+        """Active and low-stock product counts in one statement"""
+        active = and_(Product.store_id == store_id, Product.is_active == True)
+        result = await db.execute(select(
+            select(func.count()).select_from(Product).where(active).scalar_subquery(),
+            select(func.count()).select_from(Product).where(active, LOW_STOCK).scalar_subquery(),
+        ))
+        total, low = result.one()
+        return {"total_products": total, "low_stock": low}
+
+    async def low_stock(self, db: AsyncSession, store_id: int, exclude_expiring: bool = False) -> List[Any]:
+        """Active low-stock products, fewest days of cover first"""
+        query = select(*PRODUCT_COLUMNS).where(
+            Product.store_id == store_id, Product.is_active == True, LOW_STOCK
+        )
+        if exclude_expiring:
+            query = query.where(not_(expiring(datetime.now())))
+        result = await db.execute(
+            query.order_by(DAYS_OF_COVER.asc().nulls_last(), Product.current_stock, Product.id)
+        )
+        return result.all()
+
+    async def top_priority(self, db: AsyncSession, store_id: int, limit: int = 20) -> List[Any]:
+        """The `limit` active products with the most urgent alerts"""
+        now = datetime.now()
+        ranked = (
+            select(*PRODUCT_COLUMNS)
+            .where(Product.store_id == store_id, Product.is_active == True)
+            .order_by(priority(now).desc(), DAYS_OF_COVER.asc().nulls_last(), Product.id)
+        )
+        rows = (await db.execute(ranked.where(Product.id.in_(urgent(store_id, now))).limit(limit))).all()
+        if len(rows) < limit:
+            rest = ranked.where(Product.id.notin_([row.id for row in rows])) if rows else ranked
+            rows.extend((await db.execute(rest.limit(limit - len(rows)))).all())
+        return rows
+
+    def clear(self):
+        self._refreshed_at.clear()
+
+    def get_stats(self) -> dict:
+        return {
+            "stores_refreshed": len(self._refreshed_at),
+            "refreshes": self._refreshes,
+            "velocity_rows_updated": self._updated_rows,
+            "refresh_seconds": self.refresh_seconds,
+        }
+
+
+def product_dict(row) -> Dict[str, Any]:
+    """A query row in the shape InventoryAgent takes"""
+    return {
+        "id": row.id,
+        "name": row.name,
+        "current_stock": row.current_stock,
+        "min_stock_alert": row.min_stock_alert,
+        "cost_price": row.cost_price or 0,
+        "selling_price": row.selling_price,
+        "expiry_date": row.expiry_date,
+        "sales_velocity": row.sales_velocity,
+    }
+
+
+def days_of_cover(row) -> Optional[float]:
+    return round(row.days_of_cover, 1) if row.days_of_cover is not None else None
+
+
+# Global singleton
+inventory_insights = InventoryInsights(refresh_seconds=settings.inventory_velocity_refresh_seconds)
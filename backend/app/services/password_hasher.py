@@ -0,0 +1,130 @@
+"""
+KadaiGPT - Password Hashing
+bcrypt off the event loop, with a tunable cost and rehash-on-login.
+
+Strategy:
+- bcrypt takes 100-300 ms of CPU per call; it runs in a dedicated thread
+  pool (bcrypt releases the GIL) so a login burst at shift change doesn't
+  stall every other request on the worker
+- The pool has its own worker count and a bounded queue; beyond that,
+  callers get PasswordHasherBusy instead of piling up behind each other
+- Queue wait and hashing time go into histograms (GET /api/health)
+- bcrypt_rounds sets the cost of new hashes; a login whose stored hash has
+  a different cost gets a fresh hash to save in the same transaction
+"""
+
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional, Tuple
+
+from passlib.context import CryptContext
+
+from app.config import settings
+from app.middleware.query_metrics import Histogram
+
+logger = logging.getLogger("KadaiGPT.PasswordHasher")
+
+TIMING_BOUNDS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class PasswordHasherBusy(Exception):
+    """More hashing requests in flight than the pool and its queue admit"""
+
+
+class PasswordHasher:
+    """bcrypt hashing and verification on a bounded thread pool"""
+
+    def __init__(self, rounds: int, workers: int, max_queue: int):
+        self.context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=rounds)
+        self.rounds = rounds
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._in_flight = 0  # running + waiting for a worker
+        self._peak_waiting = 0
+        self._completed = 0
+        self._rejected = 0
+        self._rehashed = 0
+        self._wait_ms = Histogram(TIMING_BOUNDS_MS)
+        self._hash_ms = Histogram(TIMING_BOUNDS_MS)
+
+    # ─── Public API ──────────────────────────────────────────────
+
+    async def hash(self, password: str) -> str:
+        """bcrypt hash at the configured cost"""
+        return await self._run(self.context.hash, password)
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        return await self._run(self.context.verify, password, hashed)
+
+    async def verify_and_update(self, password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+        """
+        (valid, new_hash). new_hash is set when the password is valid but the
+        stored hash was made with a different cost; the caller saves it.
+        """
+        valid, new_hash = await self._run(self.context.verify_and_update, password, hashed)
+        if new_hash is not None:
+            self._rehashed += 1
+        return valid, new_hash
+
+    def configure(self, rounds: int):
+        """Change the cost of new hashes (existing ones upgrade on next login)"""
+        self.context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=rounds)
+        self.rounds = rounds
+
+    # ─── Pool ────────────────────────────────────────────────────
+
+    async def _run(self, func: Callable[..., Any], *args) -> Any:
+        if self._in_flight >= self.workers + self.max_queue:
+            self._rejected += 1
+            logger.warning(f"[PasswordHasher] Queue full ({self._in_flight} in flight), rejecting")
+            raise PasswordHasherBusy("Password hashing queue is full")
+
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+
+        self._in_flight += 1
+        self._peak_waiting = max(self._peak_waiting, self._in_flight - self.workers)
+        submitted = time.perf_counter()
+        started = []
+
+        def timed():
+            started.append(time.perf_counter())
+            return func(*args)
+
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(self._executor, timed)
+        finally:
+            self._in_flight -= 1
+            if started:
+                self._wait_ms.observe((started[0] - submitted) * 1000)
+                self._hash_ms.observe((time.perf_counter() - started[0]) * 1000)
+        self._completed += 1
+        return result
+
+    # ─── Metrics ─────────────────────────────────────────────────
+
+    def get_status(self) -> dict:
+        return {
+            "rounds": self.rounds,
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "in_flight": self._in_flight,
+            "waiting": max(self._in_flight - self.workers, 0),
+            "peak_waiting": self._peak_waiting,
+            "completed": self._completed,
+            "rejected": self._rejected,
+            "rehashed": self._rehashed,
+            "queue_wait_ms": self._wait_ms.to_dict(),
+            "hash_ms": self._hash_ms.to_dict(),
+        }
+
+
+# Global singleton
+password_hasher = PasswordHasher(
+    rounds=settings.bcrypt_rounds,
+    workers=settings.password_hash_workers,
+    max_queue=settings.password_hash_max_queue
+)
@@ -0,0 +1,182 @@
+"""
+KadaiGPT - Pricing Engine
+Line, cart and GST arithmetic in integer paise.
+
+Strategy:
+- Inputs (rupees, quantities, percentages) are scaled to integers once:
+  prices to paise, quantities to thousandths (grams / ml), rates to basis points
+- Every amount is then integer math with round-half-up at fixed points:
+  line subtotal, line discount, line tax
+- Cart totals are exact sums of the rounded line amounts, so a bill's total
+  always equals the sum of its printed lines
+- price_carts() prices many carts column-wise in one pass (batch sync, reports)
+
+Amounts leave the engine as rupee floats with at most two decimals, which is
+what the Float columns and API schemas already carry.
+"""
+
+import logging
+from decimal import Decimal, ROUND_HALF_UP
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger("KadaiGPT.Pricing")
+
+PAISE_PER_RUPEE = 100
+QUANTITY_SCALE = 1000     # quantities to 3 decimals
+RATE_SCALE = 100          # percentages to 2 decimals (basis points)
+PERCENT_SCALE = 100 * RATE_SCALE
+
+# (unit_price, quantity, discount_percent, tax_rate) in API units
+PriceLine = Tuple[float, float, Optional[float], Optional[float]]
+# (subtotal, discount, tax, total) in paise
+LineAmounts = Tuple[int, int, int, int]
+
+
+@lru_cache(maxsize=8192)
+def _scale(value: float, factor: int) -> int:
+    """Scale a decimal value to an integer, rounding half up (away from zero)"""
+    return int((Decimal(repr(value)) * factor).to_integral_value(rounding=ROUND_HALF_UP))
+
+
+def _scale_column(values: Sequence[Optional[float]], factor: int) -> List[int]:
+    """Scale a column of values, converting each distinct value only once"""
+    lookup = {value: _scale(value or 0, factor) for value in set(values)}
+    return [lookup[value] for value in values]
+
+
+def to_paise(amount: Optional[float]) -> int:
+    """Rupees -> paise"""
+    return _scale(float(amount or 0), PAISE_PER_RUPEE)
+
+
+def to_rupees(paise: int) -> float:
+    """Paise -> rupees"""
+    return paise / PAISE_PER_RUPEE
+
+
+def div_half_up(numerator: int, denominator: int) -> int:
+    """Integer division rounding half away from zero (denominator > 0)"""
+    if numerator >= 0:
+        return (2 * numerator + denominator) // (2 * denominator)
+    return -((-2 * numerator + denominator) // (2 * denominator))
+
+
+class PricingEngine:
+    """
+    Deterministic billing arithmetic.
+
+    Features:
+    - price_line / price_cart for the single-bill path (one pass per bill)
+    - price_carts for many carts at once (columnar, shared input scaling)
+    - split_gst for CGST/SGST/IGST that always adds back up to the tax
+    """
+
+    @staticmethod
+    def price_line(
+        unit_price: float, quantity: float,
+        discount_percent: Optional[float] = 0, tax_rate: Optional[float] = 0
+    ) -> LineAmounts:
+        """Amounts in paise for one line"""
+        subtotal = div_half_up(to_paise(unit_price) * _scale(float(quantity or 0), QUANTITY_SCALE), QUANTITY_SCALE)
+        discount = div_half_up(subtotal * _scale(float(discount_percent or 0), RATE_SCALE), PERCENT_SCALE)
+        taxable = subtotal - discount
+        tax = div_half_up(taxable * _scale(float(tax_rate or 0), RATE_SCALE), PERCENT_SCALE)
+        return subtotal, discount, tax, taxable + tax
+
+    def price_cart(self, lines: Sequence[PriceLine]) -> Tuple[List[LineAmounts], Dict[str, int]]:
+        """Line amounts and cart totals (all paise) for one bill"""
+        return self.price_carts([lines])[0]
+
+    def price_carts(
+        self, carts: Sequence[Sequence[PriceLine]]
+    ) -> List[Tuple[List[LineAmounts], Dict[str, int]]]:
+        """
+        Price many carts in one columnar pass.
+
+        All lines are flattened, each input column is scaled once, the four
+        amount columns are computed with integer comprehensions, and the
+        results are sliced back per cart.
+        """
+        flat = [line for cart in carts for line in cart]
+        if not flat:
+            return [([], self._totals(0, 0, 0)) for _ in carts]
+
+        prices, quantities, discounts, rates = zip(*flat)
+        prices = _scale_column(prices, PAISE_PER_RUPEE)
+        quantities = _scale_column(quantities, QUANTITY_SCALE)
+        discounts = _scale_column(discounts, RATE_SCALE)
+        rates = _scale_column(rates, RATE_SCALE)
+
+        if min(prices) >= 0 and min(quantities) >= 0 and min(rates) >= 0 and 0 <= min(discounts) <= max(discounts) <= PERCENT_SCALE:
+            # Common case, everything non-negative: inline half-up division
+            q2, p2 = 2 * QUANTITY_SCALE, 2 * PERCENT_SCALE
+            subtotals = [(2 * p * q + QUANTITY_SCALE) // q2 for p, q in zip(prices, quantities)]
+            discount_amounts = [(2 * s * d + PERCENT_SCALE) // p2 for s, d in zip(subtotals, discounts)]
+            taxables = [s - d for s, d in zip(subtotals, discount_amounts)]
+            taxes = [(2 * t * r + PERCENT_SCALE) // p2 for t, r in zip(taxables, rates)]
+        else:
+            subtotals = [div_half_up(p * q, QUANTITY_SCALE) for p, q in zip(prices, quantities)]
+            discount_amounts = [div_half_up(s * d, PERCENT_SCALE) for s, d in zip(subtotals, discounts)]
+            taxables = [s - d for s, d in zip(subtotals, discount_amounts)]
+            taxes = [div_half_up(t * r, PERCENT_SCALE) for t, r in zip(taxables, rates)]
+        amounts = list(zip(subtotals, discount_amounts, taxes, [t + x for t, x in zip(taxables, taxes)]))
+
+        priced = []
+        offset = 0
+        for cart in carts:
+            end = offset + len(cart)
+            priced.append((amounts[offset:end], self._totals(
+                sum(subtotals[offset:end]),
+                sum(discount_amounts[offset:end]),
+                sum(taxes[offset:end])
+            )))
+            offset = end
+        return priced
+
+    @staticmethod
+    def _totals(subtotal: int, discount: int, tax: int) -> Dict[str, int]:
+        return {
+            "subtotal": subtotal,
+            "discount_amount": discount,
+            "tax_amount": tax,
+            "total_amount": subtotal - discount + tax
+        }
+
+    @staticmethod
+    def split_gst(tax_paise: int, interstate: bool = False) -> Dict[str, int]:
+        """CGST/SGST halves (odd paisa goes to CGST) or IGST, in paise"""
+        if interstate:
+            return {"cgst": 0, "sgst": 0, "igst": tax_paise}
+        cgst = tax_paise - tax_paise // 2
+        return {"cgst": cgst, "sgst": tax_paise - cgst, "igst": 0}
+
+    @staticmethod
+    def prorate(amount: float, part_quantity: float, full_quantity: float) -> int:
+        """Paise share of a line amount for part of its quantity"""
+        full = _scale(full_quantity or 0, QUANTITY_SCALE)
+        if full == 0:
+            return 0
+        return div_half_up(to_paise(amount) * _scale(part_quantity or 0, QUANTITY_SCALE), full)
+
+    @staticmethod
+    def change_due(amount_paid: float, total_amount: float) -> float:
+        """Change to return in rupees, never negative"""
+        return to_rupees(max(0, to_paise(amount_paid) - to_paise(total_amount)))
+
+    @staticmethod
+    def totals_in_rupees(totals: Dict[str, int]) -> Dict[str, float]:
+        return {key: to_rupees(value) for key, value in totals.items()}
+
+    @staticmethod
+    def line_in_rupees(amounts: LineAmounts) -> Dict[str, float]:
+        subtotal, discount, tax, total = amounts
+        return {
+            "subtotal": to_rupees(subtotal),
+            "discount_amount": to_rupees(discount),
+            "tax_amount": to_rupees(tax),
+            "total": to_rupees(total)
+        }
+
+
+pricing_engine = PricingEngine()
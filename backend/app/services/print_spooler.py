@@ -0,0 +1,333 @@
+"""
+KadaiGPT - Print Spooler
+Durable asynchronous receipt printing backed by the print_jobs table.
+
+Strategy:
+- Billing endpoints only INSERT a PrintJob row and return
+- One asyncio worker per printer drains that printer's queue in job order
+- A worker claims a job with a guarded UPDATE (only if still pending, or
+  printing under an expired lease), so two workers or processes never
+  print the same job
+- Failed attempts, including exceptions while rendering or printing, are
+  retried with exponential backoff up to max_attempts
+- Jobs survive restarts: pending rows, and printing rows whose claim is
+  older than print_job_lease_seconds, are picked up again
+- Rendered receipts come from the bill cache, so reprints skip rendering
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.database import async_session_maker
+from app.models import Bill, BillItem, PrintJob
+from app.agents.print_agent import print_agent
+from app.services.bill_cache import bill_cache
+from app.services.change_feed import change_feed
+from app.services.sales_counters import local_bill_time
+
+logger = logging.getLogger("KadaiGPT.PrintSpooler")
+
+JOB_PENDING = "pending"
+JOB_PRINTING = "printing"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+
+
+def build_print_payload(bill: Bill, items: List[BillItem], store_name: Optional[str]) -> Dict[str, Any]:
+    """Build the bill dict the PrintAgent renders receipts from"""
+    return {
+        "id": bill.id,
+        "bill_number": bill.bill_number,
+        "bill_date": local_bill_time(bill.bill_date),
+        "store_name": store_name or "KadaiGPT Store",
+        "items": [
+            {
+                "product_name": item.product_name,
+                "quantity": item.quantity,
+                "total": item.total
+            }
+            for item in items
+        ],
+        "total_amount": bill.total_amount
+    }
+
+
+def render_receipt(bill: Bill) -> Tuple[Dict[str, Any], str]:
+    """Print payload and receipt text for a bill loaded with items and store"""
+    payload = build_print_payload(bill, bill.items, bill.store.name if bill.store else None)
+    return payload, print_agent.generate_receipt_content(payload)
+
+
+class PrintSpooler:
+    """
+    Per-printer print queues persisted in print_jobs.
+
+    A job's printer_name is the queue it belongs to. "auto" jobs let the
+    PrintAgent pick a ready printer at print time.
+    """
+
+    BASE_BACKOFF_SECONDS = 2
+    MAX_BACKOFF_SECONDS = 60
+    IDLE_POLL_SECONDS = 30
+
+    def __init__(self, session_factory: Callable[[], AsyncSession] = async_session_maker,
+                 lease_seconds: float = settings.print_job_lease_seconds):
+        self._session_factory = session_factory
+        self.lease_seconds = lease_seconds
+        self._workers: Dict[str, asyncio.Task] = {}
+        self._wakeups: Dict[str, asyncio.Event] = {}
+        self._running = False
+        self._printed_count = 0
+        self._failed_count = 0
+        self._last_error: Optional[str] = None
+
+    # ─── Producer side ───────────────────────────────────────────
+
+    async def enqueue(
+        self, db: AsyncSession, bill_id: int, printer_name: Optional[str] = None
+    ) -> PrintJob:
+        """
+        Add a print job to the caller's transaction.
+
+        The caller commits and then calls wake() so the worker picks it up.
+        """
+        job = PrintJob(
+            bill_id=bill_id,
+            printer_name=printer_name or settings.default_printer_name,
+            status=JOB_PENDING,
+            attempts=0
+        )
+        db.add(job)
+        await db.flush()
+        return job
+
+    def wake(self, printer_name: Optional[str] = None):
+        """Signal the printer's worker, starting it if needed"""
+        printer_name = printer_name or settings.default_printer_name
+        if not self._running:
+            return
+        self._ensure_worker(printer_name)
+        self._wakeups[printer_name].set()
+
+    # ─── Lifecycle ───────────────────────────────────────────────
+
+    async def start(self):
+        """Recover unfinished jobs and start a worker for each printer that has any"""
+        if self._running:
+            return
+        self._running = True
+
+        printers: List[str] = []
+        try:
+            async with self._session_factory() as db:
+                # Only expired claims: another live process may be printing the rest
+                await db.execute(
+                    update(PrintJob)
+                    .where(PrintJob.status == JOB_PRINTING, self._lease_expired(datetime.utcnow()))
+                    .values(status=JOB_PENDING)
+                )
+                await db.commit()
+                result = await db.execute(
+                    select(PrintJob.printer_name)
+                    .where(PrintJob.status == JOB_PENDING)
+                    .distinct()
+                )
+                printers = [name or settings.default_printer_name for name in result.scalars().all()]
+        except Exception as e:
+            logger.warning(f"[PrintSpooler] Job recovery skipped: {e}")
+
+        for printer_name in printers:
+            self.wake(printer_name)
+        logger.info(f"[PrintSpooler] Started with {len(printers)} printer queue(s) pending")
+
+    async def stop(self):
+        """Stop all workers. Unfinished jobs stay in the table for the next start."""
+        self._running = False
+        for task in self._workers.values():
+            task.cancel()
+        for task in self._workers.values():
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._workers.clear()
+        self._wakeups.clear()
+        logger.info("[PrintSpooler] Stopped")
+
+    def _ensure_worker(self, printer_name: str):
+        task = self._workers.get(printer_name)
+        if task is None or task.done():
+            self._wakeups.setdefault(printer_name, asyncio.Event())
+            self._workers[printer_name] = asyncio.create_task(self._worker_loop(printer_name))
+
+    # ─── Consumer side ───────────────────────────────────────────
+
+    async def _worker_loop(self, printer_name: str):
+        """Drain one printer's queue, backing off after failed attempts"""
+        wakeup = self._wakeups[printer_name]
+        while self._running:
+            wakeup.clear()
+            try:
+                outcome = await self.process_next(printer_name)
+            except Exception as e:
+                logger.error(f"[PrintSpooler] Worker error on {printer_name}: {e}")
+                outcome = {"status": JOB_PENDING, "attempts": 1}
+
+            if outcome is None:
+                try:
+                    await asyncio.wait_for(wakeup.wait(), timeout=self.IDLE_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+            elif outcome["status"] == JOB_PENDING:
+                await asyncio.sleep(self.backoff_seconds(outcome["attempts"]))
+
+    def backoff_seconds(self, attempts: int) -> float:
+        """Exponential backoff before the next attempt on the same printer"""
+        return min(self.BASE_BACKOFF_SECONDS * 2 ** max(attempts - 1, 0), self.MAX_BACKOFF_SECONDS)
+
+    def _lease_expired(self, now: datetime):
+        return or_(PrintJob.claimed_at.is_(None),
+                   PrintJob.claimed_at < now - timedelta(seconds=self.lease_seconds))
+
+    async def _claim_next(self, db: AsyncSession, printer_name: str) -> Optional[PrintJob]:
+        """Take the oldest claimable job of a printer; None when there is none"""
+        while True:
+            now = datetime.utcnow()
+            claimable = and_(
+                PrintJob.printer_name == printer_name,
+                or_(PrintJob.status == JOB_PENDING,
+                    and_(PrintJob.status == JOB_PRINTING, self._lease_expired(now)))
+            )
+            job_id = (await db.execute(
+                select(PrintJob.id).where(claimable).order_by(PrintJob.id).limit(1)
+            )).scalar_one_or_none()
+            if job_id is None:
+                return None
+
+            claimed = await db.execute(
+                update(PrintJob)
+                .where(PrintJob.id == job_id, claimable)
+                .values(status=JOB_PRINTING, claimed_at=now,
+                        attempts=func.coalesce(PrintJob.attempts, 0) + 1)
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
+            if claimed.rowcount == 1:
+                return await db.get(PrintJob, job_id, populate_existing=True)
+            # Another worker claimed it first; look again
+
+    async def process_next(self, printer_name: str) -> Optional[Dict[str, Any]]:
+        """
+        Claim and print the oldest pending job for a printer.
+
+        Returns None when the queue is empty, otherwise the job's new
+        status and attempt count.
+        """
+        async with self._session_factory() as db:
+            job = await self._claim_next(db, printer_name)
+            if job is None:
+                return None
+            job_id, bill_id = job.id, job.bill_id
+            attempts, max_attempts = job.attempts, job.max_attempts or 1
+
+            try:
+                success, error = await self._print_job(db, job)
+            except Exception as e:
+                await db.rollback()
+                logger.error(f"[PrintSpooler] Job {job_id} raised: {e}")
+                success, error = False, f"{type(e).__name__}: {e}"
+
+            if success:
+                job_status = JOB_COMPLETED
+                await db.execute(
+                    update(PrintJob)
+                    .where(PrintJob.id == job_id)
+                    .values(status=job_status, completed_at=datetime.utcnow(), last_error=None)
+                    .execution_options(synchronize_session=False)
+                )
+                printed = (await db.execute(
+                    update(Bill)
+                    .where(Bill.id == bill_id)
+                    .values(is_printed=True, print_count=func.coalesce(Bill.print_count, 0) + 1)
+                    .returning(Bill.updated_at, Bill.store_id)
+                )).one_or_none()
+                if printed is not None:
+                    change_feed.record(db, printed.store_id, "bill", [bill_id])
+                bill_cache.mark_printed(bill_id, printed.updated_at if printed is not None else None)
+                self._printed_count += 1
+            else:
+                job_status = JOB_FAILED if attempts >= max_attempts else JOB_PENDING
+                await db.execute(
+                    update(PrintJob)
+                    .where(PrintJob.id == job_id)
+                    .values(status=job_status, last_error=error)
+                    .execution_options(synchronize_session=False)
+                )
+                self._last_error = error
+                if job_status == JOB_FAILED:
+                    self._failed_count += 1
+                    logger.warning(f"[PrintSpooler] Job {job_id} failed after {attempts} attempts: {error}")
+            await db.commit()
+
+            return {"job_id": job_id, "status": job_status, "attempts": attempts}
+
+    async def _print_job(self, db: AsyncSession, job: PrintJob) -> Tuple[bool, Optional[str]]:
+        """Render and send one job. Returns (success, error message)."""
+        printable = await bill_cache.get_receipt(db, job.bill_id, render_receipt)
+        if printable is None:
+            return False, "Bill not found"
+        bill_for_print, receipt_content = printable
+        # Release the connection while the printer works (seconds, with retries)
+        await db.commit()
+
+        preferred = None if job.printer_name == "auto" else job.printer_name
+        decision = await print_agent.decide_print_strategy(bill_for_print, preferred)
+        if not decision.should_print:
+            return False, decision.reason
+
+        print_result = await print_agent.execute_silent_print(
+            receipt_content,
+            decision.printer_name,
+            max_retries=1
+        )
+        if print_result.get("success"):
+            return True, None
+        return False, print_result.get("error") or print_result.get("message", "Print failed")
+
+    # ─── Status ──────────────────────────────────────────────────
+
+    async def get_queue_counts(
+        self, db: AsyncSession, store_id: Optional[int] = None
+    ) -> Dict[str, Dict[str, int]]:
+        """Job counts per printer and status, of one store's bills when store_id is given"""
+        query = select(PrintJob.printer_name, PrintJob.status, func.count(PrintJob.id))
+        if store_id is not None:
+            query = query.join(Bill, Bill.id == PrintJob.bill_id).where(Bill.store_id == store_id)
+        result = await db.execute(query.group_by(PrintJob.printer_name, PrintJob.status))
+        counts: Dict[str, Dict[str, int]] = {}
+        for printer_name, job_status, count in result.all():
+            counts.setdefault(printer_name or settings.default_printer_name, {})[job_status] = count
+        return counts
+
+    def get_status(self) -> Dict[str, Any]:
+        """In-process spooler status"""
+        return {
+            "running": self._running,
+            "workers": {
+                name: ("running" if not task.done() else "stopped")
+                for name, task in self._workers.items()
+            },
+            "printed": self._printed_count,
+            "failed": self._failed_count,
+            "last_error": self._last_error
+        }
+
+
+# Global singleton
+print_spooler = PrintSpooler()
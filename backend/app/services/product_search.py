@@ -0,0 +1,524 @@
+"""
+KadaiGPT - Product Search
+POS typeahead over a store's catalogue without scanning the products table.
+
+Strategy:
+- Each store's catalogue is held in memory as a vocabulary of the words in
+  product names plus an inverted index of their trigrams, padded like
+  pg_trgm so the first letters of a word are trigrams of their own. SKU and
+  barcode are indexed as exact codes and by prefix
+- Names are indexed together with their regional equivalents (thuvaram /
+  toor / arhar, paruppu / dal, ...), so "toor dal" finds "Thuvaram Paruppu"
+  and the other way round
+- A query word matches a vocabulary word sharing enough trigrams, so typos
+  still match; the last word is matched as a prefix while it is being typed.
+  A product must match every query word
+- Results rank by match quality, then by sales velocity (units sold per day
+  over the last VELOCITY_DAYS days), so fast movers come first
+- Committed product inserts/updates/deletes patch loaded indexes in place
+  (session events); a bulk UPDATE/DELETE on products drops them. Indexes
+  are rebuilt after product_search_ttl_seconds, which picks up other
+  workers' edits and fresh velocity; stores are evicted LRU
+- product_search_backend = "pg_trgm" ranks with PostgreSQL word_similarity()
+  over a GIN trigram index (migration m0008) instead; other databases
+  always use the in-memory index
+"""
+
+import asyncio
+import heapq
+import logging
+import re
+import time
+import unicodedata
+from bisect import bisect_left
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import and_, func, literal, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.models import Bill, BillItem, BillStatus, Product
+from app.services.write_tracker import TransactionWrites, write_tracker
+
+logger = logging.getLogger("KadaiGPT.ProductSearch")
+
+VELOCITY_DAYS = 30
+MIN_SIMILARITY = 0.45      # share of trigrams a fuzzy word match needs
+MIN_CODE_PREFIX = 3        # shortest SKU/barcode prefix that is searched
+MAX_CODE_PREFIX_MATCHES = 100
+MAX_CANDIDATES = 2000      # ranked ids handed to SQL when it has to filter
+
+# Regional names for common kirana items; a product is indexed under every
+# name in its group
+ALIAS_GROUPS = [
+    ("toor", "thuvaram", "thuvarai", "tuvar", "arhar", "kandi", "togari"),
+    ("dal", "daal", "dhal", "paruppu", "parippu", "pappu", "bele"),
+    ("urad", "urid", "ulundu", "uddina", "minumulu"),
+    ("moong", "mung", "pasi", "payaru", "pesara", "hesaru"),
+    ("chana", "kadalai", "senagalu", "kadale", "chickpea"),
+    ("rice", "arisi", "chawal", "biyyam", "akki"),
+    ("wheat", "godhumai", "gehun", "godhuma"),
+    ("atta", "aata", "flour", "maavu", "pindi", "hittu"),
+    ("oil", "ennai", "ennei", "tel", "nune", "enne"),
+    ("sugar", "sakkarai", "cheeni", "chakkera", "sakkare"),
+    ("salt", "uppu", "namak"),
+    ("milk", "paal", "doodh", "palu", "haalu"),
+    ("curd", "thayir", "dahi", "perugu", "mosaru"),
+    ("ghee", "nei", "neyyi", "tuppa"),
+    ("jaggery", "vellam", "gur", "bellam", "bella"),
+    ("tamarind", "puli", "imli", "chintapandu", "hunase"),
+    ("turmeric", "manjal", "haldi", "pasupu", "arishina"),
+    ("chilli", "chili", "milagai", "mirchi", "mirapakaya", "menasinakai"),
+    ("pepper", "milagu", "miriyalu", "menasu"),
+    ("coriander", "kothamalli", "dhaniya", "dhania", "kothimbir"),
+    ("cumin", "jeeragam", "jeera", "jeelakarra", "jeerige"),
+    ("mustard", "kadugu", "rai", "avalu", "sasive"),
+    ("onion", "vengayam", "pyaz", "pyaaz", "ullipaya", "eerulli"),
+    ("tomato", "thakkali", "tamatar"),
+    ("potato", "urulaikizhangu", "aloo", "alu", "bangaladumpa"),
+    ("garlic", "poondu", "lahsun", "vellulli"),
+    ("ginger", "inji", "adrak", "allam"),
+    ("tea", "chai", "theneer"),
+    ("coconut", "thengai", "nariyal", "kobbari"),
+    ("groundnut", "peanut", "verkadalai", "moongphali", "palli", "kadalekai"),
+    ("rava", "ravai", "sooji", "suji", "semolina"),
+]
+ALIASES: Dict[str, Tuple[str, ...]] = {name: group for group in ALIAS_GROUPS for name in group}
+
+_NON_WORD = re.compile(r"[\W_]+")
+
+
+def normalize_words(text: Optional[str]) -> List[str]:
+    """Lower-case words with accents folded and punctuation dropped"""
+    if not text:
+        return []
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return [w for w in _NON_WORD.split(text.lower()) if w]
+
+
+def trigrams(word: str, prefix: bool = False) -> Set[str]:
+    """pg_trgm style trigrams; a prefix has no trailing pad"""
+    padded = f"  {word}" if prefix else f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def expand_aliases(words: Iterable[str]) -> Set[str]:
+    expanded = set()
+    for word in words:
+        expanded.update(ALIASES.get(word, (word,)))
+    return expanded
+
+
+@dataclass(slots=True)
+class ProductDoc:
+    id: int
+    name: str
+    category_id: Optional[int]
+    is_active: bool
+    codes: Tuple[str, ...]
+    word_ids: Tuple[int, ...] = ()
+
+
+def product_doc(values: Dict) -> ProductDoc:
+    codes = tuple(c.strip().lower() for c in (values.get("sku"), values.get("barcode")) if c and c.strip())
+    return ProductDoc(
+        id=values["id"],
+        name=values["name"] or "",
+        category_id=values.get("category_id"),
+        is_active=values.get("is_active") is not False,
+        codes=codes,
+    )
+
+
+# ─── Per-store index ─────────────────────────────────────────────
+
+@dataclass
+class StoreIndex:
+    """Trigram index over one store's products"""
+    built_at: float = field(default_factory=time.monotonic)
+    docs: Dict[int, ProductDoc] = field(default_factory=dict)
+    velocity: Dict[int, float] = field(default_factory=dict)
+    words: List[str] = field(default_factory=list)
+    word_ids: Dict[str, int] = field(default_factory=dict)
+    word_trigram_count: List[int] = field(default_factory=list)
+    word_products: List[Set[int]] = field(default_factory=list)
+    trigram_words: Dict[str, List[int]] = field(default_factory=dict)
+    code_products: Dict[str, Set[int]] = field(default_factory=dict)
+    sorted_codes: List[str] = field(default_factory=list)
+    inactive: Set[int] = field(default_factory=set)
+
+    # ─── Maintenance ─────────────────────────────────────────────
+
+    def _word_id(self, word: str) -> int:
+        word_id = self.word_ids.get(word)
+        if word_id is None:
+            word_id = self.word_ids[word] = len(self.words)
+            grams = trigrams(word)
+            self.words.append(word)
+            self.word_trigram_count.append(len(grams))
+            self.word_products.append(set())
+            for gram in grams:
+                self.trigram_words.setdefault(gram, []).append(word_id)
+        return word_id
+
+    def load(self, docs: Iterable[ProductDoc]):
+        """Initial fill: like upsert for each doc, sorting the codes once at the end"""
+        for doc in docs:
+            self._add(doc, keep_sorted=False)
+        self.sorted_codes.sort()
+
+    def upsert(self, doc: ProductDoc):
+        self.remove(doc.id)
+        self._add(doc)
+
+    def _add(self, doc: ProductDoc, keep_sorted: bool = True):
+        doc.word_ids = tuple(self._word_id(w) for w in expand_aliases(normalize_words(doc.name)))
+        for word_id in doc.word_ids:
+            self.word_products[word_id].add(doc.id)
+        for code in doc.codes:
+            products = self.code_products.get(code)
+            if products is None:
+                products = self.code_products[code] = set()
+                if keep_sorted:
+                    self.sorted_codes.insert(bisect_left(self.sorted_codes, code), code)
+                else:
+                    self.sorted_codes.append(code)
+            products.add(doc.id)
+        if not doc.is_active:
+            self.inactive.add(doc.id)
+        self.docs[doc.id] = doc
+
+    def remove(self, product_id: int):
+        # Vocabulary words are kept; an unused one just matches nothing
+        doc = self.docs.pop(product_id, None)
+        if doc is None:
+            return
+        for word_id in doc.word_ids:
+            self.word_products[word_id].discard(product_id)
+        for code in doc.codes:
+            self.code_products.get(code, set()).discard(product_id)
+        self.inactive.discard(product_id)
+
+    # ─── Query ───────────────────────────────────────────────────
+
+    def _match_word(self, word: str, prefix: bool) -> Dict[int, float]:
+        """Vocabulary word id -> similarity for one query word"""
+        grams = trigrams(word, prefix)
+        hits: Dict[int, int] = {}
+        for gram in grams:
+            for word_id in self.trigram_words.get(gram, ()):
+                hits[word_id] = hits.get(word_id, 0) + 1
+
+        matches = {}
+        exact_only = len(word) <= 2  # too few trigrams to tell a typo from noise
+        for word_id, count in hits.items():
+            if prefix:
+                similarity = count / len(grams)
+            else:
+                similarity = count / (len(grams) + self.word_trigram_count[word_id] - count)
+            if similarity >= 1.0 or (not exact_only and similarity >= MIN_SIMILARITY):
+                matches[word_id] = similarity
+        return matches
+
+    def _code_matches(self, code: str) -> Set[int]:
+        """Products whose SKU/barcode is code or, for the first MAX_CODE_PREFIX_MATCHES, starts with it"""
+        matched = set(self.code_products.get(code, ()))
+        if len(code) >= MIN_CODE_PREFIX:
+            start = bisect_left(self.sorted_codes, code)
+            for candidate in self.sorted_codes[start:start + MAX_CODE_PREFIX_MATCHES]:
+                if not candidate.startswith(code):
+                    break
+                matched |= self.code_products[candidate]
+        return matched
+
+    def search(
+        self,
+        query: str,
+        category_id: Optional[int] = None,
+        active_only: bool = True,
+        limit: Optional[int] = None
+    ) -> List[int]:
+        """Matching product ids, best first"""
+        words = normalize_words(query)
+        if not words:
+            return []
+        typing = not query[-1:].isspace()
+
+        # Product id -> summed similarity of its best word for each query word.
+        # Postings are merged one similarity level at a time with set
+        # operations, so a two-letter prefix over thousands of products stays
+        # cheap
+        scores: Optional[Dict[int, float]] = None
+        levels: List[Tuple[float, Set[int]]] = []
+        for i, word in enumerate(words):
+            matches = self._match_word(word, typing and i == len(words) - 1)
+            best: Dict[int, float] = {}
+            levels = []
+            for similarity in sorted(set(matches.values()), reverse=True):
+                products = set().union(*(self.word_products[w] for w, s in matches.items() if s == similarity))
+                if scores is not None:
+                    products &= scores.keys()
+                products -= best.keys()
+                best.update(dict.fromkeys(products, similarity))
+                levels.append((similarity, products))
+            scores = best if scores is None else {pid: scores[pid] + sim for pid, sim in best.items()}
+            if not scores:
+                break
+
+        # Match quality (in steps of 0.1) -> products; one query word already
+        # comes grouped by similarity
+        buckets: Dict[float, Set[int]] = {}
+        if len(words) == 1:
+            for similarity, products in levels:
+                buckets.setdefault(round(similarity, 1), set()).update(products)
+        else:
+            for product_id, score in scores.items():
+                buckets.setdefault(round(score / len(words), 1), set()).add(product_id)
+
+        # A SKU or barcode (or the start of one) outranks any name match
+        code = query.strip().lower()
+        exact = self.code_products.get(code, set())
+        prefixed = self._code_matches(code) - exact
+        for quality, products in ((3.0, exact), (2.0, prefixed)):
+            if products:
+                for bucket in buckets.values():
+                    bucket -= products
+                buckets[quality] = set(products)
+
+        # Best quality first; within one, fast movers first, then oldest product
+        velocity = self.velocity
+        ranked: List[int] = []
+        for quality in sorted(buckets, reverse=True):
+            candidates = buckets[quality]
+            if active_only:
+                candidates -= self.inactive
+            if category_id is not None:
+                candidates = {pid for pid in candidates if self.docs[pid].category_id == category_id}
+            wanted = len(candidates) if limit is None else limit - len(ranked)
+            sold = candidates & velocity.keys()
+            top = heapq.nlargest(wanted, sold, key=lambda pid: (velocity[pid], -pid))
+            top += heapq.nsmallest(wanted - len(top), candidates - sold)
+            ranked.extend(top)
+            if limit is not None and len(ranked) >= limit:
+                break
+        return ranked
+
+
+# ─── Search service ──────────────────────────────────────────────
+
+class ProductSearch:
+    """Per-process LRU of store indexes, plus the pg_trgm backend"""
+
+    def __init__(self, backend: str, ttl_seconds: float, max_stores: int):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.max_stores = max_stores
+        self._indexes: "OrderedDict[int, StoreIndex]" = OrderedDict()
+        self._locks: Dict[int, asyncio.Lock] = {}
+        self._pending: Dict[int, List[Tuple[int, Optional[Dict]]]] = {}  # writes during a build
+        self._builds = 0
+        self._queries = 0
+
+    # ─── Public API ──────────────────────────────────────────────
+
+    async def search(
+        self,
+        db: AsyncSession,
+        store_id: int,
+        query: str,
+        category_id: Optional[int] = None,
+        active_only: bool = True,
+        low_stock_only: bool = False,
+        skip: int = 0,
+        limit: int = 100
+    ) -> List[Product]:
+        """Products matching query, best first (same filters as GET /products)"""
+        self._queries += 1
+        if self.backend == "pg_trgm" and db.bind.dialect.name == "postgresql":
+            return await self._search_pg_trgm(
+                db, store_id, query, category_id, active_only, low_stock_only, skip, limit
+            )
+
+        index = await self.get_index(db, store_id)
+        if low_stock_only:
+            ids = index.search(query, category_id, active_only, MAX_CANDIDATES)
+        else:
+            ids = index.search(query, category_id, active_only, skip + limit)[skip:]
+        if not ids:
+            return []
+
+        stmt = select(Product).where(Product.id.in_(ids))
+        if low_stock_only:
+            stmt = stmt.where(Product.current_stock <= Product.min_stock_alert)
+        products = {p.id: p for p in (await db.execute(stmt)).scalars().all()}
+        ranked = [products[pid] for pid in ids if pid in products]
+        return ranked[skip:skip + limit] if low_stock_only else ranked
+
+    async def get_index(self, db: AsyncSession, store_id: int) -> StoreIndex:
+        index = self._indexes.get(store_id)
+        if index is not None and time.monotonic() - index.built_at < self.ttl_seconds:
+            self._indexes.move_to_end(store_id)
+            return index
+
+        lock = self._locks.setdefault(store_id, asyncio.Lock())
+        async with lock:
+            index = self._indexes.get(store_id)
+            if index is not None and time.monotonic() - index.built_at < self.ttl_seconds:
+                return index
+            self._pending[store_id] = []
+            try:
+                index = await self.build_index(db, store_id)
+                for product_id, values in self._pending[store_id]:
+                    self._apply(index, product_id, values)
+            finally:
+                self._pending.pop(store_id, None)
+            self._indexes[store_id] = index
+            self._indexes.move_to_end(store_id)
+            while len(self._indexes) > self.max_stores:
+                evicted, _ = self._indexes.popitem(last=False)
+                self._locks.pop(evicted, None)
+            return index
+
+    async def build_index(self, db: AsyncSession, store_id: int) -> StoreIndex:
+        """Full build: one SELECT of the searchable columns and one of sales velocity"""
+        started = time.perf_counter()
+        index = StoreIndex()
+        rows = await db.execute(
+            select(Product.id, Product.name, Product.sku, Product.barcode,
+                   Product.category_id, Product.is_active)
+            .where(Product.store_id == store_id)
+        )
+        index.load(product_doc(row) for row in rows.mappings())
+        index.velocity = await self.load_velocity(db, store_id)
+        self._builds += 1
+        logger.info(f"[ProductSearch] Indexed {len(index.docs)} products for store {store_id} "
+                    f"in {(time.perf_counter() - started) * 1000:.0f}ms")
+        return index
+
+    @staticmethod
+    async def load_velocity(db: AsyncSession, store_id: int) -> Dict[int, float]:
+        """Units sold per day over the last VELOCITY_DAYS days, net of refunds"""
+        since = datetime.now() - timedelta(days=VELOCITY_DAYS)
+        units = func.sum(BillItem.quantity - func.coalesce(BillItem.refunded_quantity, 0))
+        result = await db.execute(
+            select(BillItem.product_id, units)
+            .join(Bill, Bill.id == BillItem.bill_id)
+            .where(and_(
+                Bill.store_id == store_id,
+                Bill.bill_date >= since,
+                Bill.status.in_([BillStatus.COMPLETED, BillStatus.REFUNDED]),
+                BillItem.product_id.isnot(None)
+            ))
+            .group_by(BillItem.product_id)
+        )
+        return {product_id: float(total or 0) / VELOCITY_DAYS for product_id, total in result.all()}
+
+    # ─── PostgreSQL pg_trgm ──────────────────────────────────────
+
+    async def _search_pg_trgm(
+        self, db, store_id, query, category_id, active_only, low_stock_only, skip, limit
+    ) -> List[Product]:
+        words = normalize_words(query)
+        if not words:
+            return []
+        name = func.lower(Product.name)
+        since = datetime.now() - timedelta(days=VELOCITY_DAYS)
+        units = func.sum(BillItem.quantity - func.coalesce(BillItem.refunded_quantity, 0))
+        velocity = (
+            select(BillItem.product_id, units.label("units"))
+            .join(Bill, Bill.id == BillItem.bill_id)
+            .where(and_(Bill.store_id == store_id, Bill.bill_date >= since,
+                        Bill.status.in_([BillStatus.COMPLETED, BillStatus.REFUNDED])))
+            .group_by(BillItem.product_id)
+            .subquery()
+        )
+
+        # Every query word (or one of its regional names) must match; "<%" is
+        # word_similarity above pg_trgm.word_similarity_threshold and uses the
+        # GIN index
+        conditions, score = [], 0
+        for word in words:
+            names = ALIASES.get(word, (word,))
+            conditions.append(or_(*(literal(n).op("<%")(name) for n in names)))
+            score = score + func.greatest(*(func.word_similarity(n, name) for n in names), 0)
+        code = query.strip().lower()
+        code_match = or_(func.lower(Product.sku).startswith(code), func.lower(Product.barcode).startswith(code))
+
+        stmt = (
+            select(Product)
+            .outerjoin(velocity, velocity.c.product_id == Product.id)
+            .where(Product.store_id == store_id)
+            .where(or_(and_(*conditions), code_match))
+            .order_by(code_match.desc(), (score / len(words)).desc(),
+                      func.coalesce(velocity.c.units, 0).desc(), Product.id)
+        )
+        if active_only:
+            stmt = stmt.where(Product.is_active == True)
+        if category_id:
+            stmt = stmt.where(Product.category_id == category_id)
+        if low_stock_only:
+            stmt = stmt.where(Product.current_stock <= Product.min_stock_alert)
+        result = await db.execute(stmt.offset(skip).limit(limit))
+        return list(result.scalars().all())
+
+    # ─── Invalidation ────────────────────────────────────────────
+
+    @staticmethod
+    def _apply(index: StoreIndex, product_id: int, values: Optional[Dict]):
+        if values is None:
+            index.remove(product_id)
+        else:
+            index.upsert(product_doc(values))
+
+    def apply_write(self, store_id: int, product_id: int, values: Optional[Dict]):
+        """A committed product write; values is None for a delete"""
+        pending = self._pending.get(store_id)
+        if pending is not None:
+            pending.append((product_id, values))
+        index = self._indexes.get(store_id)
+        if index is not None:
+            self._apply(index, product_id, values)
+
+    def invalidate_store(self, store_id: int):
+        self._indexes.pop(store_id, None)
+
+    def clear(self):
+        self._indexes.clear()
+
+    def get_stats(self) -> dict:
+        return {
+            "backend": self.backend,
+            "stores": len(self._indexes),
+            "max_stores": self.max_stores,
+            "ttl_seconds": self.ttl_seconds,
+            "products": sum(len(i.docs) for i in self._indexes.values()),
+            "words": sum(len(i.words) for i in self._indexes.values()),
+            "builds": self._builds,
+            "queries": self._queries,
+        }
+
+
+# Global singleton
+product_search = ProductSearch(
+    backend=settings.product_search_backend,
+    ttl_seconds=settings.product_search_ttl_seconds,
+    max_stores=settings.product_search_max_stores
+)
+
+
+# ─── Write tracking ──────────────────────────────────────────────
+
+SEARCHED_COLUMNS = ("id", "store_id", "name", "sku", "barcode", "category_id", "is_active")
+write_tracker.watch(Product, columns=SEARCHED_COLUMNS)
+
+
+@write_tracker.on_commit
+def _apply_committed_product_writes(writes: TransactionWrites):
+    if writes.bulk_written(Product):
+        product_search.clear()
+    for write in writes.of(Product):
+        product_search.apply_write(write.store_id, write.id, None if write.deleted else write.values)
@@ -0,0 +1,387 @@
+"""
+KadaiGPT - Live Sales Counters
+Incrementally maintained per-store sales aggregates for today.
+
+Strategy:
+- Every bill commit / cancellation upserts its delta into daily_summaries in
+  the same transaction: one row per (store, day, hour) plus one whole-day row
+  (hour = DAILY_ROW_HOUR)
+- Today's analytics read at most 25 summary rows per store, never the bills
+- An in-process snapshot per store serves repeated reads and is updated in
+  place after each local commit; it is reloaded from the summary rows every
+  few seconds so other workers' sales show up
+- A store with bills but no summary rows for today (first run after upgrade,
+  restored backup) is rebuilt once with a GROUP BY over that day's bills
+- Days and hours are the shop's wall clock (settings.store_timezone); bill
+  times are stored in UTC (naive values, e.g. SQLite's CURRENT_TIMESTAMP,
+  are read as UTC)
+"""
+
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta, timezone, tzinfo
+from typing import Dict, Iterable, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import select, delete, func, and_, extract
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.models import Bill, BillStatus, DailySummary
+from app.services.pricing_engine import div_half_up, to_paise, to_rupees
+
+logger = logging.getLogger("KadaiGPT.SalesCounters")
+
+DAILY_ROW_HOUR = -1  # DailySummary.hour of the whole-day row
+PAYMENT_COLUMNS = {
+    "cash": "cash_amount",
+    "upi": "upi_amount",
+    "card": "card_amount",
+    "credit": "credit_amount",
+}
+
+
+def store_zone() -> tzinfo:
+    return ZoneInfo(settings.store_timezone)  # ZoneInfo caches instances per key
+
+
+def local_bill_time(bill_date: Optional[datetime]) -> datetime:
+    """Bill timestamp as naive store wall-clock time (how the day/hour buckets are keyed)"""
+    if bill_date is None:
+        bill_date = datetime.now(timezone.utc)
+    elif bill_date.tzinfo is None:
+        bill_date = bill_date.replace(tzinfo=timezone.utc)
+    return bill_date.astimezone(store_zone()).replace(tzinfo=None)
+
+
+def store_today() -> date:
+    """Today's date on the store's wall clock"""
+    return datetime.now(store_zone()).date()
+
+
+def day_start(day: date) -> datetime:
+    return datetime(day.year, day.month, day.day)
+
+
+def utc_day_bounds(day: date) -> Tuple[datetime, datetime]:
+    """[start, end) of a store day as UTC instants, for filtering bill_date"""
+    zone = store_zone()
+    start = day_start(day).replace(tzinfo=zone).astimezone(timezone.utc)
+    end = day_start(day + timedelta(days=1)).replace(tzinfo=zone).astimezone(timezone.utc)
+    return start, end
+
+
+@dataclass
+class SaleRecord:
+    """The part of a bill that the counters aggregate"""
+    bill_time: datetime
+    total_amount: float
+    tax_amount: float
+    discount_amount: float
+    payment_method: str
+    items_sold: float = 0
+    bills: int = 1  # 0 for adjustments that don't add or remove a bill (refunds)
+
+    @classmethod
+    def from_bill(cls, bill: Bill, items_sold: float = 0) -> "SaleRecord":
+        method = bill.payment_method
+        return cls(
+            bill_time=local_bill_time(bill.bill_date),
+            total_amount=bill.total_amount or 0,
+            tax_amount=bill.tax_amount or 0,
+            discount_amount=bill.discount_amount or 0,
+            payment_method=method.value if hasattr(method, "value") else str(method or "cash"),
+            items_sold=items_sold
+        )
+
+
+@dataclass
+class StoreDayCounters:
+    """Today's aggregate for one store, in paise"""
+    day: date
+    bills: int = 0
+    revenue: int = 0
+    tax: int = 0
+    discount: int = 0
+    items_sold: int = 0
+    payments: Dict[str, int] = field(default_factory=dict)
+    hourly_bills: List[int] = field(default_factory=lambda: [0] * 24)
+    hourly_revenue: List[int] = field(default_factory=lambda: [0] * 24)
+    loaded_at: float = field(default_factory=time.monotonic)
+
+    def apply(self, sale: SaleRecord, sign: int = 1):
+        revenue = to_paise(sale.total_amount) * sign
+        hour = sale.bill_time.hour
+        self.bills += sale.bills * sign
+        self.revenue += revenue
+        self.tax += to_paise(sale.tax_amount) * sign
+        self.discount += to_paise(sale.discount_amount) * sign
+        self.items_sold += int(round(sale.items_sold)) * sign
+        self.payments[sale.payment_method] = self.payments.get(sale.payment_method, 0) + revenue
+        self.hourly_bills[hour] += sale.bills * sign
+        self.hourly_revenue[hour] += revenue
+
+    def to_dict(self) -> Dict:
+        return {
+            "date": self.day.isoformat(),
+            "revenue": to_rupees(self.revenue),
+            "bills": self.bills,
+            "avg_bill_value": to_rupees(div_half_up(self.revenue, self.bills)) if self.bills > 0 else 0,
+            "tax": to_rupees(self.tax),
+            "discount": to_rupees(self.discount),
+            "items_sold": self.items_sold,
+            "payment_breakdown": {
+                method: to_rupees(amount) for method, amount in self.payments.items() if amount
+            },
+            "hourly": [
+                {"hour": f"{hour:02d}:00", "bills": self.hourly_bills[hour],
+                 "revenue": to_rupees(self.hourly_revenue[hour])}
+                for hour in range(24)
+            ],
+        }
+
+
+class SalesCounters:
+    """
+    Per-store live sales aggregates backed by daily_summaries.
+
+    Write path (inside the bill transaction):
+        sales = await sales_counters.record(db, store_id, [SaleRecord.from_bill(bill, qty)])
+        await db.commit()
+        sales_counters.apply(store_id, sales)
+
+    Read path:
+        counters = await sales_counters.get_today(db, store_id)
+    """
+
+    REFRESH_SECONDS = 5
+
+    def __init__(self):
+        self._stores: Dict[int, StoreDayCounters] = {}
+        self._past_revenue: Dict[Tuple[int, date], float] = {}
+
+    # ─── Write side ──────────────────────────────────────────────
+
+    async def record(
+        self, db: AsyncSession, store_id: int, sales: List[SaleRecord], sign: int = 1
+    ) -> List[Tuple[SaleRecord, int]]:
+        """
+        Upsert the hourly and daily summary rows for these sales in the
+        caller's transaction. sign=-1 removes them (cancellation).
+
+        Returns the applied deltas to pass to apply() after commit.
+        """
+        if not sales:
+            return []
+
+        rows = self._build_rows(store_id, [(sale, sale.bills * sign, sign) for sale in sales])
+        await self._upsert(db, rows)
+        return [(sale, sign) for sale in sales]
+
+    def apply(self, store_id: int, deltas: Iterable[Tuple[SaleRecord, int]]):
+        """Apply committed deltas to the in-process snapshot, if it is for the same day"""
+        counters = self._stores.get(store_id)
+        for sale, sign in deltas:
+            if counters is not None and sale.bill_time.date() == counters.day:
+                counters.apply(sale, sign)
+            else:
+                self._past_revenue.pop((store_id, sale.bill_time.date()), None)
+
+    @staticmethod
+    def _build_rows(store_id: int, entries: Iterable[Tuple[SaleRecord, int, int]]) -> List[Dict]:
+        """
+        Summary rows for (sale, bill count delta, amount sign) entries: one per
+        (day, hour) touched plus the whole-day rows, amounts summed in paise
+        """
+        rows: Dict[Tuple[datetime, int], Dict] = {}
+        for sale, bills, sign in entries:
+            summary_date = day_start(sale.bill_time.date())
+            revenue = to_paise(sale.total_amount) * sign
+            for hour in (sale.bill_time.hour, DAILY_ROW_HOUR):
+                row = rows.setdefault((summary_date, hour), {
+                    "store_id": store_id, "summary_date": summary_date, "hour": hour,
+                    "total_bills": 0, "total_revenue": 0, "total_tax": 0,
+                    "total_discount": 0, "total_items_sold": 0,
+                    **{column: 0 for column in PAYMENT_COLUMNS.values()}
+                })
+                row["total_bills"] += bills
+                row["total_revenue"] += revenue
+                row["total_tax"] += to_paise(sale.tax_amount) * sign
+                row["total_discount"] += to_paise(sale.discount_amount) * sign
+                row["total_items_sold"] += int(round(sale.items_sold)) * sign
+                column = PAYMENT_COLUMNS.get(sale.payment_method)
+                if column:
+                    row[column] += revenue
+
+        for row in rows.values():
+            for column in ("total_revenue", "total_tax", "total_discount", *PAYMENT_COLUMNS.values()):
+                row[column] = to_rupees(row[column])
+        return list(rows.values())
+
+    async def _upsert(self, db: AsyncSession, rows: List[Dict]):
+        """Add the rows' values onto existing summary rows (INSERT ... ON CONFLICT DO UPDATE)"""
+        dialect = db.get_bind().dialect.name
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+
+        table = DailySummary.__table__
+        stmt = dialect_insert(table).values(rows)
+        additive = ("total_bills", "total_revenue", "total_tax", "total_discount",
+                    "total_items_sold", *PAYMENT_COLUMNS.values())
+        await db.execute(stmt.on_conflict_do_update(
+            index_elements=[table.c.store_id, table.c.summary_date, table.c.hour],
+            set_={
+                column: func.coalesce(table.c[column], 0) + getattr(stmt.excluded, column)
+                for column in additive
+            }
+        ))
+
+    # ─── Read side ───────────────────────────────────────────────
+
+    async def get_today(self, db: AsyncSession, store_id: int) -> StoreDayCounters:
+        """Today's counters for a store (at most 25 summary rows read, usually none)"""
+        today = store_today()
+        counters = self._stores.get(store_id)
+        if (
+            counters is None
+            or counters.day != today
+            or time.monotonic() - counters.loaded_at > self.REFRESH_SECONDS
+        ):
+            counters = await self._load(db, store_id, today)
+            self._stores[store_id] = counters
+        return counters
+
+    async def get_day_revenue(self, db: AsyncSession, store_id: int, day: date) -> float:
+        """Revenue of a past day from its whole-day summary row (cached per process)"""
+        key = (store_id, day)
+        if key not in self._past_revenue:
+            revenue = await self._day_revenue_row(db, store_id, day)
+            if revenue is None and await self.rebuild_day(db, store_id, day):
+                await db.commit()
+                revenue = await self._day_revenue_row(db, store_id, day)
+            if len(self._past_revenue) > 4 * max(len(self._stores), 256):
+                self._past_revenue.clear()
+            self._past_revenue[key] = to_rupees(to_paise(revenue))
+        return self._past_revenue[key]
+
+    async def _day_revenue_row(self, db: AsyncSession, store_id: int, day: date) -> Optional[float]:
+        result = await db.execute(
+            select(DailySummary.total_revenue).where(and_(
+                DailySummary.store_id == store_id,
+                DailySummary.summary_date == day_start(day),
+                DailySummary.hour == DAILY_ROW_HOUR
+            ))
+        )
+        return result.scalar_one_or_none()
+
+    async def _load(self, db: AsyncSession, store_id: int, day: date) -> StoreDayCounters:
+        rows = await self._summary_rows(db, store_id, day)
+        if not rows:
+            if await self.rebuild_day(db, store_id, day):
+                await db.commit()
+                rows = await self._summary_rows(db, store_id, day)
+
+        counters = StoreDayCounters(day=day)
+        for row in rows:
+            if row.hour == DAILY_ROW_HOUR:
+                counters.bills = row.total_bills or 0
+                counters.revenue = to_paise(row.total_revenue)
+                counters.tax = to_paise(row.total_tax)
+                counters.discount = to_paise(row.total_discount)
+                counters.items_sold = row.total_items_sold or 0
+                counters.payments = {
+                    method: to_paise(getattr(row, column))
+                    for method, column in PAYMENT_COLUMNS.items()
+                }
+            elif row.hour is not None and 0 <= row.hour < 24:
+                counters.hourly_bills[row.hour] = row.total_bills or 0
+                counters.hourly_revenue[row.hour] = to_paise(row.total_revenue)
+        return counters
+
+    async def _summary_rows(self, db: AsyncSession, store_id: int, day: date) -> List[DailySummary]:
+        result = await db.execute(
+            select(DailySummary).where(and_(
+                DailySummary.store_id == store_id,
+                DailySummary.summary_date == day_start(day)
+            ))
+        )
+        return result.scalars().all()
+
+    async def rebuild_day(self, db: AsyncSession, store_id: int, day: date) -> bool:
+        """
+        Recompute a day's summary rows from its completed bills with one
+        GROUP BY (UTC minute, payment method); the minutes are mapped onto the
+        store's wall-clock hours here, which also covers half-hour offsets.
+        Partially refunded bills count net of their refunds (revenue only).
+        Returns False if the day had no bills.
+        """
+        start, end = utc_day_bounds(day)
+        bill_date = Bill.bill_date
+        if db.get_bind().dialect.name == "postgresql":
+            bill_date = func.timezone("UTC", Bill.bill_date)  # timestamptz -> UTC wall clock
+        result = await db.execute(
+            select(
+                extract("day", bill_date).label("day"),
+                extract("hour", bill_date).label("hour"),
+                extract("minute", bill_date).label("minute"),
+                Bill.payment_method,
+                func.count(Bill.id),
+                func.sum(Bill.total_amount - func.coalesce(Bill.refunded_amount, 0)),
+                func.sum(Bill.tax_amount),
+                func.sum(Bill.discount_amount),
+            )
+            .where(and_(
+                Bill.store_id == store_id,
+                Bill.status.in_([BillStatus.COMPLETED, BillStatus.REFUNDED]),
+                Bill.bill_date >= start,
+                Bill.bill_date < end
+            ))
+            .group_by("day", "hour", "minute", Bill.payment_method)
+        )
+        groups = result.all()
+        if not groups:
+            return False
+
+        def bill_time(utc_day, hour, minute) -> datetime:
+            # The window spans at most two UTC dates
+            base = start if int(utc_day) == start.day else end
+            return local_bill_time(base.replace(hour=int(hour or 0), minute=int(minute or 0)))
+
+        await db.execute(
+            delete(DailySummary).where(and_(
+                DailySummary.store_id == store_id,
+                DailySummary.summary_date == day_start(day)
+            ))
+        )
+        # One entry per (minute, payment method) group, carrying the group's bill count
+        rows = self._build_rows(store_id, [
+            (SaleRecord(
+                bill_time=bill_time(utc_day, hour, minute),
+                total_amount=revenue or 0,
+                tax_amount=tax or 0,
+                discount_amount=discount or 0,
+                payment_method=method.value if hasattr(method, "value") else str(method)
+            ), count, 1)
+            for utc_day, hour, minute, method, count, revenue, tax, discount in groups
+        ])
+        await self._upsert(db, rows)
+        logger.info(f"[SalesCounters] Rebuilt {day} for store {store_id} from {len(groups)} group(s)")
+        return True
+
+    def invalidate(self, store_id: Optional[int] = None):
+        """Drop the in-process snapshot(s); the next read reloads from the summary rows"""
+        if store_id is None:
+            self._stores.clear()
+            self._past_revenue.clear()
+        else:
+            self._stores.pop(store_id, None)
+            self._past_revenue = {
+                key: value for key, value in self._past_revenue.items() if key[0] != store_id
+            }
+
+
+# Global singleton
+sales_counters = SalesCounters()
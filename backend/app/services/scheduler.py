@@ -10,6 +10,8 @@ from typing import Dict, List, Optional, Callable
 from functools import wraps
 import threading
 
+from app.config import settings
+
 logger = logging.getLogger(__name__)
 
 
@@ -229,6 +231,16 @@ async def sync_offline_data():
     # Would process offline queue
 
 
+async def maintain_bill_partitions():
+    """Create upcoming monthly bill partitions and detach expired ones"""
+    from app.database import engine
+    from app.services.bill_partitions import bill_partitions
+    
+    result = await bill_partitions.maintain(engine)
+    logger.info(f"[Task] Bill partitions: converted {result['converted']}, "
+                f"created {result['created']}, detached {result['detached']}")
+
+
 def register_default_tasks():
     """Register all default scheduled tasks"""
     
@@ -294,13 +306,24 @@ def register_default_tasks():
         interval_minutes=15,
         enabled=True
     ))
+    
+    # Monthly bill partitions, kept a few months ahead (PostgreSQL, opt-in)
+    scheduler.add_task(Task(
+        name="bill_partitions",
+        func=maintain_bill_partitions,
+        schedule_type="daily",
+        run_at=time(3, 0),
+        enabled=settings.bill_partitioning
+    ))
 
 
 # ═══════════════════════════════════════════════════════════════════
 # API Router for Scheduler Management
 # ═══════════════════════════════════════════════════════════════════
 
-from fastapi import APIRouter, Depends, HTTPException
+import hmac
+
+from fastapi import APIRouter, Depends, HTTPException, Header
 from app.routers.auth import get_current_user
 from app.models import User
 
@@ -357,3 +380,47 @@ async def run_task_now(
         "message": f"Task '{task_name}' executed",
         "last_run": task.last_run.isoformat() if task.last_run else None
     }
+
+
+# ═══════════════════════════════════════════════════════════════════
+# Cron Trigger (serverless mode: no scheduler loop, Vercel Cron calls in)
+# ═══════════════════════════════════════════════════════════════════
+
+cron_router = APIRouter(prefix="/cron", tags=["Scheduler"])
+
+
+async def verify_cron_secret(authorization: Optional[str] = Header(None)):
+    """Require "Authorization: Bearer <CRON_SECRET>" (as Vercel Cron sends it)"""
+    secret = settings.cron_secret
+    if not secret:
+        raise HTTPException(status_code=404, detail="Cron trigger not configured")
+    if not authorization or not hmac.compare_digest(authorization, f"Bearer {secret}"):
+        raise HTTPException(status_code=401, detail="Invalid cron secret")
+
+
+@cron_router.api_route("/{task_name}", methods=["GET", "POST"], dependencies=[Depends(verify_cron_secret)])
+async def run_cron_task(task_name: str):
+    """
+    Run one scheduled task now.
+    
+    The schedule itself lives with the caller (vercel.json "crons"), since
+    a serverless instance keeps no next-run state between invocations.
+    """
+    if not scheduler.tasks:
+        register_default_tasks()
+    task = scheduler.tasks.get(task_name)
+    if task is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+    if not task.enabled:
+        return {"task": task_name, "status": "disabled"}
+    
+    errors_before = task.error_count
+    await task.run()
+    if task.error_count > errors_before:
+        raise HTTPException(status_code=500, detail=f"Task '{task_name}' failed: {task.last_error}")
+    
+    return {
+        "task": task_name,
+        "status": "completed",
+        "last_run": task.last_run.isoformat() if task.last_run else None
+    }
@@ -0,0 +1,173 @@
+"""
+KadaiGPT - Stock Engine
+Set-based stock validation and decrement for the billing write path.
+
+A bill touches every product it sells exactly twice, no matter how many
+lines it has: one locked SELECT over all referenced products and one
+conditional UPDATE that decrements them together. Cancellations and
+refunds put stock back with a single UPDATE as well.
+
+Core UPDATEs bypass ORM flush events, so the new stock levels are left in
+session.info["stock_changes"] for caches to pick up on commit, and the
+products are recorded in the change feed.
+"""
+
+import logging
+from typing import Dict, Any, Iterable, List, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, and_, case, func
+
+from app.models import Product
+from app.services.change_feed import change_feed
+
+logger = logging.getLogger("KadaiGPT.Stock")
+
+
+class InsufficientStockError(Exception):
+    """Raised when one or more products cannot cover the requested quantity"""
+
+    def __init__(self, items: List[Dict[str, Any]]):
+        self.items = items
+        super().__init__(f"{len(items)} item(s) have insufficient stock")
+
+
+class StockEngine:
+    """
+    Batch stock operations used by billing.
+
+    Features:
+    - Aggregates repeated product lines into one quantity per product
+    - Locks all referenced products in one query (FOR UPDATE, ordered by id
+      so concurrent bills always acquire row locks in the same order)
+    - Decrements all stock in one conditional UPDATE ... RETURNING
+    """
+
+    @staticmethod
+    def aggregate_quantities(lines: Iterable[Tuple[int, float]]) -> Dict[int, float]:
+        """Sum quantities per product_id, skipping free-text lines"""
+        quantities: Dict[int, float] = {}
+        for product_id, quantity in lines:
+            if product_id:
+                quantities[product_id] = quantities.get(product_id, 0) + quantity
+        return quantities
+
+    async def lock_products(
+        self, db: AsyncSession, store_id: int, product_ids: Iterable[int]
+    ) -> Dict[int, Product]:
+        """Fetch and row-lock every referenced product of the store in one query"""
+        ids = sorted(set(product_ids))
+        if not ids:
+            return {}
+
+        result = await db.execute(
+            select(Product)
+            .where(and_(Product.store_id == store_id, Product.id.in_(ids)))
+            .order_by(Product.id)
+            .with_for_update()
+        )
+        return {p.id: p for p in result.scalars().all()}
+
+    @staticmethod
+    def find_shortfalls(
+        products: Dict[int, Product], quantities: Dict[int, float]
+    ) -> List[Dict[str, Any]]:
+        """Compare requested quantities against the locked stock snapshot"""
+        shortfalls = []
+        for product_id, requested in quantities.items():
+            product = products.get(product_id)
+            if product is None:
+                continue
+            available = product.current_stock or 0
+            if available < requested:
+                shortfalls.append({
+                    "product_name": product.name,
+                    "product_id": product_id,
+                    "available": available,
+                    "requested": requested,
+                    "shortfall": round(requested - available, 2)
+                })
+        return shortfalls
+
+    async def decrement_stock(
+        self, db: AsyncSession, store_id: int, quantities: Dict[int, float]
+    ) -> Dict[int, float]:
+        """
+        Decrement stock for many products in one statement.
+
+        The UPDATE only touches rows whose stock covers the requested quantity
+        and returns the rows it changed. If any product is missing from the
+        result, InsufficientStockError is raised and the caller must roll back.
+
+        Returns a mapping of product_id -> new current_stock.
+        """
+        if not quantities:
+            return {}
+
+        ids = sorted(quantities)
+        delta = case(
+            {product_id: quantities[product_id] for product_id in ids},
+            value=Product.id,
+            else_=0,
+        )
+        table = Product.__table__
+        result = await db.execute(
+            table.update()
+            .where(and_(
+                table.c.store_id == store_id,
+                table.c.id.in_(ids),
+                table.c.current_stock >= delta
+            ))
+            .values(current_stock=table.c.current_stock - delta)
+            .returning(table.c.id, table.c.current_stock)
+        )
+        updated = {row.id: row.current_stock for row in result.all()}
+        db.info.setdefault("stock_changes", {}).update(updated)
+        change_feed.record(db, store_id, "product", updated)
+
+        missing = [product_id for product_id in ids if product_id not in updated]
+        if missing:
+            logger.warning(f"Stock decrement rejected for products {missing} (store {store_id})")
+            raise InsufficientStockError([
+                {"product_id": product_id, "requested": quantities[product_id]}
+                for product_id in missing
+            ])
+        return updated
+
+    async def restore_stock(
+        self, db: AsyncSession, store_id: int, quantities: Dict[int, float]
+    ) -> Dict[int, float]:
+        """
+        Add quantities back to many products in one statement.
+
+        Only the store's own products are touched; products deleted since the
+        sale are skipped. Returns product_id -> new current_stock for the rows
+        that were updated.
+        """
+        quantities = {pid: qty for pid, qty in quantities.items() if qty}
+        if not quantities:
+            return {}
+
+        ids = sorted(quantities)
+        delta = case(
+            {product_id: quantities[product_id] for product_id in ids},
+            value=Product.id,
+            else_=0,
+        )
+        table = Product.__table__
+        result = await db.execute(
+            table.update()
+            .where(and_(table.c.store_id == store_id, table.c.id.in_(ids)))
+            .values(current_stock=func.coalesce(table.c.current_stock, 0) + delta)
+            .returning(table.c.id, table.c.current_stock)
+        )
+        updated = {row.id: row.current_stock for row in result.all()}
+        db.info.setdefault("stock_changes", {}).update(updated)
+        change_feed.record(db, store_id, "product", updated)
+
+        skipped = [product_id for product_id in ids if product_id not in updated]
+        if skipped:
+            logger.info(f"Stock restore skipped missing products {skipped} (store {store_id})")
+        return updated
+
+
+stock_engine = StockEngine()
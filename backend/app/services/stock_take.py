@@ -0,0 +1,305 @@
+"""
+KadaiGPT - Stock Take
+Physical stock counts: open a session, stream scanned counts in batches,
+review the variance, then apply every adjustment at once.
+
+Strategy:
+- Counts are upserted into stock_take_lines per batch (INSERT ... ON
+  CONFLICT DO UPDATE in chunks of CHUNK_SIZE), one row per product; scans
+  of the same product on different shelves add up, a recount can replace
+- Scanned barcodes/SKUs are resolved through barcode_cache, product ids
+  with one ownership query per batch
+- The variance is computed in the database: one aggregate over the lines
+  joined to products, and a sorted page of the differing lines
+- Applying is one transaction: one UPDATE ... FROM snapshots current_stock
+  into the lines, one UPDATE ... FROM sets every differing product to its
+  counted quantity, and one executemany INSERT writes the audit rows
+- Products are row-locked in id order first (like stock_engine), so sales
+  during the apply wait instead of being overwritten mid-way
+"""
+
+import logging
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import and_, case, delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import AuditTrail, Product, StockTake, StockTakeLine, StockTakeStatus
+from app.services.barcode_cache import barcode_cache
+from app.services.change_feed import change_feed
+
+logger = logging.getLogger("KadaiGPT.StockTake")
+
+CHUNK_SIZE = 500
+
+CountLine = Tuple[Optional[int], Optional[str], int]  # (product_id, code, quantity)
+
+
+class StockTakeClosedError(Exception):
+    """Raised when counts are added to, or applied from, a stock take that is not open"""
+
+    def __init__(self, stock_take: StockTake):
+        self.stock_take = stock_take
+        status = stock_take.status.value if hasattr(stock_take.status, "value") else stock_take.status
+        super().__init__(f"Stock take {stock_take.id} is {status}")
+
+
+def _dialect_insert(db: AsyncSession):
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert
+
+
+class StockTakeService:
+    """
+    Stock-take sessions for one store at a time.
+
+    Usage:
+        take = await stock_takes.load(db, store_id, take_id)
+        await stock_takes.add_counts(db, take, [(None, "8901491101219", 12), ...])
+        summary = await stock_takes.variance_summary(db, take)
+        result = await stock_takes.apply(db, take, user_id)
+        await db.commit()
+    """
+
+    def __init__(self):
+        self._applied = 0
+        self._lines_counted = 0
+        self._products_adjusted = 0
+
+    async def load(self, db: AsyncSession, store_id: int, stock_take_id: int,
+                   lock: bool = False) -> Optional[StockTake]:
+        query = select(StockTake).where(and_(StockTake.id == stock_take_id, StockTake.store_id == store_id))
+        if lock:
+            query = query.with_for_update().execution_options(populate_existing=True)
+        result = await db.execute(query)
+        return result.scalar_one_or_none()
+
+    async def open_session(self, db: AsyncSession, store_id: int) -> Optional[StockTake]:
+        """The store's stock take that is still collecting counts, if any"""
+        result = await db.execute(
+            select(StockTake)
+            .where(StockTake.store_id == store_id, StockTake.status == StockTakeStatus.OPEN)
+            .limit(1)
+        )
+        return result.scalar_one_or_none()
+
+    # ─── Counting ────────────────────────────────────────────────
+
+    async def add_counts(
+        self, db: AsyncSession, take: StockTake, lines: Iterable[CountLine], replace: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Upsert one batch of counts. Lines name a product by id or by scanned
+        code; repeats within the batch are summed. With replace=True the
+        batch's totals overwrite earlier counts of those products.
+
+        Returns {"accepted": products upserted, "unknown": unmatched ids/codes}.
+        """
+        if take.status != StockTakeStatus.OPEN:
+            raise StockTakeClosedError(take)
+
+        lines = list(lines)
+        ids = {product_id for product_id, code, _ in lines if product_id is not None}
+        codes = [code for product_id, code, _ in lines if product_id is None and code]
+
+        owned = set()
+        if ids:
+            result = await db.execute(
+                select(Product.id).where(Product.store_id == take.store_id, Product.id.in_(ids))
+            )
+            owned = set(result.scalars().all())
+        resolved = await barcode_cache.resolve(db, take.store_id, codes) if codes else {}
+
+        counts: Dict[int, int] = {}
+        unknown: List[Any] = []
+        for product_id, code, quantity in lines:
+            if product_id is None:
+                values = resolved.get((code or "").strip())
+                product_id = values["id"] if values else None
+                if product_id is None:
+                    unknown.append(code)
+                    continue
+            elif product_id not in owned:
+                unknown.append(product_id)
+                continue
+            counts[product_id] = counts.get(product_id, 0) + quantity
+
+        if counts:
+            insert = _dialect_insert(db)
+            table = StockTakeLine.__table__
+            rows = [
+                {"stock_take_id": take.id, "product_id": product_id, "counted_quantity": quantity}
+                for product_id, quantity in sorted(counts.items())
+            ]
+            for start in range(0, len(rows), CHUNK_SIZE):
+                stmt = insert(table).values(rows[start:start + CHUNK_SIZE])
+                counted = stmt.excluded.counted_quantity
+                if not replace:
+                    counted = table.c.counted_quantity + counted
+                await db.execute(stmt.on_conflict_do_update(
+                    index_elements=[table.c.stock_take_id, table.c.product_id],
+                    set_={"counted_quantity": counted}
+                ))
+        self._lines_counted += len(lines)
+        return {"accepted": len(counts), "unknown": list(dict.fromkeys(unknown))}
+
+    # ─── Variance ────────────────────────────────────────────────
+
+    @staticmethod
+    def _expected(take: StockTake):
+        """Stock the count is compared with: live until applied, then the snapshot"""
+        if take.status == StockTakeStatus.APPLIED:
+            return StockTakeLine.expected_quantity
+        return func.coalesce(Product.current_stock, 0)
+
+    async def variance_summary(self, db: AsyncSession, take: StockTake) -> Dict[str, Any]:
+        """Totals of the count against stock, in one aggregate"""
+        expected = self._expected(take)
+        variance = StockTakeLine.counted_quantity - expected
+        value = variance * func.coalesce(Product.cost_price, 0)
+        result = await db.execute(
+            select(
+                func.count(),
+                func.count(case((variance != 0, 1))),
+                func.coalesce(func.sum(case((variance < 0, -variance), else_=0)), 0),
+                func.coalesce(func.sum(case((variance > 0, variance), else_=0)), 0),
+                func.coalesce(func.sum(case((variance < 0, -value), else_=0)), 0),
+                func.coalesce(func.sum(case((variance > 0, value), else_=0)), 0),
+            )
+            .select_from(StockTakeLine)
+            .join(Product, Product.id == StockTakeLine.product_id)
+            .where(StockTakeLine.stock_take_id == take.id)
+        )
+        lines, differing, short_units, excess_units, short_value, excess_value = result.one()
+        return {
+            "counted_products": lines,
+            "products_with_variance": differing,
+            "shortage_units": short_units,
+            "excess_units": excess_units,
+            "shortage_value": round(short_value, 2),
+            "excess_value": round(excess_value, 2),
+        }
+
+    async def variance_lines(
+        self, db: AsyncSession, take: StockTake, limit: int = 100, offset: int = 0
+    ) -> List[Any]:
+        """Products whose count differs from stock, largest difference in value first"""
+        expected = self._expected(take)
+        variance = StockTakeLine.counted_quantity - expected
+        value = variance * func.coalesce(Product.cost_price, 0)
+        result = await db.execute(
+            select(
+                Product.id, Product.name, Product.sku, Product.barcode,
+                expected.label("expected"), StockTakeLine.counted_quantity.label("counted"),
+                variance.label("variance"), value.label("value"),
+            )
+            .join(Product, Product.id == StockTakeLine.product_id)
+            .where(StockTakeLine.stock_take_id == take.id, variance != 0)
+            .order_by(func.abs(value).desc(), func.abs(variance).desc(), Product.id)
+            .limit(limit)
+            .offset(offset)
+        )
+        return result.all()
+
+    # ─── Apply ───────────────────────────────────────────────────
+
+    async def apply(self, db: AsyncSession, take: StockTake, user_id: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Set every counted product to its counted quantity, in the caller's
+        transaction. `take` should be loaded with lock=True. Products deleted
+        since they were counted are skipped. The caller commits.
+        """
+        if take.status != StockTakeStatus.OPEN:
+            raise StockTakeClosedError(take)
+
+        store_id = take.store_id
+        lines = StockTakeLine.__table__
+        products = Product.__table__
+        counted_ids = select(lines.c.product_id).where(lines.c.stock_take_id == take.id)
+
+        # 🔒 Same lock order as billing (stock_engine.lock_products)
+        await db.execute(
+            select(products.c.id)
+            .where(products.c.store_id == store_id, products.c.id.in_(counted_ids))
+            .order_by(products.c.id)
+            .with_for_update()
+        )
+        await db.execute(
+            lines.update()
+            .where(lines.c.stock_take_id == take.id, lines.c.product_id == products.c.id,
+                   products.c.store_id == store_id)
+            .values(expected_quantity=func.coalesce(products.c.current_stock, 0))
+        )
+        changed = and_(lines.c.expected_quantity.isnot(None),
+                       lines.c.expected_quantity != lines.c.counted_quantity)
+        result = await db.execute(
+            select(lines.c.product_id, lines.c.expected_quantity, lines.c.counted_quantity)
+            .where(lines.c.stock_take_id == take.id, changed)
+        )
+        adjustments = result.all()
+
+        updated: Dict[int, int] = {}
+        if adjustments:
+            result = await db.execute(
+                products.update()
+                .where(products.c.id == lines.c.product_id, products.c.store_id == store_id,
+                       lines.c.stock_take_id == take.id, changed)
+                .values(current_stock=lines.c.counted_quantity)
+                .returning(products.c.id, products.c.current_stock)
+            )
+            updated = {row.id: row.current_stock for row in result.all()}
+            db.info.setdefault("stock_changes", {}).update(updated)
+            change_feed.record(db, store_id, "product", updated)
+
+        now = datetime.utcnow()
+        audit_rows = [
+            {
+                "store_id": store_id, "user_id": user_id, "action": "stock_take",
+                "entity_type": "product", "entity_id": row.product_id,
+                "old_values": {"current_stock": row.expected_quantity},
+                "new_values": {"current_stock": row.counted_quantity, "stock_take_id": take.id},
+                "created_at": now,
+            }
+            for row in adjustments if row.product_id in updated
+        ]
+        counted = await db.scalar(select(func.count()).select_from(counted_ids.subquery()))
+        audit_rows.append({
+            "store_id": store_id, "user_id": user_id, "action": "apply",
+            "entity_type": "stock_take", "entity_id": take.id,
+            "old_values": {"status": StockTakeStatus.OPEN.value},
+            "new_values": {"status": StockTakeStatus.APPLIED.value,
+                           "counted_products": counted, "adjusted_products": len(updated)},
+            "created_at": now,
+        })
+        await db.execute(AuditTrail.__table__.insert(), audit_rows)
+
+        take.status = StockTakeStatus.APPLIED
+        take.applied_at = now
+        take.adjusted_count = len(updated)
+
+        self._applied += 1
+        self._products_adjusted += len(updated)
+        logger.info(f"Stock take {take.id} applied: {len(updated)} of {counted} products adjusted (store {store_id})")
+        return {"counted_products": counted, "adjusted_products": len(updated)}
+
+    async def cancel(self, db: AsyncSession, take: StockTake):
+        """Discard an open stock take and its counts. The caller commits."""
+        if take.status != StockTakeStatus.OPEN:
+            raise StockTakeClosedError(take)
+        await db.execute(delete(StockTakeLine).where(StockTakeLine.stock_take_id == take.id))
+        take.status = StockTakeStatus.CANCELLED
+
+    def get_stats(self) -> dict:
+        return {
+            "applied": self._applied,
+            "lines_counted": self._lines_counted,
+            "products_adjusted": self._products_adjusted,
+        }
+
+
+# Global singleton
+stock_takes = StockTakeService()
@@ -0,0 +1,157 @@
+"""
+KadaiGPT - Tenant Context Cache
+Resolves the authenticated user and their store settings without querying
+on every request.
+
+Strategy:
+- A miss loads the user and store with one joined SELECT and keeps a
+  snapshot of their column values
+- A hit rebuilds both as detached instances and merges them into the
+  request's session with load=False: no SQL, yet handlers still get
+  session-bound User/Store objects they can modify and commit
+- Entries expire after principal_cache_ttl_seconds and are evicted LRU
+- Committed ORM writes to a user or store (and bulk UPDATE/DELETE on
+  those tables) invalidate the affected entries; logout drops the entry
+- The cache is per process: other workers see a change within the TTL
+"""
+
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from sqlalchemy import inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, make_transient_to_detached
+
+from app.config import settings
+from app.models import Store, User
+from app.services.write_tracker import TransactionWrites, write_tracker
+
+logger = logging.getLogger("KadaiGPT.TenantCache")
+
+
+@dataclass
+class TenantContext:
+    """The authenticated user and their store, bound to the request's session"""
+    user: User
+    store: Optional[Store]
+
+
+@dataclass
+class TenantEntry:
+    user_values: Dict[str, Any]
+    store_values: Optional[Dict[str, Any]]
+    expires_at: float
+
+
+def column_values(obj) -> Dict[str, Any]:
+    return {attr.key: getattr(obj, attr.key) for attr in inspect(obj).mapper.column_attrs}
+
+
+def detached_copy(model, values: Dict[str, Any]):
+    """A clean detached instance, as if just loaded by a query that has ended"""
+    obj = model(**values)
+    make_transient_to_detached(obj)
+    return obj
+
+
+class TenantCache:
+    """Per-process LRU of user + store snapshots keyed by user id"""
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[int, TenantEntry]" = OrderedDict()
+        self._generation = 0  # bumped by every invalidation
+        self._hits = 0
+        self._misses = 0
+
+    # ─── Lookup ──────────────────────────────────────────────────
+
+    async def get(self, db: AsyncSession, user_id: int) -> Optional[TenantContext]:
+        """User and store for user_id, or None if the user doesn't exist"""
+        entry = self._entries.get(user_id)
+        if entry is not None and entry.expires_at > time.monotonic():
+            self._entries.move_to_end(user_id)
+            self._hits += 1
+            store = None
+            if entry.store_values is not None:
+                store = await db.merge(detached_copy(Store, entry.store_values), load=False)
+            user = await db.merge(detached_copy(User, entry.user_values), load=False)
+            return TenantContext(user=user, store=store)
+
+        self._misses += 1
+        generation = self._generation
+        result = await db.execute(
+            select(User).options(joinedload(User.store)).where(User.id == user_id)
+        )
+        user = result.scalar_one_or_none()
+        if user is None:
+            self._entries.pop(user_id, None)
+            return None
+
+        # An invalidation while we were loading means this snapshot may be stale
+        if self.ttl_seconds > 0 and generation == self._generation:
+            self._entries[user_id] = TenantEntry(
+                user_values=column_values(user),
+                store_values=column_values(user.store) if user.store is not None else None,
+                expires_at=time.monotonic() + self.ttl_seconds,
+            )
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return TenantContext(user=user, store=user.store)
+
+    # ─── Invalidation ────────────────────────────────────────────
+
+    def invalidate_user(self, user_id: int):
+        self._generation += 1
+        self._entries.pop(user_id, None)
+
+    def invalidate_store(self, store_id: int):
+        self._generation += 1
+        for user_id in [u for u, e in self._entries.items() if e.user_values.get("store_id") == store_id]:
+            del self._entries[user_id]
+
+    def clear(self):
+        self._generation += 1
+        self._entries.clear()
+
+    def get_stats(self) -> dict:
+        total = self._hits + self._misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_rate": round(self._hits / total, 3) if total else 0.0
+        }
+
+
+# Global singleton
+tenant_cache = TenantCache(
+    max_entries=settings.principal_cache_max_entries,
+    ttl_seconds=settings.principal_cache_ttl_seconds
+)
+
+
+# ─── Write tracking ──────────────────────────────────────────────
+
+write_tracker.watch(User, Store)
+
+
+@write_tracker.on_commit
+def _invalidate_committed_tenant_writes(writes: TransactionWrites):
+    if writes.bulk_written(User, Store):
+        tenant_cache.clear()
+        return
+    for write in writes.of(User, Store):
+        if write.created:
+            continue
+        if write.model is User:
+            tenant_cache.invalidate_user(write.id)
+        else:
+            tenant_cache.invalidate_store(write.id)
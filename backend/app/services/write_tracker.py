@@ -0,0 +1,194 @@
+"""
+KadaiGPT - Session Write Tracking
+Collects each transaction's model writes once and hands them to the
+in-process caches and feeds that follow the database.
+
+Strategy:
+- One set of Session listeners for the whole app: after_flush walks
+  session.new / dirty / deleted once and records every object of a watched
+  model (id, store and the columns its watchers asked for); an object
+  written again in a later flush of the same transaction replaces its record
+- ORM bulk UPDATE / DELETE statements can't be itemised: they mark their
+  model as bulk-written and its watchers drop everything for it
+- The store_id of every flushed object is kept for all models, as is
+  whether the transaction wrote at all (read-your-writes routing)
+- Core writers (stock_engine, stock takes) leave their new stock levels in
+  session.info["stock_changes"]; they are dispatched with the writes
+- before_commit subscribers run inside the transaction after a final
+  flush; commit subscribers get the writes once, after commit
+- A rollback drops everything collected, along with the session.info keys
+  other producers registered (change_feed.record's sync_changes)
+"""
+
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+WRITES_KEY = "tracked_writes"
+STOCK_CHANGES_KEY = "stock_changes"
+
+
+@dataclass
+class ModelWrite:
+    """The last state of one written object in the transaction"""
+    model: type
+    id: Any
+    store_id: Optional[int]
+    values: Dict[str, Any]
+    created: bool = False
+    deleted: bool = False
+    modified: bool = True  # False: only its relationships/collections changed
+
+
+@dataclass
+class TransactionWrites:
+    """Everything a transaction wrote, as seen by the tracker"""
+    rows: Dict[Tuple[type, Any], ModelWrite] = field(default_factory=dict)
+    bulk: Set[type] = field(default_factory=set)
+    stock_changes: Dict[int, float] = field(default_factory=dict)  # product id -> stock
+    store_ids: Set[int] = field(default_factory=set)
+    written: bool = False  # any flush or ORM-executed DML
+
+    def of(self, *models: type) -> List[ModelWrite]:
+        return [write for write in self.rows.values() if write.model in models]
+
+    def bulk_written(self, *models: type) -> bool:
+        return not self.bulk.isdisjoint(models)
+
+
+class WriteTracker:
+    """
+    Registry of watched models and write subscribers.
+
+    Usage (at import time of the cache module):
+        write_tracker.watch(Product, columns=("barcode", "sku"))
+
+        @write_tracker.on_commit
+        def _apply(writes: TransactionWrites):
+            for write in writes.of(Product):
+                ...
+    """
+
+    def __init__(self):
+        self._columns: Dict[type, Set[str]] = {}
+        self._before_commit: List[Callable[[Session, TransactionWrites], None]] = []
+        self._on_commit: List[Callable[[TransactionWrites], None]] = []
+        self._info_keys: Set[str] = {WRITES_KEY, STOCK_CHANGES_KEY}
+
+    def watch(self, *models: type, columns: Iterable[str] = ()):
+        """Record flushed objects of these models, with these column values"""
+        for model in models:
+            self._columns.setdefault(model, set()).update(columns)
+
+    def forget_on_rollback(self, key: str):
+        """Drop session.info[key] when the transaction rolls back"""
+        self._info_keys.add(key)
+
+    def before_commit(self, callback: Callable[[Session, TransactionWrites], None]):
+        """Run callback(session, writes) inside every committing transaction"""
+        self._before_commit.append(callback)
+        return callback
+
+    def on_commit(self, callback: Callable[[TransactionWrites], None]):
+        """Run callback(writes) after every commit that wrote something"""
+        self._on_commit.append(callback)
+        return callback
+
+    # ─── Session events ──────────────────────────────────────────
+
+    @staticmethod
+    def _writes(session: Session) -> TransactionWrites:
+        writes = session.info.get(WRITES_KEY)
+        if writes is None:
+            writes = session.info[WRITES_KEY] = TransactionWrites()
+        return writes
+
+    def collect_flush(self, session: Session):
+        writes = self._writes(session)
+        writes.written = True
+        new, deleted = session.new, session.deleted
+        for obj in (*new, *session.dirty, *deleted):
+            store_id = getattr(obj, "store_id", None)
+            if store_id is not None:
+                writes.store_ids.add(store_id)
+            columns = self._columns.get(type(obj))
+            if columns is None:
+                continue
+            is_new, is_deleted = obj in new, obj in deleted
+            key = (type(obj), obj.id)
+            previous = writes.rows.get(key)
+            writes.rows[key] = ModelWrite(
+                model=type(obj),
+                id=obj.id,
+                store_id=store_id,
+                values={column: getattr(obj, column, None) for column in columns},
+                created=is_new or (previous is not None and previous.created),
+                deleted=is_deleted,
+                modified=(
+                    is_new or is_deleted or (previous is not None and previous.modified)
+                    or session.is_modified(obj, include_collections=False)
+                )
+            )
+
+    def collect_statement(self, orm_execute_state):
+        if orm_execute_state.is_select:
+            return
+        writes = self._writes(orm_execute_state.session)
+        writes.written = True
+        if orm_execute_state.is_update or orm_execute_state.is_delete:
+            mapper = orm_execute_state.bind_mapper
+            if mapper is not None and mapper.class_ in self._columns:
+                writes.bulk.add(mapper.class_)
+
+    def run_before_commit(self, session: Session):
+        if not self._before_commit:
+            return
+        session.flush()  # pending ORM writes are collected by the flush
+        writes = session.info.get(WRITES_KEY) or TransactionWrites()
+        for callback in self._before_commit:
+            callback(session, writes)
+
+    def dispatch_commit(self, session: Session):
+        writes = session.info.pop(WRITES_KEY, None)
+        stock_changes = session.info.pop(STOCK_CHANGES_KEY, None)
+        if writes is None and not stock_changes:
+            return
+        writes = writes or TransactionWrites()
+        writes.stock_changes = stock_changes or {}
+        for callback in self._on_commit:
+            callback(writes)
+
+    def forget(self, session: Session):
+        for key in self._info_keys:
+            session.info.pop(key, None)
+
+
+# Global singleton
+write_tracker = WriteTracker()
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_flushed_writes(session, flush_context):
+    write_tracker.collect_flush(session)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _collect_statement_writes(orm_execute_state):
+    write_tracker.collect_statement(orm_execute_state)
+
+
+@event.listens_for(Session, "before_commit")
+def _run_before_commit(session):
+    write_tracker.run_before_commit(session)
+
+
+@event.listens_for(Session, "after_commit")
+def _dispatch_committed_writes(session):
+    write_tracker.dispatch_commit(session)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_rolled_back_writes(session):
+    write_tracker.forget(session)
@@ -0,0 +1,163 @@
+"""
+KadaiGPT - Lazy Imports
+Keeps heavy subsystems (Gemini SDK, AI agents, chat bots, PIL) out of cold starts.
+
+Strategy:
+- LazyObject stands in for a module-level singleton named "module:attribute";
+  the module is imported on first attribute access, then every access is
+  forwarded to the real object
+- lazy_exports() builds a PEP 562 module __getattr__, so a package's
+  `from package import name` only imports the submodule that defines name
+- optional_import() imports an optional SDK on first use (None if missing);
+  is_installed() answers "could it be imported" without importing it
+- LazyRouter holds a router's URL prefix in the route table; the first
+  request under that prefix imports the router and swaps its routes in
+"""
+
+import importlib
+import importlib.util
+import sys
+from functools import lru_cache
+from types import ModuleType
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from starlette.routing import BaseRoute, Match, NoMatchFound
+from starlette.types import Receive, Scope, Send
+
+_UNRESOLVED = object()
+
+
+def resolve(target: str) -> Any:
+    """Import "package.module:attribute" and return the attribute"""
+    module_name, _, attribute = target.partition(":")
+    module = importlib.import_module(module_name)
+    return getattr(module, attribute) if attribute else module
+
+
+class LazyObject:
+    """Proxy for a singleton that is imported on first use"""
+
+    __slots__ = ("_target", "_value")
+
+    def __init__(self, target: str):
+        object.__setattr__(self, "_target", target)
+        object.__setattr__(self, "_value", _UNRESOLVED)
+
+    def _resolve(self) -> Any:
+        value = object.__getattribute__(self, "_value")
+        if value is _UNRESOLVED:
+            value = resolve(object.__getattribute__(self, "_target"))
+            object.__setattr__(self, "_value", value)
+        return value
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._resolve(), name)
+
+    def __setattr__(self, name: str, value: Any):
+        setattr(self._resolve(), name, value)
+
+    def __repr__(self) -> str:
+        value = object.__getattribute__(self, "_value")
+        if value is _UNRESOLVED:
+            return f"<LazyObject {object.__getattribute__(self, '_target')} (not loaded)>"
+        return repr(value)
+
+
+def lazy_exports(package: str, exports: Dict[str, str]) -> Callable[[str], Any]:
+    """
+    Module-level __getattr__ for a package whose names load on first access.
+
+    exports maps each public name to "module:attribute"; relative module
+    names (".print_agent") are resolved against the package.
+    """
+    def __getattr__(name: str) -> Any:
+        target = exports.get(name)
+        if target is None:
+            raise AttributeError(f"module {package!r} has no attribute {name!r}")
+        module_name, _, attribute = target.partition(":")
+        module = importlib.import_module(module_name, package)
+        value = getattr(module, attribute)
+        setattr(sys.modules[package], name, value)  # later lookups skip __getattr__
+        return value
+
+    return __getattr__
+
+
+def is_installed(module_name: str) -> bool:
+    """True if the module can be imported, without importing it"""
+    try:
+        return importlib.util.find_spec(module_name) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+@lru_cache(maxsize=None)
+def optional_import(module_name: str) -> Optional[ModuleType]:
+    """Import an optional dependency on first use; None when it isn't installed"""
+    try:
+        return importlib.import_module(module_name)
+    except ImportError:
+        return None
+
+
+class LazyRouter(BaseRoute):
+    """
+    Route-table placeholder for an APIRouter that is included on first use.
+
+    Matches every path under path_prefix; on the first hit the router named by
+    target is imported, its routes replace this placeholder at the same
+    position (so ordering against catch-all routes is kept) and the request
+    is dispatched again through the app's router.
+    """
+
+    def __init__(self, app, target: str, path_prefix: str, prefix: str = ""):
+        self.app = app
+        self.target = target
+        self.path_prefix = path_prefix.rstrip("/")
+        self.prefix = prefix
+        self.loaded = False
+
+    def matches(self, scope: Scope) -> Tuple[Match, Scope]:
+        if scope["type"] in ("http", "websocket"):
+            path = scope["path"]
+            if path == self.path_prefix or path.startswith(self.path_prefix + "/"):
+                return Match.FULL, {}
+        return Match.NONE, {}
+
+    def url_path_for(self, name: str, /, **path_params: Any):
+        raise NoMatchFound(name, path_params)
+
+    def load(self):
+        """Import the router and put its routes where the placeholder was"""
+        if self.loaded:
+            return
+        routes = self.app.router.routes
+        before = len(routes)
+        self.app.include_router(resolve(self.target), prefix=self.prefix)
+        added = routes[before:]
+        del routes[before:]
+        if self in routes:
+            index = routes.index(self)
+            routes[index:index + 1] = added
+        else:
+            routes.extend(added)
+        self.app.openapi_schema = None
+        self.loaded = True
+
+    async def handle(self, scope: Scope, receive: Receive, send: Send):
+        self.load()
+        await self.app.router(scope, receive, send)
+
+
+def include_lazy_router(app, target: str, path_prefix: str, prefix: str = "") -> LazyRouter:
+    """Register a LazyRouter on app (in the order include_router would have)"""
+    route = LazyRouter(app, target, path_prefix, prefix)
+    app.router.routes.append(route)
+    return route
+
+
+def load_lazy_routers(app):
+    """Include every pending LazyRouter (OpenAPI docs need the full route table)"""
+    for route in list(app.router.routes):
+        if isinstance(route, LazyRouter):
+            route.load()
@@ -0,0 +1,4 @@
+"""
+KadaiGPT - Benchmarks
+Run any benchmark from the backend directory: python -m benchmarks.<name>
+"""
@@ -0,0 +1,119 @@
+"""
+KadaiGPT - Benchmark: a handheld's 30-item scan
+Run with: python -m benchmarks.bench_barcode_lookup
+
+Loads 20,000 products into one store (in-memory SQLite) and times resolving
+baskets of 30 scanned barcodes through the API:
+- "query": one GET per scan through a plain barcode/SKU SELECT, i.e. what a
+  scan cost before the lookup cache
+- "scan": one GET /products/lookup per scan
+- "batch": one POST /products/lookup/batch per basket
+Reports milliseconds per basket and product queries per basket, cold (first
+basket after a restart) and warm (best sellers already cached).
+"""
+
+import asyncio
+import random
+import statistics
+import time
+
+import httpx
+from fastapi import Depends, FastAPI, HTTPException
+from sqlalchemy import event, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+from app.database import Base, get_db
+from app.models import Product, Store, User, UserRole
+from app.routers import products
+from app.routers.auth import get_current_active_user
+from app.services.barcode_cache import barcode_cache
+
+PRODUCTS = 20_000
+BASKET = 30
+BASKETS = 100
+BEST_SELLERS = 500
+
+
+async def main():
+    rng = random.Random(7)
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:", poolclass=StaticPool,
+                                 connect_args={"check_same_thread": False})
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with maker() as db:
+        db.add(Store(id=1, name="Benchmark Store"))
+        db.add(User(id=1, store_id=1, email="bench@kadaigpt.in", password_hash="x",
+                    full_name="Bench", role=UserRole.OWNER))
+        await db.flush()
+        await db.run_sync(lambda session: session.bulk_insert_mappings(Product, [
+            {"id": i, "store_id": 1, "name": f"Product {i}", "sku": f"SKU-{i:06d}",
+             "barcode": f"890{i:010d}", "selling_price": 100, "current_stock": 50, "is_active": True}
+            for i in range(1, PRODUCTS + 1)
+        ]))
+        await db.commit()
+
+    queries = []
+    event.listen(engine.sync_engine, "before_cursor_execute",
+                 lambda conn, cursor, statement, *args: queries.append(statement))
+
+    app = FastAPI()
+    app.include_router(products.router, prefix="/api/v1")
+
+    @app.get("/api/v1/scan-query")
+    async def query_by_code(code: str, db: AsyncSession = Depends(get_db)):
+        result = await db.execute(select(Product).where(
+            Product.store_id == 1, or_(Product.barcode == code, Product.sku == code)
+        ).limit(1))
+        product = result.scalar_one_or_none()
+        if product is None:
+            raise HTTPException(status_code=404)
+        return products.ProductResponse.model_validate(product)
+
+    async def override_get_db():
+        async with maker() as session:
+            yield session
+
+    user = User(id=1, store_id=1, email="bench@kadaigpt.in", full_name="Bench", role=UserRole.OWNER)
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_current_active_user] = lambda: user
+
+    best_sellers = [f"890{i:010d}" for i in rng.sample(range(1, PRODUCTS + 1), BEST_SELLERS)]
+    baskets = [rng.sample(best_sellers, BASKET) for _ in range(BASKETS)]
+
+    async def run(client, mode, basket):
+        if mode == "batch":
+            response = await client.post("/api/v1/products/lookup/batch", json={"codes": basket})
+            assert not response.json()["missing"]
+            return
+        path = "/api/v1/scan-query" if mode == "query" else "/api/v1/products/lookup"
+        for code in basket:
+            assert (await client.get(path, params={"code": code})).status_code == 200
+
+    transport = httpx.ASGITransport(app=app)
+    print(f"{PRODUCTS} products, {BASKETS} baskets of {BASKET} scans from {BEST_SELLERS} best sellers")
+    print(f"{'mode':<6} {'cold ms':>8} {'warm ms':>8} {'queries':>8} {'requests':>9}")
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for mode in ("query", "scan", "batch"):
+            barcode_cache.clear()
+            started = time.perf_counter()
+            await run(client, mode, baskets[0])
+            cold = (time.perf_counter() - started) * 1000
+
+            for basket in baskets:  # fill the cache with every best seller
+                await run(client, mode, basket)
+            timings = []
+            queries.clear()
+            for basket in baskets:
+                started = time.perf_counter()
+                await run(client, mode, basket)
+                timings.append((time.perf_counter() - started) * 1000)
+            requests = 1 if mode == "batch" else BASKET
+            per_basket = sum("FROM products" in sql for sql in queries) / BASKETS
+            print(f"{mode:<6} {cold:>8.2f} {statistics.median(timings):>8.2f} {per_basket:>8.1f} {requests:>9}")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,96 @@
+"""
+KadaiGPT - Benchmark: database round trips per bill
+Run with: python -m benchmarks.bench_bill_roundtrips
+
+Compares the legacy per-line stock path (pre-check SELECT, double-check
+SELECT and UPDATE for every line) against the set-based StockEngine path
+(one locked SELECT and one conditional UPDATE per bill).
+"""
+
+import asyncio
+import time
+
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.pool import StaticPool
+
+from app.database import Base
+from app.models import Store, Product
+from app.services.stock_engine import stock_engine
+
+LINE_COUNTS = [1, 10, 40, 100]
+PRODUCT_COUNT = 200
+
+
+async def legacy_stock_path(db: AsyncSession, lines):
+    """Stock handling as create_bill did it before the StockEngine"""
+    for product_id, quantity in lines:
+        product = (await db.execute(select(Product).where(Product.id == product_id))).scalar_one()
+        assert product.current_stock >= quantity
+    for product_id, quantity in lines:
+        product = (await db.execute(select(Product).where(Product.id == product_id))).scalar_one()
+        assert product.current_stock >= quantity
+    for product_id, quantity in lines:
+        await db.execute(
+            Product.__table__.update()
+            .where(Product.id == product_id)
+            .values(current_stock=Product.current_stock - quantity)
+        )
+
+
+async def set_based_stock_path(db: AsyncSession, lines):
+    """Stock handling through the StockEngine"""
+    quantities = stock_engine.aggregate_quantities(lines)
+    products = await stock_engine.lock_products(db, 1, quantities)
+    assert not stock_engine.find_shortfalls(products, quantities)
+    await stock_engine.decrement_stock(db, 1, quantities)
+
+
+async def measure(session_maker, counter, path, lines, repeats=20):
+    counter.clear()
+    start = time.perf_counter()
+    for _ in range(repeats):
+        async with session_maker() as db:
+            await path(db, lines)
+            await db.rollback()
+    elapsed_ms = (time.perf_counter() - start) * 1000 / repeats
+    return len(counter) // repeats, elapsed_ms
+
+
+async def main():
+    engine = create_async_engine(
+        "sqlite+aiosqlite:///:memory:",
+        poolclass=StaticPool,
+        connect_args={"check_same_thread": False},
+    )
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    session_maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with session_maker() as db:
+        db.add(Store(id=1, name="Bench Store"))
+        db.add_all([
+            Product(id=i, store_id=1, name=f"Product {i}", selling_price=10, current_stock=10_000)
+            for i in range(1, PRODUCT_COUNT + 1)
+        ])
+        await db.commit()
+
+    counter = []
+    event.listen(
+        engine.sync_engine, "before_cursor_execute",
+        lambda conn, cursor, statement, *args: counter.append(statement)
+    )
+
+    print(f"{'lines':>6} | {'legacy stmts':>12} {'legacy ms':>10} | {'set-based stmts':>15} {'set-based ms':>12}")
+    print("-" * 66)
+    for count in LINE_COUNTS:
+        lines = [(i, 1) for i in range(1, count + 1)]
+        legacy_stmts, legacy_ms = await measure(session_maker, counter, legacy_stock_path, lines)
+        batch_stmts, batch_ms = await measure(session_maker, counter, set_based_stock_path, lines)
+        print(f"{count:>6} | {legacy_stmts:>12} {legacy_ms:>10.2f} | {batch_stmts:>15} {batch_ms:>12.2f}")
+
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
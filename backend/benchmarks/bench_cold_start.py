@@ -0,0 +1,95 @@
+"""
+KadaiGPT - Benchmark: schema work on every cold start
+Run with: python -m benchmarks.bench_cold_start
+
+Compares the legacy init_db (create_all, DO $$ column migrations and
+CREATE INDEX IF NOT EXISTS for every index, on every boot) against the
+versioned migrations fast path on an already-current database. Each boot
+uses a fresh engine, like a new Render/Vercel process.
+"""
+
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.database import Base
+from app.migrations import migrate, load_migrations, CreateIndex
+import app.models  # noqa: F401
+
+BOOTS = 20
+
+LEGACY_COLUMN_MIGRATIONS = [
+    ("customers", "deleted_at TIMESTAMPTZ"),
+    ("customers", "loyalty_points INTEGER DEFAULT 0"),
+    ("customers", "last_purchase TIMESTAMP"),
+    ("bills", "refunded_amount DOUBLE PRECISION DEFAULT 0"),
+    ("bill_items", "refunded_quantity DOUBLE PRECISION DEFAULT 0"),
+    ("daily_summaries", "hour INTEGER NOT NULL DEFAULT -1"),
+]
+
+
+async def legacy_init_db(engine):
+    """Boot-time schema work as init_db did it before app/migrations"""
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with engine.begin() as conn:
+        for table, column in LEGACY_COLUMN_MIGRATIONS:
+            try:
+                await conn.execute(text(
+                    f"DO $$ BEGIN ALTER TABLE {table} ADD COLUMN {column}; "
+                    f"EXCEPTION WHEN duplicate_column THEN NULL; END $$;"
+                ))
+            except Exception:
+                pass
+    indexes = [step for m in load_migrations() for step in m.steps if isinstance(step, CreateIndex)]
+    async with engine.begin() as conn:
+        for index in indexes:
+            unique = "UNIQUE " if index.unique else ""
+            await conn.execute(text(
+                f"CREATE {unique}INDEX IF NOT EXISTS {index.name} ON {index.table}({index.columns})"
+            ))
+
+
+async def versioned_init_db(engine):
+    await migrate(engine)
+
+
+async def measure(url, init):
+    timings, statements = [], []
+    for _ in range(BOOTS):
+        engine = create_async_engine(url)
+        counter = []
+        event.listen(engine.sync_engine, "before_cursor_execute",
+                     lambda conn, cursor, statement, *args: counter.append(statement))
+        start = time.perf_counter()
+        await init(engine)
+        timings.append((time.perf_counter() - start) * 1000)
+        statements.append(len(counter))
+        await engine.dispose()
+    return statistics.median(timings), statements[-1]
+
+
+async def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite+aiosqlite:///{os.path.join(tmp, 'cold_start.db')}"
+        engine = create_async_engine(url)
+        await migrate(engine)
+        await engine.dispose()
+
+        legacy_ms, legacy_statements = await measure(url, legacy_init_db)
+        versioned_ms, versioned_statements = await measure(url, versioned_init_db)
+
+    print(f"Schema work per cold start, current schema (median of {BOOTS} boots, SQLite file)")
+    print(f"{'path':<12} {'ms':>8} {'statements':>11}")
+    print(f"{'legacy':<12} {legacy_ms:>8.2f} {legacy_statements:>11}")
+    print(f"{'versioned':<12} {versioned_ms:>8.2f} {versioned_statements:>11}")
+    print(f"saved {legacy_ms - versioned_ms:.2f} ms per boot ({legacy_ms / versioned_ms:.1f}x)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
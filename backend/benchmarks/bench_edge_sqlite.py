@@ -0,0 +1,117 @@
+"""
+KadaiGPT - Benchmark: bills per second on embedded SQLite
+Run with: python -m benchmarks.bench_edge_sqlite
+
+Several cashier tasks create bills (bill row, line items, conditional stock
+decrement, commit) while reporting tasks keep summing revenue. Compares the
+current defaults (rollback journal, synchronous=FULL, a pool of competing
+writers) against the edge profile (WAL, synchronous=NORMAL, one writer
+connection, query-only reader pool).
+"""
+
+import asyncio
+import os
+import tempfile
+import time
+
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+from app.database import Base, create_edge_engines
+from app.models import Store, Product, Bill, BillItem, PaymentMethod
+
+CASHIERS = 8
+READERS = 2
+BILLS_PER_CASHIER = 60
+LINES_PER_BILL = 5
+PRODUCT_COUNT = 50
+
+
+async def seed(engine):
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    maker = async_sessionmaker(engine, class_=AsyncSession)
+    async with maker() as db:
+        db.add(Store(id=1, name="Edge Store"))
+        db.add_all([
+            Product(id=i, store_id=1, name=f"Product {i}", selling_price=10, current_stock=1_000_000)
+            for i in range(1, PRODUCT_COUNT + 1)
+        ])
+        await db.commit()
+
+
+async def cashier(maker, cashier_id, failures):
+    for n in range(BILLS_PER_CASHIER):
+        product_ids = [(cashier_id * 7 + n * 3 + k) % PRODUCT_COUNT + 1 for k in range(LINES_PER_BILL)]
+        try:
+            async with maker() as db:
+                bill_id = (await db.execute(
+                    insert(Bill).values(
+                        store_id=1, bill_number=f"B-{cashier_id}-{n}", subtotal=50, total_amount=50,
+                        payment_method=PaymentMethod.CASH
+                    ).returning(Bill.id)
+                )).scalar_one()
+                await db.execute(insert(BillItem), [
+                    {"bill_id": bill_id, "product_id": pid, "product_name": f"Product {pid}",
+                     "unit_price": 10, "quantity": 1, "subtotal": 10, "total": 10}
+                    for pid in product_ids
+                ])
+                await db.execute(
+                    update(Product)
+                    .where(Product.id.in_(product_ids), Product.current_stock >= 1)
+                    .values(current_stock=Product.current_stock - 1)
+                )
+                await db.commit()
+        except OperationalError:
+            failures.append(1)  # "database is locked"
+
+
+async def reporter(maker, stop, reads):
+    while not stop.is_set():
+        async with maker() as db:
+            await db.execute(select(func.sum(Bill.total_amount)).where(Bill.store_id == 1))
+        reads.append(1)
+        await asyncio.sleep(0)
+
+
+async def run(write_engine, read_engine):
+    write_maker = async_sessionmaker(write_engine, class_=AsyncSession)
+    read_maker = async_sessionmaker(read_engine, class_=AsyncSession)
+    failures, reads, stop = [], [], asyncio.Event()
+
+    readers = [asyncio.create_task(reporter(read_maker, stop, reads)) for _ in range(READERS)]
+    start = time.perf_counter()
+    await asyncio.gather(*[cashier(write_maker, c, failures) for c in range(CASHIERS)])
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await asyncio.gather(*readers)
+
+    created = CASHIERS * BILLS_PER_CASHIER - len(failures)
+    return created / elapsed, len(failures), len(reads) / elapsed
+
+
+async def main():
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite+aiosqlite:///{os.path.join(tmp, 'default.db')}"
+        engine = create_async_engine(url, connect_args={"timeout": 5})
+        await seed(engine)
+        results["default"] = await run(engine, engine)
+        await engine.dispose()
+
+        writer, reader = create_edge_engines(f"sqlite+aiosqlite:///{os.path.join(tmp, 'edge.db')}")
+        await seed(writer)
+        results["edge"] = await run(writer, reader)
+        await writer.dispose()
+        await reader.dispose()
+
+    print(f"{CASHIERS} cashiers x {BILLS_PER_CASHIER} bills ({LINES_PER_BILL} lines), {READERS} report readers")
+    print(f"{'profile':<10} {'bills/s':>9} {'failed':>7} {'reads/s':>9}")
+    for name, (bills_per_second, failed, reads_per_second) in results.items():
+        print(f"{name:<10} {bills_per_second:>9.1f} {failed:>7} {reads_per_second:>9.1f}")
+    print(f"edge/default bills per second: {results['edge'][0] / results['default'][0]:.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,118 @@
+"""
+KadaiGPT - Benchmark: inventory endpoints as the catalogue grows
+Run with: python -m benchmarks.bench_inventory_insights
+
+Loads catalogues of increasing size into one store (in-memory SQLite), each
+with the same 200 products below their stock alert, 5% perishables and a
+month of sales, and times the three inventory endpoints and the dashboard
+stats through the API once the sales velocity has been refreshed. Also
+times the first read, which refreshes it.
+"""
+
+import asyncio
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+import httpx
+from fastapi import FastAPI
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+from app.database import Base, get_db
+from app.models import Bill, BillItem, BillStatus, Product, Store, User, UserRole
+from app.routers import dashboard, products
+from app.routers.auth import get_current_active_user
+from app.services.inventory_insights import inventory_insights
+from app.services.sales_counters import sales_counters
+
+SIZES = (1_000, 10_000, 50_000)
+LOW_STOCK = 200
+PERISHABLE_SHARE = 0.05
+BILLS = 300
+ITEMS_PER_BILL = 20
+RUNS = 20
+
+ENDPOINTS = {
+    "low-stock": "/api/v1/products/inventory/low-stock",
+    "reorder": "/api/v1/products/inventory/reorder-list",
+    "insights": "/api/v1/products/inventory/insights",
+    "dashboard": "/api/v1/dashboard/stats",
+}
+
+
+async def load(maker, size: int, rng: random.Random):
+    async with maker() as db:
+        db.add(Store(id=1, name="Benchmark Store"))
+        db.add(User(id=1, store_id=1, email="bench@kadaigpt.in", password_hash="x",
+                    full_name="Bench", role=UserRole.OWNER))
+        await db.flush()
+        now = datetime.now()
+        low = set(rng.sample(range(1, size + 1), LOW_STOCK))
+        await db.run_sync(lambda session: session.bulk_insert_mappings(Product, [
+            {"id": i, "store_id": 1, "name": f"Product {i}", "selling_price": 100, "cost_price": 80,
+             "current_stock": rng.randint(0, 9) if i in low else rng.randint(20, 500),
+             "min_stock_alert": 10, "is_active": True,
+             "expiry_date": now + timedelta(days=rng.randint(30, 365)) if rng.random() < PERISHABLE_SHARE else None}
+            for i in range(1, size + 1)
+        ]))
+        await db.run_sync(lambda session: session.bulk_insert_mappings(Bill, [
+            {"id": b, "store_id": 1, "bill_number": f"B-{b}", "subtotal": 0, "total_amount": 0,
+             "status": BillStatus.COMPLETED, "bill_date": now - timedelta(days=rng.randint(0, 29))}
+            for b in range(1, BILLS + 1)
+        ]))
+        await db.run_sync(lambda session: session.bulk_insert_mappings(BillItem, [
+            {"bill_id": b, "product_id": pid, "product_name": f"Product {pid}", "unit_price": 100,
+             "quantity": rng.randint(1, 5), "subtotal": 100, "total": 100}
+            for b in range(1, BILLS + 1)
+            for pid in rng.sample(range(1, size + 1), ITEMS_PER_BILL)
+        ]))
+        await db.commit()
+
+
+async def main():
+    app = FastAPI()
+    app.include_router(products.router, prefix="/api/v1")
+    app.include_router(dashboard.router, prefix="/api/v1")
+    user = User(id=1, store_id=1, email="bench@kadaigpt.in", full_name="Bench", role=UserRole.OWNER)
+    app.dependency_overrides[get_current_active_user] = lambda: user
+
+    print(f"Median ms per request over {RUNS} runs, {LOW_STOCK} products low on stock")
+    print(f"{'products':>9} {'refresh':>8} " + " ".join(f"{name:>10}" for name in ENDPOINTS))
+    for size in SIZES:
+        engine = create_async_engine("sqlite+aiosqlite:///:memory:", poolclass=StaticPool,
+                                     connect_args={"check_same_thread": False})
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        await load(maker, size, random.Random(size))
+
+        async def override_get_db():
+            async with maker() as session:
+                yield session
+
+        app.dependency_overrides[get_db] = override_get_db
+        inventory_insights._refreshed_at.clear()
+        sales_counters.invalidate()
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            started = time.perf_counter()
+            assert (await client.get(ENDPOINTS["low-stock"])).status_code == 200
+            refresh = (time.perf_counter() - started) * 1000
+
+            medians = []
+            for path in ENDPOINTS.values():
+                timings = []
+                for _ in range(RUNS):
+                    started = time.perf_counter()
+                    assert (await client.get(path)).status_code == 200
+                    timings.append((time.perf_counter() - started) * 1000)
+                medians.append(statistics.median(timings))
+        print(f"{size:>9} {refresh:>8.1f} " + " ".join(f"{ms:>10.2f}" for ms in medians))
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
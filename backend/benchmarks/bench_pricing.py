@@ -0,0 +1,101 @@
+"""
+KadaiGPT - Benchmark: CPU time to price a bill
+Run with: python -m benchmarks.bench_pricing
+
+Compares the legacy float path (per-item loop in create_bill followed by a
+second totals pass over the items) against the integer-paise
+PricingEngine, for single carts and for a 200-bill offline batch.
+"""
+
+import random
+import time
+
+from app.schemas import BillItemCreate
+from app.routers.bills import price_bills
+
+LINE_COUNTS = [10, 100, 500]
+BATCH_BILLS = 200
+BATCH_LINES = 20
+
+
+def legacy_price(items):
+    """Line and bill arithmetic as create_bill did it before the PricingEngine"""
+    processed = []
+    for item in items:
+        item_subtotal = item.unit_price * item.quantity
+        item_discount = item_subtotal * (item.discount_percent / 100)
+        item_taxable = item_subtotal - item_discount
+        item_tax = item_taxable * (item.tax_rate / 100)
+        processed.append({
+            "product_id": item.product_id,
+            "product_name": item.product_name,
+            "product_sku": item.product_sku,
+            "unit_price": item.unit_price,
+            "quantity": item.quantity,
+            "discount_percent": item.discount_percent,
+            "tax_rate": item.tax_rate,
+            "subtotal": round(item_subtotal, 2),
+            "discount_amount": round(item_discount, 2),
+            "tax_amount": round(item_tax, 2),
+            "total": round(item_taxable + item_tax, 2)
+        })
+
+    subtotal = total_discount = total_tax = 0.0
+    for item in [
+        {"unit_price": i.unit_price, "quantity": i.quantity,
+         "discount_percent": i.discount_percent, "tax_rate": i.tax_rate}
+        for i in items
+    ]:
+        item_subtotal = item["unit_price"] * item["quantity"]
+        item_discount = item_subtotal * (item.get("discount_percent", 0) / 100)
+        item_tax = (item_subtotal - item_discount) * (item.get("tax_rate", 0) / 100)
+        subtotal += item_subtotal
+        total_discount += item_discount
+        total_tax += item_tax
+    return processed, round(subtotal - total_discount + total_tax, 2)
+
+
+def make_cart(rng, lines):
+    return [
+        BillItemCreate(
+            product_name=f"Item {n}",
+            unit_price=rng.choice([9.5, 12, 24.75, 48, 99.99, 120, 245.5]),
+            quantity=rng.choice([1, 1, 2, 3, 0.5, 0.25, 1.75]),
+            discount_percent=rng.choice([0, 0, 5, 10, 2.5]),
+            tax_rate=rng.choice([0, 5, 12, 18, 28])
+        )
+        for n in range(lines)
+    ]
+
+
+def measure(fn, repeats, rounds=5):
+    """Best-of-rounds microseconds per call"""
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(repeats):
+            fn()
+        best = min(best, (time.perf_counter() - start) * 1_000_000 / repeats)
+    return best
+
+
+def main():
+    rng = random.Random(42)
+
+    print(f"{'lines':>6} | {'legacy us/bill':>14} | {'engine us/bill':>14} | {'speedup':>7}")
+    print("-" * 52)
+    for count in LINE_COUNTS:
+        cart = make_cart(rng, count)
+        repeats = max(20, 20_000 // count)
+        legacy_us = measure(lambda: legacy_price(cart), repeats)
+        engine_us = measure(lambda: price_bills([cart]), repeats)
+        print(f"{count:>6} | {legacy_us:>14.1f} | {engine_us:>14.1f} | {legacy_us / engine_us:>6.2f}x")
+
+    carts = [make_cart(rng, BATCH_LINES) for _ in range(BATCH_BILLS)]
+    legacy_ms = measure(lambda: [legacy_price(cart) for cart in carts], 20) / 1000
+    engine_ms = measure(lambda: price_bills(carts), 20) / 1000
+    print(f"\nbatch of {BATCH_BILLS} x {BATCH_LINES} lines: legacy {legacy_ms:.2f} ms, engine {engine_ms:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+KadaiGPT - Benchmark: POS typeahead latency at 50k products
+Run with: python -m benchmarks.bench_product_search
+
+Loads 50,000 generated products into one store (in-memory SQLite) and
+replays the keystrokes of cashiers typing product names, SKUs and barcodes.
+"ilike" is the query GET /products?search= used to run (ILIKE '%term%' over
+name, SKU and barcode); "index" is product_search.search, i.e. the trigram
+index plus the primary-key fetch of the page. Both return the first 20
+results. Reports p50/p95/p99 per keystroke and the index build time.
+"""
+
+import asyncio
+import random
+import statistics
+import time
+
+from sqlalchemy import or_, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+from app.database import Base
+from app.models import Product, Store
+from app.services.product_search import ALIAS_GROUPS, ProductSearch
+
+PRODUCTS = 50_000
+PAGE = 20
+TYPED_QUERIES = 150
+
+BRANDS = ["Aashirvaad", "Tata", "Fortune", "Saffola", "Everest", "MTR", "Aachi", "Sakthi",
+          "Patanjali", "Amul", "Aavin", "Nandini", "Daawat", "India Gate", "Catch", "Organic Tattva"]
+SIZES = ["100g", "200g", "250g", "500g", "1kg", "2kg", "5kg", "10kg", "500ml", "1L", "5L"]
+EXTRAS = ["Premium", "Classic", "Gold", "Select", "Organic", "Unpolished", "Refined", "Cold Pressed",
+          "Powder", "Whole", "Split", "Value Pack", "Family Pack"]
+
+
+def product_names(rng):
+    items = [group[0] for group in ALIAS_GROUPS] + [group[1] for group in ALIAS_GROUPS]
+    for i in range(PRODUCTS):
+        words = [rng.choice(BRANDS), rng.choice(items).title()]
+        if rng.random() < 0.5:
+            words.append(rng.choice(items).title())
+        if rng.random() < 0.6:
+            words.append(rng.choice(EXTRAS))
+        words.append(rng.choice(SIZES))
+        yield " ".join(words)
+
+
+def keystrokes(rng, products):
+    """Every prefix of what cashiers type, with an occasional typo"""
+    typed = []
+    for _ in range(TYPED_QUERIES):
+        pid, name, sku, barcode = rng.choice(products)
+        kind = rng.random()
+        if kind < 0.7:
+            text = " ".join(name.lower().split()[1:3])
+            if rng.random() < 0.2 and len(text) > 5:
+                cut = rng.randrange(2, len(text) - 1)
+                text = text[:cut] + text[cut + 1:]
+        elif kind < 0.85:
+            text = sku.lower()
+        else:
+            text = barcode
+        typed.extend(text[:i] for i in range(2, len(text) + 1))
+    return typed
+
+
+async def ilike_search(db, term):
+    pattern = f"%{term}%"
+    result = await db.execute(
+        select(Product)
+        .where(Product.store_id == 1, Product.is_active == True)
+        .where(or_(Product.name.ilike(pattern), Product.sku.ilike(pattern), Product.barcode.ilike(pattern)))
+        .limit(PAGE)
+    )
+    return result.scalars().all()
+
+
+def percentiles(samples):
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+    return statistics.median(ordered), pick(0.95), pick(0.99)
+
+
+async def main():
+    rng = random.Random(11)
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:", poolclass=StaticPool,
+                                 connect_args={"check_same_thread": False})
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    products = [(i + 1, name, f"SKU-{i + 1:06d}", f"890{rng.randrange(10 ** 9, 10 ** 10)}")
+                for i, name in enumerate(product_names(rng))]
+    async with maker() as db:
+        db.add(Store(id=1, name="Benchmark Store"))
+        await db.flush()
+        await db.run_sync(lambda session: session.bulk_insert_mappings(Product, [
+            {"id": pid, "store_id": 1, "name": name, "sku": sku, "barcode": barcode,
+             "selling_price": 100, "current_stock": 50, "is_active": True}
+            for pid, name, sku, barcode in products
+        ]))
+        await db.commit()
+
+    search = ProductSearch(backend="memory", ttl_seconds=3600, max_stores=10)
+    async with maker() as db:
+        started = time.perf_counter()
+        index = await search.get_index(db, 1)
+        build_ms = (time.perf_counter() - started) * 1000
+
+    typed = keystrokes(rng, products)
+    timings = {"ilike": [], "index": []}
+    async with maker() as db:
+        for term in typed:
+            started = time.perf_counter()
+            await ilike_search(db, term)
+            timings["ilike"].append((time.perf_counter() - started) * 1000)
+
+            started = time.perf_counter()
+            await search.search(db, 1, term, limit=PAGE)
+            timings["index"].append((time.perf_counter() - started) * 1000)
+            db.expunge_all()
+
+    print(f"{PRODUCTS} products, {len(typed)} keystrokes, first {PAGE} results")
+    print(f"index build: {build_ms:.0f} ms ({len(index.words)} words, {len(index.trigram_words)} trigrams)")
+    print(f"{'search':<8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for name, samples in timings.items():
+        p50, p95, p99 = percentiles(samples)
+        print(f"{name:<8} {p50:>8.2f} {p95:>8.2f} {p99:>8.2f}")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,104 @@
+"""
+KadaiGPT - Benchmark: per-request rate limiter cost and retained memory
+Run with: python -m benchmarks.bench_rate_limit
+
+Replays the same request stream against the limiter this module replaced
+(a list of datetimes per key, filtered on every request and never evicted)
+and against the GCRA limiter with its memory and shared (mmap) stores.
+Traffic is a few busy clients near the 'api' limit (100/min) plus a long
+tail of one-off IPs. Reports microseconds per check and the memory the
+limiter still holds at the end (tracemalloc; the shared store's table is a
+fixed file mapping).
+"""
+
+import os
+import random
+import statistics
+import tempfile
+import time
+import tracemalloc
+import warnings
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from app.middleware.rate_limit import MemoryRateLimitStore, RateLimiter, SharedRateLimitStore
+
+REQUESTS = 200_000
+BUSY_CLIENTS = 50
+ONE_OFF_SHARE = 0.3
+MAX_REQUESTS, WINDOW = 100, 60
+REPEATS = 3
+
+
+class LegacyRateLimiter:
+    """The previous implementation, reduced to its per-request path"""
+
+    def __init__(self):
+        self.requests = defaultdict(list)
+
+    def check_rate_limit(self, key, max_requests, window_seconds):
+        cutoff = datetime.utcnow() - timedelta(seconds=window_seconds)
+        self.requests[key] = [t for t in self.requests[key] if t > cutoff]
+        current_count = len(self.requests[key])
+        if current_count >= max_requests:
+            return False, 0
+        self.requests[key].append(datetime.utcnow())
+        return True, max_requests - current_count - 1
+
+    def reset(self):
+        self.requests.clear()
+
+
+def request_stream():
+    rng = random.Random(7)
+    keys = []
+    for i in range(REQUESTS):
+        if rng.random() < ONE_OFF_SHARE:
+            keys.append(f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}:api")
+        else:
+            keys.append(f"192.168.0.{rng.randrange(BUSY_CLIENTS)}:api")
+    return keys
+
+
+def run(limiter, keys):
+    """Microseconds per check (median of REPEATS) and bytes retained"""
+    timings = []
+    for _ in range(REPEATS):
+        limiter.reset()
+        start = time.perf_counter()
+        for key in keys:
+            limiter.check_rate_limit(key, MAX_REQUESTS, WINDOW)
+        timings.append((time.perf_counter() - start) / len(keys) * 1e6)
+
+    limiter.reset()
+    tracemalloc.start()
+    for key in keys:
+        limiter.check_rate_limit(key, MAX_REQUESTS, WINDOW)
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(timings), retained
+
+
+def main():
+    warnings.simplefilter("ignore", DeprecationWarning)  # utcnow() in the legacy limiter
+    keys = request_stream()
+    shared_path = os.path.join(tempfile.mkdtemp(), "ratelimit")
+    shared = SharedRateLimitStore(shared_path, 65536)
+    limiters = {
+        "legacy": LegacyRateLimiter(),
+        "gcra-memory": RateLimiter(MemoryRateLimitStore(100_000)),
+        "gcra-shared": RateLimiter(shared),
+    }
+
+    print(f"{REQUESTS} checks, {BUSY_CLIENTS} busy clients + {ONE_OFF_SHARE:.0%} one-off IPs, "
+          f"limit {MAX_REQUESTS}/{WINDOW}s (median of {REPEATS})")
+    print(f"{'limiter':<12} {'us/check':>9} {'retained KB':>12}")
+    for name, limiter in limiters.items():
+        per_check_us, retained = run(limiter, keys)
+        if name == "gcra-shared":
+            retained = os.path.getsize(shared_path)
+        print(f"{name:<12} {per_check_us:>9.2f} {retained / 1024:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
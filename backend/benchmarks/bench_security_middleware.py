@@ -0,0 +1,119 @@
+"""
+KadaiGPT - Benchmark: security middleware throughput
+Run with: python -m benchmarks.bench_security_middleware
+
+Serves the same two endpoints (a small JSON body and a 64-chunk CSV stream)
+behind the previous @app.middleware("http") security function and behind
+the pure ASGI SecurityMiddleware, and reports requests per second through
+an in-process httpx client. The rate limit is raised so every request goes
+through the full allowed path.
+"""
+
+import asyncio
+import time
+import uuid
+
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from app.middleware import security
+from app.middleware.security import RATE_LIMITS, SecurityMiddleware, get_rate_limit_type, rate_limiter
+
+REQUESTS = 3000
+STREAM_REQUESTS = 500
+CHUNKS = 64
+
+
+async def legacy_security_middleware(request: Request, call_next):
+    """The middleware app/main.py used before, unchanged apart from imports"""
+    start_time = time.time()
+    request_id = str(uuid.uuid4())[:8]
+    client_ip = request.client.host if request.client else "unknown"
+    path = request.url.path
+
+    if not path.startswith(("/api/ping", "/api/health", "/api/docs", "/api/redoc", "/api/openapi")):
+        limit_type = get_rate_limit_type(path)
+        limits = RATE_LIMITS.get(limit_type, RATE_LIMITS['api'])
+        decision = await rate_limiter.check(
+            f"{client_ip}:{limit_type}",
+            max_requests=limits['max'],
+            window_seconds=limits['window']
+        )
+        if not decision.allowed:
+            return JSONResponse(status_code=429, content={"error": True})
+
+    response = await call_next(request)
+    response.headers["X-Request-ID"] = request_id
+    response.headers["X-Response-Time"] = f"{(time.time() - start_time)*1000:.1f}ms"
+    response.headers["X-Content-Type-Options"] = "nosniff"
+    response.headers["X-Frame-Options"] = "DENY"
+    response.headers["X-XSS-Protection"] = "1; mode=block"
+    response.headers["Referrer-Policy"] = "strict-origin-when-cross-origin"
+    response.headers["Permissions-Policy"] = "camera=(), microphone=(self), geolocation=()"
+    csp_directives = [
+        "default-src 'self'",
+        "script-src 'self' 'unsafe-inline' 'unsafe-eval'",
+        "style-src 'self' 'unsafe-inline' https://fonts.googleapis.com",
+        "font-src 'self' https://fonts.gstatic.com",
+        "img-src 'self' data: blob: https:",
+        "connect-src 'self' https://api.whatsapp.com https://wa.me https://*.googleapis.com wss: ws:",
+        "media-src 'self' blob:",
+        "worker-src 'self' blob:",
+        "frame-ancestors 'none'",
+    ]
+    response.headers["Content-Security-Policy"] = "; ".join(csp_directives)
+    return response
+
+
+def build_app(mode: str) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/api/v1/products/{product_id}")
+    async def product(product_id: int):
+        return {"id": product_id, "name": "Toor Dal 1kg", "price": 145.0, "stock": 32}
+
+    @app.get("/api/v1/reports/stream")
+    async def report():
+        async def rows():
+            for i in range(CHUNKS):
+                yield f"{i},Toor Dal 1kg,145.00\n".encode()
+        return StreamingResponse(rows(), media_type="text/csv")
+
+    if mode == "legacy":
+        app.middleware("http")(legacy_security_middleware)
+    else:
+        app.add_middleware(SecurityMiddleware)
+    return app
+
+
+async def requests_per_second(app: FastAPI, path: str, count: int) -> float:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for _ in range(50):
+            await client.get(path)
+        start = time.perf_counter()
+        for i in range(count):
+            response = await client.get(path)
+            assert response.status_code == 200
+        return count / (time.perf_counter() - start)
+
+
+async def main():
+    for limits in RATE_LIMITS.values():
+        limits['max'] = 10 ** 9
+    security.route_timings.reset()
+
+    cases = [("json", "/api/v1/products/42", REQUESTS), ("stream", "/api/v1/reports/stream", STREAM_REQUESTS)]
+    print("Requests per second through an in-process httpx client")
+    print(f"{'endpoint':<8} {'legacy':>9} {'asgi':>9} {'speedup':>8}")
+    for name, path, count in cases:
+        rates = {}
+        for mode in ("legacy", "asgi"):
+            rate_limiter.reset()
+            rates[mode] = await requests_per_second(build_app(mode), path, count)
+        print(f"{name:<8} {rates['legacy']:>9.0f} {rates['asgi']:>9.0f} {rates['asgi'] / rates['legacy']:>7.2f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,73 @@
+"""
+KadaiGPT - Benchmark: serverless cold start (import time and memory)
+Run with: python -m benchmarks.bench_startup
+
+Each boot is a fresh interpreter importing app.main, like a new Vercel
+instance. "eager" then loads everything the lazy paths defer (Gemini SDK,
+PIL, the agent modules, the chat bots and the lazily included routers), which
+is what importing app.main cost before they were deferred; "lazy" stops at
+the import. Reports median wall time and peak RSS.
+"""
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BOOTS = 7
+
+BOOT_SCRIPT = """
+import json, resource, sys, time
+start = time.perf_counter()
+import app.main
+if sys.argv[1] == "eager":
+    import importlib
+    from app.utils.lazy import load_lazy_routers, optional_import
+    load_lazy_routers(app.main.app)
+    optional_import("google.generativeai")
+    optional_import("PIL.Image")
+    for name in ("app.agents.core", "app.agents.ocr_agent",
+                 "app.services.whatsapp_bot", "app.services.telegram_bot"):
+        importlib.import_module(name)
+    import app.agents.core as core
+    for name in core.__all__:
+        getattr(core, name)
+elapsed = (time.perf_counter() - start) * 1000
+rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({"ms": elapsed, "rss_mb": rss_kb / 1024, "modules": len(sys.modules)}))
+"""
+
+
+def boot(mode):
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run(
+        [sys.executable, "-c", BOOT_SCRIPT, mode],
+        cwd=backend_dir, capture_output=True, text=True, check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def measure(mode):
+    boot(mode)  # warm the bytecode cache so every mode pays the same disk cost
+    runs = [boot(mode) for _ in range(BOOTS)]
+    return (
+        statistics.median(r["ms"] for r in runs),
+        statistics.median(r["rss_mb"] for r in runs),
+        runs[-1]["modules"],
+    )
+
+
+def main():
+    results = {mode: measure(mode) for mode in ("eager", "lazy")}
+
+    print(f"Cold start of app.main (median of {BOOTS} fresh interpreters)")
+    print(f"{'mode':<8} {'ms':>8} {'rss MB':>8} {'modules':>8}")
+    for mode, (ms, rss, modules) in results.items():
+        print(f"{mode:<8} {ms:>8.1f} {rss:>8.1f} {modules:>8}")
+    (eager_ms, eager_rss, _), (lazy_ms, lazy_rss, _) = results["eager"], results["lazy"]
+    print(f"saved {eager_ms - lazy_ms:.1f} ms and {eager_rss - lazy_rss:.1f} MB per cold start")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+KadaiGPT - Benchmark: a 10,000-line physical stock take
+Run with: python -m benchmarks.bench_stock_take
+
+Loads 20,000 products into one store (in-memory SQLite) and counts 10,000
+of them through the API:
+- "adjust": one POST /products/{id}/stock/adjust per counted product, i.e.
+  what a stock take cost before stock-take sessions
+- "stock-take": open a session, send the scanned barcodes in batches of
+  BATCH lines, read the variance, apply
+Reports wall time per phase, requests and SQL statements.
+"""
+
+import asyncio
+import random
+import time
+
+import httpx
+from fastapi import FastAPI
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+from app.database import Base, get_db
+from app.models import Product, Store, User, UserRole
+from app.routers import products, stock_takes
+from app.routers.auth import get_current_active_user
+
+PRODUCTS = 20_000
+LINES = 10_000
+BATCH = 2_000
+
+
+async def setup():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:", poolclass=StaticPool,
+                                 connect_args={"check_same_thread": False})
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with maker() as db:
+        db.add(Store(id=1, name="Benchmark Store"))
+        db.add(User(id=1, store_id=1, email="bench@kadaigpt.in", password_hash="x",
+                    full_name="Bench", role=UserRole.OWNER))
+        await db.flush()
+        await db.run_sync(lambda session: session.bulk_insert_mappings(Product, [
+            {"id": i, "store_id": 1, "name": f"Product {i}", "sku": f"SKU-{i:06d}",
+             "barcode": f"890{i:010d}", "selling_price": 100, "cost_price": 80,
+             "current_stock": 50, "is_active": True}
+            for i in range(1, PRODUCTS + 1)
+        ]))
+        await db.commit()
+    return engine, maker
+
+
+async def main():
+    rng = random.Random(11)
+    counted = {i: max(0, 50 + rng.randint(-5, 3)) for i in rng.sample(range(1, PRODUCTS + 1), LINES)}
+
+    app = FastAPI()
+    app.include_router(products.router, prefix="/api/v1")
+    app.include_router(stock_takes.router, prefix="/api/v1")
+    user = User(id=1, store_id=1, email="bench@kadaigpt.in", full_name="Bench", role=UserRole.OWNER)
+    app.dependency_overrides[get_current_active_user] = lambda: user
+
+    print(f"{LINES} counted of {PRODUCTS} products, batches of {BATCH} lines")
+    print(f"{'mode':<11} {'phase':<9} {'ms':>9} {'requests':>9} {'statements':>11}")
+    for mode in ("adjust", "stock-take"):
+        engine, maker = await setup()
+        statements = []
+        event.listen(engine.sync_engine, "before_cursor_execute",
+                     lambda conn, cursor, statement, *args: statements.append(statement))
+
+        async def override_get_db():
+            async with maker() as session:
+                yield session
+
+        app.dependency_overrides[get_db] = override_get_db
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            async def phase(name, requests, work):
+                statements.clear()
+                started = time.perf_counter()
+                await work()
+                elapsed = (time.perf_counter() - started) * 1000
+                print(f"{mode:<11} {name:<9} {elapsed:>9.1f} {requests:>9} {len(statements):>11}")
+
+            if mode == "adjust":
+                async def adjust_each():
+                    for product_id, quantity in counted.items():
+                        response = await client.post(f"/api/v1/products/{product_id}/stock/adjust",
+                                                     params={"quantity": quantity - 50, "reason": "stock_take"})
+                        assert response.status_code == 200
+                await phase("total", LINES, adjust_each)
+            else:
+                take = {}
+                lines = [{"code": f"890{i:010d}", "quantity": q} for i, q in counted.items()]
+
+                async def open_take():
+                    take["id"] = (await client.post("/api/v1/stock-takes", json={})).json()["id"]
+
+                async def send_counts():
+                    for start in range(0, LINES, BATCH):
+                        response = await client.post(f"/api/v1/stock-takes/{take['id']}/counts",
+                                                     json={"lines": lines[start:start + BATCH]})
+                        assert response.json()["accepted"] == min(BATCH, LINES - start)
+
+                async def variance():
+                    assert (await client.get(f"/api/v1/stock-takes/{take['id']}/variance")).status_code == 200
+
+                async def apply():
+                    response = await client.post(f"/api/v1/stock-takes/{take['id']}/apply")
+                    assert response.json()["counted_products"] == LINES
+
+                started = time.perf_counter()
+                await phase("open", 1, open_take)
+                await phase("counts", -(-LINES // BATCH), send_counts)
+                await phase("variance", 1, variance)
+                await phase("apply", 1, apply)
+                print(f"{mode:<11} {'total':<9} {(time.perf_counter() - started) * 1000:>9.1f}")
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -9,7 +9,7 @@
 Main FastAPI Application Entry Point
 """
 
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, Request, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import JSONResponse
@@ -18,13 +18,16 @@ import os
 import time
 
 from app.config import settings
-from app.database import init_db
+from app.database import init_db, check_db_health
+from app.middleware.query_metrics import QueryMetricsMiddleware, db_metrics
 from app.routers import auth_router, products_router, bills_router, ocr_router, print_router, customers_router, suppliers_router, whatsapp_router, dashboard_router
 from app.routers.analytics import router as analytics_router
+from app.models import User, UserRole
+from app.rbac import require_min_role
 
 # Import security middleware (optional - can be disabled)
 try:
-    from app.middleware.security import SecurityMiddleware
+    from app.middleware.security import SecurityMiddleware, route_timings
     SECURITY_MIDDLEWARE_AVAILABLE = True
 except ImportError:
     SECURITY_MIDDLEWARE_AVAILABLE = False
@@ -117,6 +120,10 @@ app.add_middleware(
 )
 
 
+# Per-request statement counts and timings for /health/db
+app.add_middleware(QueryMetricsMiddleware)
+
+
 # Request timing middleware
 @app.middleware("http")
 async def add_process_time_header(request: Request, call_next):
@@ -160,8 +167,17 @@ from app.routers.bulk import router as bulk_router
 app.include_router(bulk_router, prefix=settings.api_v1_prefix)
 
 # Include scheduler router
-from app.services.scheduler import router as scheduler_router
+from app.services.scheduler import router as scheduler_router, cron_router
 app.include_router(scheduler_router, prefix=settings.api_v1_prefix)
+app.include_router(cron_router, prefix=settings.api_v1_prefix)
+
+# Include delta sync router
+from app.routers.sync import router as sync_router
+app.include_router(sync_router, prefix=settings.api_v1_prefix)
+
+# Include stock take router
+from app.routers.stock_takes import router as stock_takes_router
+app.include_router(stock_takes_router, prefix=settings.api_v1_prefix)
 
 # Include AI Agents router
 from app.routers.agents import router as agents_router
@@ -170,7 +186,7 @@ print("🤖 AI Agents router enabled")
 
 # Add security middleware if available
 if SECURITY_MIDDLEWARE_AVAILABLE:
-    app.add_middleware(SecurityMiddleware)
+    app.add_middleware(SecurityMiddleware, trust_forwarded_for=True)
     print("🔒 Security middleware enabled")
 
 
@@ -185,6 +201,29 @@ async def health_check():
     }
 
 
+# Database query metrics endpoint
+@app.get("/health/db")
+async def db_health_metrics(
+    top: int = 20,
+    current_user: User = Depends(require_min_role(UserRole.OWNER))
+):
+    """Connection pool waits, per-route statement histograms and slow queries (owners only)"""
+    return {
+        "database": await check_db_health(),
+        **db_metrics.snapshot(top)
+    }
+
+
+# Request timing endpoint
+@app.get("/health/routes")
+async def route_health_metrics(
+    top: int = 20,
+    current_user: User = Depends(require_min_role(UserRole.OWNER))
+):
+    """Per-route request counts, 5xx counts and latency histograms (owners only)"""
+    return route_timings.snapshot(top)
+
+
 # Root endpoint
 @app.get("/")
 async def root():
@@ -0,0 +1,116 @@
+"""
+KadaiGPT - Shared test fixtures
+An in-memory database per test, sessions and an API client bound to it.
+
+A test file provides its rows by overriding `seed`:
+
+    @pytest.fixture
+    def seed():
+        async def add(db):
+            db.add(Store(id=1, name="Test Store"))
+        return add
+"""
+
+import pytest
+import httpx
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.pool import StaticPool
+
+from main import app
+from app.middleware.security import rate_limiter
+from app.database import Base, get_db
+from app.models import User
+from app.routers.auth import get_current_active_user, get_current_user
+from app.services.barcode_cache import barcode_cache
+from app.services.bill_cache import bill_cache
+from app.services.inventory_insights import inventory_insights
+from app.services.product_search import product_search
+from app.services.sales_counters import sales_counters
+from app.services.tenant_cache import tenant_cache
+
+
+def reset_caches():
+    """Process-wide caches hold rows of the previous test's database"""
+    barcode_cache.clear()
+    bill_cache.invalidate()
+    inventory_insights.clear()
+    product_search.clear()
+    sales_counters.invalidate()
+    tenant_cache.clear()
+
+
+@pytest.fixture
+def seed():
+    """Rows added to the database before the test; override per file"""
+    async def add(db):
+        pass
+    return add
+
+
+@pytest.fixture
+async def engine(seed):
+    """In-memory database with the full schema and the file's seed rows"""
+    engine = create_async_engine(
+        "sqlite+aiosqlite:///:memory:",
+        poolclass=StaticPool,
+        connect_args={"check_same_thread": False},
+    )
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with maker() as db:
+        await seed(db)
+        await db.commit()
+    reset_caches()
+    yield engine
+    reset_caches()
+    await engine.dispose()
+
+
+@pytest.fixture
+def session_maker(engine):
+    return async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+
+@pytest.fixture
+def statements(engine):
+    """SQL statements run against the engine"""
+    executed = []
+    event.listen(engine.sync_engine, "before_cursor_execute",
+                 lambda conn, cursor, statement, *args: executed.append(statement))
+    return executed
+
+
+@pytest.fixture
+def acting_user():
+    """User the client acts as; set ["id"] mid-test to switch, override with None to send real tokens"""
+    return {"id": 1}
+
+
+@pytest.fixture
+async def client(session_maker, acting_user):
+    """API client bound to the in-memory database"""
+    async def override_get_db():
+        async with session_maker() as session:
+            yield session
+
+    async def override_user():
+        async with session_maker() as session:
+            return await session.get(User, acting_user["id"])
+
+    app.dependency_overrides[get_db] = override_get_db
+    if acting_user is not None:
+        app.dependency_overrides[get_current_user] = override_user
+        app.dependency_overrides[get_current_active_user] = override_user
+    rate_limiter.reset()  # the suite shares one client IP
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        yield client
+    app.dependency_overrides.clear()
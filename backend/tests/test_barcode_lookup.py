@@ -0,0 +1,179 @@
+"""
+KadaiGPT - Tests for barcode/SKU scan lookups
+Run with: pytest tests/test_barcode_lookup.py -v
+"""
+
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import update
+
+from app.models import Product, Store, User, UserRole
+from app.services.barcode_cache import BarcodeCache, barcode_cache
+from app.services.stock_engine import stock_engine
+
+CATALOGUE = [(pid, f"Product {pid}", f"SKU-{pid:03d}", f"89012345{pid:05d}") for pid in range(1, 41)]
+
+
+@pytest.fixture
+def seed():
+    """40 products in store 1 and one in store 2"""
+    async def add(db):
+        db.add_all([Store(id=1, name="Scan Store"), Store(id=2, name="Other Store")])
+        db.add(User(id=1, store_id=1, email="owner@scanstore.in", password_hash="x",
+                    full_name="Owner", role=UserRole.OWNER))
+        db.add_all([
+            Product(id=pid, store_id=1, name=name, sku=sku, barcode=barcode,
+                    selling_price=100, current_stock=50)
+            for pid, name, sku, barcode in CATALOGUE
+        ])
+        db.add(Product(id=100, store_id=2, name="Other Store Dal", sku="OS-1", barcode="8909999900001",
+                       selling_price=100, current_stock=5))
+    return add
+
+
+def product_queries(statements):
+    return [sql for sql in statements if "FROM products" in sql]
+
+
+async def scan(client, code):
+    return await client.get("/api/v1/products/lookup", params={"code": code})
+
+
+class TestLookup:
+    """Tests for GET /products/lookup"""
+
+    async def test_barcode_and_sku(self, client):
+        assert (await scan(client, "8901234500007")).json()["id"] == 7
+        assert (await scan(client, "SKU-012")).json()["id"] == 12
+
+    async def test_unknown_code_is_404(self, client):
+        assert (await scan(client, "0000000000000")).status_code == 404
+
+    async def test_other_stores_products_not_found(self, client):
+        assert (await scan(client, "8909999900001")).status_code == 404
+
+    async def test_warm_scan_runs_no_product_query(self, client, statements):
+        await scan(client, "8901234500007")
+        await scan(client, "0000000000000")
+        statements.clear()
+        assert (await scan(client, "8901234500007")).json()["id"] == 7
+        assert (await scan(client, "0000000000000")).status_code == 404
+        assert product_queries(statements) == []
+
+    async def test_duplicate_codes_prefer_barcode_then_active(self, client, session_maker):
+        async with session_maker() as db:
+            # Product 2's SKU is product 1's barcode; product 41 duplicates it but is inactive
+            (await db.get(Product, 2)).sku = "8901234500001"
+            db.add(Product(id=41, store_id=1, name="Old Pack", barcode="8901234500001",
+                           selling_price=90, is_active=False))
+            await db.commit()
+        assert (await scan(client, "8901234500001")).json()["id"] == 1
+
+        async with session_maker() as db:
+            (await db.get(Product, 1)).is_active = False
+            await db.commit()
+        assert (await scan(client, "8901234500001")).json()["id"] == 1  # lowest id among inactive barcodes
+
+        async with session_maker() as db:
+            (await db.get(Product, 41)).is_active = True
+            await db.commit()
+        assert (await scan(client, "8901234500001")).json()["id"] == 41
+
+
+class TestBatch:
+    """Tests for POST /products/lookup/batch"""
+
+    async def test_thirty_scans_one_request_one_query(self, client, statements):
+        codes = [barcode for _, _, _, barcode in CATALOGUE[:29]] + ["UNKNOWN-1"]
+        response = await client.post("/api/v1/products/lookup/batch", json={"codes": codes})
+        assert response.status_code == 200
+        body = response.json()
+        assert len(body["products"]) == 29
+        assert body["products"]["8901234500003"]["id"] == 3
+        assert body["missing"] == ["UNKNOWN-1"]
+        assert len(product_queries(statements)) == 1
+
+    async def test_warm_codes_served_from_memory(self, client, statements):
+        await client.post("/api/v1/products/lookup/batch", json={"codes": ["SKU-001", "SKU-002"]})
+        statements.clear()
+        response = await client.post("/api/v1/products/lookup/batch",
+                                     json={"codes": ["SKU-001", "SKU-002", "SKU-003"]})
+        assert set(response.json()["products"]) == {"SKU-001", "SKU-002", "SKU-003"}
+        queries = product_queries(statements)
+        assert len(queries) == 1  # only SKU-003 was looked up
+
+    async def test_repeated_and_padded_codes(self, client):
+        response = await client.post("/api/v1/products/lookup/batch",
+                                     json={"codes": ["SKU-001", " SKU-001 ", "SKU-001"]})
+        assert list(response.json()["products"]) == ["SKU-001"]
+        assert response.json()["missing"] == []
+
+    async def test_batch_size_is_capped(self, client):
+        response = await client.post("/api/v1/products/lookup/batch", json={"codes": ["x"] * 201})
+        assert response.status_code == 422
+
+
+class TestInvalidation:
+    """Tests for keeping cached scans in step with product writes"""
+
+    async def test_update_and_delete(self, client):
+        await scan(client, "SKU-005")
+        await client.put("/api/v1/products/5", json={"selling_price": 120})
+        assert (await scan(client, "SKU-005")).json()["selling_price"] == 120
+
+        await client.delete("/api/v1/products/5")
+        assert (await scan(client, "SKU-005")).json()["is_active"] is False
+
+    async def test_new_product_replaces_cached_miss(self, client):
+        assert (await scan(client, "8900000000999")).status_code == 404
+        response = await client.post("/api/v1/products", json={
+            "name": "Fresh Paneer 200g", "selling_price": 90, "barcode": "8900000000999"
+        })
+        assert (await scan(client, "8900000000999")).json()["id"] == response.json()["id"]
+
+    async def test_changed_barcode(self, client, session_maker):
+        await scan(client, "8901234500008")
+        async with session_maker() as db:
+            (await db.get(Product, 8)).barcode = "8901234599999"
+            await db.commit()
+        assert (await scan(client, "8901234500008")).status_code == 404
+        assert (await scan(client, "8901234599999")).json()["id"] == 8
+
+    async def test_committed_stock_change_is_patched(self, client, session_maker, statements):
+        await scan(client, "SKU-009")
+        async with session_maker() as db:
+            await stock_engine.decrement_stock(db, 1, {9: 3})
+            await db.commit()
+        statements.clear()
+        assert (await scan(client, "SKU-009")).json()["current_stock"] == 47
+        assert product_queries(statements) == []
+
+    async def test_rolled_back_stock_change_is_ignored(self, client, session_maker):
+        await scan(client, "SKU-009")
+        async with session_maker() as db:
+            await stock_engine.decrement_stock(db, 1, {9: 3})
+            await db.rollback()
+        assert (await scan(client, "SKU-009")).json()["current_stock"] == 50
+
+    async def test_bulk_update_clears(self, client, session_maker):
+        await scan(client, "SKU-010")
+        async with session_maker() as db:
+            await db.execute(update(Product).where(Product.id == 10).values(selling_price=75))
+            await db.commit()
+        assert barcode_cache.get_stats()["entries"] == 0
+        assert (await scan(client, "SKU-010")).json()["selling_price"] == 75
+
+
+class TestBounds:
+    """Tests for the memory cap"""
+
+    async def test_lru_eviction(self, session_maker):
+        cache = BarcodeCache(max_entries=5, ttl_seconds=60)
+        async with session_maker() as db:
+            await cache.resolve(db, 1, [sku for _, _, sku, _ in CATALOGUE[:8]])
+            assert cache.get_stats()["entries"] == 5
+            assert set(cache._keys_by_product) == {4, 5, 6, 7, 8}
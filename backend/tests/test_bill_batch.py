@@ -0,0 +1,168 @@
+"""
+KadaiGPT - Tests for batch bill ingestion (offline sync)
+Run with: pytest tests/test_bill_batch.py -v
+"""
+
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import select, func
+from sqlalchemy.exc import IntegrityError
+
+from app.models import Store, User, Product, Bill, UserRole
+from app.routers import bills as bills_router
+from app.agents.offline_agent import OfflineAgent
+
+
+@pytest.fixture
+def seed():
+    """A store, its owner and two products"""
+    async def add(db):
+        db.add(Store(id=1, name="Batch Store"))
+        db.add(User(id=1, store_id=1, email="owner@batch.test", password_hash="x",
+                    full_name="Owner", role=UserRole.OWNER))
+        db.add_all([
+            Product(id=1, store_id=1, name="Rice", selling_price=50, current_stock=100),
+            Product(id=2, store_id=1, name="Dal", selling_price=120, current_stock=3),
+        ])
+    return add
+
+
+def offline_bill(local_id, product_id=1, quantity=1):
+    return {
+        "local_id": local_id,
+        "payment_method": "cash",
+        "items": [
+            {"product_id": product_id, "product_name": "Item", "unit_price": 50, "quantity": quantity},
+            {"product_name": "Carry bag", "unit_price": 5, "quantity": 1},
+        ]
+    }
+
+
+class TestBillBatch:
+    """Tests for POST /bills/batch"""
+    
+    async def test_batch_creates_bills_and_decrements_once(self, client, session_maker):
+        bills = [offline_bill(f"day-{i}") for i in range(50)]
+        response = await client.post("/api/v1/bills/batch", json={"bills": bills})
+        
+        assert response.status_code == 200
+        data = response.json()
+        assert data["created_count"] == 50
+        assert [r["local_id"] for r in data["results"]] == [b["local_id"] for b in bills]
+        assert len({r["bill_number"] for r in data["results"]}) == 50
+        
+        async with session_maker() as db:
+            assert await db.scalar(select(Product.current_stock).where(Product.id == 1)) == 50
+    
+    async def test_batch_is_idempotent_on_local_id(self, client, session_maker):
+        bills = [offline_bill("a"), offline_bill("b"), offline_bill("a")]
+        first = (await client.post("/api/v1/bills/batch", json={"bills": bills})).json()
+        second = (await client.post("/api/v1/bills/batch", json={"bills": bills})).json()
+        
+        assert [r["status"] for r in first["results"]] == ["created", "created", "duplicate"]
+        assert second["duplicate_count"] == 3
+        assert second["results"][0]["bill_id"] == first["results"][0]["bill_id"]
+        
+        async with session_maker() as db:
+            assert await db.scalar(select(func.count(Bill.id))) == 2
+    
+    async def test_bill_exceeding_remaining_stock_is_rejected_alone(self, client):
+        bills = [offline_bill("d1", 2, 2), offline_bill("d2", 2, 2), offline_bill("d3", 1, 1)]
+        data = (await client.post("/api/v1/bills/batch", json={"bills": bills})).json()
+        
+        assert [r["status"] for r in data["results"]] == ["created", "rejected", "created"]
+        assert data["results"][1]["error"]["error"] == "insufficient_stock"
+        assert data["results"][1]["error"]["items"][0]["available"] == 1
+    
+    async def test_bill_without_local_id_is_rejected(self, client):
+        bill = offline_bill(None)
+        data = (await client.post("/api/v1/bills/batch", json={"bills": [bill]})).json()
+        
+        assert data["results"][0]["status"] == "rejected"
+        assert data["results"][0]["error"]["error"] == "local_id_required"
+
+
+class TestOfflineReplay:
+    """Tests for idx_bills_store_local_id behind POST /bills and /bills/batch"""
+    
+    @pytest.fixture
+    def race(self, monkeypatch):
+        """Arm it and the next existence check misses, as if the other replay had not committed yet"""
+        misses = []
+        lookup = bills_router.find_offline_bills
+        
+        async def racing_lookup(db, store_id, local_ids):
+            if misses:
+                misses.pop()
+                return {}
+            return await lookup(db, store_id, local_ids)
+        
+        monkeypatch.setattr(bills_router, "find_offline_bills", racing_lookup)
+        return lambda: misses.append(True)
+    
+    async def stock(self, session_maker):
+        async with session_maker() as db:
+            return await db.scalar(select(Product.current_stock).where(Product.id == 1))
+    
+    async def test_database_rejects_a_second_copy(self, session_maker):
+        async with session_maker() as db:
+            db.add_all([Bill(store_id=1, bill_number="L-1", total_amount=1, local_id="same"),
+                        Bill(store_id=1, bill_number="L-2", total_amount=1, local_id="same")])
+            with pytest.raises(IntegrityError):
+                await db.commit()
+    
+    async def test_replay_returns_the_first_bill(self, client, session_maker):
+        first = await client.post("/api/v1/bills?auto_print=false", json=offline_bill("r1"))
+        second = await client.post("/api/v1/bills?auto_print=false", json=offline_bill("r1"))
+        assert first.status_code == second.status_code == 201
+        assert second.json()["id"] == first.json()["id"]
+        assert await self.stock(session_maker) == 99
+    
+    async def test_concurrent_replay_returns_the_winner(self, client, session_maker, race):
+        first = (await client.post("/api/v1/bills?auto_print=false", json=offline_bill("r2"))).json()
+        race()
+        response = await client.post("/api/v1/bills?auto_print=false", json=offline_bill("r2"))
+        assert response.status_code == 201
+        assert response.json()["id"] == first["id"]
+        assert await self.stock(session_maker) == 99
+        async with session_maker() as db:
+            assert await db.scalar(select(func.count(Bill.id))) == 1
+    
+    async def test_concurrent_batch_replay_is_a_conflict(self, client, session_maker, race):
+        await client.post("/api/v1/bills/batch", json={"bills": [offline_bill("r3")]})
+        race()
+        response = await client.post("/api/v1/bills/batch", json={"bills": [offline_bill("r3")]})
+        assert response.status_code == 409
+        assert await self.stock(session_maker) == 99
+
+
+class TestOfflineAgentBatchSync:
+    """Tests for batched bill replay in the Offline Agent"""
+    
+    async def test_bills_sync_in_batches(self, tmp_path, monkeypatch):
+        agent = OfflineAgent(storage_path=str(tmp_path))
+        agent.bill_batch_size = 4
+        for i in range(10):
+            await agent.queue_transaction("bill", offline_bill(None))
+        
+        calls = []
+        original = agent._sync_bill_batch
+        
+        async def counting_batch(transactions, api_endpoint, auth_token=None):
+            calls.append(len(transactions))
+            return await original(transactions, api_endpoint, auth_token)
+        
+        monkeypatch.setattr(agent, "_sync_bill_batch", counting_batch)
+        result = await agent.sync_pending_transactions()
+        
+        assert result.synced_count == 10
+        assert calls == [4, 4, 2]
+        assert agent.pending_transactions == []
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,155 @@
+"""
+KadaiGPT - Tests for the bill detail / receipt cache
+Run with: pytest tests/test_bill_cache.py -v
+"""
+
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+from app.models import Store, User, Product, UserRole
+from app.agents.print_agent import print_agent, PrintDecision
+from app.services.bill_cache import etag_matches
+from app.services.print_spooler import PrintSpooler
+
+
+@pytest.fixture
+def seed():
+    """A store, its owner and a product"""
+    async def add(db):
+        db.add_all([Store(id=1, name="Cache Store"), Store(id=2, name="Other Store")])
+        db.add(User(id=1, store_id=1, email="owner@cache.test", password_hash="x",
+                    full_name="Owner", role=UserRole.OWNER))
+        db.add(Product(id=1, store_id=1, name="Rice", selling_price=50, current_stock=100))
+    return add
+
+
+async def create_bill(client):
+    response = await client.post("/api/v1/bills?auto_print=false", json={
+        "payment_method": "cash",
+        "items": [
+            {"product_id": 1, "product_name": "Rice", "unit_price": 50, "quantity": 2},
+            {"product_id": 1, "product_name": "Rice", "unit_price": 50, "quantity": 1},
+        ]
+    })
+    assert response.status_code == 201
+    return response.json()
+
+
+class TestBillDetail:
+    """Tests for GET /bills/{id} through the cache"""
+
+    async def test_detail_loads_in_one_query_then_serves_cached(self, client, statements):
+        bill = await create_bill(client)
+        statements.clear()
+        first = await client.get(f"/api/v1/bills/{bill['id']}")
+        loads = [s for s in statements if "FROM bills" in s and "bill_items" in s]
+        statements.clear()
+        second = await client.get(f"/api/v1/bills/{bill['id']}")
+
+        assert first.status_code == 200
+        assert len(first.json()["items"]) == 2
+        assert len(loads) == 1 and "stores" in loads[0]
+        assert second.json() == first.json()
+        assert not [s for s in statements if "bill_items" in s]
+
+    async def test_etag_and_304(self, client):
+        bill = await create_bill(client)
+        first = await client.get(f"/api/v1/bills/{bill['id']}")
+        etag = first.headers["etag"]
+
+        cached = await client.get(f"/api/v1/bills/{bill['id']}", headers={"If-None-Match": etag})
+        assert cached.status_code == 304
+        assert cached.headers["etag"] == etag
+
+        weak = await client.get(f"/api/v1/bills/{bill['id']}", headers={"If-None-Match": f'"x", W/{etag}'})
+        assert weak.status_code == 304
+
+    async def test_cancel_changes_etag(self, client):
+        bill = await create_bill(client)
+        etag = (await client.get(f"/api/v1/bills/{bill['id']}")).headers["etag"]
+        await client.post(f"/api/v1/bills/{bill['id']}/cancel")
+
+        response = await client.get(f"/api/v1/bills/{bill['id']}", headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.json()["status"] == "cancelled"
+        assert response.headers["etag"] != etag
+
+    async def test_other_store_bill_not_found(self, client, session_maker):
+        bill = await create_bill(client)
+        async with session_maker() as db:
+            (await db.get(User, 1)).store_id = 2
+            await db.commit()
+        assert (await client.get(f"/api/v1/bills/{bill['id']}")).status_code == 404
+
+    def test_etag_matches(self):
+        assert etag_matches('"a", "b"', '"b"')
+        assert etag_matches("*", '"b"')
+        assert not etag_matches(None, '"b"')
+        assert not etag_matches('"a"', '"b"')
+
+
+class TestReprint:
+    """Tests for reusing rendered receipts"""
+
+    @pytest.fixture
+    def rendered(self, monkeypatch):
+        renders, printed = [], []
+        original = print_agent.generate_receipt_content
+
+        def render(bill_data):
+            renders.append(bill_data["id"])
+            return original(bill_data)
+
+        async def decide(bill_data, preferred_printer=None):
+            return PrintDecision(should_print=True, printer_name="Counter-1", reason="test", confidence=1.0)
+
+        async def execute(content, printer_name, content_type="receipt", max_retries=None):
+            printed.append(content)
+            return {"success": True, "attempts": 1}
+
+        monkeypatch.setattr(print_agent, "generate_receipt_content", render)
+        monkeypatch.setattr(print_agent, "decide_print_strategy", decide)
+        monkeypatch.setattr(print_agent, "execute_silent_print", execute)
+        return renders, printed
+
+    async def reprint(self, client, spooler, bill_id):
+        response = await client.post(f"/api/v1/bills/{bill_id}/print",
+                                     json={"bill_id": bill_id, "printer_name": "Counter-1"})
+        assert response.status_code == 200
+        assert (await spooler.process_next("Counter-1"))["status"] == "completed"
+
+    async def test_reprint_reuses_rendered_receipt(self, client, session_maker, rendered):
+        renders, printed = rendered
+        bill = await create_bill(client)
+        spooler = PrintSpooler(session_factory=session_maker)
+        await self.reprint(client, spooler, bill["id"])
+        await self.reprint(client, spooler, bill["id"])
+
+        assert renders == [bill["id"]]
+        assert printed[0] == printed[1]
+        assert bill["bill_number"] in printed[0]
+
+        detail = (await client.get(f"/api/v1/bills/{bill['id']}")).json()
+        assert detail["print_count"] == 2
+
+    async def test_store_rename_rerenders(self, client, session_maker, rendered):
+        renders, printed = rendered
+        bill = await create_bill(client)
+        spooler = PrintSpooler(session_factory=session_maker)
+        await self.reprint(client, spooler, bill["id"])
+
+        async with session_maker() as db:
+            (await db.get(Store, 1)).name = "Renamed Store"
+            await db.commit()
+
+        await self.reprint(client, spooler, bill["id"])
+        assert len(renders) == 2
+        assert "Renamed Store" in printed[1]
+
+    async def test_print_unknown_bill(self, client):
+        response = await client.post("/api/v1/bills/999/print", json={"bill_id": 999})
+        assert response.status_code == 404
@@ -0,0 +1,73 @@
+"""
+KadaiGPT - Tests for keyset-paginated bill listing
+Run with: pytest tests/test_bill_listing.py -v
+"""
+
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models import Bill, Product, Store, User, UserRole
+
+BILLS = 7
+
+
+@pytest.fixture
+def seed():
+    """A store, its owner, a product, and another store's bill"""
+    async def add(db):
+        db.add_all([Store(id=1, name="Listing Store"), Store(id=2, name="Other Store")])
+        db.add(User(id=1, store_id=1, email="owner@listing.test", password_hash="x",
+                    full_name="Owner", role=UserRole.OWNER))
+        db.add(Product(id=1, store_id=1, name="Rice", selling_price=50, current_stock=1000))
+        db.add(Bill(id=500, store_id=2, bill_number="OTHER-1", total_amount=10))
+    return add
+
+
+@pytest.fixture
+async def bills(client):
+    """BILLS bills created through the API (most in the same second); id -> item lines"""
+    created = {}
+    for i in range(BILLS):
+        lines = i % 3 + 1
+        response = await client.post("/api/v1/bills?auto_print=false", json={
+            "payment_method": "cash",
+            "items": [{"product_id": 1, "product_name": "Rice", "unit_price": 50, "quantity": 1}] * lines
+        })
+        assert response.status_code == 201
+        created[response.json()["id"]] = lines
+    return created
+
+
+async def all_pages(client, limit):
+    pages, cursor = [], None
+    while True:
+        params = {"limit": limit, **({"cursor": cursor} if cursor else {})}
+        response = await client.get("/api/v1/bills", params=params)
+        assert response.status_code == 200
+        pages.append(response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            return pages
+
+
+class TestCursorPaging:
+    """Tests for following X-Next-Cursor through GET /bills"""
+
+    @pytest.mark.parametrize("limit", [3, 7, 10])
+    async def test_pages_cover_every_bill_once(self, client, bills, limit):
+        pages = await all_pages(client, limit)
+        rows = [row for page in pages for row in page]
+        assert [row["id"] for row in rows] == sorted(bills, reverse=True)  # newest first, ties by id
+        assert {row["id"]: row["items_count"] for row in rows} == bills
+        assert all(len(page) == limit for page in pages[:-1])
+
+    async def test_offset_paging_still_works(self, client, bills):
+        first = (await client.get("/api/v1/bills", params={"limit": 3})).json()
+        second = (await client.get("/api/v1/bills", params={"limit": 3, "skip": 3})).json()
+        assert [row["id"] for row in first + second] == sorted(bills, reverse=True)[:6]
+
+    async def test_bad_cursor_is_400(self, client):
+        assert (await client.get("/api/v1/bills", params={"cursor": "not-a-cursor"})).status_code == 400
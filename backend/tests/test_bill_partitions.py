@@ -0,0 +1,205 @@
+"""
+KadaiGPT - Tests for monthly bill partitions and the bill_date copy on bill_items
+Run with: pytest tests/test_bill_partitions.py -v
+
+The partition DDL itself needs PostgreSQL; on SQLite these tests cover the
+month arithmetic, the no-op paths and the bill_date column every query uses.
+"""
+
+import pytest
+import sys
+import os
+from datetime import date, datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import func, select, text
+
+from app.migrations.versions import m0006_bill_items_bill_date, m0007_bill_partitions
+from app.models import Store, User, Product, Bill, BillItem, BillLocalId, BillStatus, UserRole
+from app.routers import bills as bills_router
+from app.services.bill_partitions import (
+    bill_partitions, add_months, partition_ddl, partition_month, partition_name
+)
+from app.services.gst_engine import gst_engine
+
+
+@pytest.fixture
+def seed():
+    """One store, its owner and a product"""
+    async def add(db):
+        db.add(Store(id=1, name="Partition Store"))
+        db.add(User(id=1, store_id=1, email="owner@partition.test", password_hash="x",
+                    full_name="Owner", role=UserRole.OWNER))
+        db.add(Product(id=1, store_id=1, name="Rice", selling_price=50, current_stock=100, hsn_code="1006"))
+    return add
+
+
+async def items_with_bill_dates(session_maker):
+    async with session_maker() as db:
+        result = await db.execute(select(BillItem.bill_date, Bill.bill_date).join(Bill, BillItem.bill_id == Bill.id))
+        return result.all()
+
+
+class TestMonths:
+    """Tests for partition naming and bounds"""
+
+    def test_add_months_wraps_years(self):
+        assert add_months(date(2026, 11, 1), 3) == date(2027, 2, 1)
+        assert add_months(date(2026, 1, 1), -1) == date(2025, 12, 1)
+
+    def test_partition_ddl_uses_utc_month_bounds(self):
+        assert partition_name("bills", date(2026, 12, 1)) == "bills_2026_12"
+        assert partition_ddl("bill_items", date(2026, 12, 1)) == (
+            "CREATE TABLE IF NOT EXISTS bill_items_2026_12 PARTITION OF bill_items "
+            "FOR VALUES FROM ('2026-12-01 00:00:00+00') TO ('2027-01-01 00:00:00+00')"
+        )
+
+    def test_partition_month_parsed_from_name(self):
+        assert partition_month("bill_items_2025_03") == date(2025, 3, 1)
+        assert partition_month("bills_default") is None
+
+
+class TestSQLite:
+    """Partitioning is PostgreSQL-only; SQLite keeps the plain tables"""
+
+    async def test_maintenance_is_a_no_op(self, engine):
+        assert await bill_partitions.convert(engine) is False
+        assert await bill_partitions.maintain(engine) == {"converted": False, "created": [], "detached": []}
+        assert await bill_partitions.detach_partition(engine, date(2024, 1, 1)) == []
+
+
+class TestEnabling:
+    """Turning BILL_PARTITIONING on after migration 0007 already ran"""
+
+    @pytest.fixture
+    def conversions(self, monkeypatch):
+        """Pretend PostgreSQL with plain tables: record convert() calls"""
+        calls = []
+
+        async def convert(engine):
+            calls.append(engine)
+            return True
+
+        monkeypatch.setattr(bill_partitions, "supported", lambda engine: True)
+        monkeypatch.setattr(bill_partitions, "convert", convert)
+        monkeypatch.setattr(bill_partitions, "ensure_partitions", lambda engine: _async([]))
+        monkeypatch.setattr(bill_partitions, "detach_expired", lambda engine: _async([]))
+        return calls
+
+    async def test_migration_leaves_tables_plain_while_disabled(self, engine, conversions, monkeypatch):
+        monkeypatch.setattr(bill_partitions, "enabled", False)
+        await m0007_bill_partitions.PartitionBills().apply(engine)
+        assert conversions == []
+
+    async def test_maintenance_converts_once_enabled(self, engine, conversions, monkeypatch):
+        monkeypatch.setattr(bill_partitions, "enabled", False)
+        await m0007_bill_partitions.PartitionBills().apply(engine)
+        monkeypatch.setattr(bill_partitions, "enabled", True)
+        assert (await bill_partitions.maintain(engine))["converted"] is True
+        assert conversions == [engine]
+
+
+async def _async(value):
+    return value
+
+
+class TestOfflineGuard:
+    """Partitioned bills are unique on (store_id, local_id, bill_date) only; bill_local_ids holds the line"""
+
+    @pytest.fixture
+    async def partitioned(self, engine, monkeypatch):
+        """Drop the plain-table index and make every existence check miss, as in a replay race"""
+        async with engine.begin() as conn:
+            await conn.execute(text("DROP INDEX idx_bills_store_local_id"))
+        lookup = bills_router.find_offline_bills
+        misses = []
+
+        async def racing_lookup(db, store_id, local_ids):
+            if misses:
+                misses.pop()
+                return {}
+            return await lookup(db, store_id, local_ids)
+
+        monkeypatch.setattr(bills_router, "find_offline_bills", racing_lookup)
+        return lambda: misses.append(True)
+
+    def offline_bill(self, local_id):
+        return {"local_id": local_id, "payment_method": "cash",
+                "items": [{"product_id": 1, "product_name": "Rice", "unit_price": 50, "quantity": 1}]}
+
+    async def counts(self, session_maker):
+        async with session_maker() as db:
+            return (await db.scalar(select(func.count(Bill.id))),
+                    await db.scalar(select(Product.current_stock).where(Product.id == 1)))
+
+    async def test_replay_race_returns_the_first_bill(self, client, session_maker, partitioned):
+        first = (await client.post("/api/v1/bills?auto_print=false", json=self.offline_bill("p1"))).json()
+        partitioned()
+        response = await client.post("/api/v1/bills?auto_print=false", json=self.offline_bill("p1"))
+        assert response.status_code == 201
+        assert response.json()["id"] == first["id"]
+        assert await self.counts(session_maker) == (1, 99)
+        async with session_maker() as db:
+            assert (await db.get(BillLocalId, (1, "p1"))).bill_id == first["id"]
+
+    async def test_batch_replay_race_is_a_conflict(self, client, session_maker, partitioned):
+        await client.post("/api/v1/bills/batch", json={"bills": [self.offline_bill("p2")]})
+        partitioned()
+        response = await client.post("/api/v1/bills/batch", json={"bills": [self.offline_bill("p2")]})
+        assert response.status_code == 409
+        assert await self.counts(session_maker) == (1, 99)
+
+
+class TestBillDateCopy:
+    """Tests for bill_items.bill_date"""
+
+    async def test_created_items_carry_bill_date(self, client, session_maker):
+        response = await client.post("/api/v1/bills?auto_print=false", json={
+            "payment_method": "cash",
+            "items": [{"product_id": 1, "product_name": "Rice", "unit_price": 50, "quantity": 1}] * 2
+        })
+        assert response.status_code == 201
+        rows = await items_with_bill_dates(session_maker)
+        assert len(rows) == 2
+        assert all(item_date is not None and item_date == bill_date for item_date, bill_date in rows)
+
+    async def test_batch_items_carry_bill_date(self, client, session_maker):
+        response = await client.post("/api/v1/bills/batch", json={"bills": [
+            {"local_id": f"offline-{n}", "payment_method": "cash",
+             "items": [{"product_id": 1, "product_name": "Rice", "unit_price": 50, "quantity": 1}]}
+            for n in range(3)
+        ]})
+        assert response.status_code == 200
+        rows = await items_with_bill_dates(session_maker)
+        assert len(rows) == 3
+        assert all(item_date is not None and item_date == bill_date for item_date, bill_date in rows)
+
+    async def test_migration_backfills_existing_items(self, engine, session_maker):
+        async with session_maker() as db:
+            db.add(Bill(id=1, store_id=1, bill_number="OLD-1", total_amount=50, subtotal=50,
+                        bill_date=datetime(2025, 3, 14, 10, 0)))
+            db.add(BillItem(bill_id=1, product_name="Rice", unit_price=50, quantity=1, subtotal=50, total=50))
+            await db.commit()
+
+        for step in m0006_bill_items_bill_date.steps:
+            await step.apply(engine)
+
+        async with engine.connect() as conn:
+            backfilled = (await conn.execute(text("SELECT bill_date FROM bill_items"))).scalar()
+        assert str(backfilled).startswith("2025-03-14 10:00:00")
+
+    async def test_gstr1_items_limited_to_month(self, session_maker):
+        async with session_maker() as db:
+            for bill_id, when, quantity in [(1, datetime(2026, 9, 30, 23, 0), 5), (2, datetime(2026, 10, 2, 9, 0), 2)]:
+                db.add(Bill(id=bill_id, store_id=1, bill_number=f"GST-{bill_id}", total_amount=50, subtotal=50,
+                            status=BillStatus.COMPLETED, bill_date=when))
+                db.add(BillItem(bill_id=bill_id, product_id=1, bill_date=when, product_name="Rice",
+                                unit_price=10, quantity=quantity, subtotal=50, total=50))
+            await db.commit()
+
+            report = await gst_engine.generate_gstr1(db, 1, 2026, 10)
+        assert report["summary"]["total_invoices"] == 1
+        assert report["hsn_summary"] == [
+            {"hsn_code": "1006", "quantity": 2, "taxable_value": 50.0, "cgst": 0.0, "sgst": 0.0, "igst": 0, "total_tax": 0.0}
+        ]
@@ -0,0 +1,151 @@
+"""
+KadaiGPT - Tests for bill cancellation and partial refunds
+Run with: pytest tests/test_bill_refunds.py -v
+"""
+
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import select
+
+from app.models import Store, User, Product, Bill, BillItem, AuditTrail, UserRole
+
+
+@pytest.fixture
+def seed():
+    """Two stores and products"""
+    async def add(db):
+        db.add_all([Store(id=1, name="Refund Store"), Store(id=2, name="Other Store")])
+        db.add(User(id=1, store_id=1, email="owner@refund.test", password_hash="x",
+                    full_name="Owner", role=UserRole.OWNER))
+        db.add_all([
+            Product(id=1, store_id=1, name="Rice", selling_price=50, current_stock=100),
+            Product(id=2, store_id=1, name="Dal", selling_price=120, current_stock=100),
+            Product(id=3, store_id=2, name="Foreign", selling_price=10, current_stock=100),
+        ])
+    return add
+
+
+async def create_bill(client, lines):
+    response = await client.post("/api/v1/bills?auto_print=false", json={
+        "payment_method": "cash",
+        "items": [
+            {"product_id": pid, "product_name": f"P{pid}", "unit_price": price, "quantity": qty, "tax_rate": 5}
+            for pid, price, qty in lines
+        ]
+    })
+    assert response.status_code == 201
+    return response.json()
+
+
+async def stock(session_maker, product_id):
+    async with session_maker() as db:
+        return (await db.get(Product, product_id)).current_stock
+
+
+class TestCancel:
+    """Tests for POST /bills/{id}/cancel"""
+
+    async def test_cancel_restores_repeated_products_in_one_update(self, client, session_maker, statements):
+        bill = await create_bill(client, [(1, 50, 2), (1, 50, 3), (2, 120, 1), (1, 50, 1)])
+        assert await stock(session_maker, 1) == 94
+
+        statements.clear()
+        response = await client.post(f"/api/v1/bills/{bill['id']}/cancel")
+
+        assert response.status_code == 200
+        assert len([s for s in statements if s.startswith("UPDATE products")]) == 1
+        assert await stock(session_maker, 1) == 100
+        assert await stock(session_maker, 2) == 100
+
+        async with session_maker() as db:
+            audit = (await db.execute(select(AuditTrail).where(AuditTrail.action == "cancel"))).scalar_one()
+            assert audit.entity_id == bill["id"]
+            assert audit.new_values["restored"] == {"1": 6.0, "2": 1.0}
+
+    async def test_cancel_twice_rejected(self, client):
+        bill = await create_bill(client, [(1, 50, 1)])
+        assert (await client.post(f"/api/v1/bills/{bill['id']}/cancel")).status_code == 200
+        assert (await client.post(f"/api/v1/bills/{bill['id']}/cancel")).status_code == 400
+
+    async def test_cancel_never_touches_other_stores_products(self, client, session_maker):
+        bill = await create_bill(client, [(1, 50, 1)])
+        async with session_maker() as db:
+            item = (await db.execute(select(BillItem).where(BillItem.bill_id == bill["id"]))).scalar_one()
+            item.product_id = 3  # line pointing at another store's product
+            await db.commit()
+
+        assert (await client.post(f"/api/v1/bills/{bill['id']}/cancel")).status_code == 200
+        assert await stock(session_maker, 3) == 100
+
+
+class TestRefund:
+    """Tests for POST /bills/{id}/refund"""
+
+    async def test_partial_refund(self, client, session_maker):
+        bill = await create_bill(client, [(1, 50, 4), (2, 120, 1)])
+        rice_line = next(i for i in bill["items"] if i["product_id"] == 1)
+
+        response = await client.post(f"/api/v1/bills/{bill['id']}/refund", json={
+            "items": [{"bill_item_id": rice_line["id"], "quantity": 1}], "reason": "damaged"
+        })
+        assert response.status_code == 200
+        data = response.json()
+        assert data["status"] == "refunded"
+        assert data["refund_amount"] == 52.5  # 50 + 5% tax
+        assert data["items"][0]["remaining_quantity"] == 3
+        assert await stock(session_maker, 1) == 97
+
+        today = (await client.get("/api/v1/bills/analytics/today")).json()["today"]
+        assert today["bills"] == 1
+        assert today["revenue"] == bill["total_amount"] - 52.5
+
+    async def test_refunds_cannot_exceed_quantity_sold(self, client):
+        bill = await create_bill(client, [(1, 50, 2)])
+        line = bill["items"][0]["id"]
+        url = f"/api/v1/bills/{bill['id']}/refund"
+
+        assert (await client.post(url, json={"items": [{"bill_item_id": line, "quantity": 1.5}]})).status_code == 200
+        response = await client.post(url, json={"items": [{"bill_item_id": line, "quantity": 1}]})
+        assert response.status_code == 400
+        assert response.json()["detail"]["items"][0]["refundable"] == 0.5
+
+    async def test_repeated_refunds_add_up_to_line_total(self, client, session_maker):
+        bill = await create_bill(client, [(1, 33.33, 3)])
+        line = bill["items"][0]
+        url = f"/api/v1/bills/{bill['id']}/refund"
+        for _ in range(3):
+            await client.post(url, json={"items": [{"bill_item_id": line["id"], "quantity": 1}]})
+
+        async with session_maker() as db:
+            refunded = (await db.get(Bill, bill["id"])).refunded_amount
+        assert refunded == line["total"]
+
+    async def test_cancel_after_partial_refund_restores_the_rest(self, client, session_maker):
+        bill = await create_bill(client, [(1, 50, 4)])
+        line = bill["items"][0]["id"]
+        await client.post(f"/api/v1/bills/{bill['id']}/refund", json={"items": [{"bill_item_id": line, "quantity": 1}]})
+        assert (await client.post(f"/api/v1/bills/{bill['id']}/cancel")).status_code == 200
+
+        assert await stock(session_maker, 1) == 100
+        today = (await client.get("/api/v1/bills/analytics/today")).json()["today"]
+        assert today["bills"] == 0
+        assert today["revenue"] == 0
+
+    async def test_refund_of_cancelled_bill_rejected(self, client):
+        bill = await create_bill(client, [(1, 50, 1)])
+        await client.post(f"/api/v1/bills/{bill['id']}/cancel")
+        response = await client.post(f"/api/v1/bills/{bill['id']}/refund", json={
+            "items": [{"bill_item_id": bill["items"][0]["id"], "quantity": 1}]
+        })
+        assert response.status_code == 400
+
+    async def test_unknown_line_rejected(self, client):
+        bill = await create_bill(client, [(1, 50, 1)])
+        response = await client.post(f"/api/v1/bills/{bill['id']}/refund", json={
+            "items": [{"bill_item_id": 9999, "quantity": 1}]
+        })
+        assert response.status_code == 404
@@ -71,6 +71,29 @@ class TestListBills:
         assert response.status_code == 200
 
 
+class TestBillCursor:
+    """Tests for keyset pagination cursors"""
+    
+    def test_cursor_round_trip(self):
+        """Test that a cursor decodes to the position it was built from"""
+        from app.routers.bills import encode_bill_cursor, decode_bill_cursor
+        
+        position = (datetime(2026, 3, 14, 9, 26, 53), 4210)
+        cursor = encode_bill_cursor(*position)
+        
+        assert "=" not in cursor
+        assert decode_bill_cursor(cursor) == position
+    
+    def test_invalid_cursor_rejected(self):
+        """Test that a malformed cursor is a 400, not a 500"""
+        from fastapi import HTTPException
+        from app.routers.bills import decode_bill_cursor
+        
+        with pytest.raises(HTTPException) as exc:
+            decode_bill_cursor("not-a-cursor")
+        assert exc.value.status_code == 400
+
+
 class TestCreateBill:
     """Tests for creating bills"""
     
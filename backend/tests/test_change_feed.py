@@ -0,0 +1,157 @@
+"""
+KadaiGPT - Tests for the per-store change feed (delta sync)
+Run with: pytest tests/test_change_feed.py -v
+"""
+
+import pytest
+import json
+import sys
+import os
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import select
+
+from app.models import Category, Customer, Product, Store, SyncChange, User, UserRole
+from app.services.change_feed import change_feed
+
+
+@pytest.fixture
+def seed():
+    """Two stores, a category, products and a customer"""
+    async def add(db):
+        db.add_all([Store(id=1, name="Sync Store"), Store(id=2, name="Other Store")])
+        db.add(User(id=1, store_id=1, email="owner@sync.test", password_hash="x",
+                    full_name="Owner", role=UserRole.OWNER))
+        db.add(Category(id=1, store_id=1, name="Grains"))
+        db.add_all([
+            Product(id=1, store_id=1, category_id=1, name="Rice", selling_price=50, current_stock=100),
+            Product(id=2, store_id=1, name="Dal", selling_price=120, current_stock=100),
+            Product(id=3, store_id=2, name="Foreign", selling_price=10, current_stock=100),
+        ])
+        db.add(Customer(id=1, store_id=1, name="Meena", phone="9876500001"))
+    return add
+
+
+async def changes(client, since, **params):
+    """Entity records and the final cursor line of one feed page"""
+    response = await client.get("/api/v1/sync/changes", params={"since": since, **params})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    return lines[:-1], lines[-1]
+
+
+def ids(records, entity_type):
+    return sorted(r["id"] for r in records if r["type"] == entity_type)
+
+
+class TestSnapshot:
+    """Tests for since=0"""
+
+    async def test_snapshot_of_own_store(self, client):
+        records, cursor = await changes(client, 0)
+        assert ids(records, "category") == [1]
+        assert ids(records, "product") == [1, 2]
+        assert ids(records, "customer") == [1]
+        assert cursor == {"cursor": 1, "more": False}  # the fixture's commit
+        rice = next(r for r in records if r["type"] == "product" and r["id"] == 1)
+        assert rice["data"]["name"] == "Rice" and rice["data"]["category_id"] == 1
+        assert "store_id" not in rice["data"]
+
+
+class TestDeltas:
+    """Tests for since=<cursor>"""
+
+    async def test_nothing_new(self, client):
+        _, cursor = await changes(client, 0)
+        records, next_cursor = await changes(client, cursor["cursor"])
+        assert records == []
+        assert next_cursor == cursor
+
+    async def test_api_writes_appear_once_per_entity(self, client):
+        _, cursor = await changes(client, 0)
+        created = (await client.post("/api/v1/products", json={"name": "Ragi", "selling_price": 60})).json()
+        await client.put(f"/api/v1/products/{created['id']}", json={"selling_price": 65})
+        await client.put("/api/v1/products/2", json={"name": "Toor Dal"})
+
+        records, next_cursor = await changes(client, cursor["cursor"])
+        assert [(r["type"], r["id"]) for r in records] == [("product", created["id"]), ("product", 2)]
+        assert records[0]["data"]["selling_price"] == 65
+        assert records[1]["data"]["name"] == "Toor Dal"
+        assert next_cursor == {"cursor": cursor["cursor"] + 3, "more": False}
+
+    async def test_bill_and_its_stock_share_one_version(self, client):
+        _, cursor = await changes(client, 0)
+        response = await client.post("/api/v1/bills?auto_print=false", json={
+            "payment_method": "cash",
+            "items": [{"product_id": 1, "product_name": "Rice", "unit_price": 50, "quantity": 4}]
+        })
+        assert response.status_code == 201
+
+        records, next_cursor = await changes(client, cursor["cursor"])
+        by_type = {r["type"]: r for r in records}
+        assert by_type["bill"]["id"] == response.json()["id"]
+        assert by_type["product"]["data"]["current_stock"] == 96
+        assert {r["v"] for r in records} == {next_cursor["cursor"]}
+
+    async def test_deletes_are_tombstones(self, client, session_maker):
+        _, cursor = await changes(client, 0)
+        async with session_maker() as db:
+            await db.delete(await db.get(Product, 2))
+            (await db.get(Customer, 1)).deleted_at = datetime.now()  # soft delete
+            await db.commit()
+
+        records, _ = await changes(client, cursor["cursor"])
+        assert {(r["type"], r["id"]): r.get("deleted") for r in records} == {
+            ("product", 2): True, ("customer", 1): True
+        }
+        assert all("data" not in r for r in records)
+
+    async def test_rolled_back_writes_not_logged(self, client, session_maker):
+        _, cursor = await changes(client, 0)
+        async with session_maker() as db:
+            (await db.get(Product, 1)).name = "Never"
+            await db.flush()
+            await db.rollback()
+        records, _ = await changes(client, cursor["cursor"])
+        assert records == []
+
+    async def test_other_stores_changes_hidden(self, client, session_maker):
+        _, cursor = await changes(client, 0)
+        async with session_maker() as db:
+            (await db.get(Product, 3)).selling_price = 11
+            await db.commit()
+        records, next_cursor = await changes(client, cursor["cursor"])
+        assert records == []
+        assert next_cursor["cursor"] == cursor["cursor"]
+
+
+class TestPaging:
+    """Tests for the limit and version boundaries"""
+
+    async def test_pages_never_split_a_version(self, client, session_maker):
+        _, cursor = await changes(client, 0)
+        async with session_maker() as db:
+            db.add_all([Product(store_id=1, name=f"Bulk {i}", selling_price=10) for i in range(3)])
+            await db.commit()
+        async with session_maker() as db:
+            (await db.get(Product, 1)).selling_price = 55
+            await db.commit()
+
+        first, page = await changes(client, cursor["cursor"], limit=1)
+        assert len(first) == 3 and page["more"] is True
+        second, page = await changes(client, page["cursor"], limit=1)
+        assert ids(second, "product") == [1] and page["more"] is False
+
+    async def test_log_keeps_latest_change_per_entity(self, session_maker):
+        for price in (51, 52, 53):
+            async with session_maker() as db:
+                (await db.get(Product, 1)).selling_price = price
+                await db.commit()
+        async with session_maker() as db:
+            rows = (await db.execute(select(SyncChange).where(SyncChange.entity_id == 1,
+                                                              SyncChange.entity_type == "product"))).scalars().all()
+            assert len(rows) == 1
+            assert rows[0].version == await change_feed.current_version(db, 1)
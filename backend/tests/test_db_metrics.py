@@ -0,0 +1,152 @@
+"""
+KadaiGPT - Tests for database query metrics and the /health/db endpoint
+Run with: pytest tests/test_db_metrics.py -v
+"""
+
+import asyncio
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.middleware.query_metrics import db_metrics, normalize_sql, fingerprint, Histogram, TimedAsyncQueuePool
+from app.models import Store, User, Product, UserRole
+
+
+@pytest.fixture
+def seed():
+    """An owner, a cashier and a product"""
+    async def add(db):
+        db.add(Store(id=1, name="Metrics Store"))
+        db.add_all([
+            User(id=1, store_id=1, email="owner@metrics.test", password_hash="x", full_name="Owner", role=UserRole.OWNER),
+            User(id=2, store_id=1, email="cashier@metrics.test", password_hash="x", full_name="Cashier", role=UserRole.CASHIER),
+        ])
+        db.add(Product(id=1, store_id=1, name="Rice", selling_price=50, current_stock=100))
+    return add
+
+
+@pytest.fixture
+def engine(engine):
+    """The shared in-memory database, instrumented as "test" """
+    db_metrics.install(engine, "test")
+    db_metrics.reset()
+    yield engine
+    db_metrics.uninstall("test")
+    db_metrics.reset()
+
+
+async def create_bill(client):
+    response = await client.post("/api/v1/bills?auto_print=false", json={
+        "payment_method": "cash",
+        "items": [{"product_id": 1, "product_name": "Rice", "unit_price": 50, "quantity": 1}]
+    })
+    assert response.status_code == 201
+    return response.json()
+
+
+class TestFingerprints:
+    """Tests for SQL normalization"""
+
+    def test_literals_and_placeholders_collapse(self):
+        a = normalize_sql("SELECT * FROM bills WHERE store_id = 1 AND bill_number = 'B-1'")
+        b = normalize_sql("SELECT *  FROM bills\n WHERE store_id = $1 AND bill_number = :num")
+        assert a == b == "SELECT * FROM bills WHERE store_id = ? AND bill_number = ?"
+
+    def test_in_and_values_lists_collapse(self):
+        assert normalize_sql("DELETE FROM t WHERE id IN (?, ?, ?)") == normalize_sql("DELETE FROM t WHERE id IN (7)")
+        assert normalize_sql("INSERT INTO t (a, b) VALUES (?, ?), (?, ?), (?, ?)") == "INSERT INTO t (a, b) VALUES (?, ?)"
+
+    def test_identifiers_and_casts_kept(self):
+        sql = normalize_sql("SELECT anon_1.t1 FROM x WHERE y = '5'::text")
+        assert sql == "SELECT anon_1.t1 FROM x WHERE y = ?::text"
+        assert fingerprint("SELECT 1")[0] == fingerprint("SELECT 2")[0]
+
+
+class TestHistogram:
+    def test_percentiles_are_bucket_bounds(self):
+        histogram = Histogram((1, 10, 100))
+        for value in [0.5] * 90 + [50] * 9 + [400]:
+            histogram.observe(value)
+        data = histogram.to_dict()
+        assert data["count"] == 100
+        assert data["p50"] == 1
+        assert data["p95"] == 100
+        assert data["p99"] == 100
+        assert data["max"] == 400
+        assert data["buckets"] == {"le_1": 90, "le_100": 9, "inf": 1}
+
+
+class TestRequestMetrics:
+    """Tests for per-route statement metrics"""
+
+    async def test_statements_attributed_to_route_template(self, client):
+        bill = await create_bill(client)
+        await client.get(f"/api/v1/bills/{bill['id']}")
+        await client.get(f"/api/v1/bills/{bill['id']}")
+
+        routes = (await client.get("/health/db")).json()["routes"]
+        assert routes["POST /api/v1/bills"]["requests"] == 1
+        assert routes["POST /api/v1/bills"]["statements_per_request"]["max"] >= 3
+        assert routes["GET /api/v1/bills/{bill_id}"]["requests"] == 2
+        assert not any(f"/bills/{bill['id']}" in route for route in routes)
+
+    async def test_slow_queries_grouped_with_plan(self, client, monkeypatch):
+        monkeypatch.setattr(db_metrics, "slow_query_ms", 0)
+        monkeypatch.setattr(db_metrics, "explain_sample_rate", 0)
+        for _ in range(3):
+            await create_bill(client)
+
+        slow = (await client.get("/health/db?top=200")).json()["slow_queries"]
+        product_reads = [
+            s for s in slow
+            if s["route"] == "POST /api/v1/bills" and s["sql"].startswith("SELECT") and "FROM products" in s["sql"]
+        ]
+        assert product_reads
+        assert product_reads[0]["count"] == 3
+        assert product_reads[0]["plan"]  # EXPLAIN QUERY PLAN rows
+        assert "'" not in product_reads[0]["sql"]
+
+    async def test_excessive_requests_counted(self, client, monkeypatch):
+        monkeypatch.setattr(db_metrics, "excessive_statements", 1)
+        await create_bill(client)
+        routes = (await client.get("/health/db")).json()["routes"]
+        assert routes["POST /api/v1/bills"]["excessive_requests"] == 1
+
+    async def test_owner_only(self, client, acting_user):
+        acting_user["id"] = 2
+        assert (await client.get("/health/db")).status_code == 403
+
+
+class TestPoolWaits:
+    """Tests for TimedAsyncQueuePool"""
+
+    async def test_waits_for_busy_pool_recorded(self, tmp_path):
+        engine = create_async_engine(
+            f"sqlite+aiosqlite:///{tmp_path / 'pool.db'}",
+            poolclass=TimedAsyncQueuePool, pool_size=1, max_overflow=0,
+        )
+        db_metrics.install(engine, "pool-test")
+        try:
+            async def hold():
+                async with engine.connect() as conn:
+                    await conn.execute(text("SELECT 1"))
+                    await asyncio.sleep(0.1)
+
+            async def wait():
+                await asyncio.sleep(0.01)
+                async with engine.connect() as conn:
+                    await conn.execute(text("SELECT 1"))
+
+            await asyncio.gather(hold(), wait())
+            summary = db_metrics.pool_summary("pool-test")
+            assert summary["checkouts"] == 2
+            assert summary["wait_ms"]["max"] >= 50
+            assert summary["hold_ms"]["max"] >= 90
+        finally:
+            db_metrics.uninstall("pool-test")
+            await engine.dispose()
@@ -0,0 +1,152 @@
+"""
+KadaiGPT - Tests for the edge (embedded SQLite) database profile
+Run with: pytest tests/test_edge_profile.py -v
+"""
+
+import asyncio
+import pytest
+import httpx
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import async_sessionmaker, AsyncSession
+
+from main import app
+from app.database import Base, create_edge_engines, get_db, replica_router
+from app.config import settings
+from app.middleware.security import rate_limiter
+from app.models import Store, User, Product, UserRole
+from app.routers.auth import get_current_active_user, get_current_user
+from app.services.barcode_cache import barcode_cache
+from app.services.product_search import product_search
+
+
+@pytest.fixture
+async def engines(tmp_path):
+    """(writer, reader) edge engines on a fresh SQLite file"""
+    writer, reader = create_edge_engines(f"sqlite+aiosqlite:///{tmp_path / 'edge.db'}")
+    async with writer.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(text("CREATE TABLE counters (id INTEGER PRIMARY KEY, value INTEGER)"))
+        await conn.execute(text("INSERT INTO counters VALUES (1, 0)"))
+    yield writer, reader
+    await writer.dispose()
+    await reader.dispose()
+
+
+async def pragma(engine, name):
+    async with engine.connect() as conn:
+        return (await conn.execute(text(f"PRAGMA {name}"))).scalar()
+
+
+class TestPragmas:
+    """Tests for the connect-time PRAGMAs"""
+
+    async def test_writer_pragmas(self, engines):
+        writer, _ = engines
+        assert await pragma(writer, "journal_mode") == "wal"
+        assert await pragma(writer, "synchronous") == 1  # NORMAL
+        assert await pragma(writer, "busy_timeout") == settings.sqlite_busy_timeout_ms
+        assert await pragma(writer, "cache_size") == -settings.sqlite_cache_size_mb * 1024
+        assert await pragma(writer, "query_only") == 0
+
+    async def test_reader_is_query_only(self, engines):
+        _, reader = engines
+        assert await pragma(reader, "query_only") == 1
+        with pytest.raises(OperationalError):
+            async with reader.begin() as conn:
+                await conn.execute(text("UPDATE counters SET value = 1"))
+
+
+class TestConcurrency:
+    """Tests for single-writer / concurrent-reader behaviour"""
+
+    async def test_writers_queue_instead_of_failing(self, engines):
+        writer, _ = engines
+        maker = async_sessionmaker(writer, class_=AsyncSession, expire_on_commit=False)
+
+        async def increment():
+            async with maker() as db:
+                value = (await db.execute(text("SELECT value FROM counters WHERE id = 1"))).scalar()
+                await asyncio.sleep(0)  # let the other writers interleave
+                await db.execute(text("UPDATE counters SET value = :v WHERE id = 1"), {"v": value + 1})
+                await db.commit()
+
+        await asyncio.gather(*[increment() for _ in range(25)])
+        async with writer.connect() as conn:
+            assert (await conn.execute(text("SELECT value FROM counters"))).scalar() == 25
+
+    async def test_readers_run_during_open_write(self, engines):
+        writer, reader = engines
+        async with writer.begin() as conn:
+            await conn.execute(text("UPDATE counters SET value = 99"))
+            # Uncommitted write in progress: readers neither block nor see it
+            async with reader.connect() as read_conn:
+                value = await asyncio.wait_for(
+                    read_conn.execute(text("SELECT value FROM counters")), timeout=1
+                )
+                assert value.scalar() == 0
+
+        async with reader.connect() as read_conn:
+            assert (await read_conn.execute(text("SELECT value FROM counters"))).scalar() == 99
+
+
+@pytest.fixture
+async def edge_client(engines, monkeypatch):
+    """API client on the edge engines: primary sessions on the writer, reads on the reader"""
+    writer, reader = engines
+    writer_maker = async_sessionmaker(writer, class_=AsyncSession, expire_on_commit=False)
+    reader_maker = async_sessionmaker(reader, class_=AsyncSession, expire_on_commit=False)
+    async with writer_maker() as db:
+        db.add(Store(id=1, name="Edge Store"))
+        db.add(User(id=1, store_id=1, email="owner@edge.test", password_hash="x",
+                    full_name="Owner", role=UserRole.OWNER))
+        db.add(Product(id=1, store_id=1, name="Basmati Rice", sku="RICE-1", barcode="8901234567890",
+                       selling_price=120, current_stock=40))
+        await db.commit()
+    # As app.database wires the edge profile: readers see commits at once
+    monkeypatch.setattr(replica_router, "read_session_maker", reader_maker)
+    monkeypatch.setattr(replica_router, "window_seconds", 0)
+    barcode_cache.clear()
+    product_search.clear()
+
+    async def override_get_db():
+        async with writer_maker() as session:
+            yield session
+
+    async def override_user():
+        async with reader_maker() as session:
+            return await session.get(User, 1)
+
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_current_user] = override_user
+    app.dependency_overrides[get_current_active_user] = override_user
+    rate_limiter.reset()
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+    app.dependency_overrides.clear()
+    barcode_cache.clear()
+    product_search.clear()
+
+
+class TestHotReads:
+    """Tests for product search and scans staying off the single writer connection"""
+
+    async def test_reads_run_while_writer_is_busy(self, engines, edge_client):
+        writer, _ = engines
+        async with writer.begin() as conn:
+            # A bill holds the only writer connection; scans and typeahead still answer
+            await conn.execute(text("UPDATE counters SET value = 1"))
+            lookup = await asyncio.wait_for(edge_client.get("/api/v1/products/lookup?code=RICE-1"), 5)
+            batch = await asyncio.wait_for(edge_client.post(
+                "/api/v1/products/lookup/batch", json={"codes": ["8901234567890", "NOPE"]}
+            ), 5)
+            search = await asyncio.wait_for(edge_client.get("/api/v1/products?search=basmati"), 5)
+
+        assert lookup.status_code == 200 and lookup.json()["id"] == 1
+        assert batch.json()["missing"] == ["NOPE"]
+        assert [p["id"] for p in search.json()] == [1]
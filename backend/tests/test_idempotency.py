@@ -0,0 +1,163 @@
+"""
+KadaiGPT - Tests for the Idempotency-Key response cache
+Run with: pytest tests/test_idempotency.py -v
+"""
+
+import asyncio
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import select, func
+
+from app.models import Store, User, Product, Bill, Customer, UserRole
+from app.services import idempotency
+from app.services.idempotency import MemoryIdempotencyStore, IdempotencyRecord, IdempotencyConflict
+
+
+@pytest.fixture
+def seed():
+    """A store, its owner, a product and a customer"""
+    async def add(db):
+        db.add(Store(id=1, name="Idem Store"))
+        db.add(User(id=1, store_id=1, email="owner@idem.test", password_hash="x",
+                    full_name="Owner", role=UserRole.OWNER))
+        db.add(Product(id=1, store_id=1, name="Rice", selling_price=50, current_stock=100))
+        db.add(Customer(id=1, store_id=1, name="Ravi", phone="9876543210", credit=500))
+    return add
+
+
+@pytest.fixture(autouse=True)
+def fresh_store(monkeypatch):
+    """A fresh idempotency store per test"""
+    monkeypatch.setattr(idempotency, "idempotency_store", MemoryIdempotencyStore(60, 100))
+
+
+BILL = {
+    "payment_method": "cash",
+    "items": [{"product_id": 1, "product_name": "Rice", "unit_price": 50, "quantity": 2}]
+}
+
+
+async def count_bills(session_maker):
+    async with session_maker() as db:
+        return (await db.execute(select(func.count(Bill.id)))).scalar()
+
+
+class TestMemoryStore:
+    """Tests for MemoryIdempotencyStore"""
+
+    async def test_first_caller_owns_key(self):
+        store = MemoryIdempotencyStore(60, 10)
+        assert await store.begin("k") is None
+        await store.complete("k", IdempotencyRecord("fp", 201, {"id": 1}))
+        record = await store.begin("k")
+        assert record.status_code == 201
+        assert record.body == {"id": 1}
+
+    async def test_lru_bound(self):
+        store = MemoryIdempotencyStore(60, 2)
+        for key in ("a", "b", "c"):
+            await store.begin(key)
+            await store.complete(key, IdempotencyRecord("fp", 200, key))
+        assert await store.begin("a") is None
+        assert store.get_stats()["entries"] == 2
+
+    async def test_ttl_expiry(self):
+        store = MemoryIdempotencyStore(0, 10)
+        await store.begin("k")
+        await store.complete("k", IdempotencyRecord("fp", 200, {}))
+        await asyncio.sleep(0.01)
+        assert await store.begin("k") is None
+
+    async def test_waiter_gets_result_of_in_flight_request(self):
+        store = MemoryIdempotencyStore(60, 10)
+        assert await store.begin("k") is None
+        waiter = asyncio.create_task(store.begin("k"))
+        await asyncio.sleep(0)
+        assert not waiter.done()
+        await store.complete("k", IdempotencyRecord("fp", 200, {"ok": True}))
+        assert (await waiter).body == {"ok": True}
+
+    async def test_release_hands_key_to_waiter(self):
+        store = MemoryIdempotencyStore(60, 10)
+        await store.begin("k")
+        waiter = asyncio.create_task(store.begin("k"))
+        await asyncio.sleep(0)
+        await store.release("k")
+        assert await waiter is None
+
+    async def test_wait_timeout_raises_conflict(self):
+        store = MemoryIdempotencyStore(60, 10, wait_timeout=0.01)
+        await store.begin("k")
+        with pytest.raises(IdempotencyConflict):
+            await store.begin("k")
+
+
+class TestIdempotentEndpoints:
+    """Tests for Idempotency-Key on mutating endpoints"""
+
+    async def test_retry_replays_bill_without_new_rows(self, client, session_maker):
+        headers = {"Idempotency-Key": "bill-retry-1"}
+        first = await client.post("/api/v1/bills", json=BILL, headers=headers)
+        second = await client.post("/api/v1/bills", json=BILL, headers=headers)
+
+        assert first.status_code == 201
+        assert second.status_code == 201
+        assert second.headers["Idempotent-Replayed"] == "true"
+        assert second.json()["bill_number"] == first.json()["bill_number"]
+        assert await count_bills(session_maker) == 1
+
+        async with session_maker() as db:
+            assert (await db.get(Product, 1)).current_stock == 98
+
+    async def test_concurrent_duplicates_create_one_bill(self, client, session_maker):
+        headers = {"Idempotency-Key": "bill-race"}
+        responses = await asyncio.gather(*[
+            client.post("/api/v1/bills", json=BILL, headers=headers) for _ in range(5)
+        ])
+
+        assert {r.status_code for r in responses} == {201}
+        assert len({r.json()["id"] for r in responses}) == 1
+        assert await count_bills(session_maker) == 1
+
+    async def test_key_reuse_with_different_body_rejected(self, client):
+        headers = {"Idempotency-Key": "bill-mismatch"}
+        await client.post("/api/v1/bills", json=BILL, headers=headers)
+        other = {**BILL, "payment_method": "upi"}
+        response = await client.post("/api/v1/bills", json=other, headers=headers)
+        assert response.status_code == 422
+
+    async def test_no_header_keeps_old_behaviour(self, client, session_maker):
+        await client.post("/api/v1/bills", json=BILL)
+        await client.post("/api/v1/bills", json=BILL)
+        assert await count_bills(session_maker) == 2
+
+    async def test_failed_request_is_not_cached(self, client):
+        headers = {"Idempotency-Key": "pay-missing"}
+        missing = await client.post("/api/v1/customers/99/payment", json={"amount": 100}, headers=headers)
+        assert missing.status_code == 404
+        retry = await client.post("/api/v1/customers/99/payment", json={"amount": 100}, headers=headers)
+        assert retry.status_code == 404
+        assert "Idempotent-Replayed" not in retry.headers
+
+    async def test_customer_payment_applied_once(self, client, session_maker):
+        headers = {"Idempotency-Key": "pay-1"}
+        for _ in range(3):
+            response = await client.post("/api/v1/customers/1/payment", json={"amount": 100}, headers=headers)
+            assert response.status_code == 200
+            assert response.json()["credit"] == 400
+
+        async with session_maker() as db:
+            assert (await db.get(Customer, 1)).credit == 400
+
+    async def test_direct_call_bypasses_cache(self, session_maker):
+        from app.routers.bills import create_bill
+        from app.schemas import BillCreate
+
+        async with session_maker() as db:
+            user = await db.get(User, 1)
+            bill = await create_bill(bill_data=BillCreate(**BILL), auto_print=False, current_user=user, db=db)
+        assert bill.bill_number
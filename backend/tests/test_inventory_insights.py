@@ -0,0 +1,164 @@
+"""
+KadaiGPT - Tests for the SQL-side inventory insights
+Run with: pytest tests/test_inventory_insights.py -v
+"""
+
+import pytest
+import sys
+import os
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import select, text
+
+from app.models import Bill, BillItem, BillStatus, Product, Store, User, UserRole
+from app.agents.inventory_agent import InventoryAgent
+from app.services.inventory_insights import (
+    LOW_STOCK, PRODUCT_COLUMNS, inventory_insights, priority, product_dict
+)
+
+# id, name, current_stock, min_stock_alert, units sold in the last 30 days
+CATALOGUE = [
+    (1, "Rice 5kg", 8, 10, 60),      # low, 2/day -> 4 days of cover
+    (2, "Toor Dal 1kg", 5, 10, 300),  # low, 10/day -> 0.5 days
+    (3, "Salt 1kg", 0, 10, 0),        # out of stock, never sold
+    (4, "Sugar 1kg", 50, 10, 30),     # healthy, 1/day
+    (5, "Ghee 500ml", 400, 10, 30),   # overstocked, 400 days
+]
+
+
+@pytest.fixture
+def seed():
+    """A catalogue and its last month's sales"""
+    async def add(db):
+        db.add_all([Store(id=1, name="Insight Store"), Store(id=2, name="Other Store")])
+        db.add(User(id=1, store_id=1, email="owner@insight.test", password_hash="x",
+                    full_name="Owner", role=UserRole.OWNER))
+        db.add_all([
+            Product(id=pid, store_id=1, name=name, selling_price=100, cost_price=80,
+                    current_stock=stock, min_stock_alert=minimum)
+            for pid, name, stock, minimum, _ in CATALOGUE
+        ])
+        db.add(Product(id=9, store_id=2, name="Foreign", selling_price=10, current_stock=0, min_stock_alert=10))
+        db.add(Bill(id=1, store_id=1, bill_number="I-1", bill_date=datetime.now() - timedelta(days=3),
+                    subtotal=0, total_amount=0, status=BillStatus.COMPLETED))
+        db.add_all([
+            BillItem(bill_id=1, product_id=pid, product_name=name, unit_price=100,
+                     quantity=sold, subtotal=100 * sold, total=100 * sold)
+            for pid, name, _, _, sold in CATALOGUE if sold
+        ])
+    return add
+
+
+class TestVelocity:
+    """Tests for the rolling sales_velocity column"""
+
+    async def test_refresh_writes_changed_rows_only(self, session_maker):
+        async with session_maker() as db:
+            assert await inventory_insights.refresh_velocity(db, 1) == 4
+            velocity = dict((await db.execute(select(Product.id, Product.sales_velocity))).all())
+            assert velocity[1] == 2.0 and velocity[2] == 10.0 and velocity[3] == 0
+            assert await inventory_insights.refresh_velocity(db, 1) == 0
+
+    async def test_cancelled_sales_drop_out(self, session_maker):
+        async with session_maker() as db:
+            await inventory_insights.refresh_velocity(db, 1)
+            (await db.get(Bill, 1)).status = BillStatus.CANCELLED
+            await db.commit()
+            assert await inventory_insights.refresh_velocity(db, 1) == 4
+            assert (await db.get(Product, 2)).sales_velocity == 0
+
+    async def test_refresh_is_throttled(self, session_maker, statements):
+        async with session_maker() as db:
+            await inventory_insights.ensure_fresh(db, 1)
+            statements.clear()
+            await inventory_insights.ensure_fresh(db, 1)
+        assert statements == []
+
+
+class TestQueries:
+    """Tests for the SQL expressions"""
+
+    async def test_low_stock_uses_partial_index(self, session_maker):
+        async with session_maker() as db:
+            query = select(Product.id).where(Product.store_id == 1, Product.is_active == True, LOW_STOCK)
+            compiled = query.compile(db.get_bind(), compile_kwargs={"literal_binds": True})
+            plan = (await db.execute(text(f"EXPLAIN QUERY PLAN {compiled}"))).all()
+        assert any("idx_products_low_stock" in row[-1] for row in plan), plan
+
+    async def test_enough_urgent_products_skip_the_rest(self, session_maker, statements):
+        async with session_maker() as db:
+            statements.clear()
+            rows = await inventory_insights.top_priority(db, 1, limit=2)
+        assert [row.id for row in rows] == [2, 3]
+        assert len(statements) == 1
+
+    async def test_sql_priority_matches_agent(self, session_maker):
+        now = datetime.now()
+        async with session_maker() as db:
+            db.add_all([
+                Product(id=20, store_id=1, name="Expiring", selling_price=1, current_stock=50,
+                        min_stock_alert=10, expiry_date=now + timedelta(days=7, hours=12)),
+                Product(id=21, store_id=1, name="Expiry far", selling_price=1, current_stock=50,
+                        min_stock_alert=10, expiry_date=now + timedelta(days=8, hours=1)),
+                Product(id=22, store_id=1, name="Fast healthy", selling_price=1, current_stock=30,
+                        min_stock_alert=10, sales_velocity=12.0),
+                Product(id=23, store_id=1, name="Half min", selling_price=1, current_stock=5,
+                        min_stock_alert=10),
+            ])
+            await db.commit()
+            await inventory_insights.refresh_velocity(db, 1)
+            (await db.get(Product, 22)).sales_velocity = 12.0  # not sold; set after the refresh
+            await db.commit()
+
+            rows = (await db.execute(
+                select(*PRODUCT_COLUMNS, priority(now).label("priority")).where(Product.store_id == 1)
+            )).all()
+        agent = InventoryAgent()
+        insights = {i.product_id: i for i in await agent.analyze_inventory([product_dict(r) for r in rows])}
+        assert {r.id: r.priority for r in rows} == {pid: i.priority for pid, i in insights.items()}
+
+
+class TestEndpoints:
+    """Tests for the inventory endpoints and dashboard counts"""
+
+    async def test_low_stock_by_days_of_cover(self, client):
+        response = await client.get("/api/v1/products/inventory/low-stock")
+        body = response.json()
+        assert body["count"] == 3
+        assert [p["id"] for p in body["products"]] == [2, 1, 3]
+        assert body["products"][0]["days_of_cover"] == 0.5
+        assert body["products"][2]["days_of_cover"] is None
+
+    async def test_insights_load_only_top_rows(self, client, statements):
+        await client.get("/api/v1/products/inventory/insights")  # refresh velocity
+        statements.clear()
+        response = await client.get("/api/v1/products/inventory/insights")
+        body = response.json()
+        assert body["total_products"] == 5
+        assert [i["product_id"] for i in body["insights"][:3]] == [2, 3, 1]
+        assert sorted(i["product_id"] for i in body["insights"]) == [1, 2, 3, 4, 5]
+        ghee = next(i for i in body["insights"] if i["product_id"] == 5)
+        assert ghee["alert_type"] == "overstock" and ghee["days_of_stock"] == 400
+        product_queries = [sql for sql in statements if "FROM products" in sql]
+        assert len(product_queries) == 3  # counts, urgent products, then the rest
+        assert "count(" in product_queries[0]
+        assert "UNION" in product_queries[1] and "LIMIT" in product_queries[1]
+        assert "NOT IN" in product_queries[2] and "LIMIT" in product_queries[2]
+
+    async def test_reorder_list(self, client, session_maker):
+        async with session_maker() as db:
+            (await db.get(Product, 3)).expiry_date = datetime.now() + timedelta(days=2)
+            await db.commit()
+        body = (await client.get("/api/v1/products/inventory/reorder-list")).json()
+        assert [s["product_id"] for s in body["reorder_list"]] == [2, 1]  # expiring salt is left out
+        dal = body["reorder_list"][0]
+        assert dal["urgency"] == "immediate"
+        assert dal["suggested_quantity"] == 10 * 21 + 10
+        assert body["estimated_total_cost"] == sum(s["estimated_cost"] for s in body["reorder_list"])
+
+    async def test_dashboard_counts(self, client):
+        body = (await client.get("/api/v1/dashboard/stats")).json()
+        assert body["totalProducts"] == 5
+        assert body["lowStockCount"] == 3
@@ -0,0 +1,157 @@
+"""
+KadaiGPT - Tests for the versioned schema migrations
+Run with: pytest tests/test_migrations.py -v
+"""
+
+import json
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.migrations import (
+    migrate, load_migrations, current_version, Migration, Execute, AddColumn, CreateIndex
+)
+from app.services.bill_partitions import duplicate_local_id
+
+
+@pytest.fixture
+async def engine(tmp_path):
+    """Empty SQLite file database"""
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'migrations.db'}")
+    yield engine
+    await engine.dispose()
+
+
+async def columns(engine, table):
+    async with engine.connect() as conn:
+        return [row[1] for row in (await conn.execute(text(f"PRAGMA table_info({table})"))).all()]
+
+
+class TestMigrationFiles:
+    """Tests for discovering migration modules"""
+
+    def test_versions_are_ordered_and_unique(self):
+        versions = [m.version for m in load_migrations()]
+        assert versions == sorted(set(versions))
+        assert versions[0] == 1
+
+
+class TestMigrate:
+    """Tests for applying migrations"""
+
+    async def test_fresh_database_gets_everything_once(self, engine):
+        applied = await migrate(engine)
+        assert applied == [m.version for m in load_migrations()]
+        assert await current_version(engine) == applied[-1]
+        assert "refunded_amount" in await columns(engine, "bills")
+
+        async with engine.connect() as conn:
+            indexes = {row[0] for row in (await conn.execute(
+                text("SELECT name FROM sqlite_master WHERE type = 'index'")
+            )).all()}
+        assert {"idx_bills_store_local_id", "uq_daily_summaries_store_date_hour"} <= indexes
+
+    async def test_current_schema_runs_no_ddl(self, engine):
+        await migrate(engine)
+
+        statements = []
+        listener = lambda conn, cursor, statement, *args: statements.append(statement)
+        event.listen(engine.sync_engine, "before_cursor_execute", listener)
+        try:
+            assert await migrate(engine) == []
+        finally:
+            event.remove(engine.sync_engine, "before_cursor_execute", listener)
+
+        assert len(statements) == 1
+        assert statements[0].startswith("SELECT max(schema_version.version)")
+
+    async def test_legacy_database_is_upgraded(self, engine):
+        async with engine.begin() as conn:
+            await conn.execute(text(
+                "CREATE TABLE bills (id INTEGER PRIMARY KEY, store_id INTEGER, bill_number VARCHAR(50), "
+                "total_amount FLOAT, bill_date TIMESTAMP, created_at TIMESTAMP, status VARCHAR(20), "
+                "customer_phone VARCHAR(20), local_id VARCHAR(50))"
+            ))
+            await conn.execute(text("INSERT INTO bills (id, store_id, bill_number, total_amount) VALUES (1, 1, 'OLD', 10)"))
+
+        await migrate(engine)
+
+        assert "refunded_amount" in await columns(engine, "bills")
+        async with engine.connect() as conn:
+            assert (await conn.execute(text("SELECT bill_number FROM bills"))).scalar() == "OLD"
+
+    async def test_duplicate_offline_bills_are_deduplicated(self, engine):
+        async with engine.begin() as conn:
+            await conn.execute(text(
+                "CREATE TABLE bills (id INTEGER PRIMARY KEY, store_id INTEGER, bill_number VARCHAR(50), "
+                "total_amount FLOAT, bill_date TIMESTAMP, created_at TIMESTAMP, status VARCHAR(20), "
+                "customer_phone VARCHAR(20), local_id VARCHAR(50))"
+            ))
+            # A replay before the unique index stored L1 twice; L1 in store 2 is a different bill
+            await conn.execute(text(
+                "INSERT INTO bills (id, store_id, bill_number, total_amount, local_id) VALUES "
+                "(1, 1, 'A', 10, 'L1'), (2, 1, 'B', 10, 'L1'), (3, 1, 'C', 10, 'L2'), (4, 2, 'D', 10, 'L1')"
+            ))
+
+        assert await migrate(engine) == [m.version for m in load_migrations()]
+        async with engine.connect() as conn:
+            local_ids = dict((await conn.execute(text("SELECT id, local_id FROM bills"))).all())
+            assert local_ids == {1: "L1", 2: "L1#dup-2", 3: "L2", 4: "L1"}
+            guarded = (await conn.execute(text("SELECT store_id, local_id, bill_id FROM bill_local_ids"))).all()
+            assert sorted(guarded) == [(1, "L1", 1), (1, "L1#dup-2", 2), (1, "L2", 3), (2, "L1", 4)]
+            audit = (await conn.execute(text(
+                "SELECT entity_id, old_values, new_values FROM audit_trails WHERE action = 'mark_duplicate'"
+            ))).all()
+            assert [(row[0], json.loads(row[1]), json.loads(row[2])) for row in audit] == [
+                (2, {"local_id": "L1"}, {"local_id": "L1#dup-2", "duplicate_of": 1})
+            ]
+            with pytest.raises(Exception, match="UNIQUE"):
+                await conn.execute(text(
+                    "INSERT INTO bills (store_id, bill_number, total_amount, local_id) VALUES (1, 'E', 10, 'L2')"
+                ))
+
+    def test_duplicate_local_id_fits_the_column(self):
+        marked = duplicate_local_id("x" * 50, 123456)
+        assert len(marked) == 50 and marked.endswith("#dup-123456")
+
+    async def test_extra_open_stock_takes_are_cancelled(self, engine):
+        async with engine.begin() as conn:
+            await conn.execute(text(
+                "CREATE TABLE stock_takes (id INTEGER PRIMARY KEY, store_id INTEGER NOT NULL, user_id INTEGER, "
+                "note VARCHAR(200), status VARCHAR(9) NOT NULL, adjusted_count INTEGER, "
+                "created_at TIMESTAMP, applied_at TIMESTAMP)"
+            ))
+            # Two managers opened a count at once before the unique index
+            await conn.execute(text(
+                "INSERT INTO stock_takes (id, store_id, status) VALUES "
+                "(1, 1, 'OPEN'), (2, 1, 'OPEN'), (3, 1, 'APPLIED'), (4, 2, 'OPEN')"
+            ))
+
+        await migrate(engine)
+        async with engine.connect() as conn:
+            statuses = dict((await conn.execute(text("SELECT id, status FROM stock_takes"))).all())
+            assert statuses == {1: "CANCELLED", 2: "OPEN", 3: "APPLIED", 4: "OPEN"}
+            with pytest.raises(Exception, match="UNIQUE"):
+                await conn.execute(text("INSERT INTO stock_takes (store_id, status) VALUES (2, 'OPEN')"))
+
+    async def test_failed_migration_is_retried(self, engine):
+        good = Migration(1, "good", [Execute("CREATE TABLE IF NOT EXISTS widgets (id INTEGER PRIMARY KEY)")])
+        bad = Migration(2, "bad", [Execute("ALTER TABLE missing ADD COLUMN x INTEGER")])
+        later = Migration(3, "later", [AddColumn("widgets", "name", "VARCHAR(50)")])
+
+        with pytest.raises(Exception, match="missing"):
+            await migrate(engine, [good, bad, later])
+        assert await current_version(engine) == 1
+
+        fixed = Migration(2, "bad", [CreateIndex("idx_widgets_id", "widgets", "id")])
+        assert await migrate(engine, [good, fixed, later]) == [2, 3]
+        assert "name" in await columns(engine, "widgets")
+
+    async def test_dialect_specific_step_skipped(self, engine):
+        step = Execute("CREATE EXTENSION IF NOT EXISTS pg_trgm", dialect="postgresql")
+        assert await migrate(engine, [Migration(1, "pg_only", [step])]) == [1]
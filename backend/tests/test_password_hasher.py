@@ -0,0 +1,119 @@
+"""
+KadaiGPT - Tests for off-loop password hashing and rehash-on-login
+Run with: pytest tests/test_password_hasher.py -v
+"""
+
+import asyncio
+import time
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models import Store, User, UserRole
+from app.services.password_hasher import PasswordHasher, PasswordHasherBusy, password_hasher
+
+
+@pytest.fixture
+def fast_hasher(monkeypatch):
+    """The global hasher at bcrypt's minimum cost"""
+    monkeypatch.setattr(password_hasher, "context", PasswordHasher(4, 1, 0).context)
+    monkeypatch.setattr(password_hasher, "rounds", 4)
+    return password_hasher
+
+
+@pytest.fixture
+def seed(fast_hasher):
+    """A store owner whose password is "secret123" """
+    async def add(db):
+        db.add(Store(id=1, name="Hash Store"))
+        db.add(User(id=1, store_id=1, email="owner@hashstore.in", full_name="Owner", role=UserRole.OWNER,
+                    password_hash=await fast_hasher.hash("secret123")))
+    return add
+
+
+@pytest.fixture
+def acting_user():
+    """Log in for real"""
+    return None
+
+
+async def login(client, password="secret123"):
+    return await client.post("/api/v1/auth/login", data={"username": "owner@hashstore.in", "password": password})
+
+
+class TestPool:
+    """Tests for the hashing thread pool"""
+
+    async def test_hash_and_verify(self):
+        hasher = PasswordHasher(rounds=4, workers=2, max_queue=4)
+        hashed = await hasher.hash("kadai")
+        assert hashed.startswith("$2b$04$")
+        assert await hasher.verify("kadai", hashed)
+        assert not await hasher.verify("wrong", hashed)
+        status = hasher.get_status()
+        assert status["completed"] == 3
+        assert status["hash_ms"]["count"] == 3
+        assert status["in_flight"] == 0
+
+    async def test_event_loop_keeps_running(self):
+        hasher = PasswordHasher(rounds=12, workers=1, max_queue=1)
+        gaps = []
+
+        async def heartbeat(done):
+            last = time.perf_counter()
+            while not done.is_set():
+                await asyncio.sleep(0.005)
+                now = time.perf_counter()
+                gaps.append(now - last)
+                last = now
+
+        done = asyncio.Event()
+        beat = asyncio.create_task(heartbeat(done))
+        await hasher.hash("kadai")
+        done.set()
+        await beat
+        assert len(gaps) > 5
+        assert max(gaps) < 0.1
+
+    async def test_full_queue_rejects(self):
+        hasher = PasswordHasher(rounds=10, workers=1, max_queue=1)
+        results = await asyncio.gather(*(hasher.hash("kadai") for _ in range(3)), return_exceptions=True)
+        assert sum(isinstance(r, PasswordHasherBusy) for r in results) == 1
+        status = hasher.get_status()
+        assert status["rejected"] == 1
+        assert status["peak_waiting"] == 1
+
+    async def test_cost_change_rehashes(self):
+        hasher = PasswordHasher(rounds=4, workers=1, max_queue=0)
+        old_hash = await hasher.hash("kadai")
+        assert await hasher.verify_and_update("kadai", old_hash) == (True, None)
+
+        hasher.configure(5)
+        valid, new_hash = await hasher.verify_and_update("kadai", old_hash)
+        assert valid and new_hash.startswith("$2b$05$")
+        assert await hasher.verify_and_update("wrong", old_hash) == (False, None)
+
+
+class TestLoginRehash:
+    """Tests for /auth/login and /auth/register"""
+
+    async def test_login_upgrades_hash_cost(self, client, session_maker, fast_hasher):
+        fast_hasher.configure(5)
+        assert (await login(client)).status_code == 200
+        async with session_maker() as db:
+            assert (await db.get(User, 1)).password_hash.startswith("$2b$05$")
+        assert (await login(client)).status_code == 200
+
+    async def test_wrong_password_keeps_hash(self, client, session_maker):
+        assert (await login(client, "nope")).status_code == 401
+        async with session_maker() as db:
+            assert (await db.get(User, 1)).password_hash.startswith("$2b$04$")
+
+    async def test_busy_pool_returns_503(self, client, monkeypatch):
+        monkeypatch.setattr(password_hasher, "workers", 0)
+        monkeypatch.setattr(password_hasher, "max_queue", 0)
+        response = await login(client)
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "1"
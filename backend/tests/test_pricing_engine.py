@@ -0,0 +1,116 @@
+"""
+KadaiGPT - Tests for the integer-paise pricing engine
+Run with: pytest tests/test_pricing_engine.py -v
+"""
+
+import random
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.schemas import BillItemCreate
+from app.services.pricing_engine import pricing_engine, to_paise, to_rupees, div_half_up
+from app.services.gst_engine import gst_engine
+from app.routers.bills import process_bill_items, price_bills
+
+
+class TestRounding:
+    """Tests for the integer conversions"""
+
+    def test_to_paise_rounds_half_up_on_decimal_value(self):
+        assert to_paise(1.005) == 101
+        assert to_paise(0.1 + 0.2) == 30
+        assert to_paise(None) == 0
+
+    def test_div_half_up_is_symmetric(self):
+        assert div_half_up(15, 10) == 2
+        assert div_half_up(14, 10) == 1
+        assert div_half_up(-15, 10) == -2
+
+    def test_to_rupees(self):
+        assert to_rupees(31856) == 318.56
+
+
+class TestPricing:
+    """Tests for line and cart pricing"""
+
+    def test_price_line(self):
+        # 99.99 x 3 = 299.97, 10% off = 29.997 -> 30.00, 18% on 269.97 = 48.5946 -> 48.59
+        assert pricing_engine.price_line(99.99, 3, 10, 18) == (29997, 3000, 4859, 31856)
+
+    def test_fractional_quantity(self):
+        assert pricing_engine.price_line(245.5, 0.25)[0] == 6138  # 61.375 -> 61.38
+
+    def test_negative_line(self):
+        assert pricing_engine.price_line(50, -2, 0, 5) == (-10000, 0, -500, -10500)
+
+    def test_cart_total_is_sum_of_lines(self):
+        rng = random.Random(7)
+        lines = [
+            (rng.choice([9.99, 24.5, 120.0]), rng.choice([1, 0.5, 3]),
+             rng.choice([0, 5, 12.5]), rng.choice([0, 5, 18, 28]))
+            for _ in range(300)
+        ]
+        amounts, totals = pricing_engine.price_cart(lines)
+        assert totals["total_amount"] == sum(a[3] for a in amounts)
+        assert totals["total_amount"] == totals["subtotal"] - totals["discount_amount"] + totals["tax_amount"]
+
+    def test_batch_matches_single(self):
+        rng = random.Random(3)
+        carts = [
+            [(rng.choice([1.5, 49.99, 75.0]), rng.choice([1, 2, 0.75]), None, rng.choice([None, 5, 12]))
+             for _ in range(rng.randint(0, 20))]
+            for _ in range(50)
+        ]
+        batch = pricing_engine.price_carts(carts)
+        assert batch == [pricing_engine.price_cart(cart) for cart in carts]
+        for cart, (amounts, _) in zip(carts, batch):
+            assert amounts == [pricing_engine.price_line(*line) for line in cart]
+
+    def test_empty_carts(self):
+        assert pricing_engine.price_carts([[], []])[1][1]["total_amount"] == 0
+
+    def test_change_due(self):
+        assert pricing_engine.change_due(500, 318.56) == 181.44
+        assert pricing_engine.change_due(100, 318.56) == 0
+
+
+class TestBillingUsesEngine:
+    """Tests for the billing helpers built on the engine"""
+
+    def test_process_bill_items(self):
+        items = [
+            BillItemCreate(product_name="Rice", unit_price=99.99, quantity=3, discount_percent=10, tax_rate=18),
+            BillItemCreate(product_name="Bag", unit_price=5, quantity=1, discount_percent=None, tax_rate=None),
+        ]
+        processed, totals = process_bill_items(items)
+        assert processed[0]["total"] == 318.56
+        assert processed[1]["discount_percent"] == 0
+        assert totals == {"subtotal": 304.97, "discount_amount": 30.0, "tax_amount": 48.59, "total_amount": 323.56}
+
+    def test_price_bills_keeps_bill_order(self):
+        carts = [[BillItemCreate(product_name="X", unit_price=p, quantity=1)] for p in (10, 20, 30)]
+        assert [totals["total_amount"] for _, totals in price_bills(carts)] == [10.0, 20.0, 30.0]
+
+    def test_totals_have_no_float_drift(self):
+        [(_, totals)] = price_bills([[BillItemCreate(product_name="X", unit_price=0.1, quantity=3)]])
+        assert totals["total_amount"] == 0.3
+
+
+class TestGSTCalculation:
+    """Tests for GSTComplianceEngine.calculate_tax on the engine"""
+
+    def test_intra_state_halves_add_up(self):
+        result = gst_engine.calculate_tax(10.11, 5, "33", "33")
+        assert result["total_tax"] == 0.51
+        assert result["cgst"] + result["sgst"] == pytest.approx(0.51)
+        assert result["supply_type"] == "intra_state"
+
+    def test_inter_state(self):
+        result = gst_engine.calculate_tax(1000, 18, "33", "29")
+        assert result["igst"] == 180.0
+        assert result["cgst"] == 0
+        assert result["total_with_tax"] == 1180.0
+        assert result["supply_type"] == "inter_state"
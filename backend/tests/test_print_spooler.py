@@ -0,0 +1,207 @@
+"""
+KadaiGPT - Unit Tests for the Print Spooler
+Run with: pytest tests/test_print_spooler.py -v
+"""
+
+import pytest
+import httpx
+import sys
+import os
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import app
+from app.middleware.security import rate_limiter
+from app.models import Store, Bill, BillItem, PrintJob, User, UserRole
+from app.agents.print_agent import print_agent, PrintDecision
+from app.services.print_spooler import PrintSpooler
+
+
+@pytest.fixture
+def seed():
+    """Two stores, an owner and a bill in each store"""
+    async def add(db):
+        db.add_all([Store(id=1, name="Spooler Store"), Store(id=2, name="Other Store")])
+        db.add(User(id=1, store_id=1, email="owner@spool.test", password_hash="x",
+                    full_name="Owner", role=UserRole.OWNER))
+        db.add(Bill(id=1, store_id=1, bill_number="INV-SPOOL-1", total_amount=100, print_count=0))
+        db.add(Bill(id=2, store_id=2, bill_number="INV-OTHER-1", total_amount=100, print_count=0))
+        db.add(BillItem(bill_id=1, product_name="Rice", unit_price=50, quantity=2, subtotal=100, total=100))
+    return add
+
+
+async def _decision():
+    return PrintDecision(should_print=True, printer_name="Counter-1", reason="test", confidence=1.0)
+
+
+async def add_job(session_maker, status, claimed_at=None, bill_id=1):
+    async with session_maker() as db:
+        job = PrintJob(bill_id=bill_id, printer_name="Counter-1", status=status, attempts=0, claimed_at=claimed_at)
+        db.add(job)
+        await db.commit()
+        return job.id
+
+
+@pytest.fixture
+def printer(monkeypatch):
+    """Fake printer whose outcomes are popped from a list"""
+    outcomes = []
+    
+    async def decide(bill_data, preferred_printer=None):
+        return PrintDecision(should_print=True, printer_name=preferred_printer or "Counter-1",
+                             reason="test", confidence=1.0)
+    
+    async def execute(content, printer_name, content_type="receipt", max_retries=None):
+        assert max_retries == 1
+        return {"success": outcomes.pop(0), "attempts": 1, "error": "paper jam"}
+    
+    monkeypatch.setattr(print_agent, "decide_print_strategy", decide)
+    monkeypatch.setattr(print_agent, "execute_silent_print", execute)
+    return outcomes
+
+
+class TestPrintSpooler:
+    """Tests for queueing and draining print jobs"""
+    
+    async def test_enqueue_does_not_print(self, session_maker, printer):
+        spooler = PrintSpooler(session_factory=session_maker)
+        async with session_maker() as db:
+            job = await spooler.enqueue(db, 1, "Counter-1")
+            await db.commit()
+        
+        assert job.status == "pending"
+        assert job.attempts == 0
+    
+    async def test_successful_job_marks_bill_printed(self, session_maker, printer):
+        spooler = PrintSpooler(session_factory=session_maker)
+        async with session_maker() as db:
+            await spooler.enqueue(db, 1, "Counter-1")
+            await db.commit()
+        
+        printer.append(True)
+        outcome = await spooler.process_next("Counter-1")
+        
+        assert outcome["status"] == "completed"
+        assert await spooler.process_next("Counter-1") is None
+        async with session_maker() as db:
+            bill = await db.get(Bill, 1)
+            assert bill.is_printed is True
+            assert bill.print_count == 1
+    
+    async def test_failed_job_retries_then_fails(self, session_maker, printer):
+        spooler = PrintSpooler(session_factory=session_maker)
+        async with session_maker() as db:
+            job = await spooler.enqueue(db, 1, "Counter-1")
+            await db.commit()
+        
+        printer.extend([False, False, False])
+        statuses = [(await spooler.process_next("Counter-1"))["status"] for _ in range(3)]
+        
+        assert statuses == ["pending", "pending", "failed"]
+        async with session_maker() as db:
+            stored = await db.get(PrintJob, job.id)
+            assert stored.attempts == 3
+            assert stored.last_error == "paper jam"
+    
+    async def test_queues_are_per_printer(self, session_maker, printer):
+        spooler = PrintSpooler(session_factory=session_maker)
+        async with session_maker() as db:
+            await spooler.enqueue(db, 1, "Counter-2")
+            await db.commit()
+        
+        assert await spooler.process_next("Counter-1") is None
+        async with session_maker() as db:
+            counts = await spooler.get_queue_counts(db)
+        assert counts == {"Counter-2": {"pending": 1}}
+    
+    async def test_exception_counts_as_failed_attempt(self, session_maker, monkeypatch):
+        spooler = PrintSpooler(session_factory=session_maker)
+        async with session_maker() as db:
+            job = await spooler.enqueue(db, 1, "Counter-1")
+            await db.commit()
+        
+        async def broken(content, printer_name, content_type="receipt", max_retries=None):
+            raise OSError("printer unplugged")
+        monkeypatch.setattr(print_agent, "execute_silent_print", broken)
+        monkeypatch.setattr(print_agent, "decide_print_strategy", lambda *a, **k: _decision())
+        
+        outcome = await spooler.process_next("Counter-1")
+        assert outcome["status"] == "pending" and outcome["attempts"] == 1
+        async with session_maker() as db:
+            stored = await db.get(PrintJob, job.id)
+            assert stored.status == "pending"
+            assert stored.last_error == "OSError: printer unplugged"
+    
+    def test_backoff_is_capped(self):
+        spooler = PrintSpooler()
+        assert spooler.backoff_seconds(1) == spooler.BASE_BACKOFF_SECONDS
+        assert spooler.backoff_seconds(2) == spooler.BASE_BACKOFF_SECONDS * 2
+        assert spooler.backoff_seconds(50) == spooler.MAX_BACKOFF_SECONDS
+
+
+class TestClaims:
+    """Tests for claiming jobs across workers and processes"""
+    
+    async def test_a_job_is_claimed_once(self, session_maker):
+        job_id = await add_job(session_maker, "pending")
+        first, second = PrintSpooler(session_factory=session_maker), PrintSpooler(session_factory=session_maker)
+        
+        async with session_maker() as db:
+            claimed = await first._claim_next(db, "Counter-1")
+        async with session_maker() as db:
+            assert await second._claim_next(db, "Counter-1") is None
+        assert claimed.id == job_id and claimed.status == "printing" and claimed.attempts == 1
+    
+    async def test_expired_lease_is_claimed_again(self, session_maker):
+        spooler = PrintSpooler(session_factory=session_maker, lease_seconds=60)
+        await add_job(session_maker, "printing", claimed_at=datetime.utcnow())
+        stale = await add_job(session_maker, "printing", claimed_at=datetime.utcnow() - timedelta(minutes=5))
+        
+        async with session_maker() as db:
+            assert (await spooler._claim_next(db, "Counter-1")).id == stale
+            assert await spooler._claim_next(db, "Counter-1") is None
+    
+    async def test_start_requeues_only_expired_claims(self, session_maker, monkeypatch):
+        spooler = PrintSpooler(session_factory=session_maker, lease_seconds=60)
+        monkeypatch.setattr(spooler, "wake", lambda printer_name=None: None)
+        live = await add_job(session_maker, "printing", claimed_at=datetime.utcnow())
+        stale = await add_job(session_maker, "printing", claimed_at=datetime.utcnow() - timedelta(minutes=5))
+        
+        await spooler.start()
+        await spooler.stop()
+        async with session_maker() as db:
+            assert (await db.get(PrintJob, live)).status == "printing"
+            assert (await db.get(PrintJob, stale)).status == "pending"
+
+
+class TestPrintStatus:
+    """Tests for GET /print/status"""
+    
+    @pytest.fixture(autouse=True)
+    def no_printers(self, monkeypatch):
+        async def none():
+            return []
+        monkeypatch.setattr(print_agent, "get_available_printers", none)
+    
+    async def test_requires_authentication(self, session_maker):
+        rate_limiter.reset()
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            response = await client.get("/api/v1/print/status")
+        assert response.status_code in (401, 403)
+    
+    async def test_scoped_to_the_users_store(self, client, session_maker):
+        own = await add_job(session_maker, "pending")
+        other = await add_job(session_maker, "failed", bill_id=2)
+        
+        body = (await client.get("/api/v1/print/status", params={"job_id": own})).json()
+        assert body["job"]["bill_id"] == 1
+        assert body["spooler"]["queues"] == {"Counter-1": {"pending": 1}}
+        assert "last_error" not in body["spooler"]
+        response = await client.get("/api/v1/print/status", params={"job_id": other})
+        assert response.status_code == 404
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
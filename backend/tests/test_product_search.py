@@ -0,0 +1,175 @@
+"""
+KadaiGPT - Tests for the per-store product search index
+Run with: pytest tests/test_product_search.py -v
+"""
+
+import pytest
+import sys
+import os
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import update
+
+from app.models import Bill, BillItem, BillStatus, Product, Store, User, UserRole
+from app.services.product_search import StoreIndex, product_doc, product_search
+
+CATALOGUE = [
+    (1, "Thuvaram Paruppu 1kg", "TP-1KG", "8901234500011"),
+    (2, "Toor Dal Premium 500g", "TD-500", "8901234500028"),
+    (3, "Ponni Rice 5kg", "PR-5KG", "8901234500035"),
+    (4, "Sunflower Oil 1L", "SO-1L", "8901234500042"),
+    (5, "Basmati Rice 1kg", "BR-1KG", "8901234500059"),
+    (6, "Tata Salt 1kg", "TS-1KG", "8901234500066"),
+]
+
+
+def build_index(velocity=None):
+    index = StoreIndex()
+    for product_id, name, sku, barcode in CATALOGUE:
+        index.upsert(product_doc({"id": product_id, "name": name, "sku": sku, "barcode": barcode}))
+    index.velocity = velocity or {}
+    return index
+
+
+@pytest.fixture
+def seed():
+    """The catalogue and a recent bill"""
+    async def add(db):
+        db.add(Store(id=1, name="Search Store"))
+        db.add(User(id=1, store_id=1, email="owner@searchstore.in", password_hash="x",
+                    full_name="Owner", role=UserRole.OWNER))
+        db.add_all([
+            Product(id=pid, store_id=1, name=name, sku=sku, barcode=barcode,
+                    selling_price=100, current_stock=50, min_stock_alert=10)
+            for pid, name, sku, barcode in CATALOGUE
+        ])
+        # Basmati outsells Ponni
+        recent = datetime.now() - timedelta(days=2)
+        db.add(Bill(id=1, store_id=1, bill_number="S-1", bill_date=recent, subtotal=0,
+                    total_amount=0, status=BillStatus.COMPLETED))
+        db.add(BillItem(bill_id=1, product_id=5, product_name="Basmati Rice 1kg",
+                        unit_price=100, quantity=30, subtotal=3000, total=3000))
+        db.add(BillItem(bill_id=1, product_id=3, product_name="Ponni Rice 5kg",
+                        unit_price=100, quantity=2, subtotal=200, total=200))
+    return add
+
+
+async def search(client, term, **params):
+    response = await client.get("/api/v1/products", params={"search": term, **params})
+    assert response.status_code == 200
+    return [p["id"] for p in response.json()]
+
+
+class TestMatching:
+    """Tests for the in-memory index"""
+
+    def test_regional_names_match_both_ways(self):
+        index = build_index()
+        assert set(index.search("toor dal ")) == {1, 2}
+        assert set(index.search("thuvaram paruppu ")) == {1, 2}
+
+    def test_typos_match(self):
+        index = build_index()
+        assert index.search("sunflwer ") == [4]
+        assert 1 in index.search("thuvram")
+
+    def test_last_word_is_a_prefix(self):
+        index = build_index()
+        assert index.search("sunf") == [4]
+        assert index.search("sunf ") == []  # a finished word must match as a whole
+        assert set(index.search("ri")) == {3, 5}
+
+    def test_every_word_must_match(self):
+        index = build_index()
+        assert index.search("basmati rice") == [5]
+        assert index.search("basmati oil") == []
+
+    def test_sku_and_barcode(self):
+        index = build_index()
+        assert index.search("TS-1KG") == [6]
+        assert index.search("8901234500042") == [4]
+        assert len(index.search("89012345000")) == 6
+
+    def test_velocity_breaks_ties(self):
+        assert build_index({3: 5.0, 5: 1.0}).search("rice") == [3, 5]
+        assert build_index({3: 1.0, 5: 5.0}).search("rice") == [5, 3]
+
+    def test_remove(self):
+        index = build_index()
+        index.remove(4)
+        assert index.search("sunflower") == []
+
+
+class TestEndpoint:
+    """Tests for GET /products?search="""
+
+    async def test_ranked_by_sales_velocity(self, client):
+        assert await search(client, "rice") == [5, 3]
+
+    async def test_transliterated_search(self, client):
+        assert set(await search(client, "toor dal")) == {1, 2}
+
+    async def test_pagination(self, client):
+        assert await search(client, "rice", skip=1, limit=1) == [3]
+
+    async def test_warm_search_runs_one_primary_key_query(self, client, statements):
+        await search(client, "rice")
+        statements.clear()
+        await search(client, "oil")
+        product_queries = [sql for sql in statements if "FROM products" in sql]
+        assert len(product_queries) == 1
+        assert "products.id IN" in product_queries[0]
+        assert "LIKE" not in product_queries[0].upper()
+
+    async def test_low_stock_filter(self, client, session_maker):
+        async with session_maker() as db:
+            (await db.get(Product, 3)).current_stock = 2
+            await db.commit()
+        assert await search(client, "rice", low_stock_only=True) == [3]
+
+
+class TestIncrementalUpdates:
+    """Tests for index maintenance on product writes"""
+
+    async def test_create_update_delete_without_rebuild(self, client):
+        await search(client, "rice")
+        builds = product_search.get_stats()["builds"]
+
+        response = await client.post("/api/v1/products", json={"name": "Idli Rice 25kg", "selling_price": 1100})
+        new_id = response.json()["id"]
+        assert new_id in await search(client, "idli")
+
+        await client.put(f"/api/v1/products/{new_id}", json={"name": "Sona Masoori 25kg"})
+        assert await search(client, "idli") == []
+        assert await search(client, "sona masoori") == [new_id]
+
+        await client.delete(f"/api/v1/products/{new_id}")
+        assert await search(client, "sona") == []
+        assert await search(client, "sona", active_only=False) == [new_id]
+
+        assert product_search.get_stats()["builds"] == builds
+
+    async def test_rolled_back_write_not_indexed(self, client, session_maker):
+        await search(client, "rice")
+        async with session_maker() as db:
+            (await db.get(Product, 4)).name = "Groundnut Oil 1L"
+            await db.flush()
+            await db.rollback()
+        assert await search(client, "sunflower") == [4]
+
+    async def test_bulk_update_drops_indexes(self, client, session_maker):
+        await search(client, "rice")
+        async with session_maker() as db:
+            await db.execute(update(Product).where(Product.id == 4).values(name="Groundnut Oil 1L"))
+            await db.commit()
+        assert product_search.get_stats()["stores"] == 0
+        assert await search(client, "groundnut") == [4]
+
+    async def test_ttl_rebuild(self, client, monkeypatch):
+        monkeypatch.setattr(product_search, "ttl_seconds", 0)
+        builds = product_search.get_stats()["builds"]
+        await search(client, "rice")
+        await search(client, "rice")
+        assert product_search.get_stats()["builds"] == builds + 2
@@ -0,0 +1,179 @@
+"""
+KadaiGPT - Tests for the GCRA rate limiter and its stores
+Run with: pytest tests/test_rate_limit.py -v
+"""
+
+import os
+import pytest
+import httpx
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import app
+from app.middleware.rate_limit import (
+    BLOCK_SECONDS, EMPTY_STATE, MemoryRateLimitStore, RateLimiter, SharedRateLimitStore, gcra,
+)
+from app.middleware.security import rate_limiter
+
+
+class FakeClock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def limiter(clock):
+    return RateLimiter(MemoryRateLimitStore(max_keys=100), clock=clock)
+
+
+@pytest.fixture
+async def client():
+    rate_limiter.reset()  # the suite shares one client IP
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        yield client
+    rate_limiter.reset()
+
+
+class TestGCRA:
+    """Tests for the algorithm"""
+
+    def test_burst_then_limited(self, limiter):
+        results = [limiter.check_rate_limit("ip", 10, 60) for _ in range(11)]
+        assert [allowed for allowed, _ in results] == [True] * 10 + [False]
+        assert [remaining for _, remaining in results[:10]] == list(range(9, -1, -1))
+
+    def test_window_slides_smoothly(self, limiter, clock):
+        for _ in range(10):
+            limiter.check_rate_limit("ip", 10, 60)
+        state, decision = gcra(limiter.store.get("ip", clock.now), clock.now, 10, 60)
+        assert not decision.allowed
+        assert decision.retry_after == pytest.approx(6.0)
+
+        # One request's worth of capacity comes back every window / max_requests
+        clock.now += 6
+        assert limiter.check_rate_limit("ip", 10, 60) == (True, 0)
+        assert limiter.check_rate_limit("ip", 10, 60)[0] is False
+        clock.now += 60
+        assert limiter.check_rate_limit("ip", 10, 60) == (True, 9)
+
+    def test_repeated_refusals_block(self, limiter, clock):
+        for _ in range(3):
+            limiter.check_rate_limit("ip", 3, 60)
+        for _ in range(3):
+            assert limiter.check_rate_limit("ip", 3, 60)[0] is False
+        assert limiter.is_blocked("ip")
+
+        clock.now += 60  # the window has passed but the block has not
+        assert limiter.check_rate_limit("ip", 3, 60)[0] is False
+        clock.now += BLOCK_SECONDS
+        assert limiter.check_rate_limit("ip", 3, 60)[0] is True
+        assert not limiter.is_blocked("ip")
+
+    def test_manual_block(self, limiter, clock):
+        limiter.block("ip", 30)
+        assert limiter.is_blocked("ip")
+        clock.now += 31
+        assert not limiter.is_blocked("ip")
+
+    def test_keys_are_independent(self, limiter):
+        for _ in range(5):
+            limiter.check_rate_limit("a:auth", 5, 60)
+        assert limiter.check_rate_limit("a:auth", 5, 60)[0] is False
+        assert limiter.check_rate_limit("b:auth", 5, 60)[0] is True
+
+
+class TestMemoryStore:
+    """Tests for bounded memory"""
+
+    def test_idle_keys_evicted(self, limiter, clock):
+        for i in range(50):
+            limiter.check_rate_limit(f"ip{i}", 10, 60)
+        assert limiter.get_stats()["keys"] == 50
+
+        clock.now += 7  # one interval: every TAT has passed
+        limiter.check_rate_limit("fresh", 10, 60)
+        stats = limiter.get_stats()
+        assert stats["keys"] == 1
+        assert stats["evicted"] == 50
+
+    def test_key_count_capped(self, clock):
+        limiter = RateLimiter(MemoryRateLimitStore(max_keys=10), clock=clock)
+        for i in range(1000):
+            limiter.check_rate_limit(f"ip{i}", 10, 60)
+        assert limiter.get_stats()["keys"] == 10
+        # The most recent keys survive
+        assert limiter.store.get("ip999", clock.now) != EMPTY_STATE
+        assert limiter.store.get("ip0", clock.now) == EMPTY_STATE
+
+
+class TestSharedStore:
+    """Tests for the mmap'd store shared by worker processes"""
+
+    def test_workers_share_state(self, tmp_path, clock):
+        path = str(tmp_path / "ratelimit")
+        worker_a = RateLimiter(SharedRateLimitStore(path, 64), clock=clock)
+        worker_b = RateLimiter(SharedRateLimitStore(path, 64), clock=clock)
+
+        for _ in range(3):
+            assert worker_a.check_rate_limit("ip:auth", 5, 60)[0]
+        assert worker_b.check_rate_limit("ip:auth", 5, 60) == (True, 1)
+        assert worker_a.check_rate_limit("ip:auth", 5, 60) == (True, 0)
+        assert worker_b.check_rate_limit("ip:auth", 5, 60)[0] is False
+
+        worker_a.block("other", 60)
+        assert worker_b.is_blocked("other")
+
+    def test_fixed_size(self, tmp_path, clock):
+        path = str(tmp_path / "ratelimit")
+        limiter = RateLimiter(SharedRateLimitStore(path, 16), clock=clock)
+        for i in range(1000):
+            limiter.check_rate_limit(f"ip{i}", 10, 60)
+        assert os.path.getsize(path) == 16 * SharedRateLimitStore.SLOT.size
+        assert limiter.get_stats()["live_keys"] <= 16
+        # The latest key always gets a slot
+        assert limiter.check_rate_limit("ip999", 10, 60) == (True, 8)
+
+    def test_idle_slot_reused(self, tmp_path, clock):
+        store = SharedRateLimitStore(str(tmp_path / "ratelimit"), 1)
+        limiter = RateLimiter(store, clock=clock)
+        limiter.check_rate_limit("first", 10, 60)
+        clock.now += 7
+        limiter.check_rate_limit("second", 10, 60)
+        assert store.get("first", clock.now) == EMPTY_STATE
+
+    def test_reset(self, tmp_path, clock):
+        limiter = RateLimiter(SharedRateLimitStore(str(tmp_path / "ratelimit"), 64), clock=clock)
+        limiter.check_rate_limit("ip", 10, 60)
+        limiter.reset()
+        assert limiter.get_stats()["live_keys"] == 0
+
+
+class BrokenStore:
+    is_async = True
+
+    async def hit(self, key, now, max_requests, window_seconds):
+        raise ConnectionError("redis down")
+
+
+class TestLimiter:
+    async def test_async_store_failure_fails_open(self):
+        decision = await RateLimiter(BrokenStore()).check("ip", 5, 60)
+        assert decision.allowed
+        assert decision.remaining == 5
+
+    async def test_429_carries_retry_after(self, client):
+        for _ in range(5):
+            assert (await client.get("/api/v1/auth/me")).status_code == 401
+        response = await client.get("/api/v1/auth/me")
+        assert response.status_code == 429
+        assert 1 <= int(response.headers["Retry-After"]) <= 12
@@ -0,0 +1,135 @@
+"""
+KadaiGPT - Tests for read-replica routing with read-your-writes
+Run with: pytest tests/test_read_replica.py -v
+
+Two SQLite files stand in for the primary and the replica; they are
+seeded with different bills so each response shows which one served it.
+"""
+
+import pytest
+import httpx
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+from main import app
+from app.middleware.security import rate_limiter
+from app.database import Base, get_db, replica_router
+from app.models import Store, User, Product, Bill, UserRole
+from app.routers.auth import get_current_active_user, get_current_user
+from app.services.sales_counters import sales_counters
+
+
+async def make_database(path, bill_number):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with maker() as db:
+        db.add_all([Store(id=1, name="Store One"), Store(id=2, name="Store Two")])
+        db.add_all([
+            User(id=1, store_id=1, email="one@replica.test", password_hash="x", full_name="One", role=UserRole.OWNER),
+            User(id=2, store_id=2, email="two@replica.test", password_hash="x", full_name="Two", role=UserRole.OWNER),
+        ])
+        db.add(Product(id=1, store_id=1, name="Rice", selling_price=50, current_stock=100))
+        db.add_all([
+            Bill(store_id=store_id, bill_number=f"{bill_number}-{store_id}", total_amount=10, subtotal=10)
+            for store_id in (1, 2)
+        ])
+        await db.commit()
+    return engine, maker
+
+
+@pytest.fixture
+async def databases(tmp_path, monkeypatch):
+    """(primary, replica) session makers, with the replica wired into the router"""
+    primary_engine, primary = await make_database(tmp_path / "primary.db", "PRIMARY")
+    replica_engine, replica = await make_database(tmp_path / "replica.db", "REPLICA")
+    monkeypatch.setattr(replica_router, "read_session_maker", replica)
+    monkeypatch.setattr(replica_router, "_last_write", {})
+    sales_counters.invalidate()
+    yield primary, replica
+    sales_counters.invalidate()
+    await primary_engine.dispose()
+    await replica_engine.dispose()
+
+
+@pytest.fixture
+def client_for(databases):
+    """API client factory acting as the owner of a given store"""
+    primary, _ = databases
+
+    async def override_get_db():
+        async with primary() as session:
+            yield session
+
+    def make(user_id):
+        async def override_user():
+            async with primary() as session:
+                return await session.get(User, user_id)
+
+        app.dependency_overrides[get_db] = override_get_db
+        app.dependency_overrides[get_current_user] = override_user
+        app.dependency_overrides[get_current_active_user] = override_user
+        rate_limiter.reset()  # the suite shares one client IP
+        return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+    yield make
+    app.dependency_overrides.clear()
+
+
+async def activity_source(client):
+    """Which database served the activity feed"""
+    response = await client.get("/api/v1/dashboard/activity")
+    assert response.status_code == 200
+    messages = " ".join(a["message"] for a in response.json() if a["type"] == "sale")
+    return "replica" if "REPLICA" in messages else "primary"
+
+
+async def create_bill(client):
+    response = await client.post("/api/v1/bills?auto_print=false", json={
+        "payment_method": "cash",
+        "items": [{"product_id": 1, "product_name": "Rice", "unit_price": 50, "quantity": 1}]
+    })
+    assert response.status_code == 201
+
+
+class TestReadRouting:
+    """Tests for get_read_db"""
+
+    async def test_reads_go_to_replica(self, client_for):
+        assert await activity_source(client_for(1)) == "replica"
+
+    async def test_write_pins_only_that_store_to_primary(self, client_for):
+        await create_bill(client_for(1))
+
+        assert await activity_source(client_for(1)) == "primary"
+        assert await activity_source(client_for(2)) == "replica"
+
+    async def test_window_expiry_returns_to_replica(self, client_for, monkeypatch):
+        await create_bill(client_for(1))
+        monkeypatch.setattr(replica_router, "window_seconds", 0)
+        assert await activity_source(client_for(1)) == "replica"
+
+    async def test_rolled_back_write_does_not_pin(self, databases, client_for):
+        primary, _ = databases
+        async with primary() as db:
+            db.add(Bill(store_id=1, bill_number="ROLLED-BACK", total_amount=1, subtotal=1))
+            await db.flush()
+            await db.rollback()
+        assert await activity_source(client_for(1)) == "replica"
+
+    async def test_offline_batch_pins_store(self, client_for):
+        batch = {"bills": [{
+            "local_id": "offline-1", "payment_method": "cash",
+            "items": [{"product_id": 1, "product_name": "Rice", "unit_price": 50, "quantity": 1}]
+        }]}
+        assert (await client_for(1).post("/api/v1/bills/batch", json=batch)).status_code == 200
+        assert await activity_source(client_for(1)) == "primary"
+
+    async def test_without_replica_reads_use_primary(self, client_for, monkeypatch):
+        monkeypatch.setattr(replica_router, "read_session_maker", None)
+        assert await activity_source(client_for(1)) == "primary"
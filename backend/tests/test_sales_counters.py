@@ -0,0 +1,211 @@
+"""
+KadaiGPT - Tests for the live sales counters
+Run with: pytest tests/test_sales_counters.py -v
+"""
+
+import pytest
+import httpx
+import sys
+import os
+from datetime import date, datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import FastAPI
+from sqlalchemy import select
+
+from main import app
+from app.models import Store, User, Product, Bill, DailySummary, UserRole, BillStatus, PaymentMethod
+from app.routers import backup
+from app.config import settings
+from app.services.sales_counters import (
+    sales_counters, SalesCounters, DAILY_ROW_HOUR, day_start, local_bill_time, store_today, utc_day_bounds
+)
+
+
+@pytest.fixture
+def seed():
+    """A store, its owner and a product"""
+    async def add(db):
+        db.add(Store(id=1, name="Counter Store"))
+        db.add(User(id=1, store_id=1, email="owner@counter.test", password_hash="x",
+                    full_name="Owner", role=UserRole.OWNER))
+        db.add(Product(id=1, store_id=1, name="Rice", selling_price=50, current_stock=1000))
+    return add
+
+
+def bill(quantity=1, payment_method="cash", price=50.0):
+    return {
+        "payment_method": payment_method,
+        "items": [{"product_id": 1, "product_name": "Rice", "unit_price": price, "quantity": quantity}]
+    }
+
+
+async def create_bills(client, *bills):
+    ids = []
+    for data in bills:
+        response = await client.post("/api/v1/bills?auto_print=false", json=data)
+        assert response.status_code == 201
+        ids.append(response.json()["id"])
+    return ids
+
+
+class TestLiveCounters:
+    """Tests for today's counters through the API"""
+
+    async def test_today_analytics_follow_bills(self, client):
+        await create_bills(client, bill(2), bill(1, "upi"), bill(3, "cash"))
+
+        data = (await client.get("/api/v1/bills/analytics/today")).json()
+        assert data["today"] == {"revenue": 300.0, "bills": 3, "avg_bill_value": 100.0}
+        assert data["payment_breakdown"] == {"cash": 250.0, "upi": 50.0}
+
+        hourly = (await client.get("/api/v1/bills/analytics/hourly")).json()
+        assert len(hourly) == 24
+        assert sum(h["bills"] for h in hourly) == 3
+        assert sum(h["revenue"] for h in hourly) == 300.0
+
+        stats = (await client.get("/api/v1/dashboard/stats")).json()
+        assert stats["todaySales"] == 300.0
+        assert stats["todayBills"] == 3
+
+    async def test_cancel_removes_bill(self, client):
+        first, second = await create_bills(client, bill(2), bill(1, "upi"))
+        assert (await client.post(f"/api/v1/bills/{second}/cancel")).status_code == 200
+
+        data = (await client.get("/api/v1/bills/analytics/today")).json()
+        assert data["today"]["revenue"] == 100.0
+        assert data["today"]["bills"] == 1
+        assert data["payment_breakdown"] == {"cash": 100.0}
+
+    async def test_batch_updates_counters(self, client):
+        await client.get("/api/v1/bills/analytics/today")  # warm the snapshot
+        bills = [{**bill(1), "local_id": f"off-{i}"} for i in range(5)]
+        assert (await client.post("/api/v1/bills/batch", json={"bills": bills})).status_code == 200
+
+        data = (await client.get("/api/v1/bills/analytics/today")).json()
+        assert data["today"]["bills"] == 5
+        assert data["today"]["revenue"] == 250.0
+
+    async def test_summary_rows_are_upserted(self, client, session_maker):
+        await create_bills(client, *[bill(1) for _ in range(4)])
+
+        async with session_maker() as db:
+            rows = (await db.execute(select(DailySummary))).scalars().all()
+        assert len(rows) == 2
+        daily = next(r for r in rows if r.hour == DAILY_ROW_HOUR)
+        assert daily.total_bills == 4
+        assert daily.total_revenue == 200.0
+        assert daily.cash_amount == 200.0
+        assert daily.total_items_sold == 4
+
+    async def test_backup_exports_one_row_per_day(self, client):
+        await create_bills(client, *[bill(1) for _ in range(3)])
+        backup_app = FastAPI()  # the backup router is only mounted lazily by app.main
+        backup_app.include_router(backup.router, prefix="/api/v1")
+        backup_app.dependency_overrides = app.dependency_overrides
+        transport = httpx.ASGITransport(app=backup_app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as backup_client:
+            body = (await backup_client.get("/api/v1/backup/export")).json()
+        assert len(body["daily_summaries"]) == 1
+        assert body["daily_summaries"][0]["total_bills"] == 3
+        assert body["export_info"]["counts"]["daily_summaries"] == 1
+
+    async def test_reads_do_not_scan_bills(self, client, session_maker, statements):
+        await create_bills(client, *[bill(1) for _ in range(10)])
+        async with session_maker() as db:
+            db.add(DailySummary(store_id=1, summary_date=day_start(store_today() - timedelta(days=1)),
+                                hour=DAILY_ROW_HOUR, total_bills=1, total_revenue=10))
+            await db.commit()
+        sales_counters.invalidate()  # force a reload from the summary rows
+
+        statements.clear()
+        await client.get("/api/v1/bills/analytics/today")
+        await client.get("/api/v1/bills/analytics/hourly")
+
+        assert statements
+        assert not [s for s in statements if "FROM bills" in s]
+
+
+class TestRebuildAndHistory:
+    """Tests for rebuilding missing summaries and past days"""
+
+    async def test_rebuild_from_existing_bills(self, session_maker):
+        now = datetime.now(timezone.utc)
+        async with session_maker() as db:
+            db.add_all([
+                Bill(store_id=1, bill_number=f"OLD-{i}", subtotal=100, total_amount=100,
+                     payment_method=PaymentMethod.CARD, status=BillStatus.COMPLETED, bill_date=now)
+                for i in range(3)
+            ])
+            db.add(Bill(store_id=1, bill_number="OLD-X", subtotal=999, total_amount=999,
+                        payment_method=PaymentMethod.CASH, status=BillStatus.CANCELLED, bill_date=now))
+            await db.commit()
+
+        counters = SalesCounters()
+        async with session_maker() as db:
+            today = await counters.get_today(db, 1)
+        assert today.bills == 3
+        assert today.revenue == 30000
+        assert today.payments["card"] == 30000
+        assert today.hourly_bills[local_bill_time(now).hour] == 3
+
+    async def test_yesterday_revenue_from_summary_row(self, session_maker):
+        yesterday = store_today() - timedelta(days=1)
+        async with session_maker() as db:
+            db.add(DailySummary(store_id=1, summary_date=day_start(yesterday), hour=DAILY_ROW_HOUR,
+                                total_bills=2, total_revenue=150.5))
+            await db.commit()
+            assert await sales_counters.get_day_revenue(db, 1, yesterday) == 150.5
+
+
+class TestStoreTimezone:
+    """Tests for keying days and hours on the store's wall clock"""
+
+    @pytest.fixture(autouse=True)
+    def ist(self, monkeypatch):
+        monkeypatch.setattr(settings, "store_timezone", "Asia/Kolkata")
+
+    def test_naive_bill_date_is_utc(self):
+        # SQLite's CURRENT_TIMESTAMP is UTC: 20:00 UTC is 01:30 the next day in IST
+        assert local_bill_time(datetime(2026, 10, 17, 20, 0)) == datetime(2026, 10, 18, 1, 30)
+        aware = datetime(2026, 10, 17, 20, 0, tzinfo=timezone.utc)
+        assert local_bill_time(aware) == datetime(2026, 10, 18, 1, 30)
+
+    def test_day_bounds_in_utc(self):
+        start, end = utc_day_bounds(date(2026, 10, 18))
+        assert start == datetime(2026, 10, 17, 18, 30, tzinfo=timezone.utc)
+        assert end == datetime(2026, 10, 18, 18, 30, tzinfo=timezone.utc)
+
+    async def test_rebuild_buckets_by_store_day(self, session_maker):
+        utc_times = [
+            datetime(2026, 10, 17, 17, 0),   # 22:30 IST on the 17th
+            datetime(2026, 10, 17, 19, 0),   # 00:30 IST on the 18th
+            datetime(2026, 10, 18, 10, 15),  # 15:45 IST
+            datetime(2026, 10, 18, 10, 45),  # 16:15 IST
+        ]
+        async with session_maker() as db:
+            db.add_all([
+                Bill(store_id=1, bill_number=f"TZ-{i}", subtotal=100, total_amount=100,
+                     payment_method=PaymentMethod.CASH, status=BillStatus.COMPLETED, bill_date=when)
+                for i, when in enumerate(utc_times)
+            ])
+            await db.commit()
+
+            assert await SalesCounters().rebuild_day(db, 1, date(2026, 10, 18))
+            await db.commit()
+            rows = (await db.execute(select(DailySummary))).scalars().all()
+
+        assert {row.summary_date for row in rows} == {day_start(date(2026, 10, 18))}
+        hourly = {row.hour: row.total_bills for row in rows}
+        assert hourly == {DAILY_ROW_HOUR: 3, 0: 1, 15: 1, 16: 1}
+
+    async def test_today_uses_store_clock(self, client, monkeypatch):
+        monkeypatch.setattr(settings, "store_timezone", "Pacific/Kiritimati")  # UTC+14
+        await create_bills(client, bill(1))
+
+        data = (await client.get("/api/v1/bills/analytics/today")).json()
+        assert data["today"]["bills"] == 1
+        hour = local_bill_time(datetime.now(timezone.utc)).hour
+        hourly = (await client.get("/api/v1/bills/analytics/hourly")).json()
+        assert hourly[hour]["bills"] == 1
@@ -0,0 +1,175 @@
+"""
+KadaiGPT - Tests for the pure ASGI security middleware
+Run with: pytest tests/test_security_middleware.py -v
+"""
+
+import asyncio
+import pytest
+import httpx
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse
+
+from app.middleware import security
+from app.middleware.rate_limit import MemoryRateLimitStore, RateLimiter
+from app.middleware.security import SecurityMiddleware, route_timings
+
+
+def build_app(**options):
+    app = FastAPI()
+    app.state.release = asyncio.Event()
+
+    @app.get("/api/v1/items/{item_id}")
+    async def get_item(item_id: int):
+        return {"id": item_id}
+
+    @app.post("/api/v1/auth/login")
+    async def login():
+        raise HTTPException(status_code=401, detail="Incorrect email or password")
+
+    @app.get("/api/v1/export/stream")
+    async def stream():
+        async def chunks():
+            yield b"first,"
+            await app.state.release.wait()
+            yield b"second"
+        return StreamingResponse(chunks(), media_type="text/csv")
+
+    @app.get("/api/health")
+    async def health():
+        return {"status": "healthy"}
+
+    app.add_middleware(SecurityMiddleware, **options)
+    return app
+
+
+@pytest.fixture(autouse=True)
+def limiter(monkeypatch):
+    limiter = RateLimiter(MemoryRateLimitStore(max_keys=100))
+    monkeypatch.setattr(security, "rate_limiter", limiter)
+    route_timings.reset()
+    return limiter
+
+
+@pytest.fixture
+def app():
+    return build_app()
+
+
+@pytest.fixture
+async def client(app):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        yield client
+
+
+def http_scope(path, method="GET", headers=()):
+    return {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": method,
+        "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "", "query_string": b"",
+        "headers": list(headers), "client": ("10.0.0.1", 5000), "server": ("test", 80),
+    }
+
+
+class TestHeaders:
+    async def test_security_headers_on_every_response(self, client):
+        response = await client.get("/api/v1/items/7")
+        assert response.json() == {"id": 7}
+        assert response.headers["X-Content-Type-Options"] == "nosniff"
+        assert response.headers["X-Frame-Options"] == "DENY"
+        assert "frame-ancestors 'none'" in response.headers["Content-Security-Policy"]
+        assert response.headers["X-RateLimit-Remaining"] == "99"
+        assert response.headers["X-Response-Time"].endswith("ms")
+        assert "Strict-Transport-Security" not in response.headers
+
+    async def test_request_ids_are_unique(self, client):
+        ids = {(await client.get("/api/health")).headers["X-Request-ID"] for _ in range(5)}
+        assert len(ids) == 5
+        assert all(len(request_id) == 8 for request_id in ids)
+
+    async def test_hsts_in_production(self):
+        transport = httpx.ASGITransport(app=build_app(hsts=True))
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            response = await client.get("/api/health")
+        assert response.headers["Strict-Transport-Security"].startswith("max-age=31536000")
+
+    async def test_error_responses_get_headers(self, client):
+        response = await client.post("/api/v1/auth/login")
+        assert response.status_code == 401
+        assert response.headers["X-Frame-Options"] == "DENY"
+
+
+class TestRateLimiting:
+    async def test_refused_before_body_is_read(self, app, limiter):
+        for _ in range(5):
+            limiter.check_rate_limit("10.0.0.1:auth", 5, 60)
+
+        sent = []
+
+        async def receive():
+            raise AssertionError("the request body was read")
+
+        async def send(message):
+            sent.append(message)
+
+        await app(http_scope("/api/v1/auth/login", "POST"), receive, send)
+        start = sent[0]
+        assert start["status"] == 429
+        headers = dict(start["headers"])
+        assert 1 <= int(headers[b"retry-after"]) <= 12
+        assert headers[b"x-frame-options"] == b"DENY"
+
+    async def test_health_is_exempt(self, client, limiter):
+        for _ in range(200):
+            limiter.check_rate_limit("127.0.0.1:api", 100, 60)
+        assert (await client.get("/api/health")).status_code == 200
+        assert (await client.get("/api/v1/items/1")).status_code == 429
+
+    async def test_forwarded_for_only_when_trusted(self, limiter):
+        for _ in range(10):
+            limiter.check_rate_limit("203.0.113.9:api", 100, 60)
+        spoofed = {"X-Forwarded-For": "203.0.113.9"}
+
+        for trusted, remaining in ((False, "99"), (True, "89")):
+            transport = httpx.ASGITransport(app=build_app(trust_forwarded_for=trusted))
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                response = await client.get("/api/v1/items/1", headers=spoofed)
+            assert response.headers["X-RateLimit-Remaining"] == remaining
+
+
+class TestStreaming:
+    async def test_chunks_forwarded_unbuffered(self, app):
+        bodies = []
+
+        async def receive():
+            await asyncio.Event().wait()  # the client stays connected
+
+        async def send(message):
+            if message["type"] == "http.response.body" and message.get("body"):
+                bodies.append(message["body"])
+                # The first chunk arrives while the generator still waits
+                app.state.release.set()
+
+        await asyncio.wait_for(app(http_scope("/api/v1/export/stream"), receive, send), timeout=5)
+        assert bodies == [b"first,", b"second"]
+
+
+class TestRouteTimings:
+    async def test_recorded_per_route_template(self, client):
+        for item_id in (1, 2, 3):
+            await client.get(f"/api/v1/items/{item_id}")
+        await client.get("/nowhere")
+
+        routes = route_timings.snapshot()["routes"]
+        assert routes["GET /api/v1/items/{item_id}"]["requests"] == 3
+        assert routes["GET /api/v1/items/{item_id}"]["ms"]["count"] == 3
+        assert routes["(unmatched)"]["requests"] == 1
+
+    async def test_unauthorized_is_audited(self, client):
+        events = len(security.audit_logger.audit_log)
+        await client.post("/api/v1/auth/login")
+        assert security.audit_logger.audit_log[events]["event_type"] == "UNAUTHORIZED"
@@ -0,0 +1,141 @@
+"""
+KadaiGPT - Tests for the serverless profile and the cron trigger
+Run with: pytest tests/test_serverless.py -v
+"""
+
+import pytest
+import httpx
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy.pool import NullPool
+
+from main import app
+from app.config import settings
+from app.database import build_engine_kwargs
+from app.middleware.query_metrics import TimedAsyncQueuePool
+from app.middleware.security import rate_limiter
+from app.services.scheduler import scheduler, register_default_tasks, Task
+
+NEON_POOLER_URL = "postgresql+asyncpg://u:p@ep-cool-1-pooler.ap-southeast-1.aws.neon.tech/db"
+
+
+@pytest.fixture
+def serverless(monkeypatch):
+    monkeypatch.setattr(settings, "serverless", True)
+    monkeypatch.setattr(settings, "database_pgbouncer", None)
+
+
+@pytest.fixture
+async def client(monkeypatch):
+    """API client with a cron secret configured"""
+    monkeypatch.setattr(settings, "cron_secret", "s3cret")
+    tasks = dict(scheduler.tasks)
+    rate_limiter.reset()  # the suite shares one client IP
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        yield client
+    scheduler.tasks.clear()
+    scheduler.tasks.update(tasks)
+
+
+AUTH = {"Authorization": "Bearer s3cret"}
+
+
+class TestDetection:
+    def test_vercel_and_lambda_detected(self, monkeypatch):
+        monkeypatch.setattr(settings, "serverless", None)
+        monkeypatch.delenv("VERCEL", raising=False)
+        monkeypatch.delenv("AWS_LAMBDA_FUNCTION_NAME", raising=False)
+        assert settings.is_serverless() is False
+        monkeypatch.setenv("VERCEL", "1")
+        assert settings.is_serverless() is True
+        monkeypatch.setattr(settings, "serverless", False)
+        assert settings.is_serverless() is False
+
+    def test_pooler_host_detected(self, monkeypatch):
+        monkeypatch.setattr(settings, "database_pgbouncer", None)
+        assert settings.uses_pgbouncer(NEON_POOLER_URL)
+        assert not settings.uses_pgbouncer("postgresql+asyncpg://u:p@ep-cool-1.neon.tech/db")
+
+
+class TestEngineKwargs:
+    """Tests for the engine settings per profile"""
+
+    def test_serverless_uses_null_pool(self, serverless):
+        kwargs = build_engine_kwargs("postgresql+asyncpg://u:p@db.internal/kadai")
+        assert kwargs["poolclass"] is NullPool
+        assert "pool_size" not in kwargs
+        assert "statement_cache_size" not in kwargs["connect_args"]
+
+    def test_pooler_disables_prepared_statement_caches(self, serverless):
+        connect_args = build_engine_kwargs(NEON_POOLER_URL)["connect_args"]
+        assert connect_args["ssl"] == "require"
+        assert connect_args["statement_cache_size"] == 0
+        assert connect_args["prepared_statement_cache_size"] == 0
+        assert connect_args["prepared_statement_name_func"]() != connect_args["prepared_statement_name_func"]()
+
+    def test_long_lived_server_keeps_pool(self, monkeypatch):
+        monkeypatch.setattr(settings, "serverless", False)
+        kwargs = build_engine_kwargs("postgresql+asyncpg://u:p@db.internal/kadai")
+        assert kwargs["poolclass"] is TimedAsyncQueuePool
+        assert kwargs["pool_size"] == 20
+
+
+class TestLifespan:
+    async def test_serverless_boot_skips_ddl_and_loops(self, serverless, monkeypatch):
+        import app.main as production
+
+        async def fail():
+            raise AssertionError("init_db must not run in serverless mode")
+
+        monkeypatch.setattr(production, "init_db", fail)
+        tasks = dict(scheduler.tasks)
+        try:
+            async with production.lifespan(production.app):
+                assert not scheduler.running
+                assert "daily_summary" in scheduler.tasks
+        finally:
+            scheduler.tasks.clear()
+            scheduler.tasks.update(tasks)
+
+
+class TestCronTrigger:
+    """Tests for /api/v1/cron/{task_name}"""
+
+    async def test_requires_secret(self, client, monkeypatch):
+        assert (await client.get("/api/v1/cron/daily_summary")).status_code == 401
+        assert (await client.get("/api/v1/cron/daily_summary",
+                                 headers={"Authorization": "Bearer wrong"})).status_code == 401
+        monkeypatch.setattr(settings, "cron_secret", None)
+        assert (await client.get("/api/v1/cron/daily_summary", headers=AUTH)).status_code == 404
+
+    async def test_runs_task(self, client):
+        calls = []
+        scheduler.add_task(Task("test_cron", lambda: calls.append(1), "interval", interval_minutes=60))
+        response = await client.get("/api/v1/cron/test_cron", headers=AUTH)
+        assert response.status_code == 200
+        assert response.json()["status"] == "completed"
+        assert calls == [1]
+
+    async def test_registers_tasks_on_cold_instance(self, client):
+        scheduler.tasks.clear()
+        response = await client.post("/api/v1/cron/session_cleanup", headers=AUTH)
+        assert response.status_code == 200
+        assert "session_cleanup" in scheduler.tasks
+
+    async def test_disabled_unknown_and_failing_tasks(self, client):
+        register_default_tasks()
+        scheduler.disable_task("weekly_report")
+        assert (await client.get("/api/v1/cron/weekly_report", headers=AUTH)).json()["status"] == "disabled"
+        assert (await client.get("/api/v1/cron/nope", headers=AUTH)).status_code == 404
+
+        def broken():
+            raise RuntimeError("disk full")
+
+        scheduler.add_task(Task("broken", broken, "interval", interval_minutes=5))
+        response = await client.get("/api/v1/cron/broken", headers=AUTH)
+        assert response.status_code == 500
+        assert "disk full" in response.json()["detail"]
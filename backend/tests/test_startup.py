@@ -0,0 +1,124 @@
+"""
+KadaiGPT - Tests for lazy loading and the cold-start import budget
+Run with: pytest tests/test_startup.py -v
+
+The budget tests import app.main in a fresh interpreter, as a new serverless
+instance would. KADAIGPT_IMPORT_BUDGET_S overrides the wall-time budget.
+"""
+
+import json
+import pytest
+import subprocess
+import sys
+import os
+from types import SimpleNamespace
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from fastapi import APIRouter, FastAPI
+from fastapi.testclient import TestClient
+
+from app.utils.lazy import LazyObject, LazyRouter, include_lazy_router, lazy_exports, load_lazy_routers
+
+IMPORT_BUDGET_S = float(os.environ.get("KADAIGPT_IMPORT_BUDGET_S", "6"))
+
+# Loaded on first use only; none of these may be imported by app.main
+DEFERRED_MODULES = [
+    "google.generativeai",
+    "PIL",
+    "app.agents.core.store_manager_agent",
+    "app.agents.core.voice_agent",
+    "app.agents.ocr_agent",
+    "app.services.whatsapp_bot",
+    "app.services.telegram_bot",
+    "app.routers.whatsapp",
+    "app.routers.telegram",
+    "app.routers.gst",
+]
+
+
+@pytest.fixture(scope="module")
+def cold_import():
+    """Import app.main in a fresh interpreter"""
+    script = (
+        "import json, sys, time\n"
+        "start = time.perf_counter()\n"
+        "import app.main\n"
+        "elapsed = time.perf_counter() - start\n"
+        f"print(json.dumps({{'seconds': elapsed, 'loaded': [m for m in {DEFERRED_MODULES!r} if m in sys.modules]}}))\n"
+    )
+    result = subprocess.run([sys.executable, "-c", script], cwd=BACKEND_DIR,
+                            capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+class TestImportBudget:
+    """Tests for what a cold start pays for"""
+
+    def test_heavy_subsystems_not_imported(self, cold_import):
+        assert cold_import["loaded"] == []
+
+    def test_import_within_budget(self, cold_import):
+        assert cold_import["seconds"] < IMPORT_BUDGET_S
+
+
+class TestLazyObject:
+    def test_resolves_on_first_use(self):
+        proxy = LazyObject("json:JSONDecoder")
+        assert "not loaded" in repr(proxy)
+        assert proxy.__name__ == "JSONDecoder"
+        assert "not loaded" not in repr(proxy)
+
+    def test_lazy_exports_cache_on_module(self, monkeypatch):
+        module = SimpleNamespace()
+        monkeypatch.setitem(sys.modules, "kadai_lazy_pkg", module)
+        getter = lazy_exports("kadai_lazy_pkg", {"dumps": "json:dumps"})
+        assert getter("dumps") is json.dumps
+        assert module.dumps is json.dumps
+        with pytest.raises(AttributeError):
+            getter("loads")
+
+
+class TestLazyRouter:
+    """Tests for routers included on the first request"""
+
+    def make_app(self, monkeypatch):
+        router = APIRouter(prefix="/reports", tags=["Reports"])
+
+        @router.get("/daily")
+        async def daily():
+            return {"report": "daily"}
+
+        monkeypatch.setattr(sys.modules[__name__], "reports_router", router, raising=False)
+        app = FastAPI()
+        include_lazy_router(app, f"{__name__}:reports_router", "/api/reports", prefix="/api")
+
+        @app.get("/{full_path:path}")
+        async def spa(full_path: str):
+            return {"spa": full_path}
+
+        return app
+
+    def test_first_request_includes_router_in_place(self, monkeypatch):
+        app = self.make_app(monkeypatch)
+        client = TestClient(app)
+        assert any(isinstance(route, LazyRouter) for route in app.router.routes)
+
+        assert client.get("/api/reports/daily").json() == {"report": "daily"}
+        paths = [getattr(route, "path", None) for route in app.router.routes]
+        assert not any(isinstance(route, LazyRouter) for route in app.router.routes)
+        assert paths.index("/api/reports/daily") < paths.index("/{full_path:path}")
+        assert client.get("/api/reports/daily").json() == {"report": "daily"}
+
+    def test_other_paths_do_not_load(self, monkeypatch):
+        app = self.make_app(monkeypatch)
+        client = TestClient(app)
+        assert client.get("/api/reportsx").json() == {"spa": "api/reportsx"}
+        assert any(isinstance(route, LazyRouter) for route in app.router.routes)
+
+    def test_openapi_loads_pending_routers(self, monkeypatch):
+        app = self.make_app(monkeypatch)
+        load_lazy_routers(app)
+        assert "/api/reports/daily" in app.openapi()["paths"]
@@ -0,0 +1,104 @@
+"""
+KadaiGPT - Unit Tests for the Stock Engine
+Run with: pytest tests/test_stock_engine.py -v
+"""
+
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event, select
+
+from app.models import Store, Product
+from app.services.stock_engine import stock_engine, InsufficientStockError
+
+
+@pytest.fixture
+def seed():
+    """Two stores and three products"""
+    async def add(db):
+        db.add_all([Store(id=1, name="Test Store"), Store(id=2, name="Other Store")])
+        db.add_all([
+            Product(id=1, store_id=1, name="Rice", selling_price=50, current_stock=10),
+            Product(id=2, store_id=1, name="Dal", selling_price=120, current_stock=5),
+            Product(id=3, store_id=2, name="Oil", selling_price=180, current_stock=50),
+        ])
+    return add
+
+
+@pytest.fixture
+async def db(engine, session_maker):
+    """Session on the seeded database"""
+    async with session_maker() as session:
+        session.info["engine"] = engine
+        yield session
+
+
+class TestAggregateQuantities:
+    """Tests for per-product quantity aggregation"""
+    
+    def test_repeated_lines_are_summed(self):
+        quantities = stock_engine.aggregate_quantities([(1, 2), (2, 1), (1, 3), (None, 4)])
+        assert quantities == {1: 5, 2: 1}
+
+
+class TestLockAndValidate:
+    """Tests for the locked product snapshot"""
+    
+    async def test_lock_products_scoped_to_store(self, db):
+        products = await stock_engine.lock_products(db, 1, [2, 1, 3])
+        assert sorted(products) == [1, 2]
+    
+    async def test_shortfall_uses_aggregated_quantity(self, db):
+        products = await stock_engine.lock_products(db, 1, [1])
+        # Two lines of 6 each pass individually but not together
+        quantities = stock_engine.aggregate_quantities([(1, 6), (1, 6)])
+        shortfalls = stock_engine.find_shortfalls(products, quantities)
+        
+        assert len(shortfalls) == 1
+        assert shortfalls[0]["available"] == 10
+        assert shortfalls[0]["shortfall"] == 2
+
+
+class TestDecrementStock:
+    """Tests for the single-statement stock decrement"""
+    
+    async def test_decrement_returns_new_stock(self, db):
+        updated = await stock_engine.decrement_stock(db, 1, {1: 4, 2: 5})
+        await db.commit()
+        
+        assert updated == {1: 6, 2: 0}
+        stock = (await db.execute(select(Product.current_stock).where(Product.id == 1))).scalar()
+        assert stock == 6
+    
+    async def test_decrement_rejects_negative_stock(self, db):
+        with pytest.raises(InsufficientStockError) as exc:
+            await stock_engine.decrement_stock(db, 1, {1: 4, 2: 6})
+        await db.rollback()
+        
+        assert exc.value.items[0]["product_id"] == 2
+        stock = (await db.execute(select(Product.current_stock).where(Product.id == 1))).scalar()
+        assert stock == 10
+    
+    async def test_decrement_ignores_other_store(self, db):
+        with pytest.raises(InsufficientStockError):
+            await stock_engine.decrement_stock(db, 1, {3: 1})
+    
+    async def test_statement_count_is_constant(self, db):
+        statements = []
+        sync_engine = db.info["engine"].sync_engine
+        listener = lambda *args: statements.append(args[2])
+        event.listen(sync_engine, "before_cursor_execute", listener)
+        try:
+            products = await stock_engine.lock_products(db, 1, [1, 2])
+            await stock_engine.decrement_stock(db, 1, {pid: 1 for pid in products})
+        finally:
+            event.remove(sync_engine, "before_cursor_execute", listener)
+        
+        assert len(statements) == 2
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
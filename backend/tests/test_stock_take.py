@@ -0,0 +1,230 @@
+"""
+KadaiGPT - Tests for stock-take sessions and bulk stock adjustment
+Run with: pytest tests/test_stock_take.py -v
+"""
+
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
+
+from app.models import AuditTrail, Product, StockTake, StockTakeLine, StockTakeStatus, Store, User, UserRole
+from app.services.stock_take import stock_takes
+
+STOCK_TAKES = "/api/v1/stock-takes"
+
+
+@pytest.fixture
+def seed():
+    """An owner, a cashier and 300 products"""
+    async def add(db):
+        db.add_all([Store(id=1, name="Count Store"), Store(id=2, name="Other Store")])
+        db.add_all([
+            User(id=1, store_id=1, email="owner@count.test", password_hash="x",
+                 full_name="Owner", role=UserRole.OWNER),
+            User(id=2, store_id=1, email="cashier@count.test", password_hash="x",
+                 full_name="Cashier", role=UserRole.CASHIER),
+        ])
+        db.add_all([
+            Product(id=i, store_id=1, name=f"Item {i}", barcode=f"890{i:010d}", sku=f"SKU-{i}",
+                    selling_price=20, cost_price=10, current_stock=50)
+            for i in range(1, 301)
+        ])
+        db.add(Product(id=999, store_id=2, name="Foreign", barcode="8900000000999",
+                       selling_price=10, current_stock=5))
+    return add
+
+
+async def open_take(client) -> int:
+    response = await client.post(STOCK_TAKES, json={"note": "Monthly count"})
+    assert response.status_code == 201
+    return response.json()["id"]
+
+
+async def stock(session_maker, *ids):
+    async with session_maker() as db:
+        result = await db.execute(select(Product.id, Product.current_stock).where(Product.id.in_(ids)))
+        return dict(result.all())
+
+
+class TestSession:
+    """Tests for opening and cancelling stock takes"""
+
+    async def test_one_open_take_per_store(self, client):
+        take_id = await open_take(client)
+        response = await client.post(STOCK_TAKES, json={})
+        assert response.status_code == 409
+        assert str(take_id) in response.json()["detail"]
+
+    async def test_database_allows_one_open_take(self, session_maker):
+        async with session_maker() as db:
+            db.add_all([StockTake(store_id=1, status=StockTakeStatus.CANCELLED),
+                        StockTake(store_id=1, status=StockTakeStatus.APPLIED),
+                        StockTake(store_id=1), StockTake(store_id=2)])
+            await db.commit()
+            db.add(StockTake(store_id=1))
+            with pytest.raises(IntegrityError):
+                await db.commit()
+
+    async def test_concurrent_open_is_a_conflict(self, client, monkeypatch):
+        take_id = await open_take(client)
+        checks = []
+        open_session = stock_takes.open_session
+
+        async def racing_check(db, store_id):
+            checks.append(store_id)
+            return None if len(checks) == 1 else await open_session(db, store_id)
+
+        monkeypatch.setattr(stock_takes, "open_session", racing_check)
+        response = await client.post(STOCK_TAKES, json={})
+        assert response.status_code == 409
+        assert str(take_id) in response.json()["detail"]
+
+    async def test_cashier_counts_but_cannot_apply(self, client, acting_user):
+        take_id = await open_take(client)
+        acting_user["id"] = 2
+        response = await client.post(f"{STOCK_TAKES}/{take_id}/counts", json={"lines": [{"product_id": 1, "quantity": 3}]})
+        assert response.status_code == 200
+        assert (await client.post(f"{STOCK_TAKES}/{take_id}/apply")).status_code == 403
+
+    async def test_cancel_discards_counts(self, client, session_maker):
+        take_id = await open_take(client)
+        await client.post(f"{STOCK_TAKES}/{take_id}/counts", json={"lines": [{"product_id": 1, "quantity": 3}]})
+        assert (await client.delete(f"{STOCK_TAKES}/{take_id}")).status_code == 200
+        async with session_maker() as db:
+            assert await db.scalar(select(func.count()).select_from(StockTakeLine)) == 0
+        assert (await client.post(f"{STOCK_TAKES}/{take_id}/apply")).status_code == 409
+        await open_take(client)  # the store can count again
+
+
+class TestCounting:
+    """Tests for streaming counts in batches"""
+
+    async def test_scans_add_up_across_batches(self, client):
+        take_id = await open_take(client)
+        await client.post(f"{STOCK_TAKES}/{take_id}/counts", json={"lines": [
+            {"product_id": 1, "quantity": 10},
+            {"code": "8900000000001", "quantity": 5},  # same product, other shelf
+            {"code": "SKU-2", "quantity": 48},
+        ]})
+        response = await client.post(f"{STOCK_TAKES}/{take_id}/counts", json={"lines": [
+            {"product_id": 1, "quantity": 20},
+        ]})
+        assert response.json() == {"accepted": 1, "unknown": []}
+
+        body = (await client.get(f"{STOCK_TAKES}/{take_id}/variance")).json()
+        assert {line["product_id"]: line["counted"] for line in body["lines"]} == {1: 35, 2: 48}
+        assert body["summary"]["counted_products"] == 2
+
+    async def test_counts_lock_the_take(self, client, monkeypatch):
+        take_id = await open_take(client)
+        locks = []
+        load = stock_takes.load
+
+        async def recording_load(db, store_id, stock_take_id, lock=False):
+            locks.append(lock)
+            return await load(db, store_id, stock_take_id, lock=lock)
+
+        monkeypatch.setattr(stock_takes, "load", recording_load)
+        await client.post(f"{STOCK_TAKES}/{take_id}/counts", json={"lines": [{"product_id": 1, "quantity": 1}]})
+        assert locks == [True]
+
+    async def test_replace_overwrites_a_recount(self, client):
+        take_id = await open_take(client)
+        await client.post(f"{STOCK_TAKES}/{take_id}/counts", json={"lines": [{"product_id": 1, "quantity": 10}]})
+        await client.post(f"{STOCK_TAKES}/{take_id}/counts",
+                          json={"lines": [{"product_id": 1, "quantity": 7}], "replace": True})
+        body = (await client.get(f"{STOCK_TAKES}/{take_id}/variance")).json()
+        assert body["lines"][0]["counted"] == 7
+
+    async def test_unknown_and_foreign_products_reported(self, client):
+        take_id = await open_take(client)
+        response = await client.post(f"{STOCK_TAKES}/{take_id}/counts", json={"lines": [
+            {"product_id": 999, "quantity": 1},
+            {"code": "8900000000999", "quantity": 1},
+            {"code": "NO-SUCH-CODE", "quantity": 1},
+            {"product_id": 3, "quantity": 50},
+        ]})
+        assert response.json() == {"accepted": 1, "unknown": [999, "8900000000999", "NO-SUCH-CODE"]}
+
+
+class TestVariance:
+    """Tests for the server-side variance"""
+
+    async def test_summary_and_order(self, client):
+        take_id = await open_take(client)
+        await client.post(f"{STOCK_TAKES}/{take_id}/counts", json={"lines": [
+            {"product_id": 1, "quantity": 48},  # -2
+            {"product_id": 2, "quantity": 40},  # -10
+            {"product_id": 3, "quantity": 53},  # +3
+            {"product_id": 4, "quantity": 50},  # matches
+        ]})
+        body = (await client.get(f"{STOCK_TAKES}/{take_id}/variance")).json()
+        assert body["summary"] == {
+            "counted_products": 4, "products_with_variance": 3,
+            "shortage_units": 12, "excess_units": 3,
+            "shortage_value": 120.0, "excess_value": 30.0,
+        }
+        assert [(line["product_id"], line["variance"]) for line in body["lines"]] == [(2, -10), (3, 3), (1, -2)]
+
+
+class TestApply:
+    """Tests for applying a stock take"""
+
+    async def test_apply_sets_counted_stock_and_audits(self, client, session_maker):
+        take_id = await open_take(client)
+        await client.post(f"{STOCK_TAKES}/{take_id}/counts", json={"lines": [
+            {"product_id": 1, "quantity": 48},
+            {"product_id": 2, "quantity": 50},
+            {"product_id": 3, "quantity": 0},
+        ]})
+        response = await client.post(f"{STOCK_TAKES}/{take_id}/apply")
+        assert response.json()["counted_products"] == 3
+        assert response.json()["adjusted_products"] == 2
+        assert await stock(session_maker, 1, 2, 3, 4) == {1: 48, 2: 50, 3: 0, 4: 50}
+
+        async with session_maker() as db:
+            audits = (await db.execute(select(AuditTrail).order_by(AuditTrail.id))).scalars().all()
+        assert [(a.entity_type, a.entity_id) for a in audits] == [("product", 1), ("product", 3), ("stock_take", take_id)]
+        assert audits[1].old_values == {"current_stock": 50}
+        assert audits[1].new_values == {"current_stock": 0, "stock_take_id": take_id}
+
+        summary = (await client.get(f"{STOCK_TAKES}/{take_id}")).json()
+        assert summary["status"] == "applied" and summary["adjusted_count"] == 2
+
+    async def test_applied_take_is_closed_and_keeps_its_variance(self, client, session_maker):
+        take_id = await open_take(client)
+        await client.post(f"{STOCK_TAKES}/{take_id}/counts", json={"lines": [{"product_id": 1, "quantity": 40}]})
+        await client.post(f"{STOCK_TAKES}/{take_id}/apply")
+        assert (await client.post(f"{STOCK_TAKES}/{take_id}/apply")).status_code == 409
+        response = await client.post(f"{STOCK_TAKES}/{take_id}/counts", json={"lines": [{"product_id": 1, "quantity": 1}]})
+        assert response.status_code == 409
+
+        async with session_maker() as db:
+            (await db.get(Product, 1)).current_stock = 38  # sold after the count
+            await db.commit()
+        body = (await client.get(f"{STOCK_TAKES}/{take_id}/variance")).json()
+        assert body["lines"][0]["expected"] == 50 and body["lines"][0]["variance"] == -10
+
+    async def test_statements_do_not_grow_with_lines(self, client, statements):
+        async def apply_count(products):
+            take_id = await open_take(client)
+            await client.post(f"{STOCK_TAKES}/{take_id}/counts", json={"lines": [
+                {"product_id": i, "quantity": 7} for i in products
+            ]})
+            statements.clear()
+            assert (await client.post(f"{STOCK_TAKES}/{take_id}/apply")).status_code == 200
+            return len(statements)
+
+        assert await apply_count(range(1, 4)) == await apply_count(range(4, 301))
+
+    async def test_scan_lookup_sees_new_stock(self, client):
+        assert (await client.get("/api/v1/products/lookup", params={"code": "SKU-5"})).json()["current_stock"] == 50
+        take_id = await open_take(client)
+        await client.post(f"{STOCK_TAKES}/{take_id}/counts", json={"lines": [{"code": "SKU-5", "quantity": 9}]})
+        await client.post(f"{STOCK_TAKES}/{take_id}/apply")
+        assert (await client.get("/api/v1/products/lookup", params={"code": "SKU-5"})).json()["current_stock"] == 9
@@ -0,0 +1,135 @@
+"""
+KadaiGPT - Tests for the cached user + store resolution in get_current_user
+Run with: pytest tests/test_tenant_cache.py -v
+"""
+
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import select, update
+
+from app.models import Store, User, UserRole
+from app.routers.auth import create_access_token
+from app.services.tenant_cache import tenant_cache
+
+
+@pytest.fixture
+def seed():
+    """One store and two users"""
+    async def add(db):
+        db.add(Store(id=1, name="Tenant Store", gst_number="33ABCDE1234F1Z5", tax_rate=5.0))
+        db.add_all([
+            User(id=1, store_id=1, email="owner@tenantstore.in", password_hash="x", full_name="Owner", role=UserRole.OWNER),
+            User(id=2, store_id=1, email="cashier@tenantstore.in", password_hash="x", full_name="Cashier", role=UserRole.CASHIER),
+        ])
+    return add
+
+
+@pytest.fixture
+def acting_user():
+    """Authenticate with real tokens"""
+    return None
+
+
+def auth(user_id):
+    return {"Authorization": f"Bearer {create_access_token({'sub': str(user_id)})}"}
+
+
+class TestWarmRequests:
+    """Tests for query savings"""
+
+    async def test_second_request_runs_no_query(self, client, statements):
+        assert (await client.get("/api/v1/auth/me", headers=auth(1))).status_code == 200
+        assert len(statements) == 1  # user and store in one joined SELECT
+
+        statements.clear()
+        response = await client.get("/api/v1/auth/me", headers=auth(1))
+        assert response.json()["email"] == "owner@tenantstore.in"
+        assert statements == []
+
+    async def test_store_served_from_cache(self, client, statements):
+        await client.get("/api/v1/auth/me", headers=auth(1))
+        statements.clear()
+        store = (await client.get("/api/v1/auth/me/store", headers=auth(1))).json()
+        assert store["gst_number"] == "33ABCDE1234F1Z5"
+        assert store["tax_rate"] == 5.0
+        assert statements == []
+
+    async def test_cached_user_is_bound_to_session(self, session_maker):
+        async with session_maker() as db:
+            await tenant_cache.get(db, 1)
+        hits = tenant_cache.get_stats()["hits"]
+        async with session_maker() as db:
+            tenant = await tenant_cache.get(db, 1)
+            assert tenant_cache.get_stats()["hits"] == hits + 1
+            assert tenant.user in db
+            tenant.user.full_name = "Renamed Owner"
+            await db.commit()
+
+        async with session_maker() as db:
+            assert (await db.get(User, 1)).full_name == "Renamed Owner"
+            assert (await tenant_cache.get(db, 1)).user.full_name == "Renamed Owner"
+
+
+class TestInvalidation:
+    """Tests for entries dropped on writes"""
+
+    async def test_store_update_reaches_all_its_users(self, client, session_maker):
+        await client.get("/api/v1/auth/me/store", headers=auth(1))
+        await client.get("/api/v1/auth/me/store", headers=auth(2))
+        async with session_maker() as db:
+            store = await db.get(Store, 1)
+            store.name = "Renamed Store"
+            await db.commit()
+
+        assert tenant_cache.get_stats()["entries"] == 0
+        assert (await client.get("/api/v1/auth/me/store", headers=auth(2))).json()["name"] == "Renamed Store"
+
+    async def test_deactivated_user_rejected_at_once(self, client, session_maker):
+        await client.get("/api/v1/auth/me", headers=auth(2))
+        async with session_maker() as db:
+            await db.execute(update(User).where(User.id == 2).values(is_active=False))
+            await db.commit()
+        assert (await client.get("/api/v1/auth/me", headers=auth(2))).status_code == 400
+
+    async def test_rolled_back_write_keeps_entry(self, session_maker):
+        async with session_maker() as db:
+            await tenant_cache.get(db, 1)
+        async with session_maker() as db:
+            user = (await db.execute(select(User).where(User.id == 1))).scalar_one()
+            user.full_name = "Never Saved"
+            await db.flush()
+            await db.rollback()
+        assert tenant_cache.get_stats()["entries"] == 1
+
+    async def test_logout_drops_entry(self, client):
+        await client.get("/api/v1/auth/me", headers=auth(1))
+        assert (await client.post("/api/v1/auth/logout", headers=auth(1))).status_code == 200
+        assert tenant_cache.get_stats()["entries"] == 0
+
+
+class TestLimits:
+    async def test_ttl_expiry(self, session_maker, statements, monkeypatch):
+        monkeypatch.setattr(tenant_cache, "ttl_seconds", 0.0001)
+        async with session_maker() as db:
+            await tenant_cache.get(db, 1)
+        async with session_maker() as db:
+            statements.clear()
+            await tenant_cache.get(db, 1)
+        assert len(statements) == 1
+
+    async def test_lru_eviction(self, session_maker, monkeypatch):
+        monkeypatch.setattr(tenant_cache, "max_entries", 1)
+        hits = tenant_cache.get_stats()["hits"]
+        async with session_maker() as db:
+            await tenant_cache.get(db, 1)
+            await tenant_cache.get(db, 2)
+            assert tenant_cache.get_stats()["entries"] == 1
+            await tenant_cache.get(db, 2)
+        assert tenant_cache.get_stats()["hits"] == hits + 1
+
+    async def test_unknown_user(self, client):
+        assert (await client.get("/api/v1/auth/me", headers=auth(99))).status_code == 401
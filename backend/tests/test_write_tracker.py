@@ -0,0 +1,117 @@
+"""
+KadaiGPT - Tests for the shared session write tracking
+Run with: pytest tests/test_write_tracker.py -v
+"""
+
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import select, update
+
+from app.models import Store, User, UserRole
+from app.services.write_tracker import write_tracker
+
+
+@pytest.fixture
+def seed():
+    """One store and its owner"""
+    async def add(db):
+        db.add(Store(id=1, name="Tracked Store"))
+        db.add(User(id=1, store_id=1, email="owner@tracked.in", password_hash="x",
+                    full_name="Owner", role=UserRole.OWNER))
+    return add
+
+
+@pytest.fixture
+def committed(monkeypatch):
+    """Writes dispatched to commit subscribers during the test"""
+    seen = []
+    monkeypatch.setattr(write_tracker, "_on_commit", [*write_tracker._on_commit, seen.append])
+    return seen
+
+
+class TestWriteTracker:
+    """Tests for collecting a transaction's writes once"""
+
+    async def test_flushes_merge_into_one_dispatch(self, session_maker, committed):
+        async with session_maker() as db:
+            user = User(store_id=1, email="new@tracked.in", password_hash="x", full_name="New")
+            db.add(user)
+            await db.flush()
+            user.full_name = "Renamed"
+            await db.flush()
+            store = await db.get(Store, 1)
+            store.name = "Renamed Store"
+            await db.commit()
+
+        assert len(committed) == 1
+        writes = {(w.model, w.id): w for w in committed[0].rows.values()}
+        assert writes[(User, user.id)].created
+        assert writes[(User, user.id)].store_id == 1
+        assert not writes[(Store, 1)].created
+        assert not writes[(Store, 1)].deleted
+
+    async def test_delete_is_recorded(self, session_maker, committed):
+        async with session_maker() as db:
+            await db.delete(await db.get(User, 1))
+            await db.commit()
+
+        [write] = committed[0].of(User)
+        assert write.deleted
+        assert write.id == 1
+
+    async def test_bulk_update_marks_model(self, session_maker, committed):
+        async with session_maker() as db:
+            await db.execute(update(User).values(is_active=False))
+            await db.commit()
+
+        assert committed[0].bulk_written(User)
+        assert not committed[0].bulk_written(Store)
+
+    async def test_rollback_drops_writes(self, session_maker, committed):
+        async with session_maker() as db:
+            (await db.get(User, 1)).full_name = "Rolled back"
+            await db.flush()
+            await db.rollback()
+            await db.commit()
+
+        assert committed == []
+
+    async def test_reads_dispatch_nothing(self, session_maker, committed):
+        async with session_maker() as db:
+            await db.execute(select(User))
+            await db.commit()
+
+        assert committed == []
+
+    async def test_stock_changes_dispatch_without_orm_writes(self, session_maker, committed):
+        async with session_maker() as db:
+            db.info.setdefault("stock_changes", {})[7] = 3.0
+            await db.commit()
+
+        assert committed[0].stock_changes == {7: 3.0}
+        assert committed[0].rows == {}
+
+    async def test_before_commit_sees_pending_writes(self, session_maker, monkeypatch):
+        seen = []
+        monkeypatch.setattr(write_tracker, "_before_commit", [
+            *write_tracker._before_commit, lambda session, writes: seen.append(writes.of(User))
+        ])
+        async with session_maker() as db:
+            (await db.get(User, 1)).full_name = "Unflushed"
+            await db.commit()
+
+        [[write]] = seen
+        assert write.id == 1 and write.modified
+
+    async def test_rollback_drops_registered_info_keys(self, session_maker):
+        async with session_maker() as db:
+            await db.get(User, 1)  # begin the transaction
+            db.info["stock_changes"] = {1: 5.0}
+            db.info["sync_changes"] = {(1, "product", 1): False}
+            await db.rollback()
+            assert "stock_changes" not in db.info
+            assert "sync_changes" not in db.info